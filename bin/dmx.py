@@ -32,6 +32,7 @@ import glob
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'lib', 'python')
 sys.path.insert(0, LIB)
 import dmx.abnrlib.command
+from dmx.abnrlib.pluginmanifest import get_plugin_manifest, get_wrapper_manifest
 import dmx.utillib.loggingutils 
 from dmx.utillib.logstash import LogStash
 from dmx.helplib.help import *
@@ -68,60 +69,31 @@ def main():
     change_icm_tmpdir()
 
 
-    # import plugins
-    plugins_dir = os.path.join(LIB, "dmx", "wrappers")
-    if not os.path.isdir(plugins_dir):
-        print("Cannot find plugins directory!")
-        #sys.exit(1)
-    plugins = [x[:-3] for x in os.listdir(plugins_dir) if x.endswith('.py') and x[0] != '_']
-    for plugin in plugins:
-        __import__("dmx.wrappers." + plugin)
-    
     # register commands
-    command_table = {}
+    # the wrapper of a command is only imported when it is run (see dmx.abnrlib.pluginmanifest)
+    wrapper_manifest = get_wrapper_manifest()
+    command_table = wrapper_manifest.get_plugin_table()
     parser_table = {}
-    for cmd in dmx.abnrlib.cmdwrapper.CMDWrapper.__subclasses__(): # pylint: disable=E1101
-        cmd_name = cmd.__name__.lower()
-        command_table[cmd_name] = cmd
-        cmd_help = cmd.get_help()
+    for cmd_name in wrapper_manifest.get_plugin_names():
+        cmd_help = wrapper_manifest.plugins[cmd_name]['help']
         cmd_parser = subparsers.add_parser(cmd_name, help=cmd_help, add_help=False, conflict_handler='resolve')
-        cmd_parser.set_defaults(func=cmd.command)
+        cmd_parser.set_defaults(wrapper=cmd_name)
         parser_table[cmd_name] = cmd_parser
 
-    # import sub-plugins
-    subplugins_dir = os.path.join(LIB, "dmx", "plugins")
-    if not os.path.isdir(subplugins_dir):
-        print("Cannot find sub-plugins directory!")
-        #sys.exit(1)
-    subplugins = [x[:-3] for x in os.listdir(subplugins_dir) if x.endswith('.py') and x[0] != '_']
-    for subplugin in subplugins:
-        __import__("dmx.plugins." + subplugin)
-    
-    pluginparser = argparse.ArgumentParser(prog='dmx')
-    subpluginparser = pluginparser.add_subparsers()
-    
-    # register commands' sub_plugins
-    subplugin_table = {}
-    subplugin_parser_table = {}
-    for cmd in dmx.abnrlib.command.Command.__subclasses__():
-        cmd_name = cmd.__name__.lower()
-        subplugin_table[cmd_name] = cmd
-        cmd_help = cmd.get_help()
-        cmd_parser = subpluginparser.add_parser(cmd_name, help=cmd_help, add_help=False)
-        cmd.add_args(cmd_parser)
-        cmd_parser.set_defaults(func=cmd.command)
-        subplugin_parser_table[cmd_name] = cmd_parser
+    # sub-plugins are only imported when their command is run (see dmx.abnrlib.pluginmanifest)
+    subplugin_table = get_plugin_manifest().plugins
     
     # store globals in args
     parser.set_defaults(parser=parser)
     parser.set_defaults(subcommands=command_table)
     parser.set_defaults(subparsers=parser_table)
     parser.set_defaults(subplugins=subplugin_table)
-    parser.set_defaults(subpluginparsers=subplugin_parser_table)
 
     # parse args
     args, options = parser.parse_known_args()
     args.options = options
+    if 'wrapper' in args:
+        args.func = command_table[args.wrapper].command
             
     dmx.abnrlib.command.Command.echo = not 'quiet' in args or not args.quiet
     dmx.abnrlib.command.Command.execute = not 'preview' in args or not args.preview
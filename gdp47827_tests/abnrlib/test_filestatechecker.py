@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the filestatechecker library with a fake xlp4
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os, sys
+import re
+import threading
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.abnrlib.filestatechecker import FileStateChecker, get_path_from_message
+
+WSROOT = '/ws'
+OPENED = set(['v1/rtl/opened.v'])
+OUT_OF_SYNC = set(['v1/rtl/edited.v', 'v2/lint/audit/audit.xml', 'v1/rtl/opened.v'])
+
+class FakeXlp4(object):
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, cmd):
+        match = re.search(r'-x (\S+) (.*)$', cmd)
+        with open(match.group(1)) as f:
+            files = [x for x in f.read().splitlines() if x]
+        with self.lock:
+            self.calls.append((match.group(2), files))
+        out = []
+        err = []
+        for filename in files:
+            variant, libtype, rest = filename.split('/', 2)
+            if match.group(2) == 'opened':
+                if filename in OPENED:
+                    out.append('//depot/gdpxl/intel/p/{}/{}/dev/{}#1 - edit default change (text)'.format(variant, libtype, rest))
+                else:
+                    err.append('{}/{} - file(s) not opened on this client.'.format(WSROOT, filename))
+            else:
+                if filename in OUT_OF_SYNC:
+                    out.append('{}/{}#1 - opened for edit'.format(WSROOT, filename))
+                else:
+                    err.append('{}/{} - no file(s) to reconcile.'.format(WSROOT, filename))
+        return (0, '\n'.join(out) + '\n', '\n'.join(err) + '\n')
+
+
+class TestFileStateChecker(unittest.TestCase):
+
+    def setUp(self):
+        self.files = ['v1/rtl/opened.v', 'v1/rtl/edited.v', 'v1/rtl/insync.v', 'v2/lint/audit/audit.xml', 'v2/lint/insync.xml']
+        self.xlp4 = FakeXlp4()
+
+    def test_001___get_varlib(self):
+        checker = FileStateChecker(WSROOT, jobs=1)
+        self.assertEqual(checker.get_varlib('v1/rtl/a/b.v'), ('v1', 'rtl'))
+        self.assertEqual(checker.get_varlib('/ws/v1/rtl/b.v'), ('v1', 'rtl'))
+        self.assertEqual(checker.get_varlib('/elsewhere/v1/rtl/b.v'), None)
+        self.assertEqual(checker.get_varlib('readme'), None)
+
+    def test_002___get_path_from_message(self):
+        self.assertEqual(get_path_from_message('/ws/v1/rtl/b.v#1 - opened for delete'), '/ws/v1/rtl/b.v')
+
+    def test_003___one_opened_and_one_reconcile_per_varlib(self):
+        with patch('dmx.abnrlib.filestatechecker.run_command', side_effect=self.xlp4):
+            ret = FileStateChecker(WSROOT, jobs=1).check(self.files)
+        self.assertEqual(ret['opened'], ['//depot/gdpxl/intel/p/v1/rtl/dev/opened.v#1 - edit default change (text)'])
+        self.assertEqual(sorted(ret['reconcile']), ['/ws/v1/rtl/edited.v#1 - opened for edit', '/ws/v2/lint/audit/audit.xml#1 - opened for edit'])
+        self.assertEqual(len(self.xlp4.calls), 4)
+        # opened files are not reconciled
+        self.assertIn(('reconcile -n -l', ['v1/rtl/edited.v', 'v1/rtl/insync.v']), self.xlp4.calls)
+
+    def test_004___parallel_gives_the_same_result(self):
+        with patch('dmx.abnrlib.filestatechecker.run_command', side_effect=self.xlp4):
+            serial = FileStateChecker(WSROOT, jobs=1).check(self.files)
+            parallel = FileStateChecker(WSROOT, jobs=4).check(self.files)
+        self.assertEqual(serial, parallel)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,11 +25,16 @@ else:
     from StringIO import StringIO
 import io
 from tempfile import NamedTemporaryFile
+import tempfile
+import shutil
+import hashlib
 from pprint import pprint
 
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
 sys.path.insert(0, LIB)
+import dmx.abnrlib.flows.diffconfigs
 from dmx.abnrlib.flows.diffconfigs import DiffConfigs, DiffConfigsError, ConfigPair, ConfigPairError, HTMLParser, is_file_text, is_file_identical
+from dmx.abnrlib.flows.diffconfigs import compare_files, is_type_keyword_expanded
 from dmx.abnrlib.icmlibrary import IcmLibrary
 from dmx.abnrlib.icmconfig import IcmConfig
 from dmx.abnrlib.config_factory import ConfigFactoryError
@@ -305,10 +310,11 @@ class TestConfigPair(unittest.TestCase):
         filespec = 'this/should/not/exist_too'
         self.assertFalse(is_file_text(filespec))
 
+    @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_files_fstat', return_value={})
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_type')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_diff')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_digest')
-    def test_is_file_identical(self, mock_get_file_digest, mock_get_file_diff, mock_get_file_type):
+    def test_is_file_identical(self, mock_get_file_digest, mock_get_file_diff, mock_get_file_type, mock_get_files_fstat):
         '''
         Test is_file_text method
         '''
@@ -328,10 +334,11 @@ class TestConfigPair(unittest.TestCase):
         mock_get_file_type.side_effect = ['text', 'text']
         self.assertTrue(is_file_identical(first_filespec, second_filespec))
 
+    @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_files_fstat', return_value={})
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_type')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_diff')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_digest')
-    def test_is_file_not_identical(self, mock_get_file_digest, mock_get_file_diff, mock_get_file_type):
+    def test_is_file_not_identical(self, mock_get_file_digest, mock_get_file_diff, mock_get_file_type, mock_get_files_fstat):
         '''
         Test is_file_text method
         '''
@@ -348,9 +355,10 @@ class TestConfigPair(unittest.TestCase):
         mock_get_file_type.return_value = 'text'
         self.assertFalse(is_file_identical(first_filespec, second_filespec))
         
+    @patch('dmx.abnrlib.flows.diffconfigs.compare_files')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_dict_of_files')
     @patch('dmx.abnrlib.flows.diffconfigs.is_file_identical')
-    def test_differ_files(self, mock_is_file_identical, mock_get_dict_of_files):
+    def test_differ_files(self, mock_is_file_identical, mock_get_dict_of_files, mock_compare_files):
         '''
         Test differ files
         '''
@@ -368,9 +376,10 @@ class TestConfigPair(unittest.TestCase):
         pair.second_config = second_config
         self.assertTrue(pair.differ_files(10, 10))
 
+    @patch('dmx.abnrlib.flows.diffconfigs.compare_files')
     @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_dict_of_files')
     @patch('dmx.abnrlib.flows.diffconfigs.is_file_identical')
-    def test_differ_files_no_change(self, mock_is_file_identical, mock_get_dict_of_files):
+    def test_differ_files_no_change(self, mock_is_file_identical, mock_get_dict_of_files, mock_compare_files):
         '''
         Test differ files no change
         '''
@@ -508,6 +517,102 @@ class TestConfigPair(unittest.TestCase):
             output = new_stdout.getvalue()
             self.assertTrue(output.startswith('+ {0}/{1}/{2}'.format(pair.project, pair.variant, pair.libtype)))
 
+class TestCompareFiles(unittest.TestCase):
+    '''
+    Tests the comparison of many files at once, with a single fstat
+    '''
+
+    def setUp(self):
+        dmx.abnrlib.flows.diffconfigs._IDENTICAL_FILES.clear()
+
+    def tearDown(self):
+        dmx.abnrlib.flows.diffconfigs._IDENTICAL_FILES.clear()
+
+    def test_is_type_keyword_expanded(self):
+        for filetype in ('text+k', 'text+kl', 'text+ko', 'ktext', 'kxtext', 'binary+k'):
+            self.assertTrue(is_type_keyword_expanded(filetype), filetype)
+        for filetype in ('text', 'text+l', 'text+x', 'binary', 'binary+l', 'symlink', 'ubinary', ''):
+            self.assertFalse(is_type_keyword_expanded(filetype), filetype)
+
+    @patch('dmx.abnrlib.flows.diffconfigs._is_file_identical')
+    @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_file_diff')
+    @patch('dmx.abnrlib.flows.diffconfigs.ICManageCLI.get_files_fstat')
+    def test_compare_files(self, mock_get_files_fstat, mock_get_file_diff, mock_is_file_identical):
+        mock_get_files_fstat.return_value = {
+            '//depot/same#1': {'digest': 'A', 'size': '10', 'type': 'binary'},
+            '//depot/same#2': {'digest': 'A', 'size': '10', 'type': 'binary'},
+            '//depot/othersize#1': {'digest': 'A', 'size': '11', 'type': 'binary'},
+            '//depot/bin#1': {'digest': 'B', 'size': '10', 'type': 'binary'},
+            '//depot/ktext#1': {'digest': 'C', 'size': '20', 'type': 'text+k'},
+            '//depot/ktext#2': {'digest': 'D', 'size': '21', 'type': 'ktext'},
+            '//depot/kdiff#1': {'digest': 'E', 'size': '20', 'type': 'text+kl'},
+            '//depot/kdiff#2': {'digest': 'F', 'size': '22', 'type': 'text+kl'},
+            '//depot/text#1': {'digest': 'G', 'size': '20', 'type': 'text'},
+            '//depot/nodigest#1': {'digest': '', 'size': '20', 'type': 'text'},
+        }
+        # only the keyword expanded files are diffed
+        mock_get_file_diff.side_effect = lambda first, second: '' if first == '//depot/ktext#1' else 'differ'
+        mock_is_file_identical.return_value = True
+        expected = {
+            ('//depot/same#1', '//depot/same#1'): True,
+            ('//depot/same#1', '//depot/same#2'): True,
+            ('//depot/same#1', '//depot/othersize#1'): False,
+            ('//depot/same#1', '//depot/bin#1'): False,
+            ('//depot/ktext#1', '//depot/ktext#2'): True,
+            ('//depot/kdiff#1', '//depot/kdiff#2'): False,
+            # a binary file is never identical to an expanded text file
+            ('//depot/bin#1', '//depot/ktext#1'): False,
+            ('//depot/text#1', '//depot/bin#1'): False,
+            # files that fstat did not report on, or without digest, are compared one at a time
+            ('//depot/text#1', '//depot/unknown#1'): True,
+            ('//depot/text#1', '//depot/nodigest#1'): True,
+        }
+        compare_files(list(expected.keys()))
+        self.assertEqual(dmx.abnrlib.flows.diffconfigs._IDENTICAL_FILES, expected)
+        self.assertEqual(mock_get_files_fstat.call_count, 1)
+        self.assertEqual(sorted(x[0] for x in mock_get_file_diff.call_args_list),
+            [('//depot/kdiff#1', '//depot/kdiff#2'), ('//depot/ktext#1', '//depot/ktext#2')])
+        self.assertEqual(sorted(x[0] for x in mock_is_file_identical.call_args_list),
+            [('//depot/text#1', '//depot/nodigest#1'), ('//depot/text#1', '//depot/unknown#1')])
+        # already compared files are not queried again
+        compare_files(list(expected.keys()))
+        self.assertTrue(is_file_identical('//depot/same#1', '//depot/same#2'))
+        self.assertEqual(mock_get_files_fstat.call_count, 1)
+
+    @patch('dmx.abnrlib.flows.diffconfigs.run_command')
+    def test_get_large_data_deliverable_files_md5sum(self, mock_run_command):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            datafiles = []
+            for i, data in enumerate(['aaa', 'bbb', 'aaa']):
+                datafiles.append(os.path.join(tmpdir, 'data{}'.format(i)))
+                with open(datafiles[-1], 'w') as f:
+                    f.write(data)
+            stdout = '\n'.join([
+                '//depot/ldd/a b.txt#2 - edit change 100 (text+l)',
+                '{} {}'.format(datafiles[0], datafiles[1]),
+                '//depot/ldd/c.txt#1 - add change 90 (text)',
+                datafiles[2],
+                '//depot/ldd/missing.txt#1 - add change 80 (text)',
+                os.path.join(tmpdir, 'nosuchfile'),
+            ])
+            mock_run_command.return_value = (0, stdout, '')
+            diffconfigs = DiffConfigs.__new__(DiffConfigs)
+            ret = diffconfigs.get_large_data_deliverable_files_md5sum(['//depot/ldd/c.txt#1', '//depot/ldd/a b.txt#2', '//depot/ldd/missing.txt#1'])
+        finally:
+            shutil.rmtree(tmpdir)
+        md5_aaa = hashlib.md5(b'aaa').hexdigest()
+        md5_bbb = hashlib.md5(b'bbb').hexdigest()
+        # the header of a depot path with spaces is recognized too
+        self.assertEqual(ret, {
+            '//depot/ldd/a b.txt#2': '{}\n{}'.format(md5_aaa, md5_bbb),
+            '//depot/ldd/c.txt#1': md5_aaa,
+            '//depot/ldd/missing.txt#1': '',
+        })
+        self.assertEqual(mock_run_command.call_count, 1)
+        self.assertTrue(mock_run_command.call_args[0][0].startswith('_xlp4 -x '))
+        self.assertEqual(diffconfigs.get_large_data_deliverable_files_md5sum([]), {})
+
 class TestHTMLParser(unittest.TestCase):
     '''
     Tests the HTMLParser class
@@ -570,8 +675,9 @@ class TestHTMLParser(unittest.TestCase):
         self.assertEqual('parent_config', html.lookup_dict[pv]['second_config'])
         self.assertIsInstance(list(html.lookup_dict[pv]['ConfigPairs'].values())[0], ConfigPair)
 
+    @patch('dmx.abnrlib.flows.diffconfigs.compare_files')
     @patch('dmx.abnrlib.flows.diffconfigs.is_file_identical')
-    def test_get_file_comparison(self, mock_is_file_identical):
+    def test_get_file_comparison(self, mock_is_file_identical, mock_compare_files):
         mock_is_file_identical.return_value = False
 
         html = HTMLParser('project', 'variant', 'config1', 'config2', None, False)
@@ -84,5 +84,76 @@ class TestFlowsOwner(unittest.TestCase):
     def test_021___get_full_name(self):
         self.assertEqual(self.owner.get_full_name('lionelta'), 'yoke.liang.tan')
 
+
+class FakeObject(object):
+    def __init__(self, project, variant, config=None, libtype=None, library=None, lib_release=None):
+        self.project = project
+        self.variant = variant
+        self.config = config
+        self.libtype = libtype
+        self.library = library
+        self.lib_release = lib_release
+
+    def is_config(self):
+        return self.config is not None
+
+    def is_release(self):
+        return bool(self.lib_release)
+
+    def get_full_name(self, legacy_format=False):
+        if self.is_config():
+            return '{}/{}@{}'.format(self.project, self.variant, self.config)
+        return '{}/{}:{}@{}'.format(self.project, self.variant, self.libtype, self.lib_release or self.library)
+
+class FakeTree(object):
+    def __init__(self, objects):
+        self.objects = objects
+
+    def flatten_tree(self):
+        return self.objects
+
+class TestFlowsOwnerTree(unittest.TestCase):
+
+    def setUp(self):
+        with patch('dmx.abnrlib.flows.owner.ICManageCLI'), patch('dmx.ecolib.ecosphere.EcoSphere'):
+            self.owner = dmx.abnrlib.flows.owner.Owner('p', 'v1')
+        self.tree = FakeTree([
+            FakeObject('p', 'v1', config='REL1'),
+            FakeObject('p', 'v2', config='REL1'),
+            FakeObject('p', 'v1', libtype='rtl', library='dev', lib_release='REL1rtl'),
+            FakeObject('p', 'v2', libtype='rtl', library='dev'),
+            FakeObject('p', 'v2', libtype='lint', library='dev'),
+        ])
+
+    def get_objects(self, path, retkeys=['name']):
+        # Without the site
+        path = path[path.index('/p/'):]
+        self.paths.append(path)
+        objects = {
+            '/p/*/REL1:config': ['/intel/p/v1/REL1', '/intel/p/v2/REL1', '/intel/p/v3/REL1'],
+            '/p/*/*/dev:library': ['/intel/p/v2/rtl/dev', '/intel/p/v2/lint/dev', '/intel/p/v1/rtl/dev'],
+            '/p/*/*/*/REL1rtl:release': ['/intel/p/v1/rtl/dev/REL1rtl'],
+        }
+        return [{'path': x, 'created-by': 'creator', 'created': '2022', 'modified': '2023', 'Owner': x.split('/')[3]} for x in objects[path]]
+
+    def test_100___get_tree_designers___one_query_per_type_and_name(self):
+        self.paths = []
+        cli = dmx.abnrlib.icm.ICManageCLI()
+        self.owner.cli = cli
+        with patch.object(cli, '_get_objects', side_effect=self.get_objects):
+            ret = self.owner.get_tree_designers(self.tree)
+        self.assertEqual(sorted(self.paths), ['/p/*/*/*/REL1rtl:release', '/p/*/*/dev:library', '/p/*/REL1:config'])
+        self.assertEqual([x[0] for x in ret], self.tree.objects)
+        self.assertEqual([x[1] for x in ret], [[[1, 'creator', '2022'], [2, x.variant, '2023']] for x in self.tree.objects])
+
+    def test_101___get_tree_designers___missing_objects_are_skipped(self):
+        self.paths = []
+        cli = dmx.abnrlib.icm.ICManageCLI()
+        self.owner.cli = cli
+        self.tree.objects.append(FakeObject('p', 'v9', config='REL2'))
+        with patch.object(cli, '_get_objects', side_effect=lambda path, retkeys: [] if 'REL2' in path else self.get_objects(path, retkeys)):
+            ret = self.owner.get_tree_designers(self.tree)
+        self.assertEqual(len(ret), 5)
+
 if __name__ == '__main__':
     unittest.main()
@@ -27,6 +27,31 @@ from dmx.abnrlib.icmlibrary import IcmLibrary
 from dmx.abnrlib.icmconfig import IcmConfig
 from mock_ecolib import *
 
+class SerialPool(object):
+    '''
+    Runs the tasks submitted to it in this process, in place of a TaskPool
+    '''
+    def __init__(self, processes):
+        self.processes = processes
+        self.submitted = []
+        self.results = []
+
+    def start(self):
+        return self
+
+    def submit(self, func, *args):
+        taskid = len(self.submitted)
+        self.submitted.append(args)
+        self.results.append((taskid, True, func(*args)))
+        return taskid
+
+    def as_completed(self):
+        while self.results:
+            yield self.results.pop(0)
+
+    def close(self):
+        pass
+
 class TestReleaseTree(unittest.TestCase):
     '''
     Tests the releasetree abnr plugin
@@ -439,11 +464,12 @@ class TestReleaseTree(unittest.TestCase):
         with self.assertRaises(ReleaseTreeError):
             self.runner.release_simple_configs(root_config, unreleased_simples)
 
+    @patch('dmx.abnrlib.flows.releasetree.TaskPool', SerialPool)
     @patch('dmx.abnrlib.flows.releasetree.IcmConfig')
     @patch('dmx.abnrlib.flows.releasetree.ConfigFactory.create_from_icm')
-    @patch('dmx.abnrlib.flows.releasetree.run_mp')
+    @patch('dmx.abnrlib.flows.releasetree.release_composite_config')
     @patch('dmx.abnrlib.flows.releasetree.ICManageCLI.config_exists')
-    def test_018___release_all_composite_configs_works(self, mock_config_exists, mock_run_mp,
+    def test_018___release_all_composite_configs_works(self, mock_config_exists, mock_release_composite_config,
                                                  mock_create_from_icm, mock_composite_config):
         '''
         Tests the release_all_composite_configs method
@@ -498,22 +524,16 @@ class TestReleaseTree(unittest.TestCase):
 
         mock_composite_config.side_effect = composite_config_side_effect            
 
-        def run_mp_side_effect(func, args):
-            results = []
-            for arg in args:
-                results.append(
-                    {
-                        'project' : arg[0],
-                        'variant' : arg[1],
-                        'original_config' : arg[2],
-                        'success' : True,
-                        'released_config' : 'REL{0}'.format(arg[1])
-                    }
-                )
-
-            return results
+        def release_composite_config_side_effect(*args):
+            return {
+                'project' : args[0],
+                'variant' : args[1],
+                'original_config' : args[2],
+                'success' : True,
+                'released_config' : 'REL{0}'.format(args[1])
+            }
 
-        mock_run_mp.side_effect = run_mp_side_effect
+        mock_release_composite_config.side_effect = release_composite_config_side_effect
 
         released_root = self.runner.release_all_composite_configs(a)
 
@@ -534,6 +554,75 @@ class TestReleaseTree(unittest.TestCase):
             elif released_config.variant == 'b2':
                 _has_same_structure(b2, released_config)
 
+        # Every config is released once, after the configs it contains
+        released_variants = [x[0][1] for x in mock_release_composite_config.call_args_list]
+        self.assertEqual(sorted(released_variants), ['a', 'b1', 'b2', 'c1', 'c2', 'c3'])
+        self.assertEqual(released_variants[-1], 'a')
+        self.assertLess(released_variants.index('c1'), released_variants.index('b1'))
+        self.assertLess(released_variants.index('c3'), released_variants.index('b2'))
+
+    @patch('dmx.abnrlib.flows.releasetree.TaskPool', SerialPool)
+    @patch('dmx.abnrlib.flows.releasetree.ConfigFactory.remove_all_objs')
+    @patch('dmx.abnrlib.flows.releasetree.release_deliverable')
+    @patch('dmx.abnrlib.flows.releasetree.release_composite_config')
+    @patch('dmx.abnrlib.flows.releasetree.ICManageCLI.config_exists')
+    def test_018a___release_all_composite_configs_with_simple_configs(self, mock_config_exists, mock_release_composite_config,
+                                                 mock_release_deliverable, mock_remove_all_objs):
+        '''
+        Tests that release_all_composite_configs releases the simple configs, and every composite
+        config as soon as the configs it contains are released
+        '''
+        mock_config_exists.return_value = False
+        project = 'test_project'
+
+        # A -> B1, B2, A:ipspec
+        # B1 -> B1:ipspec, B1:rtl
+        # B2 -> (released) C
+        b1 = IcmConfig('b1', project, 'b1', [IcmLibrary(project, 'b1', x, 'dev', '', preview=True, use_db=False) for x in ('ipspec', 'rtl')], preview=True)
+        c = IcmConfig('RELc', project, 'c', [], preview=True)
+        b2 = IcmConfig('b2', project, 'b2', [c], preview=True)
+        a = IcmConfig('a', project, 'a', [b1, b2, IcmLibrary(project, 'a', 'ipspec', 'dev', '', preview=True, use_db=False)], preview=True)
+        unreleased_simples = [x for x in a.flatten_tree() if not x.is_config()]
+
+        def release_deliverable_side_effect(*args):
+            return {'project' : args[0], 'variant' : args[1], 'libtype' : args[2], 'original_config' : args[3],
+                    'success' : True, 'released_config' : 'REL{0}{1}'.format(args[1], args[2])}
+        mock_release_deliverable.side_effect = release_deliverable_side_effect
+
+        def release_composite_config_side_effect(*args):
+            return {'project' : args[0], 'variant' : args[1], 'original_config' : args[2],
+                    'success' : True, 'released_config' : 'REL{0}'.format(args[1])}
+        mock_release_composite_config.side_effect = release_composite_config_side_effect
+
+        released_root = self.runner.release_all_composite_configs(a, unreleased_simples)
+
+        self.assertEqual(released_root.name, 'RELa')
+        self.assertEqual(mock_release_deliverable.call_count, 3)
+        # b2 does not wait for any deliverable
+        released_variants = [x[0][1] for x in mock_release_composite_config.call_args_list]
+        self.assertEqual(released_variants, ['b2', 'b1', 'a'])
+        # b1 is released with its released deliverables
+        self.assertEqual(sorted(mock_release_composite_config.call_args_list[1][0][2]),
+            ['test_project/b1/ipspec/dev/RELb1ipspec', 'test_project/b1/rtl/dev/RELb1rtl'])
+        self.assertEqual(mock_remove_all_objs.call_count, 1)
+
+    @patch('dmx.abnrlib.flows.releasetree.TaskPool', SerialPool)
+    @patch('dmx.abnrlib.flows.releasetree.release_composite_config')
+    @patch('dmx.abnrlib.flows.releasetree.ICManageCLI.config_exists')
+    def test_018b___release_all_composite_configs_fails(self, mock_config_exists, mock_release_composite_config):
+        '''
+        Tests that release_all_composite_configs stops at the first release that fails
+        '''
+        mock_config_exists.return_value = False
+        project = 'test_project'
+        b = IcmConfig('b', project, 'b', [], preview=True)
+        a = IcmConfig('a', project, 'a', [b], preview=True)
+        mock_release_composite_config.return_value = {'project' : project, 'variant' : 'b', 'success' : False}
+
+        with self.assertRaises(ReleaseTreeError):
+            self.runner.release_all_composite_configs(a)
+        self.assertEqual(mock_release_composite_config.call_count, 1)
+
     @patch('dmx.abnrlib.flows.releasetree.ICManageCLI.config_exists')
     @patch('dmx.abnrlib.flows.releasetree.ReleaseTree.should_release_config')
     def test_019___filter_tree_works(self, mock_should_release_config, mock_config_exists):
@@ -1096,6 +1096,44 @@ View:
         ans = {'seconds': u'14', 'month': u'03', 'hours': u'09', 'year': u'2022', 'minutes': u'03', 'day': u'25'}
         self.assertEqual(ret, ans)
 
+    @patch.object(dmx.abnrlib.icm.ICManageCLI, '_ICManageCLI__run_read_command')
+    def test_079___get_files_fstat(self, ma):
+        ma.return_value = [0, """... depotFile //depot/a/x.txt
+... headType text+kl
+... headRev 3
+... digest ABC
+... fileSize 12
+
+... depotFile //depot/a/y z.bin
+... headType binary
+... headRev 1
+... digest DEF
+... fileSize 7
+
+... depotFile //depot/a/notasked.txt
+... headType text
+... headRev 1
+... digest 123
+""", '//depot/a/gone.txt#1 - no such file(s).']
+        ret = self.cli.get_files_fstat(['//depot/a/x.txt#3', '//depot/a/y z.bin#1', '//depot/a/gone.txt#1'])
+        self.assertEqual(ret, {
+            '//depot/a/x.txt#3': {'digest': 'ABC', 'size': '12', 'type': 'text+kl'},
+            '//depot/a/y z.bin#1': {'digest': 'DEF', 'size': '7', 'type': 'binary'},
+        })
+        command = ma.call_args[0][0]
+        self.assertEqual(command[1:], ['-x', '-', 'fstat', '-Ol'])
+        self.assertEqual(ma.call_args[1]['stdin'], '//depot/a/x.txt#3\n//depot/a/y z.bin#1\n//depot/a/gone.txt#1\n')
+
+    @patch.object(dmx.abnrlib.icm.ICManageCLI, '_ICManageCLI__run_read_command')
+    def test_079___get_files_fstat___no_files(self, ma):
+        self.assertEqual(self.cli.get_files_fstat([]), {})
+        self.assertFalse(ma.called)
+
+    @patch.object(dmx.abnrlib.icm.ICManageCLI, '_ICManageCLI__run_read_command')
+    def test_079___get_files_fstat___error(self, ma):
+        ma.return_value = [1, '', 'connect failed']
+        with self.assertRaises(dmx.abnrlib.icm.ICManageError):
+            self.cli.get_files_fstat(['//depot/a/x.txt#3'])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the icmbroker library
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os, sys
+import time
+import shutil
+import tempfile
+import threading
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.abnrlib.icm
+import dmx.abnrlib.icmbroker
+from dmx.abnrlib.icmbroker import QueryBroker, BrokerTransport, ICMBrokerError, parse_address, format_profile_comparison, is_read_only_command
+from mock import patch
+
+class FakeServer(object):
+    '''
+    Stands in for the gdp/xlp4 commands. Every command takes 'delay' seconds.
+    '''
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.contexts = []
+        self.lock = threading.Lock()
+
+    def run(self, command, stdin=None, timeout=None, cwd=None, env=None):
+        with self.lock:
+            self.calls.append(list(command))
+            self.contexts.append((cwd, (env or {}).get('P4CLIENT')))
+        time.sleep(self.delay)
+        client = (env or {}).get('P4CLIENT')
+        return (0, 'out:{}{}'.format(' '.join(command), ':' + client if client else ''), '')
+
+    def close(self):
+        pass
+
+class TestICMBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.address = os.path.join(self.tmpdir, 'broker.sock')
+        self.server = FakeServer(delay=0.2)
+        self.broker = QueryBroker(self.address, transport=self.server, max_workers=2, authkey=b'test').start()
+        self.fallback = FakeServer()
+        self.transport = BrokerTransport(self.address, authkey=b'test', fallback=self.fallback)
+
+    def tearDown(self):
+        self.transport.close()
+        self.broker.shutdown()
+        dmx.abnrlib.icm.ICManageCLI.set_transport(None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_001___parse_address(self):
+        self.assertEqual(parse_address('/tmp/a.sock'), ('/tmp/a.sock', 'AF_UNIX'))
+        self.assertEqual(parse_address('localhost:1234'), (('localhost', 1234), 'AF_INET'))
+
+    def test_002___run_through_broker(self):
+        ret = self.transport.run(['gdp', 'list', '/intel/a'])
+        self.assertEqual(ret, (0, 'out:gdp list /intel/a', ''))
+        self.assertEqual(self.server.calls, [['gdp', 'list', '/intel/a']])
+        self.assertEqual(self.fallback.calls, [])
+
+    def test_003___concurrent_identical_queries_are_coalesced(self):
+        results = []
+        def query():
+            results.append(self.transport.run(['gdp', 'list', '/intel/b']))
+        threads = [threading.Thread(target=query) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(set(results)), 1)
+        self.assertLess(len(self.server.calls), 5)
+        self.assertGreater(self.transport.get_stats()['coalesced'], 0)
+
+    def test_004___concurrency_is_bounded(self):
+        def query(i):
+            self.transport.run(['xlp4', 'files', str(i)])
+        threads = [threading.Thread(target=query, args=(i,)) for i in range(4)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # 4 distinct queries at 0.2s each through 2 slots needs at least 2 rounds
+        self.assertGreaterEqual(time.time() - start, 0.4)
+        stats = self.transport.get_stats()['commands']
+        self.assertEqual(stats['xlp4 files']['count'], 4)
+
+    def test_005___falls_back_when_broker_is_down(self):
+        self.broker.shutdown()
+        ret = self.transport.run(['gdp', 'list', '/intel/c'])
+        self.assertEqual(ret, (0, 'out:gdp list /intel/c', ''))
+        self.assertEqual(self.fallback.calls, [['gdp', 'list', '/intel/c']])
+
+    def test_006___run_read_command_uses_transport(self):
+        dmx.abnrlib.icm.ICManageCLI.set_transport(self.transport)
+        ret = dmx.abnrlib.icm.run_read_command(['gdp', 'list', '/intel/d'])
+        self.assertEqual(ret, (0, 'out:gdp list /intel/d', ''))
+        self.assertEqual(self.server.calls, [['gdp', 'list', '/intel/d']])
+
+    def test_007___summarize_profile(self):
+        profile = os.path.join(self.tmpdir, 'ICManageCLI.profiler.1')
+        with open(profile, 'w') as f:
+            f.write('gdp --user=icmanage list /intel/a:0.5\n')
+            f.write('gdp --user=icmanage list /intel/b:1.5\n')
+            f.write('xlp4 files //depot/a/...@12:2.0\n')
+        ret = dmx.abnrlib.icm.summarize_profile(profile)
+        self.assertEqual(ret['gdp list']['count'], 2)
+        self.assertEqual(ret['gdp list']['mean'], 1.0)
+        self.assertEqual(ret['gdp list']['max'], 1.5)
+        self.assertEqual(ret['xlp4 files']['total'], 2.0)
+
+    def test_008___commands_run_in_the_client_context(self):
+        with patch.dict(os.environ, {'P4CLIENT': 'ws1'}):
+            ret = self.transport.run(['xlp4', 'fstat', 'file'])
+        self.assertEqual(ret, (0, 'out:xlp4 fstat file:ws1', ''))
+        self.assertEqual(self.server.contexts, [(os.getcwd(), 'ws1')])
+
+    def test_009___queries_of_different_clients_are_not_coalesced(self):
+        results = {}
+        def query(client):
+            results[client] = self.broker.run(['xlp4', 'files', 'file'], context=(self.tmpdir, [('P4CLIENT', client)]))
+        threads = [threading.Thread(target=query, args=(x,)) for x in ('ws1', 'ws2')]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, {'ws1': (0, 'out:xlp4 files file:ws1', ''), 'ws2': (0, 'out:xlp4 files file:ws2', '')})
+        self.assertEqual(sorted(self.server.contexts), [(self.tmpdir, 'ws1'), (self.tmpdir, 'ws2')])
+        self.assertEqual(self.broker.get_stats()['coalesced'], 0)
+
+    def test_010___format_profile_comparison(self):
+        before = {'gdp list': {'count': 4, 'mean': 1.0, 'max': 2.0}}
+        after = {'gdp list': {'count': 1, 'mean': 0.5, 'max': 0.5}, 'xlp4 files': {'count': 2, 'mean': 0.1, 'max': 0.2}}
+        lines = format_profile_comparison(before, after).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1].split(), ['gdp', 'list', '4', '1.000', '2.000', '1', '0.500', '0.500'])
+        self.assertEqual(lines[2].split(), ['xlp4', 'files', '0', '0.000', '0.000', '2', '0.100', '0.200'])
+    def test_011___only_read_only_commands_are_run(self):
+        self.assertTrue(is_read_only_command(['gdp', '--user=icmanage', 'list', '/intel/a']))
+        self.assertTrue(is_read_only_command(['xlp4', '-u', 'changes', 'info']))
+        self.assertTrue(is_read_only_command(['xlp4', '-x', '-', 'fstat', '-Ol']))
+        self.assertFalse(is_read_only_command(['xlp4', '-u', 'fstat', 'change', '-d', '1']))
+        self.assertFalse(is_read_only_command(['xlp4', '-x', '/etc/passwd', 'files']))
+        self.assertFalse(is_read_only_command(['/bin/sh', '-c', 'list']))
+        self.assertFalse(is_read_only_command(['gdp', 'delete', '/intel/a']))
+        with self.assertRaises(ICMBrokerError):
+            self.broker.run(['sh', '-c', 'id'])
+        # The client runs them itself
+        self.assertEqual(self.transport.run(['groups', 'user']), (0, 'out:groups user', ''))
+        self.assertEqual(self.fallback.calls, [['groups', 'user']])
+        self.assertEqual(self.server.calls, [])
+
+    def test_012___tcp_needs_a_secret(self):
+        with patch.dict(os.environ, {'DMX_ICM_BROKER_AUTHKEY': ''}):
+            with self.assertRaises(ICMBrokerError):
+                QueryBroker('localhost:0', transport=self.server)
+        QueryBroker('localhost:0', transport=self.server, authkey=b'secret')
+
+    def test_013___unix_socket_in_a_private_directory(self):
+        shared = os.path.join(self.tmpdir, 'shared')
+        os.mkdir(shared)
+        os.chmod(shared, 0o755)
+        with self.assertRaises(ICMBrokerError):
+            QueryBroker(os.path.join(shared, 'broker.sock'), transport=self.server).start()
+        broker = QueryBroker(transport=self.server, authkey=b'test').start()
+        try:
+            self.assertEqual(os.stat(os.path.dirname(broker.address)).st_mode & 0o777, 0o700)
+            transport = BrokerTransport(broker.address, authkey=b'test', fallback=self.fallback)
+            self.assertEqual(transport.run(['gdp', 'info']), (0, 'out:gdp info', ''))
+            transport.close()
+        finally:
+            broker.shutdown()
+        self.assertFalse(os.path.exists(os.path.dirname(broker.address)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the tree traversal of IcmConfig on in-memory trees (no ICM server needed),
+# including a benchmark on a large DAG with heavily shared sub-trees.
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+from __future__ import print_function
+import unittest
+import os, sys
+import time
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.abnrlib.icmconfig import IcmConfig
+from dmx.abnrlib.icmlibrary import IcmLibrary
+
+def new_config(variant, config='dev', project='p'):
+    return IcmConfig(config, project, variant, [], use_db=False)
+
+def new_library(variant, libtype, library='dev', project='p'):
+    return IcmLibrary(project, variant, libtype, library, use_db=False)
+
+def build_shared_dag(layers, width, fanout=2):
+    '''
+    Builds a layered DAG where every config links to 'fanout' configs of the next layer,
+    so the number of root-to-leaf paths grows as fanout**layers.
+    Every config also has its own 'rtl' library.
+    Returns (root, number of objects)
+    '''
+    below = []
+    num_objs = 0
+    for layer in reversed(range(layers)):
+        current = []
+        for i in range(width):
+            variant = 'v{}_{}'.format(layer, i)
+            config = new_config(variant)
+            config.add_configuration(new_library(variant, 'rtl'))
+            for j in range(fanout if below else 0):
+                config.add_configuration(below[(i + j) % width])
+            current.append(config)
+            num_objs += 2
+        below = current
+    root = new_config('top')
+    for config in below:
+        root.add_configuration(config)
+    return (root, num_objs + 1)
+
+class TestIcmConfigTraversal(unittest.TestCase):
+
+    def setUp(self):
+        # top -> a -> shared
+        #     -> b -> shared
+        self.shared = new_config('shared')
+        self.shared_rtl = new_library('shared', 'rtl')
+        self.shared.add_configuration(self.shared_rtl)
+        self.a = new_config('a')
+        self.a.add_configuration(new_library('a', 'rtl'))
+        self.a.add_configuration(self.shared)
+        self.b = new_config('b')
+        self.b.add_configuration(new_library('b', 'lint'))
+        self.b.add_configuration(self.shared)
+        self.top = new_config('top')
+        self.top.add_configuration(self.a)
+        self.top.add_configuration(self.b)
+
+    def test_001___flatten_tree(self):
+        flat = self.top.flatten_tree()
+        self.assertEqual(len(flat), 7)
+        self.assertEqual(len(set(flat)), 7)
+
+    def test_002___flatten_tree_cache_is_invalidated(self):
+        self.assertEqual(len(self.top.flatten_tree()), 7)
+        self.shared.add_configuration(new_library('shared', 'lint'))
+        self.assertEqual(len(self.top.flatten_tree()), 8)
+        self.assertEqual(len(self.a.flatten_tree()), 5)
+        self.a.remove_configuration(self.shared)
+        self.assertEqual(len(self.a.flatten_tree()), 2)
+        self.assertEqual(len(self.top.flatten_tree()), 8)
+
+    def test_003___search(self):
+        self.assertEqual(self.top.search('^p$', '^shared$'), [self.shared])
+        self.assertEqual(sorted(x.variant for x in self.top.search('p', '.', '^rtl$')), ['a', 'shared'])
+        self.assertEqual(len(self.top.search('p', '.')), 4)
+
+    @patch('dmx.abnrlib.icm.ICManageCLI.get_changenum', return_value='1234')
+    def test_004___get_bom(self, mock_get_changenum):
+        bom = self.top.get_bom()
+        self.assertEqual(len(bom), 3)
+        self.assertEqual(len(self.top.get_bom(libtypes=['rtl'])), 2)
+
+    def test_005___replace_object_in_tree(self):
+        new_shared = new_config('shared', config='snap-1')
+        self.assertEqual(self.top.replace_object_in_tree(self.shared, new_shared), 2)
+        self.assertIn(new_shared, self.a.configurations)
+        self.assertIn(new_shared, self.b.configurations)
+        self.assertNotIn(self.shared_rtl, self.top.flatten_tree())
+
+    def test_006___remove_object_from_tree(self):
+        self.assertEqual(self.top.remove_object_from_tree(self.shared), 2)
+        self.assertEqual(len(self.top.flatten_tree()), 5)
+        self.assertEqual(self.top.search('p', '^shared$'), [])
+
+    def test_008___search_uses_index(self):
+        self.top._get_tree_index()
+        with patch('re.compile') as mock_compile:
+            self.assertEqual(self.top.search('^p$', '^shared$', '^rtl$'), [self.shared_rtl])
+            self.assertFalse(mock_compile.called)
+        self.assertEqual(len(self.top.search('^p$', '^(a|b)$')), 2)
+
+    def test_009___index_is_kept_current_on_edits(self):
+        self.assertEqual(self.top.search('^p$', '^shared$', '^lint$'), [])
+        lint = new_library('shared', 'lint')
+        self.shared.add_configuration(lint)
+        self.assertEqual(self.top.search('^p$', '^shared$', '^lint$'), [lint])
+        self.assertEqual(self.top.get_objects_by_location()[('p', 'shared', 'lint')], set([lint]))
+
+    def test_010___replace_all_instances_in_tree(self):
+        new_rtl = new_library('shared', 'rtl', library='REL1', project='p')
+        self.assertEqual(self.top.replace_all_instances_in_tree('p', 'shared', new_rtl, libtype='rtl'), 1)
+        self.assertEqual(self.top.search('^p$', '^shared$', '^rtl$'), [new_rtl])
+
+    def test_011___auto_replace_object_in_tree(self):
+        new_shared = new_config('shared', config='snap-1')
+        self.assertEqual(self.top.auto_replace_object_in_tree(new_shared), 2)
+        self.assertEqual(self.top.search('^p$', '^shared$')[0].config, 'snap-1')
+
+    def test_012___index_is_updated_not_rebuilt(self):
+        index = self.top._get_tree_index()
+        lint = new_library('shared', 'lint')
+        with patch.object(IcmConfig, '_get_tree_index', side_effect=AssertionError('rebuilt')):
+            self.shared.add_configuration(lint)
+        self.assertIs(self.top._tree_index, index)
+        self.assertEqual(index[('p', 'shared', 'lint')], set([lint]))
+        # shared is still reachable through b
+        self.a.remove_configuration(self.shared)
+        self.assertIs(self.top._tree_index, index)
+        self.assertEqual(index[('p', 'shared')], set([self.shared]))
+        self.assertNotIn(('p', 'a', 'lint'), index)
+        self.b.remove_configuration(self.shared)
+        self.assertNotIn(('p', 'shared'), index)
+        self.assertNotIn(('p', 'shared', 'lint'), index)
+        self.assertEqual(len(self.top._get_tree_objects()), 5)
+
+    def test_013___updated_index_matches_a_rebuilt_one(self):
+        root, num_objs = build_shared_dag(layers=6, width=6)
+        root._get_tree_index()
+        configs = [x for x in root.flatten_tree() if x.is_config() and x is not root]
+        for i, config in enumerate(configs):
+            children = [x for x in config.configurations if x.is_config()]
+            if children and i % 2:
+                config.remove_configuration(children[0])
+            elif i % 3 == 0:
+                config.add_configuration(new_library(config.variant, 'lint'))
+        updated = dict((k, set(v)) for k, v in root._tree_index.items())
+        objs = sorted(x.key() for x in root._tree_cache)
+        root._tree_cache = root._tree_index = None
+        self.assertEqual(updated, root._get_tree_index())
+        self.assertEqual(objs, sorted(x.key() for x in root._get_tree_objects()))
+
+    @patch('dmx.abnrlib.icm.ICManageCLI.get_changenum', return_value='1234')
+    def test_014___remove_equal_but_distinct_object(self, mock_get_changenum):
+        self.top._get_tree_index()
+        self.assertEqual(self.top.remove_object_from_tree(new_library('a', 'rtl')), 1)
+        self.assertEqual(self.top.search('^p$', '^a$', '^rtl$'), [])
+        self.assertNotIn(('p', 'a', 'rtl'), self.top._tree_index)
+        self.assertNotIn('p/a/rtl/dev', [x.get_full_name() for x in self.top.flatten_tree()])
+        self.assertEqual(len(self.top.flatten_tree()), 6)
+        self.assertEqual(len(self.top.get_bom()), 2)
+
+    @patch('dmx.abnrlib.icm.ICManageCLI.get_changenum', return_value='1234')
+    def test_007___benchmark_5k_node_shared_dag(self, mock_get_changenum):
+        start = time.time()
+        root, num_objs = build_shared_dag(layers=50, width=50)
+        built = time.time()
+        flat = root.flatten_tree()
+        flattened = time.time()
+        bom = root.get_bom()
+        found = root.search('p', '^v10_')
+        queried = time.time()
+        root.flatten_tree()
+        cached = time.time()
+        print('\n{} objects: build={:.3f}s flatten_tree={:.3f}s get_bom+search={:.3f}s flatten_tree(cached)={:.3f}s'.format(
+            num_objs, built - start, flattened - built, queried - flattened, cached - queried))
+        self.assertEqual(len(flat), num_objs)
+        self.assertEqual(len(bom), 50 * 50)
+        self.assertEqual(len(found), 50)
+        # The old recursive walk needed 2**50 visits on this DAG
+        self.assertLess(queried - built, 10)
+
+if __name__ == '__main__':
+    unittest.main()
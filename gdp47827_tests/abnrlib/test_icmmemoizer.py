@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the ICMMemoizer cache in the icm library
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os, sys
+import time
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.abnrlib.icm import ICMMemoizer, get_gdp_path_scope, get_command_scopes, scopes_overlap
+
+class TestICMMemoizer(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        def run(command, stdin=None, timeout=None):
+            self.calls.append(command)
+            return (0, ' '.join(command), '')
+        self.run = run
+
+    def test_001___get_gdp_path_scope(self):
+        self.assertEqual(get_gdp_path_scope('/intel/proj/var/rtl/dev/REL1:release'), ('proj', 'var', 'rtl'))
+        self.assertEqual(get_gdp_path_scope('/intel/proj/var/rtl/dev'), ('proj', 'var', 'rtl'))
+        self.assertEqual(get_gdp_path_scope('/intel/proj/var/snap-1:config/*::content'), ('proj', 'var'))
+        self.assertEqual(get_gdp_path_scope('/intel/proj/:variant'), ('proj', '*'))
+        self.assertEqual(get_gdp_path_scope('//depot/gdpxl/.../proj/var/rtl/dev/...@now'), ('proj', 'var', 'rtl'))
+        self.assertEqual(get_gdp_path_scope('/intel/proj/var/cfg:config/.**::content'), None)
+        self.assertEqual(get_gdp_path_scope('/intel/:project'), ('*',))
+
+    def test_002___get_command_scopes(self):
+        self.assertEqual(get_command_scopes(['gdp', '--user=icmanage', 'list', '/intel/p/v/rtl/:library']), [('p', 'v', 'rtl')])
+        self.assertEqual(get_command_scopes(['xlp4', 'info']), None)
+
+    def test_003___scopes_overlap(self):
+        self.assertTrue(scopes_overlap(('p', 'v'), ('p', 'v', 'rtl')))
+        self.assertTrue(scopes_overlap(('p', '*'), ('p', 'v', 'rtl')))
+        self.assertFalse(scopes_overlap(('p', 'v', 'lint'), ('p', 'v', 'rtl')))
+        self.assertFalse(scopes_overlap(('p', 'w'), ('p', 'v', 'rtl')))
+
+    def test_004___hits_and_misses(self):
+        memo = ICMMemoizer(self.run, maxsize=10, ttl=0)
+        memo(['gdp', 'list', '/intel/p/v/rtl/:library'])
+        memo(['gdp', 'list', '/intel/p/v/rtl/:library'])
+        self.assertEqual(len(self.calls), 1)
+        stats = memo.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+
+    def test_005___lru_eviction(self):
+        memo = ICMMemoizer(self.run, maxsize=2, ttl=0)
+        memo(['gdp', 'list', '/intel/p/a'])
+        memo(['gdp', 'list', '/intel/p/b'])
+        memo(['gdp', 'list', '/intel/p/a'])
+        memo(['gdp', 'list', '/intel/p/c'])
+        self.assertEqual(memo.get_stats()['evictions'], 1)
+        memo(['gdp', 'list', '/intel/p/a'])
+        self.assertEqual(len(self.calls), 3)
+        memo(['gdp', 'list', '/intel/p/b'])
+        self.assertEqual(len(self.calls), 4)
+
+    def test_006___ttl_expiry(self):
+        memo = ICMMemoizer(self.run, maxsize=10, ttl=0.05)
+        memo(['gdp', 'list', '/intel/p/a'])
+        time.sleep(0.1)
+        memo(['gdp', 'list', '/intel/p/a'])
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(memo.get_stats()['expirations'], 1)
+
+    def test_007___selective_invalidation(self):
+        memo = ICMMemoizer(self.run, maxsize=10, ttl=0)
+        rtl = ['gdp', 'list', '/intel/p/v/rtl/dev/:release']
+        lint = ['gdp', 'list', '/intel/p/v/lint/dev/:release']
+        configs = ['gdp', 'list', '/intel/p/v/*:config']
+        other = ['gdp', 'list', '/intel/p/w/rtl/dev/:release']
+        hier = ['gdp', 'list', '/intel/p/top/cfg:config/.**::content']
+        info = ['xlp4', 'info']
+        for cmd in [rtl, lint, configs, other, hier, info]:
+            memo(cmd)
+        memo.invalidate(['gdp', '--user=icmanage', 'create', 'release', '/intel/p/v/rtl/dev/snap-1'])
+        self.assertEqual(memo.get_stats()['size'], 2)
+        self.calls[:] = []
+        for cmd in [lint, other]:
+            memo(cmd)
+        self.assertEqual(self.calls, [])
+        for cmd in [rtl, configs, hier, info]:
+            memo(cmd)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_008___unknown_write_resets_everything(self):
+        memo = ICMMemoizer(self.run, maxsize=10, ttl=0)
+        memo(['gdp', 'list', '/intel/p/v/rtl/dev/:release'])
+        memo.invalidate(['xlp4', 'submit'])
+        self.assertEqual(memo.get_stats()['size'], 0)
+
+    def test_009___paths_outside_of_gdp_reach_anything(self):
+        self.assertEqual(get_gdp_path_scope('/nfs/site/disks/ws/proj/var/rtl/file.v'), None)
+        self.assertEqual(get_gdp_path_scope('/:project'), None)
+        self.assertEqual(get_command_scopes(['xlp4', 'add', '/nfs/site/disks/ws/proj/var/rtl/file.v']), None)
+        memo = ICMMemoizer(self.run, maxsize=10, ttl=0)
+        memo(['gdp', 'list', '/intel/proj/var/rtl/dev/:release'])
+        memo(['xlp4', 'files', '//depot/gdpxl/.../proj/var/rtl/dev/...'])
+        memo.invalidate(['xlp4', 'submit', '/nfs/site/disks/ws/proj/var/rtl/file.v'])
+        self.assertEqual(memo.get_stats()['size'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
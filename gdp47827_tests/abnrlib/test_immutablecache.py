@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the immutablecache library
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os, sys
+import shutil
+import tempfile
+import multiprocessing
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.abnrlib.immutablecache
+from dmx.abnrlib.immutablecache import ImmutableCache, cached_if_immutable, set_immutable_cache
+
+class FakeCLI(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get_site(self):
+        return '/intel'
+
+    @cached_if_immutable('release')
+    def get_release_changenum(self, project, variant, libtype, library, release):
+        self.calls += 1
+        return '1234'
+
+    @cached_if_immutable('config')
+    def get_config_content_details(self, project, variant, config, hierarchy=False, retkeys=['*']):
+        self.calls += 1
+        if config == 'REL-missing':
+            return []
+        return [{'path': '/intel/{}/{}/{}'.format(project, variant, config), 'hierarchy': hierarchy}]
+
+def write_and_read(root, i):
+    cache = ImmutableCache(root)
+    query = ['get_release_changenum', [['release', 'REL1']]]
+    cache.set('/intel', 'p', 'v', 'REL1', query, str(i % 2))
+    found, value = cache.get('/intel', 'p', 'v', 'REL1', query)
+    return found and value in ('0', '1')
+
+class TestImmutableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        set_immutable_cache(ImmutableCache(self.root))
+        self.cli = FakeCLI()
+
+    def tearDown(self):
+        set_immutable_cache(None)
+        shutil.rmtree(self.root)
+
+    def test_001___disabled_without_root(self):
+        cache = ImmutableCache('')
+        self.assertFalse(cache.enabled)
+        self.assertFalse(cache.set('', 'p', 'v', 'REL1', ['q'], 1))
+        self.assertEqual(cache.get('', 'p', 'v', 'REL1', ['q']), (False, None))
+
+    def test_002___immutable_results_are_shared_across_instances(self):
+        self.assertEqual(self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'REL1'), '1234')
+        other = FakeCLI()
+        self.assertEqual(other.get_release_changenum('p', 'v', 'rtl', 'dev', release='REL1'), '1234')
+        self.assertEqual((self.cli.calls, other.calls), (1, 0))
+
+    def test_003___mutable_names_are_not_cached(self):
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'mybranch')
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'mybranch')
+        self.assertEqual(self.cli.calls, 2)
+
+    def test_004___arguments_are_part_of_the_key(self):
+        flat = self.cli.get_config_content_details('p', 'v', 'snap-1')
+        hier = self.cli.get_config_content_details('p', 'v', 'snap-1', hierarchy=True)
+        self.assertNotEqual(flat, hier)
+        self.assertEqual(self.cli.get_config_content_details('p', 'v', 'snap-1', hierarchy=True), hier)
+        self.assertEqual(self.cli.calls, 2)
+
+    def test_005___empty_results_are_not_cached(self):
+        self.cli.get_config_content_details('p', 'v', 'REL-missing')
+        self.cli.get_config_content_details('p', 'v', 'REL-missing')
+        self.assertEqual(self.cli.calls, 2)
+
+    def test_006___invalidate_command(self):
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'REL1')
+        self.cli.get_config_content_details('p', 'v', 'REL2')
+        cache = dmx.abnrlib.immutablecache.get_immutable_cache()
+        cache.invalidate_command('/intel', ['gdp', '--user=icmanage', 'delete', '/intel/p/v/rtl/dev/REL1:release'])
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'REL1')
+        self.cli.get_config_content_details('p', 'v', 'REL2')
+        self.assertEqual(self.cli.calls, 3)
+
+    def test_007___concurrent_writers_and_readers(self):
+        pool = multiprocessing.Pool(8)
+        results = pool.starmap(write_and_read, [(self.root, i) for i in range(20)])
+        pool.close()
+        pool.join()
+        self.assertTrue(all(results))
+        leftovers = [f for d, _, files in os.walk(self.root) for f in files if f.startswith('.tmp.')]
+        self.assertEqual(leftovers, [])
+
+    def test_008___entries_are_per_user(self):
+        query = ['get_release_changenum', [['release', 'REL1']]]
+        ImmutableCache(self.root, user='other').set('/intel', 'p', 'v', 'REL1', query, '666')
+        self.assertEqual(ImmutableCache(self.root, user='me').get('/intel', 'p', 'v', 'REL1', query), (False, None))
+
+    def test_009___untrusted_entries_are_ignored(self):
+        cache = ImmutableCache(self.root)
+        query = ['get_release_changenum', [['release', 'REL1']]]
+        cache.set('/intel', 'p', 'v', 'REL1', query, '1234')
+        filename = cache._get_file('/intel', 'p', 'v', 'REL1', query)
+        self.assertFalse(os.stat(filename).st_mode & 0o022)
+        self.assertEqual(cache.get('/intel', 'p', 'v', 'REL1', query), (True, '1234'))
+        os.chmod(filename, 0o666)
+        self.assertEqual(cache.get('/intel', 'p', 'v', 'REL1', query), (False, None))
+        os.chmod(filename, 0o644)
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertEqual(cache.get('/intel', 'p', 'v', 'REL1', query), (False, None))
+
+    def test_010___preview_does_not_invalidate(self):
+        import dmx.abnrlib.icm
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'REL1')
+        cli = dmx.abnrlib.icm.ICManageCLI(preview=True, site='intel')
+        with patch('dmx.abnrlib.icm.run_write_command', return_value=(0, '', '')):
+            cli._ICManageCLI__run_write_command(['gdp', 'delete', '/intel/p/v/rtl/dev/REL1:release'])
+        self.cli.get_release_changenum('p', 'v', 'rtl', 'dev', 'REL1')
+        self.assertEqual(self.cli.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the plugin manifest used by bin/dmx.py
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.abnrlib.pluginmanifest import PluginManifest, PluginManifestError
+
+PLUGIN = '''
+from dmx.abnrlib.command import Command
+class {cls}(Command):
+    HIDDEN = {hidden}
+    @classmethod
+    def get_help(cls):
+        return '{help}'
+'''
+
+WRAPPER = '''
+from {package}.base import Wrapper
+class {cls}(Wrapper):
+    pass
+'''
+
+BASE = '''
+from {package} import bomcreate
+class Wrapper(object):
+    @classmethod
+    def get_help(cls):
+        return 'help of ' + cls.__name__
+'''
+
+class TestPluginManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.package = 'fakeplugins_{}'.format(os.getpid())
+        self.plugins_dir = os.path.join(self.tmpdir, self.package)
+        os.mkdir(self.plugins_dir)
+        open(os.path.join(self.plugins_dir, '__init__.py'), 'w').close()
+        self.write_plugin('BomCreate', 'create a bom')
+        self.write_plugin('BomEdit', 'edit a bom', hidden=True)
+        sys.path.insert(0, self.tmpdir)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir)
+        for name in list(sys.modules):
+            if name.startswith(self.package):
+                del sys.modules[name]
+        shutil.rmtree(self.tmpdir)
+
+    def get_wrapper_manifest(self):
+        wrappers_dir = os.path.join(self.plugins_dir, 'wrappers')
+        if not os.path.isdir(wrappers_dir):
+            os.mkdir(wrappers_dir)
+            open(os.path.join(wrappers_dir, '__init__.py'), 'w').close()
+            with open(os.path.join(self.plugins_dir, 'base.py'), 'w') as f:
+                f.write(BASE.format(package=self.package))
+            with open(os.path.join(wrappers_dir, 'bom.py'), 'w') as f:
+                f.write(WRAPPER.format(package=self.package, cls='BOM'))
+        return PluginManifest(wrappers_dir, self.package + '.wrappers', self.package + '.base.Wrapper',
+            depends_on=PluginManifest(self.plugins_dir, self.package))
+
+    def write_plugin(self, cls, help, hidden=False):
+        with open(os.path.join(self.plugins_dir, cls.lower() + '.py'), 'w') as f:
+            f.write(PLUGIN.format(cls=cls, help=help, hidden=hidden))
+
+    def test_001___build(self):
+        manifest = PluginManifest(self.plugins_dir, self.package)
+        self.assertEqual(manifest.plugins, {
+            'bomcreate': {'module': self.package + '.bomcreate', 'class': 'BomCreate', 'help': 'create a bom', 'hidden': False},
+            'bomedit': {'module': self.package + '.bomedit', 'class': 'BomEdit', 'help': 'edit a bom', 'hidden': True},
+        })
+        self.assertTrue(os.path.isfile(manifest.manifest_file))
+        self.assertEqual(manifest.get_plugin_names('bom'), ['bomcreate', 'bomedit'])
+        self.assertEqual(manifest.get_plugin_names('ip'), [])
+
+    def test_002___load_does_not_import_plugins(self):
+        PluginManifest(self.plugins_dir, self.package).plugins
+        del sys.modules[self.package + '.bomcreate']
+        del sys.modules[self.package + '.bomedit']
+        manifest = PluginManifest(self.plugins_dir, self.package)
+        self.assertEqual(manifest.get_plugin_names(), ['bomcreate', 'bomedit'])
+        self.assertNotIn(self.package + '.bomcreate', sys.modules)
+        self.assertEqual(manifest.import_plugin('bomedit').get_help(), 'edit a bom')
+        self.assertNotIn(self.package + '.bomcreate', sys.modules)
+        self.assertRaises(PluginManifestError, manifest.import_plugin, 'bomdelete')
+
+    def test_003___changed_plugins_rebuild_the_manifest(self):
+        PluginManifest(self.plugins_dir, self.package).plugins
+        self.write_plugin('BomDelete', 'delete a bom')
+        self.assertEqual(PluginManifest(self.plugins_dir, self.package).get_plugin_names(), ['bomcreate', 'bomdelete', 'bomedit'])
+        os.remove(os.path.join(self.plugins_dir, 'bomedit.py'))
+        self.assertEqual(PluginManifest(self.plugins_dir, self.package).get_plugin_names(), ['bomcreate', 'bomdelete'])
+
+    def test_004___read_only_directory(self):
+        os.chmod(self.plugins_dir, 0o555)
+        try:
+            manifest = PluginManifest(self.plugins_dir, self.package)
+            self.assertEqual(manifest.get_plugin_names(), ['bomcreate', 'bomedit'])
+        finally:
+            os.chmod(self.plugins_dir, 0o755)
+
+    def test_005___wrappers(self):
+        manifest = self.get_wrapper_manifest()
+        # the base class itself is not a plugin
+        self.assertEqual(manifest.plugins, {
+            'bom': {'module': self.package + '.wrappers.bom', 'class': 'BOM', 'help': 'help of BOM', 'hidden': False},
+        })
+        signature = manifest.get_signature()
+        self.assertEqual(self.get_wrapper_manifest().load(signature), manifest.plugins)
+        # the help of a wrapper comes from its plugins, so they invalidate its manifest too
+        self.write_plugin('BomDelete', 'delete a bom')
+        manifest = self.get_wrapper_manifest()
+        self.assertNotEqual(manifest.get_signature(), signature)
+        self.assertEqual(manifest.load(manifest.get_signature()), None)
+
+    def test_006___plugin_table_imports_on_lookup(self):
+        PluginManifest(self.plugins_dir, self.package).plugins
+        del sys.modules[self.package + '.bomcreate']
+        del sys.modules[self.package + '.bomedit']
+        table = PluginManifest(self.plugins_dir, self.package).get_plugin_table()
+        self.assertEqual(sorted(table.keys()), ['bomcreate', 'bomedit'])
+        self.assertIn('bomedit', table)
+        self.assertNotIn(self.package + '.bomedit', sys.modules)
+        self.assertEqual(table['bomedit'].get_help(), 'edit a bom')
+        self.assertNotIn(self.package + '.bomcreate', sys.modules)
+        self.assertRaises(KeyError, table.__getitem__, 'bomdelete')
+
+if __name__ == '__main__':
+    unittest.main()
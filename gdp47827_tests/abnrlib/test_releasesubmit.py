@@ -17,7 +17,7 @@
 from __future__ import print_function
 from builtins import object
 import unittest
-from mock import patch
+from mock import patch, Mock
 import os, sys
 
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
@@ -164,30 +164,29 @@ class TestReleaseQueue(unittest.TestCase):
         with self.assertRaises(Exception):
             self.handler.get_job_stdout()
 
-    @patch('dmx.abnrlib.releasesubmit.ReleaseJobHandler.get_job_stdout')
-    @patch('dmx.abnrlib.releasesubmit.ReleaseJobHandler.get_job_status')
-    @patch('dmx.abnrlib.releasesubmit.time.sleep')
-    def test_012___wait_for_job_completion_done(self, mock_sleep, mock_get_job_status, mock_get_job_stdout):
+    def test_012___wait_for_job_completion_done(self):
         '''
         Tests the wait_for_job_completion if the job is done
         '''
-        mock_sleep.return_value = None
-        mock_get_job_status.side_effect = ['queued', 'running', 'done']
-        mock_get_job_stdout.return_value = ['line1', 'Rel Config: REL123']
-        self.assertFalse(self.handler.wait_for_job_completion())
-        self.assertEqual(self.handler.rel_config, 'REL123')
+        watcher = Mock()
+        watcher.wait.return_value = 'done'
+        watcher.get_stdout.return_value = ['line1', 'Rel Config: REL123']
+        handler = ReleaseJobHandler('id', watcher=watcher)
+        self.assertFalse(handler.wait_for_job_completion())
+        self.assertEqual(handler.rel_config, 'REL123')
+        watcher.wait.assert_called_with('id', timeout=RELEASE_JOB_TIMEOUT)
 
-    @patch('dmx.abnrlib.releasesubmit.ReleaseJobHandler.get_job_status')
-    @patch('dmx.abnrlib.releasesubmit.time.sleep')
-    def test_013___wait_for_job_completion_failed(self, mock_sleep, mock_get_job_status):
+    def test_013___wait_for_job_completion_failed(self):
         '''
         Tests the wait_for_job_completion if the job failed
         '''
-        mock_sleep.return_value = None
-        mock_get_job_status.side_effect = ['queued', 'running', 'failed']
-        self.assertFalse(self.handler.wait_for_job_completion())
-        self.assertEqual(self.handler.rel_config, None)
-                          
+        watcher = Mock()
+        watcher.wait.return_value = 'failed'
+        handler = ReleaseJobHandler('id', watcher=watcher)
+        self.assertFalse(handler.wait_for_job_completion())
+        self.assertEqual(handler.rel_config, None)
+        self.assertFalse(watcher.get_stdout.called)
+
     def test_014___views_and_prel_cannot_submit_together___failed(self):
         class immutable_config(object): pass
         immutable_config.project = 'i10socfm'
@@ -200,6 +199,27 @@ class TestReleaseQueue(unittest.TestCase):
                   syncpoint='', skipsyncpoint='', skipmscheck='', regmode=False,
                   prel='prel_1')
 
+    def test_015___wait_for_job_completion_unreachable(self):
+        '''
+        Tests the wait_for_job_completion if the watcher can not be reached
+        '''
+        watcher = Mock()
+        watcher.wait.side_effect = ArcJobWatcherError('Unable to talk to the arc job watcher')
+        handler = ReleaseJobHandler('id', watcher=watcher)
+        self.assertFalse(handler.wait_for_job_completion())
+        self.assertEqual(handler.rel_config, None)
+
+    def test_016___wait_for_job_completion_timeout(self):
+        '''
+        Tests the wait_for_job_completion if the job does not finish in time
+        '''
+        watcher = Mock()
+        watcher.wait.return_value = 'running'
+        handler = ReleaseJobHandler('id', watcher=watcher)
+        self.assertFalse(handler.wait_for_job_completion())
+        self.assertEqual(handler.rel_config, None)
+        self.assertFalse(watcher.get_stdout.called)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the batched icmp4 file operations of the scm library
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os, sys
+import time
+import shutil
+import tempfile
+import subprocess
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.abnrlib.scm
+from dmx.abnrlib.scm import SCM, SCMError
+
+WSROOT = '/ws/ip/rtl'
+
+# A stand-in icmp4: files ending with .managed are on the client, files ending with .opened
+# are opened in this workspace, and files ending with .bad can not be added or edited.
+ICMP4 = r'''#!{python}
+import sys
+args = sys.argv[1:]
+if args[0] == '-x':
+    with open(args[1]) as f:
+        files = [x for x in f.read().splitlines() if x]
+    args = args[2:]
+else:
+    files = [args.pop()]
+out = []
+err = []
+exitcode = 0
+for file in files:
+    if args[0] == 'have':
+        if file.endswith('.managed') or file.endswith('.opened'):
+            out.append('//depot/ip/rtl/dev/{{}}#1 - {{}}'.format(file.split('/')[-1], file))
+        else:
+            err.append('{{}} - file(s) not on client.'.format(file))
+    elif args[0] == 'opened':
+        if file.endswith('.opened'):
+            out.append('//depot/ip/rtl/dev/{{}}#1 - edit default change (text)'.format(file.split('/')[-1]))
+        elif '-a' in args:
+            err.append('{{}} - file(s) not opened anywhere.'.format(file))
+        else:
+            err.append('{{}} - file(s) not opened on this client.'.format(file))
+    elif file.endswith('.bad'):
+        err.append('{{}} - can\'t {{}}'.format(file, args[0]))
+        exitcode = 1
+    else:
+        out.append('//depot/ip/rtl/dev/{{}}#1 - opened for {{}}'.format(file.split('/')[-1], args[0]))
+sys.stdout.write(''.join(x + '\n' for x in out))
+sys.stderr.write(''.join(x + '\n' for x in err))
+sys.exit(exitcode)
+'''
+
+class FakeIcmp4(object):
+    '''Runs the commands with the stand-in icmp4 script, and records them.'''
+    def __init__(self, tmpdir):
+        self.script = os.path.join(tmpdir, 'icmp4')
+        with open(self.script, 'w') as f:
+            f.write(ICMP4.format(python=sys.executable))
+        os.chmod(self.script, 0o755)
+        self.calls = []
+
+    def __call__(self, command):
+        self.calls.append(command)
+        args = command.split()[1:]
+        proc = subprocess.Popen([self.script] + args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        stdout, stderr = proc.communicate()
+        return (proc.returncode, stdout, stderr)
+
+
+class TestSCM(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.icmp4 = FakeIcmp4(self.tmpdir)
+        self.patches = [patch('dmx.abnrlib.icm.ICManageCLI'), patch('dmx.utillib.naa.NAA'), patch('dmx.ecolib.ecosphere.EcoSphere')]
+        for p in self.patches:
+            p.start()
+        self.scm = SCM()
+        self.scm.icmp4 = self.icmp4.script
+        self.files = ['{}/{}'.format(WSROOT, x) for x in ('a.managed', 'b.new', 'c.opened', 'd.managed', 'e.new')]
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def run_with_fake(self, func, *args):
+        with patch('dmx.abnrlib.scm.run_command', side_effect=self.icmp4):
+            return func(*args)
+
+    def test_001___get_managed_files(self):
+        ret = self.run_with_fake(self.scm._get_managed_files, self.files)
+        self.assertEqual(ret, [self.files[0], self.files[2], self.files[3]])
+        self.assertEqual(len(self.icmp4.calls), 1)
+        self.assertIn(' -x ', self.icmp4.calls[0])
+
+    def test_002___same_results_as_per_file(self):
+        for batched, per_file in ((self.scm._get_managed_files, self.scm._is_file_managed),
+                                  (self.scm._get_files_checked_out_globally, self.scm._is_file_checked_out_globally),
+                                  (self.scm._get_files_checked_out_in_this_workspace, self.scm._is_file_checked_out_in_this_workspace)):
+            expected = self.run_with_fake(lambda files: [x for x in files if per_file(x)], self.files)
+            self.assertEqual(self.run_with_fake(batched, self.files), expected)
+        self.assertEqual(self.run_with_fake(self.scm._get_files_checked_out_globally, self.files), [self.files[2]])
+
+    def test_003___batch_size(self):
+        files = ['{}/{}.managed'.format(WSROOT, i) for i in range(25)]
+        with patch('dmx.abnrlib.scm.BATCH_SIZE', 10):
+            self.assertEqual(self.run_with_fake(self.scm._get_managed_files, files), files)
+        self.assertEqual(len(self.icmp4.calls), 3)
+
+    def test_004___unmatched_output_is_checked_per_file(self):
+        def icmp4(command):
+            self.icmp4.calls.append(command)
+            if ' -x ' in command:
+                return (0, '', '/elsewhere/x - file(s) not on client.\n')
+            return (0, '', '{} - file(s) not on client.\n'.format(command.split()[-1]))
+        with patch('dmx.abnrlib.scm.run_command', side_effect=icmp4):
+            self.assertEqual(self.scm._get_managed_files(self.files[:2]), [])
+        self.assertEqual(len(self.icmp4.calls), 3)
+
+    def test_005___failed_batch_raises_error_of_the_failing_file(self):
+        files = ['{}/{}'.format(WSROOT, x) for x in ('a.new', 'b.bad', 'c.new')]
+        with patch('dmx.abnrlib.scm.run_command', side_effect=self.icmp4):
+            self.scm._add_files_to_icm(files[::2])
+            self.assertEqual(len(self.icmp4.calls), 1)
+            with self.assertRaises(SCMError) as cm:
+                self.scm._add_files_to_icm(files)
+        self.assertIn('b.bad', str(cm.exception))
+        # The batch, and then each file
+        self.assertEqual(len(self.icmp4.calls), 5)
+
+    def test_006___failed_edits_are_returned(self):
+        files = ['{}/{}'.format(WSROOT, x) for x in ('a.managed', 'b.bad', 'c.managed')]
+        failed = self.run_with_fake(self.scm._edit_files_in_icm, files)
+        self.assertEqual(list(failed), [files[1]])
+
+    def test_007___preview_does_not_add(self):
+        self.scm.preview = True
+        self.run_with_fake(self.scm._add_symlinks_to_icm, self.files)
+        self.assertEqual(self.icmp4.calls, [])
+
+    def test_008___benchmark(self):
+        '''Compare a stand-in icmp4 per file with the batched checks, in seconds.'''
+        files = ['{}/{}.{}'.format(WSROOT, i, ('managed', 'new', 'opened')[i % 3]) for i in range(60)]
+        start = time.time()
+        per_file = self.run_with_fake(lambda files: [x for x in files if self.scm._is_file_managed(x) and not self.scm._is_file_checked_out_globally(x)], files)
+        middle = time.time()
+        calls = len(self.icmp4.calls)
+        managed = self.run_with_fake(self.scm._get_managed_files, files)
+        checked_out = set(self.run_with_fake(self.scm._get_files_checked_out_globally, managed))
+        batched = [x for x in managed if x not in checked_out]
+        end = time.time()
+        print('\nPer file: {} icmp4 in {:.2f}s  Batched: {} icmp4 in {:.2f}s'.format(
+            calls, middle - start, len(self.icmp4.calls) - calls, end - middle))
+        self.assertEqual(batched, per_file)
+        self.assertEqual(len(self.icmp4.calls) - calls, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the lock files that guard SION cache population
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.sionlib.cachelock
+from dmx.sionlib.cachelock import CacheLock, get_bom_lock
+
+def populate(lockfile, target, logfile, start):
+    '''
+    What sion_utils.process_boms()/wait_for_bom() do for one deliverable@bom:
+    populate it into a temporary directory that is renamed into place, unless it already is.
+    '''
+    start.wait()
+    lock = CacheLock(lockfile, owner='arc{}'.format(os.getpid()))
+    while True:
+        if lock.acquire():
+            try:
+                if not os.path.isdir(target):
+                    with open(logfile, 'a') as f:
+                        f.write('{}\n'.format(os.getpid()))
+                    tmpdir = '{}.TEMP{}'.format(target, os.getpid())
+                    os.mkdir(tmpdir)
+                    time.sleep(0.3)
+                    os.rename(tmpdir, target)
+            finally:
+                lock.release()
+            return
+        lock.wait()
+
+def crash_while_populating(lockfile):
+    lock = CacheLock(lockfile)
+    lock.acquire()
+    time.sleep(0.5)
+    os._exit(1)
+
+class TestCacheLock(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.lockfile = os.path.join(self.tmpdir, 'proj.ip.rtl.REL1.0')
+        self.target = os.path.join(self.tmpdir, 'ip', 'rtl', 'REL1.0')
+        os.makedirs(os.path.dirname(self.target))
+        self.logfile = os.path.join(self.tmpdir, 'populated.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_populations(self):
+        if not os.path.exists(self.logfile):
+            return []
+        with open(self.logfile) as f:
+            return f.read().split()
+
+    def race(self, n):
+        start = multiprocessing.Event()
+        procs = [multiprocessing.Process(target=populate, args=(self.lockfile, self.target, self.logfile, start)) for i in range(n)]
+        for p in procs:
+            p.start()
+        start.set()
+        for p in procs:
+            p.join(60)
+            self.assertEqual(p.exitcode, 0)
+
+    def test_001___acquire_release(self):
+        lock = CacheLock(self.lockfile, owner='arc1')
+        self.assertTrue(lock.acquire())
+        with open(self.lockfile) as f:
+            self.assertEqual(f.readline(), 'arc1\n')
+        self.assertFalse(CacheLock(self.lockfile).acquire())
+        lock.release()
+        self.assertFalse(os.path.exists(self.lockfile))
+        self.assertTrue(CacheLock(self.lockfile).acquire())
+
+    def test_002___lock_of_a_dead_process_is_stale(self):
+        p = multiprocessing.Process(target=crash_while_populating, args=(self.lockfile,))
+        p.start()
+        p.join()
+        self.assertTrue(os.path.exists(self.lockfile))
+        self.assertTrue(CacheLock(self.lockfile).acquire())
+
+    def test_003___legacy_lock_files(self):
+        with open(self.lockfile, 'w') as f:
+            f.write('arc1')
+        self.assertFalse(CacheLock(self.lockfile).acquire())
+        old = time.time() - dmx.sionlib.cachelock.LEGACY_STALE_AFTER - 60
+        os.utime(self.lockfile, (old, old))
+        self.assertTrue(CacheLock(self.lockfile).acquire())
+
+    def test_004___processes_race_on_the_same_bom(self):
+        self.race(12)
+        self.assertEqual(len(self.get_populations()), 1)
+        self.assertTrue(os.path.isdir(self.target))
+        self.assertFalse(os.path.exists(self.lockfile))
+
+    def test_005___waiters_take_over_from_a_crashed_owner(self):
+        p = multiprocessing.Process(target=crash_while_populating, args=(self.lockfile,))
+        p.start()
+        while not os.path.exists(self.lockfile):
+            time.sleep(0.01)
+        self.race(8)
+        p.join()
+        self.assertEqual(len(self.get_populations()), 1)
+        self.assertTrue(os.path.isdir(self.target))
+        self.assertFalse(os.path.exists(self.lockfile))
+
+    def test_006___get_bom_lock(self):
+        lock = get_bom_lock(self.tmpdir, 'proj', 'ip', 'rtl', 'REL1.0')
+        self.assertEqual(lock.lockfile, os.path.join(self.tmpdir, '.locks', 'proj.ip.rtl.REL1.0'))
+
+if __name__ == '__main__':
+    unittest.main()
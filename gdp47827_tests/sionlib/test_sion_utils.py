@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the lookup of deliverable@boms in the SION cache disks
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.sionlib.sion_utils import SionDisk
+
+class TestSionDisk(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.disk1 = os.path.join(self.tmpdir, 'proj_sion2_1')
+        self.disk2 = os.path.join(self.tmpdir, 'proj_sion2_2')
+        for path in ('proj_sion2_1/ipA/rtl/dev', 'proj_sion2_1/ipB/rtl/REL0', 'proj_sion2_2/ipB/rtl/REL1',
+                     'proj_sion2_1/ipC/rtl/bad', 'proj_sion2_2/ipC/rtl/bad', 'proj_sion2_2/ipD/rtl/bad'):
+            os.makedirs(os.path.join(self.tmpdir, path))
+        # The bom directories that can not be read
+        self.unreadable = [os.path.join(self.disk1, 'ipC/rtl/bad'), os.path.join(self.disk2, 'ipD/rtl/bad')]
+        with patch.object(SionDisk, '_get_proj_disk_sion2', return_value={'proj': [self.disk1, self.disk2]}):
+            self.sion_disk = SionDisk()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def access(self, path, mode):
+        if path in self.unreadable:
+            return False
+        return self.real_access(path, mode)
+
+    def test_001___bulk_lookup_agrees_with_single_lookups(self):
+        pvcds = [
+            ('proj', 'ipA', 'rtl', 'dev'),      # on the first disk
+            ('proj', 'ipB', 'rtl', 'REL1'),     # on the second disk only
+            ('proj', 'ipX', 'rtl', 'dev'),      # no ip directory
+            ('proj', 'ipA', 'lint', 'dev'),     # no deliverable directory
+            ('proj', 'ipA', 'rtl', 'REL9'),     # no bom directory
+            ('proj', 'ipC', 'rtl', 'bad'),      # unreadable on the first disk, readable on the second
+            ('proj', 'ipD', 'rtl', 'bad'),      # unreadable
+            ('proj', 'ipA', 'rtl', 'dev'),      # duplicate
+        ]
+        self.real_access = os.access
+        with patch('os.access', side_effect=self.access):
+            bulk = self.sion_disk.get_pvcds_in_sion_disk(pvcds)
+            single = dict((x, self.sion_disk.is_pvcd_in_sion_disk(*x)) for x in pvcds)
+        self.assertEqual(bulk, single)
+        self.assertEqual(bulk, {
+            ('proj', 'ipA', 'rtl', 'dev'): '{}/ipA/rtl/dev'.format(self.disk1),
+            ('proj', 'ipB', 'rtl', 'REL1'): '{}/ipB/rtl/REL1'.format(self.disk2),
+            ('proj', 'ipX', 'rtl', 'dev'): False,
+            ('proj', 'ipA', 'lint', 'dev'): False,
+            ('proj', 'ipA', 'rtl', 'REL9'): False,
+            ('proj', 'ipC', 'rtl', 'bad'): '{}/ipC/rtl/bad'.format(self.disk2),
+            ('proj', 'ipD', 'rtl', 'bad'): False,
+        })
+
+    def test_002___every_directory_is_listed_once(self):
+        pvcds = [('proj', 'ipB', 'rtl', 'REL{}'.format(i)) for i in range(20)]
+        with patch('os.listdir', side_effect=os.listdir) as listdir:
+            result = self.sion_disk.get_pvcds_in_sion_disk(pvcds)
+        self.assertEqual(len([x for x in result.values() if x]), 2)
+        # 2 disks, 2 ipB directories and 2 ipB/rtl directories
+        self.assertEqual(listdir.call_count, 6)
+
+if __name__ == '__main__':
+    unittest.main()
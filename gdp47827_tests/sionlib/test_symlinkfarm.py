@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the symlink farm that links cached deliverables into workspaces
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.sionlib.symlinkfarm import link_tree
+
+def make_tree(root, ndirs, nsubdirs, nfiles):
+    for d in range(ndirs):
+        for s in range(nsubdirs):
+            path = os.path.join(root, 'dir{}'.format(d), 'sub{}'.format(s))
+            os.makedirs(path)
+            for f in range(nfiles):
+                open(os.path.join(path, 'file{}.v'.format(f)), 'w').close()
+            open(os.path.join(path, '.icmconfig'), 'w').close()
+
+def cp_link(src, dst):
+    '''The implementation SymlinkFarm replaces.'''
+    cmd = 'cp -sfLr {0}/* {1};  find {1} -name .icmconfig -exec rm -rf {{}} \\;'.format(src, dst)
+    subprocess.call(cmd, shell=True, stderr=open(os.devnull, 'w'))
+
+def snapshot(root):
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            result[os.path.relpath(path, root)] = os.readlink(path) if os.path.islink(path) else os.path.isdir(path)
+    return result
+
+class TestSymlinkFarm(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'cache', 'ip', 'rtl', 'REL1.0')
+        os.makedirs(self.src)
+        self.dst = os.path.join(self.tmpdir, 'ws', 'ip', 'rtl')
+        self.cpdst = os.path.join(self.tmpdir, 'cpws', 'ip', 'rtl')
+        os.makedirs(self.cpdst)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_001___same_links_as_cp(self):
+        make_tree(self.src, 3, 2, 3)
+        for name in ('.icmconfig', '.icminfo', 'top.v'):
+            open(os.path.join(self.src, name), 'w').close()
+        os.makedirs(os.path.join(self.src, 'dir0', '.icmconfig'))
+        os.symlink('dir1', os.path.join(self.src, 'linked_dir'))
+        os.symlink('../top.v', os.path.join(self.src, 'dir0', 'linked_file.v'))
+        os.symlink('missing.v', os.path.join(self.src, 'dir0', 'broken.v'))
+        stats = link_tree(self.src, self.dst)
+        cp_link(self.src, self.cpdst)
+        self.assertEqual(snapshot(self.dst), snapshot(self.cpdst))
+        self.assertEqual(stats.linked, 3 * 2 * 3 + 2 * 3 + 2)
+        self.assertEqual(stats.broken, [os.path.join(self.dst, 'dir0', 'broken.v')])
+
+    def test_002___relink(self):
+        make_tree(self.src, 2, 2, 2)
+        link_tree(self.src, self.dst)
+        before = snapshot(self.dst)
+        open(os.path.join(self.dst, 'dir0', 'sub0', '.icmconfig'), 'w').close()
+        os.remove(os.path.join(self.dst, 'dir0', 'sub0', 'file0.v'))
+        os.remove(os.path.join(self.dst, 'dir1', 'sub1', 'file1.v'))
+        os.symlink(self.src, os.path.join(self.dst, 'dir1', 'sub1', 'file1.v'))
+        stats = link_tree(self.src, self.dst)
+        self.assertEqual(stats.linked, 2)
+        self.assertEqual(stats.unchanged, 2 * 2 * 2 - 2)
+        self.assertEqual(snapshot(self.dst), before)
+
+    def test_003___already_linked_directory_is_skipped(self):
+        make_tree(self.src, 2, 2, 2)
+        os.makedirs(self.dst)
+        os.symlink(os.path.join(self.src, 'dir0'), os.path.join(self.dst, 'dir0'))
+        stats = link_tree(self.src, self.dst)
+        self.assertEqual(stats.linked, 2 * 2)
+        self.assertTrue(os.path.islink(os.path.join(self.dst, 'dir0')))
+
+    def test_004___loops_are_not_followed(self):
+        make_tree(self.src, 1, 1, 1)
+        os.symlink('..', os.path.join(self.src, 'dir0', 'up'))
+        stats = link_tree(self.src, self.dst)
+        self.assertEqual(stats.linked, 1)
+
+    def test_005___benchmark(self):
+        '''Compare files per second of cp -sfLr + find with the symlink farm.'''
+        make_tree(self.src, 8, 25, 100)
+        nfiles = 8 * 25 * 100
+        start = time.time()
+        cp_link(self.src, self.cpdst)
+        middle = time.time()
+        link_tree(self.src, self.dst)
+        end = time.time()
+        stats = link_tree(self.src, self.dst)
+        relink = time.time() - end
+        print('\ncp -sfLr + find: {:.0f} files/s  symlink farm: {:.0f} files/s  relink: {:.0f} files/s'.format(
+            nfiles / (middle - start), nfiles / (end - middle), nfiles / relink))
+        self.assertEqual(snapshot(self.dst), snapshot(self.cpdst))
+        self.assertEqual(stats.unchanged, nfiles)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import sys
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib', 'python')
+sys.path.insert(0, rootdir)
+
+import dmx.tnrlib.checksum_cache
+from dmx.tnrlib.checksum_cache import ChecksumCache, WORKSPACE_CACHE_FILE, get_checksum_cache
+
+class TestChecksumCache(unittest.TestCase):
+
+    def setUp(self):
+        # NAA() needs the NAA installation, which is not needed to tell NAA paths apart
+        self.naa_patcher = patch('dmx.utillib.naa.NAA')
+        self.naa_patcher.start().return_value.is_path_naa_path.return_value = False
+        self.wsroot = tempfile.mkdtemp()
+        self.shared = tempfile.mkdtemp()
+        self.infile = os.path.join(self.wsroot, 'a.txt')
+        with open(self.infile, 'w') as f:
+            f.write('aaa\n')
+        self.cache = ChecksumCache(os.path.join(self.wsroot, WORKSPACE_CACHE_FILE), os.path.join(self.shared, 'shared.db'))
+
+    def tearDown(self):
+        self.naa_patcher.stop()
+        shutil.rmtree(self.wsroot)
+        shutil.rmtree(self.shared)
+
+    def test_001___get_set(self):
+        self.assertEqual(self.cache.get(self.infile, 'f'), None)
+        self.assertTrue(self.cache.set(self.infile, 'f', 'abc'))
+        self.assertEqual(self.cache.get(self.infile, 'f'), 'abc')
+        self.assertEqual(self.cache.get(self.infile, None), None)
+        self.assertTrue(os.path.isfile(os.path.join(self.wsroot, '.dmx', 'checksum_cache.db')))
+
+    def test_002___modified_file_is_a_miss(self):
+        self.cache.set(self.infile, None, 'abc')
+        time.sleep(0.01)
+        with open(self.infile, 'a') as f:
+            f.write('bbb\n')
+        self.assertEqual(self.cache.get(self.infile, None), None)
+
+    def test_003___symlinks_share_the_entry_of_their_realpath(self):
+        link = os.path.join(self.wsroot, 'link.txt')
+        os.symlink(self.infile, link)
+        self.cache.set(self.infile, None, 'abc')
+        self.assertEqual(self.cache.get(link, None), 'abc')
+
+    def test_004___cache_paths_go_to_the_shared_db(self):
+        with patch('dmx.utillib.cache.Cache.is_path_cache_path', return_value=True):
+            self.cache.set(self.infile, None, 'abc')
+            other = ChecksumCache(os.path.join(self.shared, 'otherws.db'), os.path.join(self.shared, 'shared.db'))
+            self.assertEqual(other.get(self.infile, None), 'abc')
+        self.assertEqual(self.cache.get(self.infile, None), None)
+
+    def test_005___missing_file(self):
+        self.assertEqual(self.cache.get(os.path.join(self.wsroot, 'nosuchfile'), None), None)
+        self.assertFalse(self.cache.set(os.path.join(self.wsroot, 'nosuchfile'), None, 'abc'))
+
+    def test_006___unusable_naa_does_not_disable_the_cache(self):
+        self.naa_patcher.stop()
+        with patch('dmx.utillib.naa.NAA', side_effect=Exception('naa is not installed')) as naa:
+            self.assertTrue(self.cache.set(self.infile, None, 'abc'))
+            self.assertEqual(self.cache.get(self.infile, None), 'abc')
+            self.assertEqual(naa.call_count, 1)
+        self.naa_patcher.start()
+
+    def test_007___cache_that_can_not_be_created(self):
+        with patch('dmx.tnrlib.checksum_cache.ChecksumCache.for_workspace', side_effect=Exception('broken')) as create:
+            self.assertIsNone(get_checksum_cache(self.wsroot))
+            self.assertIsNone(get_checksum_cache(self.wsroot))
+            self.assertEqual(create.call_count, 1)
+        del dmx.tnrlib.checksum_cache._CHECKSUM_CACHES[self.wsroot]
+
+    def test_008___get_checksum_does_not_depend_on_the_cache(self):
+        from dmx.tnrlib.audit_check import get_checksum
+        expected = get_checksum(self.infile, None, True)
+        with patch('dmx.tnrlib.checksum_cache.ChecksumCache._get_connection', side_effect=Exception('locked')):
+            self.assertEqual(get_checksum(self.infile, None, True, ws_root=self.wsroot), expected)
+        dmx.tnrlib.checksum_cache._CHECKSUM_CACHES.pop(self.wsroot, None)
+        self.assertNotEqual(expected, -1)
+
+    def test_009___file_changed_while_hashed_is_not_cached(self):
+        key = self.cache.stat(self.infile, None)
+        time.sleep(0.01)
+        with open(self.infile, 'a') as f:
+            f.write('bbb\n')
+        self.assertFalse(self.cache.set(self.infile, None, 'abc', key))
+        self.assertEqual(self.cache.get(self.infile, None), None)
+        key = self.cache.stat(self.infile, None)
+        self.assertTrue(self.cache.set(self.infile, None, 'abc', key))
+        self.assertEqual(self.cache.get(self.infile, None, key), 'abc')
+
+    def test_010___shared_db_is_per_user(self):
+        with patch.dict(os.environ, {'DMX_SHARED_CHECKSUM_CACHE': self.shared}), \
+                patch('dmx.tnrlib.checksum_cache.getuser', return_value='someone'):
+            cache = ChecksumCache.for_workspace(self.wsroot)
+        self.assertEqual(cache.shared_dbfile, os.path.join(self.shared, 'someone.db'))
+        with patch.dict(os.environ, {'DMX_SHARED_CHECKSUM_CACHE': ''}):
+            cache = ChecksumCache.for_workspace(self.wsroot)
+        self.assertEqual(cache.shared_dbfile, cache.dbfile)
+
+    def test_011___writes_are_synchronous(self):
+        self.cache.set(self.infile, None, 'abc')
+        conn = self.cache._get_connection(self.cache.dbfile)
+        # FULL, the sqlite default
+        self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 2)
+
+if __name__ == "__main__":
+    unittest.main()
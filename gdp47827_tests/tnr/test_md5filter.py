@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import sys
+import os
+import time
+import random
+import shutil
+import tempfile
+import unittest
+
+rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib', 'python')
+sys.path.insert(0, rootdir)
+
+from dmx.tnrlib.md5filter import md5sum_with_filtering, md5sum_by_line, md5sum_by_dollar_lines, is_dollar_anchored
+
+### Same as dmx.tnrlib.audit_check.RCS_FILTER
+RCS_FILTER = "\\$Id.*\\$|\\$Header.*\\$|\\$Date.*\\$|\\$DateTime.*\\$|\\$Change.*\\$|\\$File.*\\$|\\$Revision.*\\$|\\$Author.*\\$"
+
+class TestMd5Filter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.infile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audit_check.txt')
+        self.non_ascii_infile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audit_check_non_ascii.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data, name='f.txt'):
+        filename = os.path.join(self.tmpdir, name)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
+
+    def test_001___same_digests_as_audit_check(self):
+        self.assertEqual(md5sum_by_dollar_lines(self.infile, RCS_FILTER), '9e214b874b19faae71407990b45212f0')
+        self.assertEqual(md5sum_by_dollar_lines(self.non_ascii_infile, RCS_FILTER), '7fa9e64c5a40057fb9c25e31ae16a076')
+
+    def test_002___is_dollar_anchored(self):
+        self.assertTrue(is_dollar_anchored(RCS_FILTER))
+        self.assertFalse(is_dollar_anchored('(?:.*bbb.*)|(?:%s)' % RCS_FILTER))
+        self.assertFalse(is_dollar_anchored('.*bbb.*'))
+
+    def test_003___line_endings(self):
+        data = b'a $Id: x $\r\nb\r$Header$\rc $ no keyword $\n$Author: me $'
+        filename = self.write(data)
+        self.assertEqual(md5sum_by_dollar_lines(filename, RCS_FILTER), md5sum_by_line(filename, RCS_FILTER))
+
+    def test_004___empty_file(self):
+        filename = self.write(b'')
+        self.assertEqual(md5sum_by_dollar_lines(filename, RCS_FILTER), md5sum_by_line(filename, RCS_FILTER))
+
+    def test_005___invalid_utf8_raises_like_the_reference(self):
+        filename = self.write(b'abc\xff\n$Id$\n')
+        self.assertRaises(UnicodeDecodeError, md5sum_by_dollar_lines, filename, RCS_FILTER)
+
+    def test_006___random_files(self):
+        rand = random.Random(1234)
+        pieces = [b'$', b'$Id', b'$Id: a.v#1 $', b'$Revision$', b'$Date', b'\n', b'\r', b'\r\n', b'x', b'wire a;', u'é'.encode('utf-8'), b' ']
+        for i in range(300):
+            filename = self.write(b''.join(rand.choice(pieces) for _ in range(rand.randint(0, 60))))
+            self.assertEqual(md5sum_by_dollar_lines(filename, RCS_FILTER), md5sum_by_line(filename, RCS_FILTER), open(filename, 'rb').read())
+
+    def test_008___optional_dollar_is_not_anchored(self):
+        filename = self.write(b'Revision 3\n$Id: a $\nId 4\n${0,1}Id\n')
+        for regexp in (r'\$?Revision.*', r'\$*Id.*', r'\${0,1}Id.*'):
+            self.assertFalse(is_dollar_anchored(regexp))
+            self.assertEqual(md5sum_with_filtering(filename, regexp), md5sum_by_line(filename, regexp))
+        self.assertTrue(is_dollar_anchored(r'\$+Id.*'))
+
+    def test_007___benchmark(self):
+        lines = []
+        for i in range(400000):
+            if i % 1000 == 0:
+                lines.append('// $Id: //depot/netlist.v#{} $\n'.format(i))
+            else:
+                lines.append('  assign n{0} = n{1} & n{2}; // cell_{0}\n'.format(i, i + 1, i + 2))
+        filename = self.write(''.join(lines).encode('utf-8'), 'netlist.v')
+        size = os.path.getsize(filename) / 1024.0 / 1024.0
+
+        start = time.time()
+        by_line = md5sum_by_line(filename, RCS_FILTER)
+        middle = time.time()
+        fast = md5sum_with_filtering(filename, RCS_FILTER)
+        end = time.time()
+        print('\n{:.1f}MB: md5sum_by_line={:.3f}s md5sum_with_filtering={:.3f}s'.format(size, middle - start, end - middle))
+        self.assertEqual(by_line, fast)
+        self.assertLess(end - middle, middle - start)
+
+if __name__ == "__main__":
+    unittest.main()
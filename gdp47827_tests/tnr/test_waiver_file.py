@@ -4,11 +4,12 @@ import sys
 import os
 import logging
 import unittest
+import random
 
 rootdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lib', 'python')
 sys.path.insert(0, rootdir)
 
-from dmx.tnrlib.waiver_file import WaiverFile
+from dmx.tnrlib.waiver_file import WaiverFile, AWaiver
 
 class TestWaiverFile(unittest.TestCase):
     
@@ -81,6 +82,49 @@ class TestWaiverFile(unittest.TestCase):
         ret = self.w.autoload_tnr_waivers(self.wsroot, self.variant, self.libtype)
 
 
+def find_by_looping(wf, variant, flow, subflow, error):
+    ''' The original linear search, as the reference '''
+    for waiver in wf.waivers:
+        if waiver.variant.match(variant) and waiver.flow.match(flow) and waiver.subflow.match(subflow) and waiver.error.match(error) and not 'UNWAIVABLE' in error:
+            if flow == 'deliverable' and subflow == 'existence' and not waiver.filepath.endswith('{}/reldoc/tnrwaivers.csv'.format(variant)):
+                continue
+            return ('CommandLine', waiver.reason, waiver.filepath)
+    return None
+
+class TestWaiverMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.rand = random.Random(42)
+        self.variants = ['va', 'vb', 'VC', 'v*']
+        self.flows = ['lint', 'rtl', 'deliverable', '*']
+        self.subflows = ['mustfix', 'existence', '', '*']
+        self.errors = ['Error 1 in file a.v', 'Error * in file b.v', 'Missing *', '*', 'exact (paren) [bracket] message.']
+
+    def random_waivers(self, num):
+        waivers = []
+        for i in range(num):
+            filepath = self.rand.choice(['/ws/va/reldoc/tnrwaivers.csv', '/ws/tnrwaivers.csv'])
+            waivers.append(AWaiver(self.rand.choice(self.variants), self.rand.choice(self.flows), self.rand.choice(self.subflows),
+                'reason {}'.format(i), self.rand.choice(self.errors), filepath))
+        wf = WaiverFile()
+        wf.load_from_list(waivers)
+        return wf
+
+    def test_001___same_result_as_looping(self):
+        wf = self.random_waivers(300)
+        for i in range(2000):
+            args = (self.rand.choice(['va', 'vb', 'vc', 'vx']), self.rand.choice(['lint', 'RTL', 'deliverable', 'x']),
+                self.rand.choice(['mustfix', 'existence', '', 'x']),
+                self.rand.choice(['Error 1 in file a.v', 'error 2 in file b.v', 'Missing cell', 'exact (paren) [bracket] message.', 'UNWAIVABLE x', 'other']))
+            self.assertEqual(wf.find_matching_waiver(*args), find_by_looping(wf, *args), args)
+
+    def test_002___added_waivers_are_seen(self):
+        wf = self.random_waivers(0)
+        self.assertEqual(wf.find_matching_waiver('va', 'lint', 'mustfix', 'new error'), None)
+        wf.load_from_list([AWaiver('va', 'lint', 'mustfix', 'new reason', 'new error', '/ws/tnrwaivers.csv')])
+        self.assertEqual(wf.find_matching_waiver('va', 'lint', 'mustfix', 'new error'), ('CommandLine', 'new reason', '/ws/tnrwaivers.csv'))
+
+
 if __name__ == "__main__":
     if '-v' in sys.argv:
         logging.basicConfig(format='[%(asctime)s] %(levelname)s:%(message)s', level=logging.DEBUG) 
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the ARC job watcher used to wait for the release jobs
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from mock import patch
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.utillib.utils import run_command
+import dmx.utillib.arcjobwatcher
+from dmx.utillib.arcjobwatcher import ArcCli, ArcJob, ArcJobWatcher, ArcJobWatcherError, ArcJobWatcherClient, get_watcher, share_watcher
+
+# A stand-in arc: 'arc job-info <id> status' prints the content of <dir>/<id>/status,
+# and 'arc job-info <id> storage' the content of <dir>/<id>/storage_path
+ARC = '''#!/bin/sh
+if [ "$3" = storage ]; then cat "{dir}/$2/storage_path"; else cat "{dir}/$2/$3"; fi
+'''
+
+class CountingCli(ArcCli):
+    '''An ArcCli that records the jobs of every query, and can fail the first ones.'''
+    def __init__(self, arc, failures=0):
+        super(CountingCli, self).__init__(arc=arc)
+        self.queries = []
+        self.failures = failures
+
+    def get_jobs_info(self, job_ids, keys=('status',)):
+        self.queries.append(list(job_ids))
+        if self.failures:
+            self.failures -= 1
+            raise ArcJobWatcherError('arc is down')
+        return super(CountingCli, self).get_jobs_info(job_ids, keys)
+
+def wait_in_child(job_id):
+    watcher = get_watcher()
+    return type(watcher).__name__, watcher.wait(job_id, 10), watcher.get_stdout(job_id)
+
+class TestArcJobWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.arc = os.path.join(self.tmpdir, 'arc')
+        with open(self.arc, 'w') as f:
+            f.write(ARC.format(dir=self.tmpdir))
+        os.chmod(self.arc, 0o755)
+        self.patches = [patch('dmx.utillib.arcjobwatcher.POLL_INTERVAL', 0.05),
+                        patch('dmx.utillib.arcjobwatcher.MAX_POLL_INTERVAL', 0.2),
+                        patch('dmx.utillib.arcjobwatcher.STORAGE_INTERVAL', 0.05)]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def add_job(self, job_id, status, visible=True, stdout=''):
+        jobdir = os.path.join(self.tmpdir, job_id)
+        storage = os.path.join(jobdir, 'storage')
+        os.makedirs(storage)
+        with open(os.path.join(storage, 'stdout.txt'), 'w') as f:
+            f.write(stdout)
+        with open(os.path.join(jobdir, 'storage_path'), 'w') as f:
+            f.write(storage if visible else '/remote' + storage)
+        self.set_status(job_id, status)
+        return storage
+
+    def set_status(self, job_id, status):
+        with open(os.path.join(self.tmpdir, job_id, 'status'), 'w') as f:
+            f.write(status + '\n')
+
+    def get_cli(self, failures=0):
+        return CountingCli(self.arc, failures)
+
+    def test_001___jobs_info_in_one_command(self):
+        for i in range(3):
+            self.add_job(str(i), 'running')
+        cli = self.get_cli()
+        with patch('dmx.utillib.arcjobwatcher.run_command', side_effect=run_command) as run:
+            info = cli.get_jobs_info(['0', '1', '2'], ('status', 'storage'))
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(sorted(info), ['0', '1', '2'])
+        self.assertEqual(info['1'], {'status': 'running', 'storage': os.path.join(self.tmpdir, '1', 'storage')})
+
+    def test_002___many_jobs_are_queried_together(self):
+        ids = [str(i) for i in range(20)]
+        for job_id in ids:
+            self.add_job(job_id, 'queued', visible=False)
+        watcher = ArcJobWatcher(self.get_cli())
+        results = {}
+        def wait(job_id):
+            results[job_id] = watcher.wait(job_id, timeout=10)
+        threads = [threading.Thread(target=wait, args=(x,)) for x in ids]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.3)
+        for job_id in ids:
+            self.set_status(job_id, 'done' if int(job_id) % 2 else 'failed')
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, dict((x, 'done' if int(x) % 2 else 'failed') for x in ids))
+        # One query for all the jobs that are due, instead of one per job
+        self.assertEqual(sorted(watcher.cli.queries[0]), sorted(ids))
+        self.assertLess(len(watcher.cli.queries), 20)
+
+    def test_003___backoff(self):
+        job = ArcJob('1')
+        intervals = []
+        for i in range(5):
+            job.backoff(0)
+            intervals.append(job.next_query)
+        self.assertEqual(intervals, [0.05, 0.1, 0.2, 0.2, 0.2])
+
+    def test_004___storage_write_makes_job_due(self):
+        storage = self.add_job('1', 'running')
+        watcher = ArcJobWatcher(self.get_cli())
+        with patch('dmx.utillib.arcjobwatcher.MAX_POLL_INTERVAL', 60), patch('dmx.utillib.arcjobwatcher.BACKOFF', 1000):
+            watcher.watch('1')
+            time.sleep(0.3)
+            # Not queried again until the storage is written
+            queries = len(watcher.cli.queries)
+            self.assertEqual(watcher.wait('1', timeout=0.2), 'running')
+            self.assertEqual(len(watcher.cli.queries), queries)
+            self.set_status('1', 'done')
+            time.sleep(0.05)
+            with open(os.path.join(storage, 'stdout.txt'), 'w') as f:
+                f.write('Rel Config: REL1\n')
+            start = time.time()
+            self.assertEqual(watcher.wait('1', timeout=10), 'done')
+            self.assertLess(time.time() - start, 2)
+        commands = watcher.commands
+        self.assertEqual(watcher.get_stdout('1'), ['Rel Config: REL1'])
+        # Read directly from the storage
+        self.assertEqual(watcher.commands, commands)
+
+    def test_005___remote_stdout(self):
+        self.add_job('1', 'done', visible=False, stdout='Rel Config: None\n')
+        cli = self.get_cli()
+        watcher = ArcJobWatcher(cli)
+        self.assertEqual(watcher.wait('1', timeout=10), 'done')
+        with patch.object(cli, 'get_job_output', return_value='Rel Config: None\n') as output:
+            self.assertEqual(watcher.get_stdout('1'), ['Rel Config: None'])
+        output.assert_called_with('1', storage='/remote' + os.path.join(self.tmpdir, '1', 'storage'), filesys='stdout')
+
+    def test_006___failed_queries_are_retried(self):
+        self.add_job('1', 'error')
+        watcher = ArcJobWatcher(self.get_cli(failures=2))
+        self.assertEqual(watcher.wait('1', timeout=10), 'error')
+        self.assertEqual(len(watcher.cli.queries), 3)
+
+    def test_007___ssh_command_reuses_a_control_connection(self):
+        cli = ArcCli(arc='/tools/arc', ssh='/bin/tnr_ssh', server='server1')
+        with patch('dmx.utillib.arcjobwatcher.run_command', return_value=(0, '', '')):
+            command = cli.get_command("echo 'a'")
+        self.assertTrue(command.startswith('/bin/tnr_ssh -q -o ControlMaster=auto -o ControlPath='))
+        self.assertIn('-o ControlPersist=', command)
+        self.assertTrue(command.endswith(''' server1 'echo '"'"'a'"'"'\''''))
+        self.assertEqual(ArcCli(arc='/tools/arc').get_command('echo a'), 'echo a')
+
+    def test_008___plain_ssh_without_control_connection_support(self):
+        cli = ArcCli(arc='/tools/arc', ssh='/bin/tnr_ssh', server='server1')
+        with patch('dmx.utillib.arcjobwatcher.run_command', return_value=(255, '', 'illegal option')) as run:
+            self.assertEqual(cli.get_command('echo a'), "/bin/tnr_ssh -q server1 'echo a'")
+            self.assertEqual(cli.get_command('echo b'), "/bin/tnr_ssh -q server1 'echo b'")
+        # Checked once
+        self.assertEqual(run.call_count, 1)
+        self.assertTrue(run.call_args[0][0].endswith(' server1 true'))
+
+    def test_009___failed_queries_are_retried_until_the_timeout(self):
+        self.add_job('1', 'done')
+        watcher = ArcJobWatcher(self.get_cli(failures=1000))
+        self.assertEqual(watcher.wait('1', timeout=1), None)
+        self.assertGreater(len(watcher.cli.queries), 3)
+        watcher.cli.failures = 0
+        self.assertEqual(watcher.wait('1', timeout=10), 'done')
+
+    def test_010___children_share_the_watcher_of_the_parent(self):
+        ids = [str(i) for i in range(4)]
+        for job_id in ids:
+            self.add_job(job_id, 'done', visible=False)
+        watcher = ArcJobWatcher(self.get_cli())
+        with patch.dict(dmx.utillib.arcjobwatcher._watchers, {None: watcher}):
+            with patch.object(watcher.cli, 'get_job_output', return_value='Rel Config: REL1\n'):
+                with share_watcher():
+                    self.assertIs(get_watcher(), watcher)
+                    pool = multiprocessing.Pool(2)
+                    try:
+                        results = pool.map(wait_in_child, ids)
+                    finally:
+                        pool.close()
+                        pool.join()
+        self.assertEqual(results, [('ArcJobWatcherClient', 'done', ['Rel Config: REL1'])] * 4)
+        # All the jobs were polled by the watcher of the parent
+        self.assertEqual(sorted(sum(watcher.cli.queries, [])), ids)
+        self.assertIsNone(os.getenv(dmx.utillib.arcjobwatcher.WATCHER_ENV))
+
+    def test_011___client_falls_back_when_the_parent_is_gone(self):
+        self.add_job('1', 'done')
+        watcher = ArcJobWatcher(self.get_cli())
+        client = ArcJobWatcherClient(os.path.join(self.tmpdir, 'nobody.sock'), fallback=watcher)
+        self.assertEqual(client.wait('1', 10), 'done')
+        self.assertEqual(len(watcher.cli.queries), 1)
+        with self.assertRaises(ArcJobWatcherError):
+            ArcJobWatcherClient(os.path.join(self.tmpdir, 'nobody.sock')).wait('1', 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the TaskPool and DependencyScheduler of the multiproc library
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import time
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+from dmx.utillib.multiproc import TaskPool, TaskPoolError, get_current_taskpool, DependencyScheduler
+
+def square(x):
+    return x * x
+
+def sum_of_squares(n):
+    ''' A task that hands sub-tasks to the pool it runs in '''
+    return sum(get_current_taskpool().map(square, [(i,) for i in range(n)], chunksize=3))
+
+def fail():
+    raise ValueError('failed on purpose')
+
+def map_fail():
+    return get_current_taskpool().map(fail, [()])
+
+def die():
+    os._exit(3)
+
+def nap(name, seconds):
+    time.sleep(seconds)
+    return name
+
+class TestTaskPool(unittest.TestCase):
+
+    def test_001___map_from_parent(self):
+        with TaskPool(2) as pool:
+            self.assertEqual(pool.map(square, [(i,) for i in range(10)], chunksize=4), [i * i for i in range(10)])
+
+    def test_002___nested_map_does_not_deadlock(self):
+        ''' more tasks than workers, and every task waits on its own sub-tasks '''
+        with TaskPool(2) as pool:
+            taskids = dict((pool.submit(sum_of_squares, n), n) for n in range(12))
+            results = dict((taskid, ret) for taskid, ok, ret in pool.as_completed())
+        self.assertEqual(sorted(results.keys()), sorted(taskids.keys()))
+        for taskid, n in taskids.items():
+            self.assertEqual(results[taskid], sum(i * i for i in range(n)))
+
+    def test_003___exceptions_are_returned(self):
+        with TaskPool(2) as pool:
+            pool.submit(fail)
+            pool.submit(map_fail)
+            results = list(pool.as_completed())
+        self.assertEqual([ok for taskid, ok, ret in results], [False, False])
+        self.assertTrue(all('failed on purpose' in ret for taskid, ok, ret in results))
+
+    def test_004___map_raises(self):
+        with TaskPool(1) as pool:
+            self.assertRaises(TaskPoolError, pool.map, fail, [()])
+
+    def test_005___not_a_worker(self):
+        self.assertEqual(get_current_taskpool(), None)
+
+    def test_006___dead_worker_fails_the_pending_tasks(self):
+        pool = TaskPool(2).start()
+        try:
+            pool.submit(nap, 'a', 0)
+            pool.submit(die)
+            pool.submit(nap, 'b', 30)
+            start = time.time()
+            results = list(pool.as_completed())
+            self.assertLess(time.time() - start, 10)
+        finally:
+            pool.close()
+        self.assertEqual(len(results), 3)
+        failed = [ret for taskid, ok, ret in results if not ok]
+        self.assertGreaterEqual(len(failed), 2)
+        self.assertTrue(all('died (exitcode 3)' in x for x in failed))
+        with self.assertRaises(TaskPoolError):
+            pool.submit(nap, 'c', 0)
+
+    def test_007___map_raises_on_dead_worker(self):
+        with TaskPool(2) as pool:
+            with self.assertRaises(TaskPoolError):
+                pool.map(die, [(), ()])
+
+class TestDependencyScheduler(unittest.TestCase):
+
+    def add(self, scheduler, key, seconds, depends_on=()):
+        scheduler.add(key, lambda: (nap, (key, seconds)), depends_on)
+
+    def test_001___not_level_by_level(self):
+        with TaskPool(2) as pool:
+            scheduler = DependencyScheduler(pool)
+            # slow -> top, fast -> middle -> top
+            self.add(scheduler, 'slow', 1)
+            self.add(scheduler, 'fast', 0.05)
+            self.add(scheduler, 'middle', 0.05, ['fast'])
+            self.add(scheduler, 'top', 0.05, ['slow', 'middle'])
+            completed = [key for key, ok, result in scheduler.run()]
+        # middle does not wait for slow, that is on the same level as fast
+        self.assertEqual(completed, ['fast', 'middle', 'slow', 'top'])
+        path = scheduler.get_critical_path()
+        self.assertEqual([x[0] for x in path], ['slow', 'top'])
+        self.assertGreaterEqual(path[0][2], 1)
+
+    def test_002___max_running(self):
+        with TaskPool(2) as pool:
+            scheduler = DependencyScheduler(pool, max_running=1)
+            for key in ('a', 'b', 'c'):
+                self.add(scheduler, key, 0.1)
+            self.add(scheduler, 'top', 0, ['a', 'b', 'c'])
+            start = time.time()
+            self.assertEqual(len(list(scheduler.run())), 4)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        path = scheduler.get_critical_path()
+        self.assertEqual(path[-1][0], 'top')
+        # the last of a, b, c waited for the other two
+        self.assertGreaterEqual(path[0][1], 0.2)
+
+    def test_003___dependents_of_failed_task_not_run(self):
+        with TaskPool(1) as pool:
+            scheduler = DependencyScheduler(pool)
+            scheduler.add('fail', lambda: (fail, ()))
+            self.add(scheduler, 'after', 0, ['fail'])
+            self.add(scheduler, 'other', 0)
+            results = dict((key, ok) for key, ok, result in scheduler.run())
+        self.assertEqual(results, {'fail': False, 'other': True})
+
+    def test_005___dead_worker_fails_the_task(self):
+        with TaskPool(1) as pool:
+            scheduler = DependencyScheduler(pool)
+            scheduler.add('die', lambda: (die, ()))
+            self.add(scheduler, 'after', 0, ['die'])
+            results = list(scheduler.run())
+        self.assertEqual([(key, ok) for key, ok, result in results], [('die', False)])
+        self.assertIn('died', results[0][2])
+
+    def test_004___bad_dependencies(self):
+        with TaskPool(1) as pool:
+            scheduler = DependencyScheduler(pool)
+            self.add(scheduler, 'a', 0, ['b'])
+            self.add(scheduler, 'b', 0, ['a'])
+            self.assertRaises(TaskPoolError, list, scheduler.run())
+            scheduler = DependencyScheduler(pool)
+            self.add(scheduler, 'a', 0, ['unknown'])
+            self.assertRaises(TaskPoolError, list, scheduler.run())
+            self.assertRaises(TaskPoolError, self.add, scheduler, 'a', 0)
+
+if __name__ == '__main__':
+    unittest.main()
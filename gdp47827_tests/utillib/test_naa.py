@@ -18,8 +18,14 @@ import unittest
 import inspect
 import os
 import sys
+import re
+import time
+import shutil
+import tempfile
+import threading
 from pprint import pprint
 import logging
+from mock import patch
 
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
 sys.path.insert(0, LIB)
@@ -69,6 +75,143 @@ class TestUtilsNaa(unittest.TestCase):
         ret = self.n.get_info_from_naa_path(f)
         self.assertEqual(ret, {})
 
+class FakeNaa(object):
+    '''
+    Stands in for 'naa.py put' and 'naa.py clone': the files show up in NAAROOT delay seconds
+    after the command returns, like they do over NFS.
+    '''
+    def __init__(self, delay):
+        self.delay = delay
+        self.commands = []
+        self.timers = []
+
+    def __call__(self, command, retry=False):
+        self.commands.append(command)
+        opts = dict(re.findall(r' -(\w+) (\S+)', command))
+        tagdir = os.path.join(dmx.utillib.naa.NAAROOT, opts['p'], opts['i'], opts['v'], opts['lib'])
+        copies = []
+        if ' put ' in command:
+            source = command.split('--source ')[1].split()[0]
+            for root, dirs, files in os.walk(source):
+                for f in files:
+                    copies.append((os.path.join(root, f), os.path.join(tagdir, opts['t'], os.path.relpath(os.path.join(root, f), source))))
+        else:
+            with open(opts['f']) as f:
+                for name in f.read().split():
+                    copies.append((os.path.join(tagdir, opts['t'], name), os.path.join(tagdir, opts['tar'], name)))
+        timer = threading.Timer(self.delay, self.copy, (copies,))
+        timer.start()
+        self.timers.append(timer)
+        return (0, '', '')
+
+    def copy(self, copies):
+        for source, dest in copies:
+            if not os.path.isdir(os.path.dirname(dest)):
+                os.makedirs(os.path.dirname(dest))
+            shutil.copy(source, dest)
+
+class TestNaaPush(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patches = [patch('dmx.utillib.naa.NAAPATH', sys.executable), patch('dmx.utillib.naa.NAAROOT', os.path.join(self.tmpdir, 'naa'))]
+        for p in self.patches:
+            p.start()
+        self.n = dmx.utillib.naa.NAA()
+        self.source = os.path.join(self.tmpdir, 'source')
+        os.makedirs(os.path.join(self.source, 'a', 'b'))
+        for name in ('x.1', 'a/y.1', 'a/b/z.1'):
+            with open(os.path.join(self.source, name), 'w') as f:
+                f.write(name)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_200___push_returns_when_files_are_visible(self):
+        fake = FakeNaa(0.3)
+        start = time.time()
+        with patch('dmx.utillib.naa.run_command', side_effect=fake):
+            self.assertEqual(self.n.push_to_naa('fam', 'proj', 'ip', 'rtl', 'dev', self.source), 0)
+        self.assertLess(time.time() - start, 10)
+        for name in ('x.1', 'a/y.1', 'a/b/z.1'):
+            self.assertTrue(os.path.exists(self.n.get_naa_path('fam', 'proj', 'ip', 'rtl', 'dev', name)))
+
+    def test_201___wait_until_visible_times_out(self):
+        path = os.path.join(self.tmpdir, 'never')
+        start = time.time()
+        self.assertEqual(dmx.utillib.naa.wait_until_visible([path], timeout=0.3, interval=0.1), [path])
+        self.assertLess(time.time() - start, 1)
+
+    def test_202___clone_returns_when_files_are_visible(self):
+        fake = FakeNaa(0.2)
+        listfile = os.path.join(self.tmpdir, 'list')
+        with open(listfile, 'w') as f:
+            f.write('x.1\na/y.1\n')
+        with patch('dmx.utillib.naa.run_command', side_effect=fake):
+            self.n.push_to_naa('fam', 'proj', 'ip', 'rtl', 'dev', self.source)
+            self.assertEqual(self.n.clone_tag('fam', 'proj', 'ip', 'rtl', 'dev', listfile, 'REL1'), 0)
+        self.assertTrue(os.path.exists(self.n.get_naa_path('fam', 'proj', 'ip', 'rtl', 'REL1', 'a/y.1')))
+
+class TestNaaVersionIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patches = [patch('dmx.utillib.naa.NAAPATH', sys.executable), patch('dmx.utillib.naa.NAAROOT', os.path.join(self.tmpdir, 'naa'))]
+        for p in self.patches:
+            p.start()
+        self.n = dmx.utillib.naa.NAA()
+        self.tagdir = self.n.get_naa_path('fam', 'proj', 'ip', 'rtl', 'dev', '').rstrip('/')
+        os.makedirs(os.path.join(self.tagdir, 'a'))
+        for name in ('x.v.1', 'x.v.2', 'x.v.4', 'a/y.1', 'a/x.v.1'):
+            open(os.path.join(self.tagdir, name), 'w').close()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_300___get_next_version(self):
+        index = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        self.assertEqual(index.get_next_version('x.v'), 'x.v.3')
+        self.assertEqual(index.get_next_version('a/x.v'), 'a/x.v.2')
+        self.assertEqual(index.get_next_version('a/new'), 'a/new.1')
+        self.assertEqual(index.get_next_version('nodir/new'), 'nodir/new.1')
+
+    def test_301___reserve(self):
+        index = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        self.assertEqual(index.reserve('x.v'), 'x.v.3')
+        self.assertEqual(index.reserve('x.v'), 'x.v.5')
+        self.assertEqual(index.reserve('a/x.v'), 'a/x.v.2')
+        # Nothing is written into NAA
+        self.assertEqual(sorted(os.listdir(self.tagdir)), ['a', 'x.v.1', 'x.v.2', 'x.v.4'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tagdir, 'a'))), ['x.v.1', 'y.1'])
+        self.assertEqual(index.get_conflicts(), [])
+
+    def test_302___reserve_skips_files_pushed_after_the_scan(self):
+        index = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        self.assertEqual(index.get_next_version('a/y'), 'a/y.2')
+        open(os.path.join(self.tagdir, 'a', 'y.2'), 'w').close()
+        self.assertEqual(index.reserve('a/y'), 'a/y.3')
+
+    def test_304___conflicts_with_a_concurrent_push(self):
+        index = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        other = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        self.assertEqual(index.reserve('x.v'), 'x.v.3')
+        self.assertEqual(index.reserve('a/y'), 'a/y.2')
+        self.assertEqual(other.reserve('x.v'), 'x.v.3')
+        # other pushes first
+        open(os.path.join(self.tagdir, 'x.v.3'), 'w').close()
+        self.assertEqual(index.get_conflicts(), ['x.v.3'])
+
+    def test_303___same_versions_as_file_exists(self):
+        for i in range(1, 501):
+            open(os.path.join(self.tagdir, 'hot.{}'.format(i)), 'w').close()
+        count = 1
+        while self.n.file_exists('fam', 'proj', 'ip', 'rtl', 'dev', 'hot.{}'.format(count)):
+            count += 1
+        index = self.n.get_version_index('fam', 'proj', 'ip', 'rtl', 'dev')
+        self.assertEqual(index.get_next_version('hot'), 'hot.{}'.format(count))
+        self.assertEqual(count, 501)
 
 if __name__ == '__main__':
     logging.basicConfig(format='[%(asctime)s] - %(levelname)s-[%(module)s]: %(message)s', level=logging.DEBUG)   
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the asynchronous telemetry sinks used for LogStash and Splunk logging
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import time
+import json
+import socket
+import threading
+import subprocess
+import multiprocessing
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.utillib.telemetry
+from dmx.utillib.telemetry import TelemetrySink, TCPTransport, get_tcp_sink
+
+def send_line(port, line):
+    get_tcp_sink('127.0.0.1', port).send_line(line)
+
+class Listener(object):
+    '''
+    A local log server, that records the lines it receives, and the number of connections.
+    If close_after is set, every connection is closed after that many reads.
+    '''
+    def __init__(self, close_after=None):
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.close_after = close_after
+        self.data = b''
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                conn, addr = self.server.accept()
+            except (IOError, OSError):
+                return
+            with self.lock:
+                self.connections += 1
+            reads = 0
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                with self.lock:
+                    self.data += data
+                reads += 1
+                if self.close_after and reads >= self.close_after:
+                    break
+            conn.close()
+
+    def get_lines(self, n, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                lines = self.data.decode().splitlines()
+            if len(lines) >= n:
+                return lines
+            time.sleep(0.01)
+        return lines
+
+    def close(self):
+        self.server.close()
+
+class BlockedTransport(object):
+    '''A transport whose writes wait until it is released.'''
+    def __init__(self):
+        self.released = threading.Event()
+        self.is_open = True
+        self.data = ''
+
+    def write(self, data):
+        self.released.wait()
+        self.data += data
+
+    def close(self):
+        pass
+
+class TestTelemetry(unittest.TestCase):
+
+    def test_001___lines_are_batched_over_one_connection(self):
+        listener = Listener()
+        sink = TelemetrySink(TCPTransport('127.0.0.1', listener.port))
+        for i in range(1000):
+            self.assertTrue(sink.send_line(json.dumps({'i': i})))
+        self.assertTrue(sink.flush())
+        self.assertEqual([json.loads(x)['i'] for x in listener.get_lines(1000)], list(range(1000)))
+        self.assertEqual(listener.connections, 1)
+        self.assertEqual(sink.get_stats()['sent'], 1000)
+        sink.close()
+        listener.close()
+
+    def test_002___never_blocks_on_a_dead_server(self):
+        s = socket.socket()
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+        s.close()
+        sink = TelemetrySink(TCPTransport('127.0.0.1', port), retry_interval=60)
+        start = time.time()
+        for i in range(100):
+            sink.send_line('x')
+        self.assertLess(time.time() - start, 1)
+        self.assertTrue(sink.flush())
+        stats = sink.get_stats()
+        self.assertEqual(stats['sent'], 0)
+        self.assertEqual(stats['failed'], 100)
+        sink.close()
+
+    def test_003___full_queue_drops_lines(self):
+        transport = BlockedTransport()
+        sink = TelemetrySink(transport, max_queued=10, max_batch=5)
+        results = [sink.send_line(str(i)) for i in range(30)]
+        self.assertFalse(all(results))
+        self.assertFalse(sink.flush(0.1))
+        transport.released.set()
+        self.assertTrue(sink.flush())
+        stats = sink.get_stats()
+        self.assertEqual(stats['sent'], results.count(True))
+        self.assertEqual(stats['dropped'], results.count(False))
+        self.assertLessEqual(stats['max_pending'], 11)
+        self.assertEqual(transport.data.split(), [str(i) for i, ok in enumerate(results) if ok])
+        sink.close()
+
+    def test_004___reconnects(self):
+        listener = Listener(close_after=1)
+        sink = TelemetrySink(TCPTransport('127.0.0.1', listener.port))
+        sink.send_line('first')
+        sink.flush()
+        listener.get_lines(1)
+        time.sleep(0.2)
+        for i in range(5):
+            sink.send_line('again')
+            sink.flush()
+            time.sleep(0.1)
+        self.assertIn('again', listener.get_lines(2))
+        self.assertGreater(listener.connections, 1)
+        sink.close()
+        listener.close()
+
+    def test_005___flushed_when_a_multiprocessing_child_exits(self):
+        listener = Listener()
+        # the child leaves with os._exit(), without running atexit
+        p = multiprocessing.Process(target=send_line, args=(listener.port, 'from child'))
+        p.start()
+        p.join()
+        self.assertEqual(p.exitcode, 0)
+        self.assertEqual(listener.get_lines(1), ['from child'])
+        listener.close()
+
+    def test_006___flushed_at_exit(self):
+        listener = Listener()
+        code = 'import sys; sys.path.insert(0, {!r}); from dmx.utillib.telemetry import get_tcp_sink; get_tcp_sink("127.0.0.1", {}).send_line("bye")'.format(LIB, listener.port)
+        subprocess.check_call([sys.executable, '-c', code])
+        self.assertEqual(listener.get_lines(1), ['bye'])
+        listener.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# 2015 Altera Corporation. All rights reserved. This source code is highly
+# confidential and proprietary information of Altera and is to be used for
+# internal Altera purposes only.   Altera assumes no responsibility or
+# liability arising out of the application or use of this source code for
+# non-Altera purposes.
+#
+# Tests the span based tracer
+#
+# $File$
+# $Revision$
+# $Change$
+# $DateTime$
+# $Author$
+
+import unittest
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), 'lib', 'python')
+sys.path.insert(0, LIB)
+import dmx.utillib.tracer
+from dmx.utillib.tracer import span, traced, start_tracing, finish_tracing, is_tracing, summarize, get_command_span_name
+from dmx.tnrlib.execute import execute
+
+@traced(cat='test')
+def nap(seconds):
+    time.sleep(seconds)
+
+def child():
+    with span('child'):
+        nap(0.01)
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'trace.json')
+
+    def tearDown(self):
+        for name in (dmx.utillib.tracer.TRACE_ENV, dmx.utillib.tracer.TRACE_OWNER_ENV):
+            os.environ.pop(name, None)
+        shutil.rmtree(self.tmpdir)
+
+    def test_001___off(self):
+        self.assertFalse(is_tracing())
+        with span('phase') as s:
+            s.args['x'] = 1
+        nap(0)
+        self.assertEqual(finish_tracing(), [])
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_002___nested_spans_commands_and_processes(self):
+        start_tracing(self.path)
+        with span('release', project='p'):
+            with span('populate_workspace'):
+                execute(['true'])
+                nap(0.05)
+            p = multiprocessing.Process(target=child)
+            p.start()
+            p.join()
+        summary = finish_tracing()
+        self.assertFalse(is_tracing())
+        self.assertFalse(os.path.exists(self.path + '.parts'))
+
+        with open(self.path) as f:
+            trace = json.load(f)
+        spans = dict((x['name'], x) for x in trace['traceEvents'] if x['ph'] == 'X')
+        self.assertEqual(set(spans), set(['release', 'populate_workspace', 'true', 'nap', 'child']))
+        self.assertEqual(spans['release']['args'], {'project': 'p'})
+        self.assertEqual(spans['true']['cat'], 'subprocess')
+        self.assertEqual(spans['true']['args']['exitcode'], 0)
+        self.assertNotEqual(spans['child']['pid'], spans['release']['pid'])
+        self.assertLessEqual(spans['release']['ts'], spans['populate_workspace']['ts'])
+        self.assertGreaterEqual(spans['release']['dur'], spans['populate_workspace']['dur'])
+        self.assertEqual(len([x for x in trace['traceEvents'] if x['ph'] == 'M']), 2)
+
+        self.assertEqual(summary[0][:3], ('phase', 'release', 1))
+        by_name = dict((x[1], x) for x in summary)
+        # populate_workspace spent its time in execute() and nap()
+        self.assertLess(by_name['populate_workspace'][4], by_name['populate_workspace'][3])
+        self.assertEqual(trace['otherData']['summary'][0]['name'], 'release')
+
+    def test_003___exception(self):
+        start_tracing(self.path)
+        with self.assertRaises(ValueError):
+            with span('fails'):
+                raise ValueError()
+        finish_tracing()
+        with open(self.path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual([x['args'] for x in events if x['ph'] == 'X'], [{'error': 'ValueError'}])
+
+    def test_004___summarize_self_time(self):
+        events = [
+            {'ph': 'X', 'name': 'a', 'cat': 'phase', 'ts': 0, 'dur': 10000000, 'pid': 1, 'tid': 1},
+            {'ph': 'X', 'name': 'b', 'cat': 'phase', 'ts': 1000000, 'dur': 3000000, 'pid': 1, 'tid': 1},
+            {'ph': 'X', 'name': 'b', 'cat': 'phase', 'ts': 5000000, 'dur': 2000000, 'pid': 1, 'tid': 1},
+            {'ph': 'X', 'name': 'b', 'cat': 'phase', 'ts': 0, 'dur': 1000000, 'pid': 1, 'tid': 2},
+        ]
+        self.assertEqual(summarize(events), [('phase', 'a', 1, 10.0, 5.0, 10.0), ('phase', 'b', 3, 6.0, 6.0, 3.0)])
+
+    def test_005___command_span_name(self):
+        self.assertEqual(get_command_span_name('/usr/bin/xlp4 -x list sync'), 'xlp4 list')
+        self.assertEqual(get_command_span_name(['gdp', '--user=x', 'list', '/a']), 'gdp list')
+
+if __name__ == '__main__':
+    unittest.main()
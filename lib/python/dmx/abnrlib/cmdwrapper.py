@@ -29,6 +29,7 @@ from future.utils import with_metaclass
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 sys.path.insert(0, LIB)
 import dmx.abnrlib.command
+from dmx.abnrlib.pluginmanifest import get_plugin_manifest
 from dmx.abnrlib.icm import ICManageCLI
 from dmx.utillib.termcolor import colored
 
@@ -38,7 +39,7 @@ class CMDWrapper(object):
     @classmethod
     def get_help(cls):
         '''short subcommand description'''
-        parser_table, plugin_table = cls._import_plugins()
+        plugins = get_plugin_manifest().plugins
         txt = ''
         maxlen = 0
         for plugin in cls._auto_get_plugins():
@@ -49,9 +50,9 @@ class CMDWrapper(object):
         for i,plugin in enumerate(sorted(cls._auto_get_plugins())):
             ### Do not print if HIDDEN property in plugins/<command><subcommand>.py is set to True
             ### https://jira.devtools.intel.com/browse/PSGDMX-1755
-            if getattr(plugin_table[plugin], 'HIDDEN', False):
+            if plugins[plugin]['hidden']:
                 continue
-            help = plugin_table[plugin].get_help()
+            help = plugins[plugin]['help']
             name = cls._get_subcmd_name(plugin, cls.__name__.lower())
             fullcmd = '{} {}'.format(cls.__name__.lower(), name)
             txt += "{:{}} - {}".format(fullcmd, maxlen, help)
@@ -80,9 +81,9 @@ class CMDWrapper(object):
     @classmethod  
     def subcommand_help(cls, plugins):
         '''comments. notes, and explanations for the command'''
-        parser_table, plugin_table = cls._import_plugins()
         plugin, subplugin = plugins
         full_plugin_name = '{}{}'.format(plugin, subplugin)
+        parser_table, plugin_table = cls._import_plugins([full_plugin_name])
 
         ### Summary Help
         txt = ''
@@ -160,7 +161,6 @@ class CMDWrapper(object):
     @classmethod
     def command(cls, args):
         '''execute the subcommand'''
-        parser_table, plugin_table = cls._import_plugins()
         wrapper = cls.__name__.lower()
 
         if args.options and not args.options[0].startswith('-'):
@@ -172,12 +172,15 @@ class CMDWrapper(object):
             parser = argparse.ArgumentParser(prog='dmx {} '.format(wrapper))
             options = args.options            
 
+        # Only import the plugin of the selected subcommand
+        parser_table, plugin_table = cls._import_plugins([x for x in cls._auto_get_plugins() if x == cmd])
+
         # If we can't find the command from the table, the command doesn't exist.
         try:
             plugin_table[cmd].add_args(parser)
         except KeyError:            
             print('{} {} is not a valid command'.format(wrapper, args.options[0]))
-            valid_commands = ['{} {}'.format(wrapper, cls._get_subcmd_name(x, wrapper)) for x in list(plugin_table.keys()) if x.startswith(wrapper)]
+            valid_commands = ['{} {}'.format(wrapper, cls._get_subcmd_name(x, wrapper)) for x in cls._auto_get_plugins()]
             print('Valid commands: {}'.format(valid_commands))
             # Why sys.exit instead of raise?
             # This message goes out to users, so there is no need of raising the errors, we could just exit the call
@@ -214,17 +217,14 @@ class CMDWrapper(object):
                 raise Exception('bad exit status from command: ' + command)
 
     @classmethod
-    def _import_plugins(cls):
-        ''' '''
-        # import sub-plugins
-        subplugins_dir = os.path.join(LIB, "dmx", "plugins")
-        if not os.path.isdir(subplugins_dir):
-            print("Cannot find sub-plugins directory!")
-            #sys.exit(1)
-        subplugins = [x[:-3] for x in os.listdir(subplugins_dir) if x.endswith('.py') and x[0] != '_']
-        #for subplugin in subplugins:
-        for subplugin in cls._auto_get_plugins():
-            __import__("dmx.plugins." + subplugin)
+    def _import_plugins(cls, plugins=None):
+        '''
+        Import the given plugins (default: all the plugins of this command),
+        and return their [parser_table, plugin_table].
+        '''
+        if plugins is None:
+            plugins = cls._auto_get_plugins()
+        manifest = get_plugin_manifest()
         
         #pluginparser = argparse.ArgumentParser(formatter_class=CustomHelpFormatter)
         pluginparser = argparse.ArgumentParser(prog='dmx')
@@ -234,8 +234,8 @@ class CMDWrapper(object):
         # register commands' sub_plugins
         parser_table = {}
         plugin_table = {}
-        for cmd in dmx.abnrlib.command.Command.__subclasses__():
-            cmd_name = cmd.__name__.lower()
+        for cmd_name in plugins:
+            cmd = manifest.import_plugin(cmd_name)
             plugin_table[cmd_name] = cmd
             cmd_help = cmd.get_help()
             subcmd_name = cls._get_subcmd_name(cmd_name, cls.__name__.lower())
@@ -266,13 +266,7 @@ class CMDWrapper(object):
     @classmethod
     def _auto_get_plugins(cls):
         ''' Automatically get all the plugin names '''
-        retlist = []
-        for cmd in dmx.abnrlib.command.Command.__subclasses__():
-            cmd_name = cmd.__name__.lower()
-            if cmd_name.startswith(cls.__name__.lower()):
-                if cmd_name not in retlist:
-                    retlist.append(cmd_name)
-        return retlist
+        return get_plugin_manifest().get_plugin_names(cls.__name__.lower())
 
 
 class Runner(with_metaclass(abc.ABCMeta, object)):
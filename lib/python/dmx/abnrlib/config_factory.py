@@ -174,6 +174,8 @@ class ConfigFactory(object):
         ... ... ...
         '''
         cli = dmx.abnrlib.icm.ICManageCLI(site='intel', preview=preview)
+        ### For immutable (REL/PREL/snap-) configs, both of these come from the on-disk
+        ### immutable cache (dmx.abnrlib.immutablecache) whenever it is enabled.
         metadata = cli.get_config_content_details(project, variant, config, hierarchy=True)  # details of each self+children config 
         linkdata = cli.get_parent_child_relationship(project, variant, config, hierarchy=True) # children info of each self+children config 
         
@@ -204,6 +206,11 @@ class ConfigFactory(object):
             if obj.is_config():
                 obj._saved_configurations = list(obj.configurations)
 
+        ### Build the location index of the whole tree once, so that search()/get_objects_by_location()
+        ### on the root are lookups from here on.
+        if rootobj:
+            rootobj._get_tree_index()
+
         return rootobj
 
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: Batched 'xlp4 opened' / 'xlp4 reconcile -n' checks for workspace files.
+
+Checking the state of files one at a time costs two xlp4 forks per file.
+FileStateChecker groups the files by varlib (<variant>/<libtype>), writes every
+group into one -x argfile, and runs a single 'opened' and a single 'reconcile -n -l'
+per varlib. The varlibs can be checked in parallel.
+
+Usage
+=====
+    checker = FileStateChecker(wsroot, jobs=4)
+    ret = checker.check(['v1/rtl/a.v', 'v1/rtl/b.v', 'v2/lint/audit/audit.xml'])
+    ret == {'opened': ['//depot/.../v1/rtl/dev/a.v#1 - edit default change (text)'],
+            'reconcile': ['/ws/v1/rtl/b.v#1 - opened for edit']}
+
+Copyright (c) Altera Corporation 2014
+All rights reserved.
+'''
+
+import os
+import re
+import logging
+import tempfile
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+
+from dmx.utillib.utils import run_command
+
+LOGGER = logging.getLogger(__name__)
+
+NOT_OPENED_MSG = 'not opened'
+NOT_RECONCILE_MSG = 'no file(s) to reconcile'
+
+def get_path_from_message(msg):
+    '''
+    Returns the file path of an 'xlp4 opened' or 'xlp4 reconcile' output line.
+
+    >>> get_path_from_message('/ws/v1/rtl/b.v#1 - opened for edit')
+    '/ws/v1/rtl/b.v'
+    '''
+    return re.sub(r'(#\d+)? - .*$', '', msg)
+
+
+class FileStateChecker(object):
+    '''
+    Reports the files of a workspace that are opened, or out-of-sync with the depot.
+    '''
+
+    def __init__(self, wsroot, jobs=None, xlp4='_xlp4'):
+        '''
+        :param wsroot: The workspace root. Relative filenames are relative to it.
+        :type wsroot: str
+        :param jobs: Number of varlibs checked in parallel. Defaults to $DMX_FILESTATE_JOBS, or 4.
+        :type jobs: int
+        :param xlp4: The xlp4 executable
+        :type xlp4: str
+        '''
+        self.wsroot = wsroot
+        if jobs is None:
+            jobs = int(os.getenv('DMX_FILESTATE_JOBS', 4))
+        self.jobs = max(1, jobs)
+        self.xlp4 = xlp4
+
+    def get_varlib(self, filename):
+        '''
+        Returns the (variant, libtype) of filename, or None if it is not a varlib file of the workspace.
+        '''
+        if os.path.isabs(filename):
+            filename = os.path.relpath(filename, self.wsroot)
+            if filename.startswith('..'):
+                return None
+        parts = filename.split('/')
+        if len(parts) < 3:
+            return None
+        return (parts[0], parts[1])
+
+    def group_by_varlib(self, filenames):
+        '''
+        Returns an OrderedDict of {(variant, libtype): [filenames]}.
+        Files that do not belong to a varlib are grouped under None.
+        '''
+        groups = OrderedDict()
+        for filename in sorted(set(filenames)):
+            groups.setdefault(self.get_varlib(filename), []).append(filename)
+        return groups
+
+    def check(self, filenames):
+        '''
+        Returns the same structure as running 'xlp4 opened' on every file, and
+        'xlp4 reconcile -n -l' on every file that is not opened:-
+            {'opened': [<xlp4 opened output line>, ...], 'reconcile': [<xlp4 reconcile output line>, ...]}
+        '''
+        groups = list(self.group_by_varlib(filenames).items())
+        if self.jobs > 1 and len(groups) > 1:
+            pool = ThreadPool(min(self.jobs, len(groups)))
+            try:
+                results = pool.map(self._check_group, groups)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [self._check_group(group) for group in groups]
+
+        ret = {'opened': [], 'reconcile': []}
+        for result in results:
+            ret['opened'] += result['opened']
+            ret['reconcile'] += result['reconcile']
+        return ret
+
+    def _check_group(self, group):
+        varlib, filenames = group
+        if varlib is None:
+            # Opened files can not be mapped back from their depot path, so check them one by one.
+            ret = {'opened': [], 'reconcile': []}
+            for filename in filenames:
+                opened = self._run_on_files('opened', [filename], NOT_OPENED_MSG)
+                if opened:
+                    ret['opened'] += opened
+                else:
+                    ret['reconcile'] += self._run_on_files('reconcile -n -l', [filename], NOT_RECONCILE_MSG)
+            return ret
+
+        opened = self._run_on_files('opened', filenames, NOT_OPENED_MSG)
+        opened_files = set()
+        for line in opened:
+            relpath = self._get_relpath_from_depot_path(varlib, line)
+            if relpath:
+                opened_files.add(relpath)
+        remaining = [f for f in filenames if self._get_relpath(f) not in opened_files]
+        reconcile = self._run_on_files('reconcile -n -l', remaining) if remaining else []
+        return {'opened': opened, 'reconcile': reconcile}
+
+    def _get_relpath(self, filename):
+        if os.path.isabs(filename):
+            return os.path.relpath(filename, self.wsroot)
+        return os.path.normpath(filename)
+
+    def _get_relpath_from_depot_path(self, varlib, line):
+        '''
+        //depot/.../<variant>/<libtype>/<library>/<path>#<rev> - ...   ==>   <variant>/<libtype>/<path>
+        '''
+        variant, libtype = varlib
+        match = re.search(r'/{}/{}/[^/]+/(.+?)#\d+ - '.format(re.escape(variant), re.escape(libtype)), line)
+        if not match:
+            return None
+        return '{}/{}/{}'.format(variant, libtype, match.group(1))
+
+    def _run_on_files(self, subcommand, filenames, skipmsg=NOT_RECONCILE_MSG):
+        '''
+        Runs 'xlp4 -x <argfile> <subcommand>' from the workspace root,
+        and returns the non-empty stdout lines that do not contain skipmsg.
+        '''
+        fd, argfile = tempfile.mkstemp(prefix='dmx_filestate_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(filenames) + '\n')
+            cmd = 'cd {}; {} -x {} {}'.format(self.wsroot, self.xlp4, argfile, subcommand)
+            LOGGER.debug("{} ({} files)".format(cmd, len(filenames)))
+            exitcode, stdout, stderr = run_command(cmd)
+            LOGGER.debug("STDOUT:{}".format(stdout))
+            LOGGER.debug("STDERR:{}".format(stderr))
+        finally:
+            os.remove(argfile)
+        return [line.strip() for line in stdout.splitlines() if line.strip() and skipmsg not in line]
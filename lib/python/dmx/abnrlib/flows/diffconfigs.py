@@ -20,7 +20,9 @@ from tempfile import NamedTemporaryFile
 import subprocess
 import filecmp
 import re
+import hashlib
 from pprint import pprint, pformat
+from multiprocessing.pool import ThreadPool
 
 from dmx.utillib.decorators import memoized
 from dmx.abnrlib.config_factory import ConfigFactory
@@ -33,15 +35,64 @@ import dmx.ecolib.ecosphere
 
 LOGGER = logging.getLogger(__name__)
 NOT_USER_FILES = ['.icminfo', 'icm_pmlog.txt']
+# The number of libraries whose files are compared at the same time
+COMPARE_JOBS = 8
 
 class DiffConfigsError(Exception): pass
 class ConfigPairError(Exception): pass
 
-@memoized
+# {(first_path, second_path): True if the files are identical}, filled in bulk by compare_files()
+_IDENTICAL_FILES = {}
+
+def compare_files(pairs):
+    '''
+    Compares (first_path, second_path) pairs of file revisions, and records in
+    _IDENTICAL_FILES whether they are identical.
+
+    The digests, sizes and types of all the files are fetched with a single fstat, and
+    compared in memory. The content of the files is only diffed (with diff2) for text
+    files whose RCS keywords are expanded, as only those can have different digests
+    but the same content.
+    '''
+    pairs = [x for x in set(pairs) if x not in _IDENTICAL_FILES]
+    if not pairs:
+        return
+    icmcli = ICManageCLI(preview=True)
+    fstat = icmcli.get_files_fstat(set([x[0] for x in pairs] + [x[1] for x in pairs]))
+    for first_path, second_path in pairs:
+        first = fstat.get(first_path)
+        second = fstat.get(second_path)
+        if first_path == second_path:
+            identical = True
+        elif not first or not second or not first['digest'] or not second['digest']:
+            identical = _is_file_identical(first_path, second_path)
+        elif first['digest'] == second['digest'] and first['size'] == second['size']:
+            identical = True
+        elif is_type_keyword_expanded(first['type']) or is_type_keyword_expanded(second['type']):
+            identical = 'text' in first['type'] and 'text' in second['type'] and not icmcli.get_file_diff(first_path, second_path)
+        else:
+            identical = False
+        _IDENTICAL_FILES[(first_path, second_path)] = identical
+
+def is_type_keyword_expanded(filetype):
+    '''
+    Returns True if the Perforce file type (eg: text+kl, ktext) expands RCS keywords
+    '''
+    base, _, modifiers = filetype.partition('+')
+    return 'k' in modifiers or (base.startswith('k') and 'text' in base)
+
 def is_file_identical(first_path, second_path):
     '''
     Check if files are identical by comparing the content
     '''
+    if (first_path, second_path) not in _IDENTICAL_FILES:
+        compare_files([(first_path, second_path)])
+    return _IDENTICAL_FILES[(first_path, second_path)]
+
+def _is_file_identical(first_path, second_path):
+    '''
+    Check if files are identical by comparing the content, one file at a time
+    '''
     if first_path == second_path:
         return True
     else:   
@@ -57,6 +108,30 @@ def is_file_identical(first_path, second_path):
                 return True
             return False
 
+def md5sum_file(path):
+    '''
+    Returns the md5 hexdigest of the file at path, or '' if it can not be read
+    '''
+    md5 = hashlib.md5()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(block)
+    except (IOError, OSError) as e:
+        LOGGER.debug('Can not read {}: {}'.format(path, e))
+        return ''
+    return md5.hexdigest()
+
+def get_file_path(files, file):
+    return "{}/{}#{}".format(files[file]['directory'], files[file]['filename'], files[file]['version'])
+
+def get_common_file_paths(first_files, second_files):
+    '''
+    Returns the (first_path, second_path) of the user files that are in both dictionaries of files
+    '''
+    return [(get_file_path(first_files, file), get_file_path(second_files, file))
+        for file in first_files if file in second_files and first_files[file]['filename'] not in NOT_USER_FILES]
+
 @memoized
 def is_file_text(filespec):
     icmcli = ICManageCLI(preview=True)
@@ -111,6 +186,7 @@ class ConfigPair(object):
         self.__parent_second_config = None
         self.__first_files = dict()
         self.__second_files = dict()
+        self.__files_generated = False
         self.__key = None
 
         self.__logger = logging.getLogger(__name__)
@@ -134,6 +210,7 @@ class ConfigPair(object):
     @first_config.setter
     def first_config(self, config):
         self.__first_config = config
+        self.__files_generated = False
 
     @property
     def second_config(self):
@@ -142,6 +219,7 @@ class ConfigPair(object):
     @second_config.setter
     def second_config(self, config):
         self.__second_config = config
+        self.__files_generated = False
 
     @property
     def parent_first_config(self):
@@ -253,6 +331,8 @@ class ConfigPair(object):
         '''
         Generates the files' dictionary for both the first and/or second configuration
         '''
+        if self.__files_generated:
+            return
         if self.diff_pv():
             if self.first_config:   
                 self.first_files = self.first_config.get_dict_of_files(ignore_project_variant=True)
@@ -263,12 +343,21 @@ class ConfigPair(object):
                 self.first_files = self.first_config.get_dict_of_files()
             if self.second_config:            
                 self.second_files = self.second_config.get_dict_of_files()
+        self.__files_generated = True
+
+    def compare_files(self):
+        '''
+        Generates the files' dictionaries, and compares the files that are in both
+        configurations, in bulk
+        '''
+        self.generate_files_dict()
+        compare_files(get_common_file_paths(self.first_files, self.second_files))
 
     def differ_files(self, first_width, second_width):
         '''
         Returns a list of files' differences in string format
         '''
-        self.generate_files_dict()
+        self.compare_files()
 
         differences = []
         files = set(list(self.first_files.keys()) + list(self.second_files.keys()))                
@@ -742,6 +831,7 @@ class HTMLParser(object):
         '''
 
         files = set(list(first_files.keys()) + list(second_files.keys()))
+        compare_files(get_common_file_paths(first_files, second_files))
         num = 0
         for file in sorted(files):
             if file in first_files and file in second_files:
@@ -777,6 +867,7 @@ class HTMLParser(object):
         '''
         htmls = ""
         files = set(list(first_files.keys()) + list(second_files.keys()))
+        compare_files(get_common_file_paths(first_files, second_files))
         diffpy = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))), "bin/difficm.py")
         gvimpy = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))))), "bin/gvimicm.py")
 
@@ -962,6 +1053,7 @@ class DiffConfigs(object):
             self.tkdiff_configs(first_config_dict, second_config_dict)
         elif self.html:
             pair_lookup = self.build_pair_lookup(first_config_dict, second_config_dict)
+            self.compare_libraries(pair_lookup)
             html = HTMLParser(self.project, self.variant, self.first_config, self.second_config, 
                               pair_lookup, self.sort_by_libtypes) 
             html.build_lookup_dict() 
@@ -993,6 +1085,8 @@ class DiffConfigs(object):
             self.logger.debug("first_config_dict: {}".format(first_config_dict))
             self.logger.debug("second_condif_dict: {}".format(second_config_dict))
             self.logger.debug("pair_lookup: {}".format(pair_lookup))
+            if self.include_files:
+                self.compare_libraries(pair_lookup)
 
             if self.sort_by_libtypes:
                 libtypes = set([x.libtype for x in list(pair_lookup.values())])
@@ -1018,6 +1112,21 @@ class DiffConfigs(object):
             if self.include_files:
                 self.print_diff_help()                               
 
+    def compare_libraries(self, pair_lookup):
+        '''
+        Fetches the files of the libraries whose files will be shown, and compares them,
+        COMPARE_JOBS libraries at a time, ahead of printing the differences
+        '''
+        pairs = [x for x in list(pair_lookup.values()) if (x.both_configs() and x.differ()) or x.first_only() or x.second_only()]
+        if not pairs:
+            return
+        pool = ThreadPool(min(COMPARE_JOBS, len(pairs)))
+        try:
+            pool.map(lambda pair: pair.compare_files(), pairs)
+        finally:
+            pool.close()
+            pool.join()
+
     def get_icmp4_diff(self):
         '''
         Get icmp4 depot path from BomDetail, diff using icmp4 diff to get file different 
@@ -1066,15 +1175,24 @@ class DiffConfigs(object):
             - if line contains '==== content'
             - check both the md5sum is the same 
             - if same, remove line, else, retain line.
+
+        The md5sums of all the files are fetched at once, see get_large_data_deliverable_files_md5sum().
         '''
         retlist = []
-        for line in stdout.split('\n'):
+        lines = stdout.split('\n')
+        filespecs = []
+        for line in lines:
+            if line and '==== content' in line:
+                filespecs.extend(re.findall("(//depot/.+?#\d+) \(", line))
+        checksums = self.get_large_data_deliverable_files_md5sum(filespecs)
+
+        for line in lines:
             if line and '==== content' in line:
                 m = re.findall("(//depot/.+?#\d+) \(", line)
                 if len(m) == 2:
-                    checksum1 = self.get_large_data_deliverable_file_md5sum(m[0])
+                    checksum1 = checksums.get(m[0], '')
                     self.logger.debug("checksum:{} ==> filespec:{}".format(checksum1, m[0]))
-                    checksum2 = self.get_large_data_deliverable_file_md5sum(m[1])
+                    checksum2 = checksums.get(m[1], '')
                     self.logger.debug("checksum:{} ==> filespec:{}".format(checksum2, m[1]))
                     if checksum1 != checksum2:
                         self.logger.debug("- file differs!")
@@ -1092,9 +1210,48 @@ class DiffConfigs(object):
 
     def get_large_data_deliverable_file_md5sum(self, filespec):
         ''' '''
-        cmd = 'md5sum `_xlp4 print -q {}` | cut -d" " -f1 '.format(filespec)
-        exitcode, stdout, stderr = run_command(cmd)
-        return stdout.strip()
+        return self.get_large_data_deliverable_files_md5sum([filespec]).get(filespec, '')
+
+
+    def get_large_data_deliverable_files_md5sum(self, filespecs):
+        '''
+        The depot files of large data deliverables hold the paths of the actual data files.
+        Returns {filespec: md5sum of the data files it points to}, like
+            md5sum `_xlp4 print -q <filespec>` | cut -d" " -f1
+        did for every filespec, but with a single _xlp4 print (of all the filespecs, passed
+        with -x), and the data files hashed in this process, COMPARE_JOBS at a time.
+        '''
+        filespecs = sorted(set(filespecs))
+        if not filespecs:
+            return {}
+
+        contents = dict((x, []) for x in filespecs)
+        argfile = NamedTemporaryFile(mode='w', delete=False, prefix='diffconfigs_ldd')
+        try:
+            argfile.write('\n'.join(filespecs) + '\n')
+            argfile.close()
+            exitcode, stdout, stderr = run_command('_xlp4 -x {} print'.format(argfile.name))
+        finally:
+            os.unlink(argfile.name)
+
+        # Every file is printed after a '<filespec> - <action> change <num> (<type>)' header
+        current = None
+        for line in stdout.splitlines():
+            m = re.match(r'^(//depot/.+?#\d+) - \S+ change \d+ \(.*\)$', line)
+            if m and m.group(1) in contents:
+                current = m.group(1)
+            elif current:
+                contents[current].extend(line.split())
+
+        paths = sorted(set([path for x in list(contents.values()) for path in x]))
+        pool = ThreadPool(COMPARE_JOBS)
+        try:
+            md5sums = dict(zip(paths, pool.map(md5sum_file, paths)))
+        finally:
+            pool.close()
+            pool.join()
+
+        return dict((x, '\n'.join([md5sums[path] for path in contents[x] if md5sums[path]])) for x in filespecs)
 
 
     def is_large_data_deliverable(self, deliverable):
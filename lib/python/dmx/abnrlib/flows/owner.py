@@ -128,26 +128,20 @@ class Owner(object):
 
     def print_output(self):        
         
-        if self.config_or_library_or_release:
+        if self.config_or_library_or_release and self.all:
+            # Every object in the tree
+            w = csv.writer(sys.stdout)
+            if self.format == 'csv':
+                w.writerow(['bom', 'owner', 'owner_fullname', 'creator', 'creator_fullname', 'time'])
+            for obj, data in self.get_tree_designers(self.cfobj):
+                self.print_designers(data, w, name=obj.get_full_name(legacy_format=True))
+
+        elif self.config_or_library_or_release:
             data = self.get_configuration_designers(self.project, self.variant, self.config_or_library_or_release, self.libtype)
-            creator = data[0][1]
-            creator_fullname = self.get_full_name(creator)
-            owner = data[-1][1]
-            owner_fullname = self.get_full_name(owner)
-            createdat = data[-1][2]
+            w = csv.writer(sys.stdout)
             if self.format == 'csv':
-                w = csv.writer(sys.stdout)
                 w.writerow(['owner', 'owner_fullname', 'creator', 'creator_fullname', 'time'])
-                w.writerow([owner, owner_fullname, creator, creator_fullname, createdat])
-            else:
-                if self.owner:
-                    print(owner)
-                elif self.creator:
-                    print(creator)
-                else:                        
-                    print("Owner: {} ({})".format(owner, owner_fullname))
-                    print("Creator: {} ({})".format(creator, creator_fullname))
-                    print("Time: {}".format(createdat))
+            self.print_designers(data, w)
 
         else:
             owner, createdat = self.get_variant_owner_properties(self.project, self.variant)
@@ -168,6 +162,31 @@ class Owner(object):
                     print("Creation date not found.")                    
 
 
+    def print_designers(self, data, w, name=None):
+        '''
+        Prints the owner, creator and time of the designers (see get_configuration_designers)
+        of an object. name is printed with them when the objects of a tree are printed.
+        '''
+        creator = data[0][1]
+        creator_fullname = self.get_full_name(creator)
+        owner = data[-1][1]
+        owner_fullname = self.get_full_name(owner)
+        createdat = data[-1][2]
+        if self.format == 'csv':
+            w.writerow(([name] if name else []) + [owner, owner_fullname, creator, creator_fullname, createdat])
+        else:
+            prefix = '{} '.format(name) if name else ''
+            if self.owner:
+                print('{}{}'.format(prefix, owner))
+            elif self.creator:
+                print('{}{}'.format(prefix, creator))
+            else:                        
+                if name:
+                    print('[{}]'.format(name))
+                print("Owner: {} ({})".format(owner, owner_fullname))
+                print("Creator: {} ({})".format(creator, creator_fullname))
+                print("Time: {}".format(createdat))
+
     def has_property(self, config, property):
         '''
         Returns True if given property exists for the config object
@@ -239,7 +258,12 @@ class Owner(object):
         else:
             config = config_or_library_or_release
             details = self.cli.get_config_details(project, variant, config)
+        return self.get_designers_from_details(details)
 
+    def get_designers_from_details(self, details):
+        '''
+        Returns the designers (see get_configuration_designers) of the details of an object
+        '''
         designers = []
         ### Initial creator
         designers.append([1, details['created-by'], details['created']])
@@ -252,6 +276,44 @@ class Owner(object):
         self.logger.debug("get_configuration_designers: {}".format(designers)) 
         return designers
 
+    def get_tree_designers(self, cfobj):
+        '''
+        Bulk version of get_configuration_designers, for every object in the tree of cfobj.
+        The details of the objects are fetched with one query per object type, project and
+        name (see ICManageCLI.get_objects_details), instead of one to three queries per object.
+
+        return = [(object, designers), (object, designers), ...] in the order of cfobj.flatten_tree()
+        '''
+        objects = cfobj.flatten_tree()
+        keys = {}
+        for obj in objects:
+            objtype, key = self.get_object_key(obj)
+            keys.setdefault(objtype, []).append(key)
+        details = {}
+        for objtype, objkeys in list(keys.items()):
+            for key, value in list(self.cli.get_objects_details(objtype, objkeys).items()):
+                details[(objtype, key)] = value
+
+        ret = []
+        for obj in objects:
+            key = self.get_object_key(obj)
+            if key not in details:
+                self.logger.warning('Details of {} not found'.format(obj.get_full_name(legacy_format=True)))
+                continue
+            ret.append((obj, self.get_designers_from_details(details[key])))
+        return ret
+
+    def get_object_key(self, obj):
+        '''
+        Returns (objtype, key) of a config/library/release object, as used by ICManageCLI.get_objects_details
+        '''
+        if obj.is_config():
+            return ('config', (obj.project, obj.variant, obj.config))
+        elif obj.is_release():
+            return ('release', (obj.project, obj.variant, obj.libtype, obj.library, obj.lib_release))
+        else:
+            return ('library', (obj.project, obj.variant, obj.libtype, obj.library))
+
     def get_configuration_updated_time(self, changelist):
         '''
         Return the changelist submitted date and time
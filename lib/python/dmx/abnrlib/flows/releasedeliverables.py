@@ -22,6 +22,7 @@ from dmx.abnrlib.icmlibrary import IcmLibrary
 from dmx.abnrlib.multireleases import release_deliverable
 from dmx.abnrlib.releaseinputvalidation import validate_inputs
 from dmx.utillib.multiproc import run_mp
+from dmx.abnrlib.releasesubmit import share_release_job_watcher
 from dmx.abnrlib.icm import ICManageCLI
 import dmx.ecolib.ecosphere 
 from dmx.utillib.admin import get_dmx_admins
@@ -125,7 +126,8 @@ class ReleaseDeliverables(object):
                             self.description, self.preview, 
                             self.force, [], self.regmode])
 
-        results = run_mp(release_deliverable, mp_args)
+        with share_release_job_watcher():
+            results = run_mp(release_deliverable, mp_args)
         released_configs = []
         for result in results:
             if not result['success']:
@@ -24,6 +24,7 @@ from dmx.abnrlib.icmsimpleconfig import SimpleConfig
 from dmx.abnrlib.multireleases import release_simple_config
 from dmx.abnrlib.releaseinputvalidation import validate_inputs
 from dmx.utillib.multiproc import run_mp
+from dmx.abnrlib.releasesubmit import share_release_job_watcher
 from dmx.abnrlib.icm import ICManageCLI
 
 ConfigPair = namedtuple('ConfigPair', 'config ipspec')
@@ -155,7 +156,8 @@ class ReleaseLibraries(object):
                             self.description, self.preview, 
                             self.waiver_files, self.force])
 
-        results = run_mp(release_simple_config, mp_args)
+        with share_release_job_watcher():
+            results = run_mp(release_simple_config, mp_args)
         released_configs = []
         for result in results:
             if not result['success']:
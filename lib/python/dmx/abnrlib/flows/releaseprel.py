@@ -25,6 +25,7 @@ from dmx.abnrlib.multireleases import release_simple_config, release_composite_c
 from dmx.abnrlib.releaseinputvalidation import validate_inputs
 from dmx.utillib.utils import format_configuration_name_for_printing, split_pvlc, get_thread_and_milestone_from_prel_config
 from dmx.utillib.multiproc import run_mp
+from dmx.abnrlib.releasesubmit import share_release_job_watcher
 import dmx.ecolib.ecosphere
 from dmx.utillib.admin import get_dmx_admins
 from dmx.utillib.arcenv import ARCEnv
@@ -246,7 +247,8 @@ class ReleasePrel(object):
         # http://pg-rdjira.altera.com:8080/browse/DI-560
         # Instead of calling release_simple_config, call release_deliverable
         # which supports the new release flow
-        results = run_mp(release_deliverable, mp_args)
+        with share_release_job_watcher():
+            results = run_mp(release_deliverable, mp_args)
 
         for result in results:
             if not result['success']:
@@ -292,7 +294,8 @@ class ReleasePrel(object):
                                     False, [], self.syncpoint, self.skipsyncpoint, 
                                     self.skipmscheck, self.prel, self.regmode])
     
-                results = run_mp(release_composite_config, mp_args)
+                with share_release_job_watcher():
+                    results = run_mp(release_composite_config, mp_args)
     
                 for result in results:
                     if result['success']:
@@ -23,13 +23,17 @@ from dmx.abnrlib.config_factory import ConfigFactory
 from dmx.abnrlib.multireleases import release_simple_config, release_composite_config, release_deliverable
 from dmx.abnrlib.releaseinputvalidation import validate_inputs
 from dmx.utillib.utils import format_configuration_name_for_printing, get_abnr_id, split_pvlc, get_thread_and_milestone_from_rel_config
-from dmx.utillib.multiproc import run_mp
+from dmx.utillib.multiproc import run_mp, TaskPool, DependencyScheduler
+from dmx.abnrlib.releasesubmit import share_release_job_watcher
 import dmx.ecolib.ecosphere 
 from dmx.utillib.admin import get_dmx_admins
 from dmx.utillib.arcenv import ARCEnv
 
 class ReleaseTreeError(Exception): pass
 
+# The number of releases that run at the same time
+RELEASE_JOBS = 4
+
 class ReleaseTree(object):
     '''
     Runs the releasetree abnr subcommand
@@ -38,7 +42,8 @@ class ReleaseTree(object):
     def __init__(self, project, variant, config, milestone, thread, description, label=None,
                  required_only=False, intermediate=False,  
                  waiver_files=None, force=False, preview=True, 
-                 syncpoint='', skipsyncpoint='', skipmscheck='', views=None, regmode=False):
+                 syncpoint='', skipsyncpoint='', skipmscheck='', views=None, regmode=False,
+                 jobs=None):
         self.project = project
         self.variant = variant
         self.config = config
@@ -57,6 +62,7 @@ class ReleaseTree(object):
         self.skipmscheck = skipmscheck
         self.views = views
         self.regmode = regmode
+        self.jobs = jobs or RELEASE_JOBS
 
         self.cli = ICManageCLI(preview=preview)
         self.logger = logging.getLogger(__name__)
@@ -153,13 +159,11 @@ class ReleaseTree(object):
 
             # Get all unreleased simple configs in the tree
             unreleased_simple_configs = [x for x in source_cfg.flatten_tree() if not x.is_config() and not x.is_released()]          
-            # Release all simple configurations in the tree
-            if unreleased_simple_configs:
-                self.release_simple_configs(source_cfg, unreleased_simple_configs)
-            else:
+            if not unreleased_simple_configs:
                 self.logger.info('No simple config to be released for {}'.format(source_cfg))
-            # Finally, release the composites            
-            rel_tree = self.release_all_composite_configs(source_cfg)
+            # Release the simple configurations and the composites, each one as soon as
+            # everything it contains has been released
+            rel_tree = self.release_all_composite_configs(source_cfg, unreleased_simple_configs)
             if not rel_tree:
                 self.logger.error('Problem building release tree')
                 ret = 1
@@ -245,27 +249,7 @@ class ReleaseTree(object):
         :return: Updated root_config
         :rtype: CompositeConfig
         '''
-        mp_args = []
-        for unreleased_simple in unreleased_simple_configs:
-            ipspec_config = ''
-            if unreleased_simple.libtype != 'ipspec':
-                ipspec = root_config.search(project=unreleased_simple.project, variant='^{0}$'.format(unreleased_simple.variant), libtype='ipspec')
-
-                if not ipspec:
-                    raise ReleaseTreeError('Cannot find ipspec for {0}'.format(unreleased_simple.get_full_name()))
-                else:
-                    ipspec = ipspec[0]
-                    # Make sure we haven't extracted the wrong ipspec config name
-                    if ipspec.variant != unreleased_simple.variant:
-                        raise ReleaseTreeError('Got a bad ipspec for {0}. Found ipspec {1}'.format(unreleased_simple.get_full_name(), ipspec.get_full_name()))
-                    ipspec_config = ipspec.name
-
-            # http://pg-rdjira.altera.com:8080/browse/DI-560
-            # With the new release flow, we provide the variant level config to release
-            # libtype from, not the libtype config
-            variant_config = root_config.search(project=unreleased_simple.project, variant='^{0}$'.format(unreleased_simple.variant))[0]
-
-            mp_args.append([unreleased_simple.project, unreleased_simple.variant, unreleased_simple.libtype, variant_config.config, self.milestone, self.thread, self.label, self.description, self.preview, self.force, self.views, self.regmode])
+        mp_args = [self.get_release_deliverable_args(root_config, x) for x in unreleased_simple_configs]
 
         # We are doing this before releasing deliverable because in ReleaseDeliverable,
         # it might re-use the configuration objects already in the memory
@@ -274,68 +258,175 @@ class ReleaseTree(object):
         # http://pg-rdjira.altera.com:8080/browse/DI-560
         # Instead of calling release_simple_config, call release_deliverable
         # which supports the new release flow
-        results = run_mp(release_deliverable, mp_args)
+        with share_release_job_watcher():
+            results = run_mp(release_deliverable, mp_args)
 
         for result in results:
-            if not result['success']:
-                raise ReleaseTreeError('Problem releasing {0}/{1}:{2}@{3}'.format(result['project'], result['variant'], result['libtype'], result['original_config']))
+            new_rel_cfg = self.get_released_library(result)
+            root_config.replace_all_instances_in_tree(new_rel_cfg.project, new_rel_cfg.variant, new_rel_cfg, libtype=new_rel_cfg.libtype)
+
+        return root_config
+
+    def get_release_deliverable_args(self, root_config, unreleased_simple):
+        '''
+        Returns the arguments of release_deliverable() to release unreleased_simple
+        '''
+        ipspec_config = ''
+        if unreleased_simple.libtype != 'ipspec':
+            ipspec = root_config.search(project=unreleased_simple.project, variant='^{0}$'.format(unreleased_simple.variant), libtype='ipspec')
+
+            if not ipspec:
+                raise ReleaseTreeError('Cannot find ipspec for {0}'.format(unreleased_simple.get_full_name()))
             else:
-                # Only get from IC Manage if we're not in preview mode
-                if not self.preview:
-                    new_rel_cfg = ConfigFactory.create_from_icm(result['project'], result['variant'], result['released_config'], libtype=result['libtype'], preview=self.preview)
-                else:
-                    # Create a fake released config with false data. We're only in preview mode
-                    # so this should suffice
-                    new_rel_cfg = IcmLibrary(result['project'], result['variant'], result['libtype'], 'dev', result['released_config'], preview=self.preview, use_db=False)
+                ipspec = ipspec[0]
+                # Make sure we haven't extracted the wrong ipspec config name
+                if ipspec.variant != unreleased_simple.variant:
+                    raise ReleaseTreeError('Got a bad ipspec for {0}. Found ipspec {1}'.format(unreleased_simple.get_full_name(), ipspec.get_full_name()))
+                ipspec_config = ipspec.name
+
+        # http://pg-rdjira.altera.com:8080/browse/DI-560
+        # With the new release flow, we provide the variant level config to release
+        # libtype from, not the libtype config
+        variant_config = root_config.search(project=unreleased_simple.project, variant='^{0}$'.format(unreleased_simple.variant))[0]
 
-                root_config.replace_all_instances_in_tree(new_rel_cfg.project, new_rel_cfg.variant, new_rel_cfg, libtype=new_rel_cfg.libtype)
+        return [unreleased_simple.project, unreleased_simple.variant, unreleased_simple.libtype, variant_config.config, self.milestone, self.thread, self.label, self.description, self.preview, self.force, self.views, self.regmode]
 
-        return root_config
+    def get_released_library(self, result):
+        '''
+        Returns the simple config released by release_deliverable()
+
+        :raises: ReleaseTreeError if the release failed
+        '''
+        if not result['success']:
+            raise ReleaseTreeError('Problem releasing {0}/{1}:{2}@{3}'.format(result['project'], result['variant'], result['libtype'], result['original_config']))
+        # Only get from IC Manage if we're not in preview mode
+        if not self.preview:
+            return ConfigFactory.create_from_icm(result['project'], result['variant'], result['released_config'], libtype=result['libtype'], preview=self.preview)
+        else:
+            # Create a fake released config with false data. We're only in preview mode
+            # so this should suffice
+            return IcmLibrary(result['project'], result['variant'], result['libtype'], 'dev', result['released_config'], preview=self.preview, use_db=False)
 
-    def release_all_composite_configs(self, root_config):
+    def release_all_composite_configs(self, root_config, unreleased_simple_configs=None):
         '''
-        Releases all composite configs in the tree. Keeps spinning, finding the smallest elements
-        until everything is done.
+        Releases all composite configs in the tree, and the simple configs in
+        unreleased_simple_configs along with them.
+
+        Every config is released as soon as all the configs it contains have been
+        released, so a slow release only holds up its own parents, and composites
+        are released while the deliverables of other sub-trees still are.
+        At most self.jobs releases run at the same time. The chain of releases that
+        took the longest (the critical path) is reported at the end.
 
         :param root_config: The root configuration object
         :type root_config: CompositeConfig
+        :param unreleased_simple_configs: List of simple configs to release
+        :type unreleased_simple_configs: list
         :return: Newly released configuration root
         :rtype: CompositeConfig
         '''
-        configs_to_release = root_config.get_configs_ready_for_release()
-        if configs_to_release:
-            while configs_to_release:
-                mp_args = []
-                for unreleased_config in configs_to_release:
-                    self.logger.info('Processing {0}'.format(unreleased_config.get_full_name()))
-                    sub_configs = [x.get_full_name() for x in unreleased_config.configurations]
-                    mp_args.append([unreleased_config.project, unreleased_config.variant, sub_configs, self.milestone, self.thread, self.label, self.description, self.preview, self.waiver_files, self.force, self.views, self.syncpoint, self.skipsyncpoint, self.skipmscheck, None, self.regmode])
-    
-                results = run_mp(release_composite_config, mp_args)
-    
-                for result in results:
-                    if result['success']:
-                        if not self.preview:
-                            new_rel_cfg = ConfigFactory.create_from_icm(result['project'], result['variant'], result['released_config'], preview=self.preview)
-                        else:
-                            # Create a fake released config with false data. We're only in preview mode
-                            # so this should suffice
-                            new_rel_cfg = IcmConfig(result['released_config'], result['project'], result['variant'], [], preview=self.preview)
-                    else:
-                        raise ReleaseTreeError('Problem releasing variant for {0}/{1}'.format(result['project'], result['variant']))
-    
-                    # Did we just release root?
-                    if len(configs_to_release) == 1 and configs_to_release[0] == root_config:
-                        root_config = new_rel_cfg
+        unreleased_simple_configs = unreleased_simple_configs or []
+        unreleased_configs = [x for x in root_config.flatten_tree() if x.is_config() and not x.is_released()]
+        if not unreleased_configs and not unreleased_simple_configs:
+            self.logger.info('No composite config to be released for {}'.format(root_config))
+            return root_config
+
+        pool = TaskPool(min(self.jobs, len(unreleased_configs) + len(unreleased_simple_configs)))
+        scheduler = DependencyScheduler(pool)
+        for unreleased_simple in unreleased_simple_configs:
+            # The deliverables do not depend on anything: check them all before anything is released
+            mp_args = self.get_release_deliverable_args(root_config, unreleased_simple)
+            scheduler.add(self.get_release_key(unreleased_simple), lambda x=mp_args: (release_deliverable, x))
+        scheduler_keys = set(self.get_release_key(x) for x in unreleased_simple_configs + unreleased_configs)
+        for unreleased_config in unreleased_configs:
+            depends_on = [self.get_release_key(x) for x in unreleased_config.configurations if not x.is_released()]
+            for key in depends_on:
+                if key not in scheduler_keys:
+                    raise ReleaseTreeError('Cannot release {0}: {1} is not released'.format(unreleased_config.get_full_name(), self.format_release_key(key)))
+            scheduler.add(self.get_release_key(unreleased_config),
+                lambda x=unreleased_config: (release_composite_config, self.get_release_composite_config_args(x)),
+                depends_on)
+        root_key = self.get_release_key(root_config)
+
+        if unreleased_simple_configs:
+            # We are doing this before releasing deliverable because in ReleaseDeliverable,
+            # it might re-use the configuration objects already in the memory
+            ConfigFactory.remove_all_objs()
+
+        with share_release_job_watcher():
+            pool.start()
+            try:
+                for key, ok, result in scheduler.run():
+                    if not ok:
+                        raise ReleaseTreeError('Problem releasing {0}:\n{1}'.format(self.format_release_key(key), result))
+                    if len(key) == 3:
+                        new_rel_cfg = self.get_released_library(result)
+                        root_config.replace_all_instances_in_tree(new_rel_cfg.project, new_rel_cfg.variant, new_rel_cfg, libtype=new_rel_cfg.libtype)
                     else:
-                        root_config.replace_all_instances_in_tree(new_rel_cfg.project, new_rel_cfg.variant, new_rel_cfg)
-    
-                configs_to_release = root_config.get_configs_ready_for_release()
-        else:
-            self.logger.info('No composite config to be released for {}'.format(root_config))                
+                        new_rel_cfg = self.get_released_config(result)
+                        # Did we just release root?
+                        if key == root_key:
+                            root_config = new_rel_cfg
+                        else:
+                            root_config.replace_all_instances_in_tree(new_rel_cfg.project, new_rel_cfg.variant, new_rel_cfg)
+            finally:
+                pool.close()
 
+        self.report_critical_path(scheduler)
         return root_config
 
+    def get_release_key(self, config):
+        '''
+        Returns how the release of config is known to the DependencyScheduler:
+        (project, variant) for a composite config, (project, variant, libtype) for a simple one
+        '''
+        if config.is_config():
+            return (config.project, config.variant)
+        return (config.project, config.variant, config.libtype)
+
+    def format_release_key(self, key):
+        if len(key) == 3:
+            return '{0}/{1}:{2}'.format(*key)
+        return '{0}/{1}'.format(*key)
+
+    def get_release_composite_config_args(self, unreleased_config):
+        '''
+        Returns the arguments of release_composite_config() to release unreleased_config,
+        once all its sub-configs have been released
+        '''
+        self.logger.info('Processing {0}'.format(unreleased_config.get_full_name()))
+        sub_configs = [x.get_full_name() for x in unreleased_config.configurations]
+        return [unreleased_config.project, unreleased_config.variant, sub_configs, self.milestone, self.thread, self.label, self.description, self.preview, self.waiver_files, self.force, self.views, self.syncpoint, self.skipsyncpoint, self.skipmscheck, None, self.regmode]
+
+    def get_released_config(self, result):
+        '''
+        Returns the composite config released by release_composite_config()
+
+        :raises: ReleaseTreeError if the release failed
+        '''
+        if not result['success']:
+            raise ReleaseTreeError('Problem releasing variant for {0}/{1}'.format(result['project'], result['variant']))
+        if not self.preview:
+            return ConfigFactory.create_from_icm(result['project'], result['variant'], result['released_config'], preview=self.preview)
+        else:
+            # Create a fake released config with false data. We're only in preview mode
+            # so this should suffice
+            return IcmConfig(result['released_config'], result['project'], result['variant'], [], preview=self.preview)
+
+    def report_critical_path(self, scheduler):
+        '''
+        Logs the chain of releases that determined how long the whole tree took to release
+        '''
+        path = scheduler.get_critical_path()
+        if not path:
+            return
+        self.logger.info('Critical path of the release ({0:.0f}s):'.format(sum([waited + ran for key, waited, ran in path])))
+        for key, waited, ran in path:
+            msg = '    {0}: released in {1:.0f}s'.format(self.format_release_key(key), ran)
+            if waited >= 1:
+                msg += ', after waiting {0:.0f}s'.format(waited)
+            self.logger.info(msg)
+
     def should_release_config(self, simple_config, ipspec_config):
         '''
         Checks if simple_config should be released
@@ -61,6 +61,7 @@ import dmx.utillib.gkutils
 import dmx.tnrlib.test_result
 import dmx.utillib.naa
 import dmx.utillib.cache
+import dmx.abnrlib.filestatechecker
 
 LOGGER = logging.getLogger(__name__)
 
@@ -705,7 +706,7 @@ class Workspace(object):
         return not exitcode
 
     @classmethod
-    def check_action(cls, project, variant, configuration, milestone, thread, libtype=None, logfile=None, dashboard=None, celllist_file=None, nowarnings=False, waiver_file=[], preview=False, views=None, validate_deliverable_existence_check=True, validate_type_check=True, validate_checksum_check=True, validate_result_check=True, validate_goldenarc_check=False, cfobj=None, familyobj=None, only_run_flow_subflow_list=None, source='proddb'):
+    def check_action(cls, project, variant, configuration, milestone, thread, libtype=None, logfile=None, dashboard=None, celllist_file=None, nowarnings=False, waiver_file=[], preview=False, views=None, validate_deliverable_existence_check=True, validate_type_check=True, validate_checksum_check=True, validate_result_check=True, validate_goldenarc_check=False, cfobj=None, familyobj=None, only_run_flow_subflow_list=None, source='proddb', jobs=None):
         '''quick check command'''
         icm = ICManageCLI(preview=preview) 
 
@@ -772,7 +773,7 @@ class Workspace(object):
         log_audit = False
         if dashboard:
             log_audit = True
-        cls.testrunner = dmx.tnrlib.test_runner.TestRunner(cls.project, cls.variant, cls.libtype, cls.config, cls.wsroot, cls.milestone, cls.thread, cls.webapi, splunk_app_name='periodic', log_audit_validation_to_splunk=log_audit, views=cls.views, validate_deliverable_existence_check=validate_deliverable_existence_check, validate_type_check=validate_type_check, validate_checksum_check=validate_checksum_check, validate_result_check=validate_result_check, validate_goldenarc_check=False, familyobj=familyobj, only_run_flow_subflow_list=only_run_flow_subflow_list, prel=cls.prel)
+        cls.testrunner = dmx.tnrlib.test_runner.TestRunner(cls.project, cls.variant, cls.libtype, cls.config, cls.wsroot, cls.milestone, cls.thread, cls.webapi, splunk_app_name='periodic', log_audit_validation_to_splunk=log_audit, views=cls.views, validate_deliverable_existence_check=validate_deliverable_existence_check, validate_type_check=validate_type_check, validate_checksum_check=validate_checksum_check, validate_result_check=validate_result_check, validate_goldenarc_check=False, familyobj=familyobj, only_run_flow_subflow_list=only_run_flow_subflow_list, prel=cls.prel, jobs=jobs)
         errors = cls.testrunner.run_tests()
        
         LOGGER.info("validate_goldenarc_check: {}".format(validate_goldenarc_check)) 
@@ -932,25 +933,24 @@ class Workspace(object):
         LOGGER.debug("required_files_from_required_audits:{}".format(required_files_from_required_audits))
         required_files = set(required_audit_logs + required_files_from_required_audits)
 
-        ### We need to cd to workspace root before running all the is_file_opened() and
-        ### is_file_out_of_sync() checks because all the returned required_files are in 
+        ### We need to cd to workspace root before running all the 'xlp4 opened' and
+        ### 'xlp4 reconcile' checks because all the returned required_files are in 
         ### relative path from the workspace root.
         currdir = os.getcwd()
         os.chdir(cls.wsroot)
         naa = dmx.utillib.naa.NAA()
         cache = dmx.utillib.cache.Cache()
 
-        retlist = {'opened': [], 'reconcile': []}
-        for filename in required_files:
-            ret = cls.is_file_opened(filename)
-            if ret:
-                retlist['opened'].append(ret)
-            else:
-                ret = cls.is_file_out_of_sync(filename)
-                if ret:
-                    fullpath = os.path.realpath(filename)
-                    if not naa.is_path_naa_path(fullpath) and not cache.is_path_cache_path(fullpath):
-                        retlist['reconcile'].append(ret)
+        ### All the files of a varlib are checked with one 'xlp4 opened' and one 'xlp4 reconcile',
+        ### instead of 2 xlp4 calls per file.
+        checker = dmx.abnrlib.filestatechecker.FileStateChecker(cls.wsroot)
+        retlist = checker.check(required_files)
+        reconcile = []
+        for ret in retlist['reconcile']:
+            fullpath = os.path.realpath(dmx.abnrlib.filestatechecker.get_path_from_message(ret))
+            if not naa.is_path_naa_path(fullpath) and not cache.is_path_cache_path(fullpath):
+                reconcile.append(ret)
+        retlist['reconcile'] = reconcile
 
         if retlist['opened'] or retlist['reconcile']:
             LOGGER.info('Current state of this workspace does not match repository. Please review the following errors before running release.\n')
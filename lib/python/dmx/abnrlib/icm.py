@@ -31,6 +31,7 @@ import signal
 import inspect
 from datetime import date, timedelta
 import functools
+import fnmatch
 import re
 import marshal
 import sys
@@ -41,15 +42,18 @@ if sys.version_info[0] > 2:
 import which
 '''
 from multiprocessing import Lock
+from collections import OrderedDict
 import time
 import json
 import warnings
 warnings.filterwarnings('ignore', category=RuntimeWarning)
 
 from dmx.utillib.decorators import memoized
+from dmx.abnrlib.immutablecache import cached_if_immutable, get_immutable_cache
 from dmx.abnrlib.command import Command
 from dmx.utillib.utils import *
 from dmx.abnrlib.namevalidator import ICMName
+from dmx.utillib.tracer import command_span
 import dmx.utillib.utils
 import dmx.utillib.contextmgr
 
@@ -245,31 +249,157 @@ def get_last_REL_from_matches(matches):
 
     return latest_rel
 
+def get_gdp_path_scope(path):
+    '''
+    Returns the (project, variant, libtype) scope that a gdp or depot path refers to.
+
+    The tuple is shorter when the path stops above the libtype level, eg:-
+        /intel/proj/var/rtl/dev/REL1:release      => ('proj', 'var', 'rtl')
+        /intel/proj/var/snap-1:config/*::content  => ('proj', 'var')
+        /intel/proj/:variant                      => ('proj', '*')
+        //depot/gdpxl/.../proj/var/rtl/dev/...@now => ('proj', 'var', 'rtl')
+    Glob components are kept as-is and compared with fnmatch by scopes_overlap().
+
+    Returns None if the path can reach anywhere in the tree (eg: hierarchical '.**' queries),
+    or if the path could not be understood: that includes the absolute paths that are neither
+    under the gdp site ($DMX_GDPSITE) nor in //depot/gdpxl, eg: the files of a workspace.
+
+    :param path: A gdp path or depot path
+    :type path: str
+    :return: Tuple of up to 3 path components, or None
+    :rtype: tuple or None
+    '''
+    if '**' in path:
+        return None
+    if path.startswith('//'):
+        m = re.match(r'^//depot/gdpxl[^.]*/\.\.\./?(.*)$', path)
+        if not m:
+            return None
+        path = m.group(1).split('@')[0].split('#')[0]
+    else:
+        path = path.lstrip('/')
+        site = os.getenv("DMX_GDPSITE", 'intel')
+        if path != site and not path.startswith(site + '/'):
+            return None
+        path = path[len(site):].lstrip('/')
+
+    scope = []
+    for component in path.split('/'):
+        if len(scope) == 3:
+            break
+        if component.startswith(':'):
+            # Listing of objects at this level. eg: /proj/:variant
+            scope.append('*')
+            break
+        if ':' in component:
+            # The object itself lives at this level. eg: /proj/var/snap-1:config
+            break
+        if not component:
+            break
+        scope.append(component)
+    if not scope:
+        return None
+    return tuple(scope)
+
+def get_command_scopes(command):
+    '''
+    Returns the list of gdp path scopes touched by command (see get_gdp_path_scope),
+    or None if the command could touch anything.
+
+    :param command: The command in a list
+    :type command: list
+    :return: List of scope tuples, or None
+    :rtype: list or None
+    '''
+    if not isinstance(command, (list, tuple)):
+        return None
+    scopes = []
+    for arg in command:
+        if not hasattr(arg, 'startswith') or not arg.startswith('/'):
+            continue
+        scope = get_gdp_path_scope(arg)
+        if scope is None:
+            return None
+        scopes.append(scope)
+    return scopes or None
+
+def scopes_overlap(first, second):
+    '''
+    Returns True if the scope tuples first and second can refer to the same objects,
+    ie: one is a (glob aware) prefix of the other.
+    '''
+    for a, b in zip(first, second):
+        if a != b and not fnmatch.fnmatchcase(a, b) and not fnmatch.fnmatchcase(b, a):
+            return False
+    return True
+
 class ICMMemoizer(object):
     '''
     IC Manage specific memoizer with support
     for cache reset
-    Shamelessly stolen from:
+
+    The cache is a bounded LRU, keyed on the normalized arguments. Entries expire after
+    DMX_ICM_CACHE_TTL seconds (0 == never), and at most DMX_ICM_CACHE_SIZE entries are kept.
+    Each entry remembers the gdp path scopes of its command, so that invalidate()
+    only throws away the entries that a write command could have changed.
+
+    Originally shamelessly stolen from:
     http://stackoverflow.com/questions/4431703/python-resettable-instance-method-memoization-decorator
     '''
 
-    def __init__(self, func):
+    def __init__(self, func, maxsize=None, ttl=None):
         self.func = func
-        self.cache = {}
+        if maxsize is None:
+            maxsize = int(os.getenv('DMX_ICM_CACHE_SIZE', 20000))
+        if ttl is None:
+            ttl = float(os.getenv('DMX_ICM_CACHE_TTL', 0))
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache = OrderedDict()
+        self.lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
         functools.wraps(func)(self)
 
+    @classmethod
+    def _normalize(cls, value):
+        if isinstance(value, (list, tuple)):
+            return tuple(cls._normalize(x) for x in value)
+        if isinstance(value, dict):
+            return tuple(sorted((k, cls._normalize(v)) for k, v in value.items()))
+        return value
+
     def __call__(self, *args, **kwargs):
-        key = str(args) + str(kwargs)
         try:
-            return self.cache[key]
-        except KeyError:
-            value = self.func(*args, **kwargs)
-            self.cache[key] = value
-            return value
+            key = (self._normalize(args), self._normalize(kwargs))
+            hash(key)
         except TypeError:
             # Better to no cache than blow up
             return self.func(*args, **kwargs)
 
+        with self.lock:
+            if key in self.cache:
+                value, timestamp, scopes = self.cache[key]
+                if self.ttl and time.time() - timestamp > self.ttl:
+                    del self.cache[key]
+                    self.stats['expirations'] += 1
+                else:
+                    self.cache.pop(key)
+                    self.cache[key] = (value, timestamp, scopes)
+                    self.stats['hits'] += 1
+                    return value
+            self.stats['misses'] += 1
+
+        value = self.func(*args, **kwargs)
+        scopes = get_command_scopes(args[0]) if args else None
+
+        with self.lock:
+            self.cache.pop(key, None)
+            self.cache[key] = (value, time.time(), scopes)
+            while self.maxsize and len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        return value
+
     def __repr__(self):
         '''
         Return the function's docstring
@@ -282,10 +412,41 @@ class ICMMemoizer(object):
         '''
         fn = functools.partial(self.__call__, obj)
         fn.reset = self._reset
+        fn.invalidate = self.invalidate
+        fn.get_stats = self.get_stats
         return fn
 
     def _reset(self):
-        self.cache = {}
+        with self.lock:
+            self.stats['invalidations'] += len(self.cache)
+            self.cache = OrderedDict()
+
+    def invalidate(self, command):
+        '''
+        Removes the cached entries that could be affected by running the write command.
+        Entries whose scope is unknown are always removed, and so is everything
+        when the scope of command is unknown.
+
+        :param command: The write command in a list
+        :type command: list
+        '''
+        write_scopes = get_command_scopes(command)
+        if write_scopes is None:
+            self._reset()
+            return
+        with self.lock:
+            for key in list(self.cache.keys()):
+                read_scopes = self.cache[key][2]
+                if read_scopes is None or any(scopes_overlap(r, w) for r in read_scopes for w in write_scopes):
+                    del self.cache[key]
+                    self.stats['invalidations'] += 1
+
+    def get_stats(self):
+        '''
+        Returns the hit/miss/eviction/expiration/invalidation counters, and the current size
+        '''
+        with self.lock:
+            return dict(self.stats, size=len(self.cache))
 
 def get_marshal_output(cmd, err_level=None):
     '''
@@ -359,6 +520,56 @@ def log_runtime(command, start, end):
         p.write('{0}:{1}\n'.format(' '.join(command), delta.total_seconds()))
     return tmpfile
 
+def summarize_profile(profile_file):
+    '''
+    Summarizes a profile file written by log_runtime into per-command latency figures.
+
+    Commands are grouped by their executable and subcommand (eg: 'gdp list', 'xlp4 files')
+    so that the numbers from a run without the query broker can be compared against
+    a run with it.
+
+    :param profile_file: Path to an ICManageCLI.profiler.<pid> file
+    :type profile_file: str
+    :return: Dictionary of {command: {'count', 'total', 'mean', 'max'}}
+    :rtype: dict
+    '''
+    summary = {}
+    with open(profile_file) as f:
+        for line in f:
+            command, _, seconds = line.rstrip('\n').rpartition(':')
+            if not command:
+                continue
+            try:
+                seconds = float(seconds)
+            except ValueError:
+                continue
+            words = [x for x in command.split() if not x.startswith('-')]
+            key = ' '.join(words[:2])
+            if key not in summary:
+                summary[key] = {'count': 0, 'total': 0.0, 'mean': 0.0, 'max': 0.0}
+            summary[key]['count'] += 1
+            summary[key]['total'] += seconds
+            summary[key]['max'] = max(summary[key]['max'], seconds)
+    for data in summary.values():
+        data['mean'] = data['total'] / data['count']
+    return summary
+
+class SubprocessTransport(object):
+    '''
+    The default transport for read-only IC Manage commands.
+    Every command is forked off as its own process through run_subcommand.
+    '''
+
+    def run(self, command, stdin=None, timeout=None, cwd=None, env=None):
+        '''
+        Runs command and returns the exitcode, stdout and stderr.
+        cwd and env are those of the client a broker runs the command for.
+        '''
+        return run_subcommand(command, stdin=stdin, timeout=timeout, env=env, cwd=cwd)
+
+    def close(self):
+        pass
+
 #
 # The run_*_command functions are used to call out to the IC Manage
 # command line
@@ -366,7 +577,7 @@ def log_runtime(command, start, end):
 # write calls are only made if preview=False
 # __run_command should not be called directly
 #
-def run_subcommand(command, stdin=None, timeout=None, retried=0, maxtry=5, delay_in_sec=10, regex_list=None, retry=False, env=None):
+def run_subcommand(command, stdin=None, timeout=None, retried=0, maxtry=5, delay_in_sec=10, regex_list=None, retry=False, env=None, cwd=None):
     '''
     Runs command and returns the exitcode, stdout and stderr
 
@@ -376,6 +587,8 @@ def run_subcommand(command, stdin=None, timeout=None, retried=0, maxtry=5, delay
     :type stdin: None or str
     :param timeout: optional timeout for the command in seconds.
     :type timeout: None or int
+    :param cwd: optional directory to run the command in
+    :type cwd: None or str
     :return: Tuple of exitcode, stdout and stderr
     :rtype: tuple
     '''
@@ -391,26 +604,28 @@ def run_subcommand(command, stdin=None, timeout=None, retried=0, maxtry=5, delay
         kill_flag.set()  # Tells the main routine we had to kill
         return
 
-    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
-
-    if timeout is not None:
-        pid = proc.pid
-        watchdog = threading.Timer(timeout, _kill_process_after_a_timeout, args=(pid, ))
-        watchdog.start()
-        start = datetime.now()
-        (stdout, stderr) = proc.communicate(stdin)
-        end = datetime.now()
-        watchdog.cancel()  # if it's still waiting to run
-        success = not kill_flag.isSet()
-        kill_flag.clear()
-        exitcode = None
-        if success:
+    with command_span(command) as span:
+        proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, cwd=cwd)
+
+        if timeout is not None:
+            pid = proc.pid
+            watchdog = threading.Timer(timeout, _kill_process_after_a_timeout, args=(pid, ))
+            watchdog.start()
+            start = datetime.now()
+            (stdout, stderr) = proc.communicate(stdin)
+            end = datetime.now()
+            watchdog.cancel()  # if it's still waiting to run
+            success = not kill_flag.isSet()
+            kill_flag.clear()
+            exitcode = None
+            if success:
+                exitcode = proc.returncode
+        else:
+            start = datetime.now()
+            (stdout, stderr) = proc.communicate(stdin)
+            end = datetime.now()
             exitcode = proc.returncode
-    else:
-        start = datetime.now()
-        (stdout, stderr) = proc.communicate(stdin)
-        end = datetime.now()
-        exitcode = proc.returncode
+        span.args['exitcode'] = exitcode
 
     #print("cmd:{}".format(command))
     #print("stdout:{}".format(stdout))
@@ -468,7 +683,7 @@ def run_subcommand(command, stdin=None, timeout=None, retried=0, maxtry=5, delay
             dmx.utillib.utils.run_corrective_action_before_retry(stdout=stdout, stderr=stderr)
             LOGGER.debug("command: {}".format(command))
             time.sleep(delay_in_sec)
-            return run_subcommand(command, stdin=stdin, timeout=timeout, retried=retried+1, maxtry=maxtry, delay_in_sec=delay_in_sec, regex_list=regex_list, retry=retry)
+            return run_subcommand(command, stdin=stdin, timeout=timeout, retried=retried+1, maxtry=maxtry, delay_in_sec=delay_in_sec, regex_list=regex_list, retry=retry, env=env, cwd=cwd)
 
     dmx.utillib.utils.rephrase_messages_in_layman_terms(stdout=stdout, stderr=stderr)
 
@@ -496,7 +711,7 @@ def run_read_command(command, stdin=None, timeout=None):
             ele = '\'{}\''.format(ele)
         _command.append(ele)
     LOGGER.debug(' '.join(_command))
-    return run_subcommand(command, stdin=stdin, timeout=timeout)
+    return ICManageCLI.get_transport().run(command, stdin=stdin, timeout=timeout)
 
 def run_write_command(command, preview, stdin=None, timeout=None, print_command=False, env=None):
     '''
@@ -528,9 +743,9 @@ def run_write_command(command, preview, stdin=None, timeout=None, print_command=
             _command.append(ele)
         LOGGER.info(' '.join(_command))
 
-    # Reset the cache for run_read
+    # Invalidate the cached run_read results that this command could change
     # Do this no matter what so preview mode still works
-    run_read_command._reset()
+    run_read_command.invalidate(command)
 
     if not preview:
         return run_subcommand(command, stdin=stdin, timeout=timeout, env=env)
@@ -570,6 +785,44 @@ class ICManageCLI(object):
 
         cls.__profiling = new_value
 
+    # The transport that all read-only commands are routed through.
+    # By default every command is its own gdp/xlp4 process. If $DMX_ICM_BROKER
+    # points to a running dmx.abnrlib.icmbroker, the commands are sent there instead.
+    __transport = None
+    @classmethod
+    def get_transport(cls):
+        '''
+        Retrieves the transport used by run_read_command.
+
+        :return: An object with a run(command, stdin=None, timeout=None) method
+        :rtype: object
+        '''
+        if cls.__transport is None:
+            address = os.getenv('DMX_ICM_BROKER', '')
+            if address:
+                import dmx.abnrlib.icmbroker
+                cls.__transport = dmx.abnrlib.icmbroker.BrokerTransport(address)
+            else:
+                cls.__transport = SubprocessTransport()
+        return cls.__transport
+
+    @classmethod
+    def set_transport(cls, transport):
+        '''
+        Sets the transport used by run_read_command.
+        Passing None reverts to the default transport.
+
+        :param transport: An object with a run(command, stdin=None, timeout=None) method
+        :type transport: object
+        :raises: ICManageError
+        '''
+        if transport is not None and not callable(getattr(transport, 'run', None)):
+            raise ICManageError('Tried to set transport to {0}, which has no run() method'.format(transport))
+        if cls.__transport is not None and cls.__transport is not transport:
+            cls.__transport.close()
+        cls.__transport = transport
+        run_read_command._reset()
+
     @property
     def preview(self):
         '''
@@ -644,6 +897,12 @@ class ICManageCLI(object):
         self.__PROJECT_CATEGORY = {}
         self._FOR_REGTEST = ''     # This property is meant for running regtest
 
+    def get_site(self):
+        '''
+        Returns the gdp site prefix (eg: '/intel'), or '' if none is used
+        '''
+        return self.__SITE
+
     def _as_gdp_admin(self):
         return '--user=icmanage'
 
@@ -688,6 +947,8 @@ class ICManageCLI(object):
         Why? Because it's a write command and we don't want to 
         actually run it if we're in preview mode
         '''
+        if not self.preview:
+            get_immutable_cache().invalidate_command(self.__SITE, command)
         return run_write_command(command, self.preview, stdin=stdin,
                                  timeout=timeout, print_command=print_command, env=env)
 
@@ -1711,6 +1972,7 @@ class ICManageCLI(object):
     def get_library_releases(self, project, variant, libtype, library='dev', retkeys=['name']):
         return self._get_objects('{}/{}/{}/{}/{}/:release'.format(self.__SITE, project, variant, libtype, library), retkeys=retkeys)
 
+    @cached_if_immutable('release')
     def get_library_from_release(self, project, variant, libtype, release, retkeys=['name']):
         '''
         in PSG's methodology, there will/should be only 1 unique release name across all libraries for the same project/variant/libtype.
@@ -2341,6 +2603,7 @@ class ICManageCLI(object):
         return match.groupdict()
 
 
+    @cached_if_immutable('release')
     def get_release_changenum(self, project, variant, libtype, library, release):
         ret = self._get_objects("{}/{}/{}/{}/{}/{}:release".format(self.__SITE, project, variant, libtype, library, release), retkeys=['change'])
         try:
@@ -3646,9 +3909,43 @@ class ICManageCLI(object):
     def get_release_details(self, project, variant, libtype, library, release):
         return self._get_objects('{}/{}/{}/{}/{}/{}:release'.format(self.__SITE, project, variant, libtype, library, release), retkeys=['*'])[0]
 
+    def get_objects_details(self, objtype, keys, retkeys=['*']):
+        '''
+        Bulk version of get_config_details/get_library_details/get_release_details.
+
+        keys are tuples of:-
+            (project, variant, config)                      for objtype == 'config'
+            (project, variant, libtype, library)            for objtype == 'library'
+            (project, variant, libtype, library, release)   for objtype == 'release'
+
+        The objects are fetched with one 'gdp list' per project and object name, with the
+        levels in between wildcarded (eg: /intel/i10socfm/*/*/dev:library for all the dev
+        libraries of a tree), instead of one 'gdp list' per object.
+
+        Returns {key: details}. Keys that are not found are left out.
+        '''
+        fields = {'config': ('project', 'variant', 'config'),
+                  'library': ('project', 'variant', 'libtype', 'library'),
+                  'release': ('project', 'variant', 'libtype', 'library', 'release')}[objtype]
+        groups = {}
+        for key in keys:
+            groups.setdefault((key[0], key[-1]), set()).add(tuple(key))
+        if retkeys != ['*'] and 'path' not in retkeys:
+            retkeys = retkeys + ['path']
+        ret = {}
+        for (project, name), wanted in sorted(groups.items()):
+            path = '{}/{}/{}{}:{}'.format(self.__SITE, project, '*/' * (len(fields) - 2), name, objtype)
+            for details in self._get_objects(path, retkeys=retkeys):
+                info = self.decompose_gdp_path(details['path'], objtype)
+                key = tuple([info[x] for x in fields])
+                if key in wanted:
+                    ret[key] = details
+        return ret
+
     def get_libtype_details(self, project, variant, libtype):
         return self._get_objects('{}/{}/{}/{}:libtype'.format(self.__SITE, project, variant, libtype), retkeys=['*'])[0]
 
+    @cached_if_immutable('config')
     def get_config_content_details(self, project, variant, config, hierarchy=False, retkeys=['*']):
         postfix = '.*::content'
         if hierarchy:
@@ -4324,6 +4621,51 @@ class ICManageCLI(object):
 
         return str(digest)
 
+    def get_files_fstat(self, filespecs):
+        '''
+        Runs a single icmp4 fstat -Ol on all the filespecs (passed with -x, so there is
+        no limit on their number), instead of one get_file_digest()/get_file_type() per file.
+        Filespecs that fstat does not report on (eg: deleted or unknown files) are left out.
+
+        :param filespecs: The Perforce filespecs, in the //depot/path#rev form
+        :type filespecs: list
+        :return: {filespec: {'digest': ..., 'size': ..., 'type': ...}}
+        :rtype: dict
+        '''
+        ret = {}
+        filespecs = list(filespecs)
+        if not filespecs:
+            return ret
+
+        command = [self.__P4, '-x', '-', 'fstat', '-Ol']
+        (exitcode, stdout, stderr) = self.__run_read_command(command, stdin='\n'.join(filespecs) + '\n')
+
+        # Files that can not be reported on only produce warnings on stderr
+        if exitcode != 0:
+            err_msg = 'Problem running {0} - returned {1}'.format(
+                ' '.join(command), exitcode
+            )
+            if stderr:
+                err_msg += '\nSTDERR: {}'.format(stderr)
+            raise ICManageError(err_msg)
+
+        wanted = set(filespecs)
+        for block in re.split(r'\n\s*\n', stdout):
+            fields = {}
+            for line in block.splitlines():
+                m = re.match(r'^\.\.\. (\w+) ?(.*)$', line)
+                if m:
+                    fields[m.group(1)] = m.group(2)
+            filespec = '{}#{}'.format(fields.get('depotFile'), fields.get('headRev'))
+            if filespec in wanted:
+                ret[filespec] = {
+                    'digest': fields.get('digest', ''),
+                    'size': fields.get('fileSize', ''),
+                    'type': fields.get('headType', ''),
+                }
+
+        return ret
+
     #TODO
     def activate_user(self, users):
         '''
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: Long-lived broker for read-only IC Manage (gdp/xlp4) queries.
+
+A dmx command on a big tree issues thousands of read-only gdp/xlp4 queries,
+and every one of them used to be its own fork. The QueryBroker is a local
+server that many dmx processes (and the run_mp children of a single dmx process)
+connect to over a persistent connection. It:-
+    - coalesces identical queries that are in flight at the same time into one call
+      (identical means the same command, run from the same directory with the same
+      P4*/ICM* and user environment, since eg: icmp4 have/opened/info depend on them)
+    - bounds the number of concurrent queries hitting the ICM server
+    - keeps per-command latency statistics
+
+Only the read-only gdp/xlp4 commands in READ_ONLY_COMMANDS are run by the broker; the
+clients run anything else themselves. The broker listens on a unix socket in a directory
+only its owner can get into, or on a TCP port only if a secret is set in $DMX_ICM_BROKER_AUTHKEY.
+
+The broker itself runs the commands through a pluggable transport (SubprocessTransport
+by default), so a fake server can stand in for it in tests.
+
+Usage
+=====
+    Start the broker (it logs the address of the socket it listens on):-
+        python -m dmx.abnrlib.icmbroker --workers 8 &
+
+    Route a dmx command through it:-
+        env DMX_ICM_BROKER=<address> dmx release ...
+
+    Compare the latencies with and without the broker by running the same command with
+    profiling turned on, and comparing the ICManageCLI.profiler.<pid> files:-
+        python -m dmx.abnrlib.icmbroker --compare <without broker profile> <with broker profile>
+
+Copyright (c) Altera Corporation 2012
+All rights reserved.
+'''
+
+import os
+import sys
+import time
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from getpass import getuser
+from datetime import datetime
+from multiprocessing.connection import Listener, Client
+
+import dmx.abnrlib.icm
+
+LOGGER = logging.getLogger(__name__)
+
+# The environment variables that decide what an IC Manage command answers:
+# the client/workspace, the server and the user
+CLIENT_ENV_PREFIXES = ('P4', 'ICM', 'GDP')
+CLIENT_ENV_NAMES = ('USER', 'LOGNAME', 'HOME')
+
+# The read-only commands the broker runs: {executable: subcommands}
+READ_ONLY_COMMANDS = {
+    'gdp': ('info', 'list', 'find'),
+    'xlp4': ('info', 'users', 'groups', 'changes', 'describe', 'filelog', 'files', 'fstat', 'print', 'sizes', 'diff2'),
+}
+# The global options that take a value, eg: xlp4 -u <user> changes ...
+OPTIONS_WITH_VALUE = ('-u', '-c', '-p', '-P', '-F', '-H', '-C', '-Q', '-L', '-r', '-z')
+
+class ICMBrokerError(Exception): pass
+
+def parse_address(address):
+    '''
+    Converts an address string into a (address, family) tuple usable by multiprocessing.connection.
+
+    - '<host>:<port>' is an AF_INET address
+    - anything else is the path to an AF_UNIX socket
+    '''
+    host, sep, port = address.rpartition(':')
+    if sep and host and port.isdigit():
+        return ((host, int(port)), 'AF_INET')
+    return (address, 'AF_UNIX')
+
+def get_subcommand(command):
+    '''
+    Returns the subcommand of a gdp/xlp4 command, eg: 'list' for ['gdp', '--user=icmanage', 'list', '/proj']
+    '''
+    args = list(command[1:])
+    while args:
+        arg = args.pop(0)
+        if arg in OPTIONS_WITH_VALUE:
+            args = args[1:]
+        elif arg == '-x':
+            # Only the arguments from stdin, not from a file of the broker
+            if args[:1] != ['-']:
+                return None
+            args = args[1:]
+        elif not arg.startswith('-'):
+            return arg
+    return None
+
+def is_read_only_command(command):
+    '''
+    Returns True if command is one of the READ_ONLY_COMMANDS that the broker runs
+    '''
+    if not isinstance(command, (list, tuple)) or not command:
+        return False
+    return get_subcommand(command) in READ_ONLY_COMMANDS.get(command[0], ())
+
+def get_default_authkey():
+    '''
+    Returns the key used to authenticate broker connections.
+    Defaults to the user name, so users can not talk to each other's broker by accident.
+    '''
+    return os.getenv('DMX_ICM_BROKER_AUTHKEY', getuser()).encode('utf-8')
+
+def is_client_env(name):
+    return name in CLIENT_ENV_NAMES or name.startswith(CLIENT_ENV_PREFIXES)
+
+def get_client_context():
+    '''
+    Returns the (cwd, env) of this process that IC Manage commands depend on, for the broker
+    to run the commands of every client in the client's own context.
+
+    :return: Tuple of the current directory, and a sorted tuple of (name, value) environment variables
+    :rtype: tuple
+    '''
+    try:
+        cwd = os.getcwd()
+    except OSError:
+        cwd = None
+    env = tuple(sorted([(k, v) for k, v in os.environ.items() if is_client_env(k)]))
+    return (cwd, env)
+
+def get_context_env(env):
+    '''
+    Returns the environment of the broker, with the client environment variables of env instead of its own
+    '''
+    ret = dict([(k, v) for k, v in os.environ.items() if not is_client_env(k)])
+    ret.update(env)
+    return ret
+
+
+class _InFlight(object):
+    '''
+    A query that is currently being run by the broker, which other requesters can wait on.
+    '''
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class QueryBroker(object):
+    '''
+    Server that multiplexes read-only IC Manage queries from many clients
+    onto a bounded number of concurrent commands.
+    '''
+
+    def __init__(self, address=None, transport=None, max_workers=8, authkey=None):
+        '''
+        :param address: Unix socket path or '<host>:<port>'. Defaults to a socket in a new private directory.
+                        A unix socket must be in a directory that only its owner can get into.
+                        A TCP port needs a secret authkey, or $DMX_ICM_BROKER_AUTHKEY.
+        :type address: str
+        :param transport: Object with a run(command, stdin=None, timeout=None, cwd=None, env=None) method. Defaults to SubprocessTransport.
+        :type transport: object
+        :param max_workers: Maximum number of commands run concurrently against the server
+        :type max_workers: int
+        :param authkey: Key clients must present. Defaults to get_default_authkey()
+        :type authkey: bytes
+        '''
+        self._tmpdir = None
+        if address is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='dmx_icmbroker_')
+            address = os.path.join(self._tmpdir, 'broker.sock')
+        self.address, self.family = parse_address(address)
+        if self.family == 'AF_INET' and not authkey and not os.getenv('DMX_ICM_BROKER_AUTHKEY'):
+            raise ICMBrokerError('Listening on {} needs a secret in $DMX_ICM_BROKER_AUTHKEY'.format(address))
+        self.transport = transport or dmx.abnrlib.icm.SubprocessTransport()
+        self.authkey = authkey or get_default_authkey()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {}
+        self._coalesced = 0
+        self._listener = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def run(self, command, stdin=None, timeout=None, context=None):
+        '''
+        Runs command through the transport, in the directory and client environment of context.
+        If the exact same command is already being run in the same context, waits for that one instead.
+
+        :param context: (cwd, env) of the client, see get_client_context(). If None, the command
+                        runs in the context of the broker.
+        :type context: tuple
+        :return: Tuple of exitcode, stdout and stderr
+        :rtype: tuple
+        :raises: ICMBrokerError if command is not a read-only command
+        '''
+        if not is_read_only_command(command):
+            raise ICMBrokerError('Not a read-only command: {}'.format(command))
+        if context is not None:
+            context = (context[0], tuple([tuple(x) for x in context[1]]))
+        key = (tuple(command), stdin, timeout, context)
+        with self._lock:
+            inflight = self._inflight.get(key)
+            owner = inflight is None
+            if owner:
+                inflight = self._inflight[key] = _InFlight()
+            else:
+                self._coalesced += 1
+
+        if not owner:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise ICMBrokerError(inflight.error)
+            return inflight.result
+
+        try:
+            with self._slots:
+                start = time.time()
+                if context is None:
+                    inflight.result = self.transport.run(command, stdin=stdin, timeout=timeout)
+                else:
+                    inflight.result = self.transport.run(command, stdin=stdin, timeout=timeout,
+                        cwd=context[0], env=get_context_env(context[1]))
+                self._record(command, time.time() - start)
+        except Exception as e:
+            inflight.error = str(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            inflight.event.set()
+        return inflight.result
+
+    def _record(self, command, seconds):
+        key = ' '.join([x for x in command if not x.startswith('-')][:2])
+        with self._lock:
+            data = self._stats.setdefault(key, {'count': 0, 'total': 0.0, 'max': 0.0})
+            data['count'] += 1
+            data['total'] += seconds
+            data['max'] = max(data['max'], seconds)
+
+    def get_stats(self):
+        '''
+        Returns the per-command latency figures of the commands the broker has actually run,
+        plus the number of requests that were coalesced into an in-flight command.
+
+        :return: {'commands': {command: {'count', 'total', 'mean', 'max'}}, 'coalesced': int}
+        :rtype: dict
+        '''
+        with self._lock:
+            commands = {}
+            for key, data in self._stats.items():
+                commands[key] = dict(data, mean=data['total'] / data['count'])
+            return {'commands': commands, 'coalesced': self._coalesced}
+
+    def _handle_connection(self, conn):
+        '''
+        Serves the requests of one client connection until it is closed.
+        '''
+        try:
+            while not self._stopped.is_set():
+                try:
+                    request = conn.recv()
+                except (EOFError, IOError, OSError):
+                    break
+                if request[0] == 'run':
+                    try:
+                        context = request[4] if len(request) > 4 else None
+                        conn.send(('ok', self.run(request[1], stdin=request[2], timeout=request[3], context=context)))
+                    except Exception as e:
+                        conn.send(('error', str(e)))
+                elif request[0] == 'stats':
+                    conn.send(('ok', self.get_stats()))
+                else:
+                    conn.send(('error', 'Unknown request: {}'.format(request[0])))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        '''
+        Accepts connections until shutdown() is called.
+        Every connection gets its own thread.
+        '''
+        if self._listener is None:
+            self._bind()
+        while not self._stopped.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                LOGGER.debug("QueryBroker failed to accept a connection: {}".format(e))
+                continue
+            t = threading.Thread(target=self._handle_connection, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def _bind(self):
+        if self.family == 'AF_UNIX':
+            # Only the owner can get to the socket, from the moment it exists
+            st = os.stat(os.path.dirname(os.path.abspath(self.address)))
+            if st.st_uid != os.getuid() or st.st_mode & 0o077:
+                raise ICMBrokerError('{} must be in a directory that only you can get into'.format(self.address))
+            if os.path.exists(self.address):
+                os.remove(self.address)
+        self._listener = Listener(self.address, self.family, authkey=self.authkey)
+
+    def start(self):
+        '''
+        Runs serve_forever() in a background thread, and returns once the broker is listening.
+        '''
+        self._bind()
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        '''
+        Stops accepting connections and closes the listener.
+        '''
+        self._stopped.set()
+        if self._listener is not None:
+            # Wake up the blocking accept() with a bare connection.
+            # A Client() would hang in the authentication handshake if nobody is accepting anymore.
+            try:
+                if self.family == 'AF_UNIX':
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                else:
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.connect(self.address)
+                sock.close()
+            except Exception:
+                pass
+            self._listener.close()
+            if self.family == 'AF_UNIX' and os.path.exists(self.address):
+                os.remove(self.address)
+        if self._thread is not None:
+            self._thread.join()
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+        self.transport.close()
+
+
+class BrokerTransport(object):
+    '''
+    Transport for run_read_command that sends the commands to a QueryBroker.
+
+    Each thread keeps its own persistent connection, so concurrent threads get
+    their queries multiplexed by the broker. Every command is sent with the current
+    directory and client environment, which the broker runs it in. The commands that are not
+    read-only, or that can not be sent because the broker can not be reached, are run through
+    the fallback transport instead.
+    '''
+
+    def __init__(self, address, authkey=None, fallback=None):
+        self.address, self.family = parse_address(address)
+        self.authkey = authkey or get_default_authkey()
+        self.fallback = fallback or dmx.abnrlib.icm.SubprocessTransport()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, self.family, authkey=self.authkey)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _request(self, request):
+        try:
+            conn = self._get_connection()
+            conn.send(request)
+            status, data = conn.recv()
+        except (EOFError, IOError, OSError, socket.error) as e:
+            self._drop_connection()
+            raise ICMBrokerError('Unable to talk to the ICM broker at {}: {}'.format(self.address, e))
+        if status != 'ok':
+            raise ICMBrokerError(data)
+        return data
+
+    def run(self, command, stdin=None, timeout=None):
+        '''
+        Runs command through the broker and returns the exitcode, stdout and stderr
+        '''
+        if not is_read_only_command(command):
+            return self.fallback.run(command, stdin=stdin, timeout=timeout)
+        start = datetime.now()
+        try:
+            ret = self._request(('run', list(command), stdin, timeout, get_client_context()))
+        except ICMBrokerError as e:
+            LOGGER.debug("{}. Running the command directly.".format(e))
+            return self.fallback.run(command, stdin=stdin, timeout=timeout)
+        end = datetime.now()
+        if dmx.abnrlib.icm.ICManageCLI.get_profiling():
+            dmx.abnrlib.icm.log_runtime(command, start, end)
+        return tuple(ret)
+
+    def get_stats(self):
+        '''
+        Returns the statistics of the broker. See QueryBroker.get_stats()
+        '''
+        return self._request(('stats',))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+def format_profile_comparison(before, after):
+    '''
+    Returns a table of the per-command latencies of two profiles (see dmx.abnrlib.icm.summarize_profile),
+    eg: of the same dmx command run without, and then with the broker.
+    '''
+    lines = ['{:<30} {:>8} {:>10} {:>10} {:>8} {:>10} {:>10}'.format('command', 'count', 'mean(s)', 'max(s)', 'count', 'mean(s)', 'max(s)')]
+    for command in sorted(set(before) | set(after)):
+        row = [command[:30]]
+        for summary in (before, after):
+            data = summary.get(command, {'count': 0, 'mean': 0.0, 'max': 0.0})
+            row.extend([data['count'], data['mean'], data['max']])
+        lines.append('{:<30} {:>8} {:>10.3f} {:>10.3f} {:>8} {:>10.3f} {:>10.3f}'.format(*row))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Broker for read-only IC Manage queries.')
+    parser.add_argument('--address', default=os.getenv('DMX_ICM_BROKER') or None,
+        help='Unix socket path (in a directory only you can get into), or <host>:<port> to listen on (needs $DMX_ICM_BROKER_AUTHKEY). (default: a socket in a new private directory)')
+    parser.add_argument('--workers', type=int, default=8,
+        help='Maximum number of concurrent queries against the ICM server. (default: %(default)s)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+        help='Print the per-command latencies of two ICManageCLI.profiler.<pid> files, instead of running the broker.')
+    args = parser.parse_args()
+
+    if args.compare:
+        print(format_profile_comparison(*[dmx.abnrlib.icm.summarize_profile(x) for x in args.compare]))
+        return 0
+
+    logging.basicConfig(level=logging.INFO)
+    broker = QueryBroker(args.address, max_workers=args.workers)
+    LOGGER.info("ICM broker listening on {}".format(broker.address if broker.family == 'AF_UNIX' else args.address))
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broker.shutdown()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
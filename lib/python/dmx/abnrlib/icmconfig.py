@@ -90,6 +90,11 @@ class IcmConfig(object):
             
         self._configurations = set(objects)
 
+        # Cached result of _get_tree_objects() and _get_tree_index().
+        # Invalidated whenever the tree below self changes.
+        self._tree_cache = None
+        self._tree_index = None
+
         # Set properties to None as we lazy load them
         self._properties = None
 
@@ -247,12 +252,19 @@ class IcmConfig(object):
         # Update the new child's parents too
         obj.add_parent(self)
         self._saved = False
+        self._update_tree_cache(obj, added=True)
     # The correct name should be add_object() instead of add_configuration(),
     # but we keep the old naming due to backward compatibility
     add_object = add_configuration
 
     def remove_configuration(self, obj):
         ret = False
+        # obj can be equal to the child without being it: work on the child itself,
+        # whose parents and sub-tree are the ones in the tree
+        for child in self.configurations:
+            if child == obj:
+                obj = child
+                break
         try:
             self.configurations.remove(obj)
             obj.remove_parent(self)
@@ -262,6 +274,7 @@ class IcmConfig(object):
             ret = False
         if ret:
             self._saved = False
+            self._update_tree_cache(obj, added=False)
         return ret
     # The correct name should be remove_object() instead of remove_configuration(),
     # but we keep the old naming due to backward compatibility
@@ -636,16 +649,9 @@ class IcmConfig(object):
         :rtype: int
         '''
         num_removed = 0
-
-        # Check the current level
-        if self.remove_configuration(sought_obj):
-            num_removed += 1
-
-        # Now go through the tree
-        for obj in self.configurations:
-            if obj.is_config():
-                num_removed += obj.remove_object_from_tree(sought_obj)
-
+        for config in self._walk_configs():
+            if config.remove_configuration(sought_obj):
+                num_removed += 1
         return num_removed
 
     def remove_objects_from_tree(self, objs_to_remove):
@@ -676,14 +682,15 @@ class IcmConfig(object):
         - if the new_obj is a IcmLibrary
            > then 'obviously' all matching 'project/variant/libtype' should be replaced with the new_obj
         '''
+        num_replaced = 0
         project = new_obj.project
         variant = new_obj.variant
         if new_obj.is_config():
             libtype = None
         else:
-            libtype = new_obj.libtype
+            libtype = "^{}$".format(new_obj.libtype)
         
-        sought_objs = self.search("^{}$".format(project), "^{}$".format(variant), "^{}$".format(libtype))
+        sought_objs = self.search("^{}$".format(project), "^{}$".format(variant), libtype)
         for obj in sought_objs:
             num_replaced += self.replace_object_in_tree(obj, new_obj)
 
@@ -716,14 +723,11 @@ class IcmConfig(object):
             if sought_obj == new_obj:
                 raise IcmConfigError("replace_object_in_tree: Source ({}) and destination ({}) objects are the same".format(sought_obj, new_obj))
 
-        if sought_obj in self.configurations:
-            self.remove_configuration(sought_obj)
-            self.add_configuration(new_obj)
-            num_replaced += 1
-
-        for obj in self.configurations:
-            if obj.is_config():
-                num_replaced += obj.replace_object_in_tree(sought_obj, new_obj)
+        for config in self._walk_configs():
+            if sought_obj in config.configurations:
+                config.remove_configuration(sought_obj)
+                config.add_configuration(new_obj)
+                num_replaced += 1
 
         return num_replaced
 
@@ -751,10 +755,146 @@ class IcmConfig(object):
         :return: List of configurations in the tree
         :rtype: list
         '''
-        flattened_tree = [self]
-        for config in self.configurations:
-            flattened_tree += config.flatten_tree()
-        return list(set(flattened_tree))
+        return list(set(self._get_tree_objects()))
+
+    def _get_tree_objects(self):
+        '''
+        Returns every object in the tree (including self) exactly once, no matter
+        how many parents a shared sub-tree has.
+
+        The tree is walked once with a visited set, and the result is cached on every
+        config, and kept current when something below it is added/removed (see _update_tree_cache()).
+        Sub-configs that already have a cached result are not walked again.
+
+        :return: List of IcmConfig/IcmLibrary objects
+        :rtype: list
+        '''
+        if self._tree_cache is None:
+            visited = set([id(self)])
+            objs = [self]
+            stack = list(self.configurations)
+            while stack:
+                obj = stack.pop()
+                if id(obj) in visited:
+                    continue
+                visited.add(id(obj))
+                objs.append(obj)
+                if not obj.is_config():
+                    continue
+                if obj._tree_cache is not None:
+                    for subobj in obj._tree_cache:
+                        if id(subobj) not in visited:
+                            visited.add(id(subobj))
+                            objs.append(subobj)
+                else:
+                    stack.extend(obj.configurations)
+            self._tree_cache = objs
+        return self._tree_cache
+
+    def _get_ancestors(self):
+        '''
+        Returns self and every config above it, each exactly once
+        '''
+        visited = set()
+        ancestors = []
+        stack = [self]
+        while stack:
+            config = stack.pop()
+            if id(config) in visited:
+                continue
+            visited.add(id(config))
+            ancestors.append(config)
+            stack.extend(config.parents)
+        return ancestors
+
+    def _is_in_tree(self, obj):
+        '''
+        Returns True if obj is self or is below self, by walking up the parents of obj
+        '''
+        visited = set()
+        stack = [obj]
+        while stack:
+            current = stack.pop()
+            if current is self:
+                return True
+            if id(current) in visited:
+                continue
+            visited.add(id(current))
+            stack.extend(current.parents)
+        return False
+
+    def _update_tree_cache(self, obj, added):
+        '''
+        Keeps the cached _get_tree_objects() and _get_tree_index() of self and of every
+        config above it current, after obj has been added to/removed from self.
+
+        Only the objects of the sub-tree of obj are looked at: the added ones are put in the
+        index, and the removed ones are taken out of it unless they are still reachable
+        through another parent. Configs without an index just drop their cached objects.
+        '''
+        subtree = obj._get_tree_objects() if obj.is_config() else [obj]
+        for config in self._get_ancestors():
+            index = config._tree_index
+            if index is None:
+                config._tree_cache = None
+                continue
+            if added:
+                new = [x for x in subtree if x not in index.get(x.location_key(), ())]
+                for x in new:
+                    index.setdefault(x.location_key(), set()).add(x)
+                if config._tree_cache is not None:
+                    config._tree_cache.extend(new)
+            else:
+                gone = set([id(x) for x in subtree if not config._is_in_tree(x)])
+                if not gone:
+                    continue
+                for x in subtree:
+                    if id(x) in gone:
+                        location = x.location_key()
+                        index[location].discard(x)
+                        if not index[location]:
+                            del index[location]
+                if config._tree_cache is not None:
+                    config._tree_cache = [x for x in config._tree_cache if id(x) not in gone]
+
+    def _get_tree_index(self):
+        '''
+        Returns the index of every object in the tree by its location:-
+            {(project, variant): set of IcmConfig, (project, variant, libtype): set of IcmLibrary}
+
+        Built from _get_tree_objects() the first time, and then kept current on
+        every add/remove (see _update_tree_cache()).
+
+        :return: Dictionary of location_key() to set of objects
+        :rtype: dict
+        '''
+        if self._tree_index is None:
+            index = {}
+            for obj in self._get_tree_objects():
+                location = obj.location_key()
+                if location in index:
+                    index[location].add(obj)
+                else:
+                    index[location] = set([obj])
+            self._tree_index = index
+        return self._tree_index
+
+    def _walk_configs(self):
+        '''
+        Yields every IcmConfig in the tree (including self) exactly once, parents before
+        their children.
+        The children of a config are read after the caller is done with it, so changes
+        made to a config while walking are followed, just like the recursive walks did.
+        '''
+        visited = set()
+        stack = [self]
+        while stack:
+            config = stack.pop()
+            if id(config) in visited:
+                continue
+            visited.add(id(config))
+            yield config
+            stack.extend([x for x in config.configurations if x.is_config()])
 
     def is_local(self, obj):
         return self.project == obj.project and self.variant == obj.variant
@@ -797,14 +937,12 @@ class IcmConfig(object):
         :return: A list of paths for all sub-configs
         :rtype: list
         '''
-        paths = []
-        for config in self.configurations:
-            bom = config.get_bom(libtypes=libtypes, p4=p4, relchange=relchange)
-            if bom:
-                paths.extend(bom)
+        paths = set()
+        for obj in self._get_tree_objects():
+            if not obj.is_config():
+                paths.update(obj.get_bom(libtypes=libtypes, p4=p4, relchange=relchange))
 
-        # Pass paths through a set to de-dupe it
-        return list(set(paths))
+        return list(paths)
 
     def search(self, project='', variant='', libtype=None):
         '''
@@ -833,18 +971,38 @@ class IcmConfig(object):
         ret = []
         if not project and not variant and not libtype:
             self.__logger.warn('IcmConfig search method called with no search criteria')
+            return ret
+
+        index = self._get_tree_index()
+        patterns = [project, variant]
+        # If libtype is specified we only match IcmLibrary, else only IcmConfig
+        if libtype is not None:
+            patterns.append(libtype)
+
+        literals = [self._get_literal_from_regex(x) for x in patterns]
+        if None not in literals:
+            # Exact names (the usual '^name$' form): straight lookup
+            ret.extend(index.get(tuple(literals), []))
         else:
-            # If libtype is specified we can't match!
-            if libtype == None:
-                if re.search(project, self.project) and re.search(variant, self.variant):
-                    ret.append(self)
-            
-            for obj in self.configurations:
-                if libtype == None and not obj.is_config():
+            regexes = [re.compile(x) for x in patterns]
+            for location, objs in index.items():
+                if len(location) != len(regexes):
                     continue
-                ret.extend(obj.search(project=project, variant=variant, libtype=libtype))
+                if all(regex.search(name) for regex, name in zip(regexes, location)):
+                    ret.extend(objs)
         return ret
 
+    @staticmethod
+    def _get_literal_from_regex(regex):
+        '''
+        Returns name if regex is an exact match regex '^name$' for a plain name,
+        else None.
+        '''
+        match = re.match(r'^\^([\w\-]+)\$$', regex)
+        if match:
+            return match.group(1)
+        return None
+
     #def get_next_mutable_composite_config(self):
     def get_next_mutable_config(self):
         '''
@@ -1061,15 +1219,7 @@ class IcmConfig(object):
         :return: A dictionary describing the configurations in the tree by their location
         :rtype: dict
         '''
-        objs_by_location = {}
-        all_objs = self.flatten_tree()
-        for obj in all_objs:
-            location = obj.location_key()
-            if location in objs_by_location:
-                objs_by_location[location].add(obj)
-            else:
-                objs_by_location[location] = set([obj])
-        return objs_by_location
+        return dict((location, set(objs)) for location, objs in self._get_tree_index().items())
 
     def clone_tree(self, new_name, clone_simple=False, clone_immutable=False, reuse_existing_config=False):
         '''
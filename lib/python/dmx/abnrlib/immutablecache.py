@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: Cross-process on-disk cache for the query results of immutable gdp objects.
+
+REL*, PREL* and snap-* configs/releases never change once they are created,
+so the results of queries about them (content, parent/child relationship, changenum,
+owning library) can be shared by every dmx process of a user.
+
+The cache is enabled by pointing $DMX_IMMUTABLE_CACHE_DIR to a (local or NFS) directory.
+Every user gets its own tree in it. Layout:-
+    <root>/v<CACHE_VERSION>/<user>/<site>/<project>/<variant>/<immutable_name>/<sha1 of query>.json
+
+The entries are written with the umask of the user, and only the entries that are owned
+by the user, and are not writable by anyone else, are read: release flows trust what is
+in the cache, so nobody else must be able to plant or change an entry.
+
+Every entry is written to a temporary file and then renamed into place, so readers
+on any host only ever see a complete entry, and no locking is needed.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import functools
+import inspect
+from getpass import getuser
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+IMMUTABLE_PREFIXES = ('snap-', 'REL', 'PREL')
+
+def is_name_immutable(name):
+    '''
+    Same admission test as ICManageCLI.is_name_immutable()
+    '''
+    return hasattr(name, 'startswith') and name.startswith(IMMUTABLE_PREFIXES)
+
+class ImmutableCache(object):
+    '''
+    On-disk store of query results of immutable gdp objects.
+    '''
+
+    def __init__(self, root=None, user=None):
+        '''
+        :param root: The cache directory. Defaults to $DMX_IMMUTABLE_CACHE_DIR. The cache is disabled if neither is set.
+        :type root: str
+        :param user: The user whose entries are read and written. Defaults to the current user.
+        :type user: str
+        '''
+        if root is None:
+            root = os.getenv('DMX_IMMUTABLE_CACHE_DIR', '')
+        self.root = os.path.join(root, 'v{}'.format(CACHE_VERSION), user or getuser()) if root else ''
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.root)
+
+    def _get_dir(self, site, project, variant, name):
+        return os.path.join(self.root, site.strip('/') or '_', project, variant, name)
+
+    def _get_file(self, site, project, variant, name, query):
+        digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self._get_dir(site, project, variant, name), '{}.json'.format(digest))
+
+    def get(self, site, project, variant, name, query):
+        '''
+        Returns (True, value) if the result of query about the immutable object
+        <site>/<project>/<variant>/.../<name> is in the cache, else (False, None).
+
+        :param query: A json serializable description of the query (eg: the function name and its arguments)
+        :type query: list
+        '''
+        if not self.enabled:
+            return (False, None)
+        filename = self._get_file(site, project, variant, name, query)
+        try:
+            with open(filename) as f:
+                if not self._is_trusted(os.fstat(f.fileno())):
+                    LOGGER.debug("Ignoring immutable cache {}, which is not owned by this user, or is writable by others".format(filename))
+                    self.stats['misses'] += 1
+                    return (False, None)
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.stats['misses'] += 1
+            return (False, None)
+        if not isinstance(data, dict) or 'value' not in data or data.get('query') != json.loads(json.dumps(query)):
+            # sha1 collision, or a corrupted entry
+            self.stats['misses'] += 1
+            return (False, None)
+        self.stats['hits'] += 1
+        return (True, data['value'])
+
+    def _is_trusted(self, st):
+        '''
+        Returns True if the entry whose stat is st was written by this user, and can not be changed by anyone else
+        '''
+        return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+    def set(self, site, project, variant, name, query, value):
+        '''
+        Stores the result of query about the immutable object <site>/<project>/<variant>/.../<name>.
+        Failures to write are logged and ignored, as the cache is only an optimization.
+        '''
+        if not self.enabled:
+            return False
+        dirname = self._get_dir(site, project, variant, name)
+        filename = self._get_file(site, project, variant, name, query)
+        tmpname = None
+        try:
+            if not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    if not os.path.isdir(dirname):
+                        raise
+            fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.tmp.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'query': query, 'value': value}, f)
+            # mkstemp creates the file 0600: let the umask decide who else can read it
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmpname, 0o666 & ~umask & ~0o022)
+            os.rename(tmpname, filename)
+        except (IOError, OSError, TypeError, ValueError) as e:
+            LOGGER.debug("Failed writing immutable cache {}: {}".format(filename, e))
+            self.stats['errors'] += 1
+            if tmpname and os.path.exists(tmpname):
+                os.remove(tmpname)
+            return False
+        self.stats['stores'] += 1
+        return True
+
+    def invalidate(self, site, project, variant, name):
+        '''
+        Removes every cached query about the immutable object <site>/<project>/<variant>/.../<name>.
+        Needed when an immutable object is deleted (and possibly re-created).
+        '''
+        if not self.enabled:
+            return
+        dirname = self._get_dir(site, project, variant, name)
+        if os.path.isdir(dirname):
+            shutil.rmtree(dirname, ignore_errors=True)
+
+    def invalidate_command(self, site, command):
+        '''
+        Invalidates every immutable object that appears as a gdp path in the (write) command.
+        '''
+        if not self.enabled:
+            return
+        for arg in command:
+            if not hasattr(arg, 'startswith') or not arg.startswith('/') or arg.startswith('//'):
+                continue
+            path = arg.lstrip('/')
+            if site and path.startswith(site.strip('/') + '/'):
+                path = path[len(site.strip('/')):].lstrip('/')
+            components = [re.sub(':.*$', '', x) for x in path.split('/')]
+            if len(components) < 3:
+                continue
+            for name in components[2:]:
+                if is_name_immutable(name):
+                    self.invalidate(site, components[0], components[1], name)
+
+
+_IMMUTABLE_CACHE = None
+def get_immutable_cache():
+    '''
+    Returns the ImmutableCache of this process.
+    '''
+    global _IMMUTABLE_CACHE
+    if _IMMUTABLE_CACHE is None:
+        _IMMUTABLE_CACHE = ImmutableCache()
+    return _IMMUTABLE_CACHE
+
+def set_immutable_cache(cache):
+    '''
+    Replaces the ImmutableCache of this process. Passing None reverts to the default one.
+    '''
+    global _IMMUTABLE_CACHE
+    _IMMUTABLE_CACHE = cache
+
+def cached_if_immutable(name_arg):
+    '''
+    Decorator for ICManageCLI getters.
+    If the argument called name_arg is an immutable name, the result is looked up in,
+    and stored into, the ImmutableCache.
+
+    Empty results (eg: a release that does not exist yet) are never stored.
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = get_immutable_cache()
+            if not cache.enabled:
+                return func(self, *args, **kwargs)
+            callargs = inspect.getcallargs(func, self, *args, **kwargs)
+            name = callargs[name_arg]
+            if not is_name_immutable(name):
+                return func(self, *args, **kwargs)
+            site = self.get_site()
+            del callargs['self']
+            query = [func.__name__, sorted(callargs.items())]
+            found, value = cache.get(site, callargs['project'], callargs['variant'], name, query)
+            if found:
+                return value
+            value = func(self, *args, **kwargs)
+            if value and value != -1:
+                cache.set(site, callargs['project'], callargs['variant'], name, query, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: Prebuilt manifest of the dmx commands (dmx/wrappers/*.py) and their
+             subcommand plugins (dmx/plugins/*.py)
+
+Every plugin pulls in a big part of dmx (abnrlib, ecolib, tnrlib, pymongo, ...), so
+importing all of them just to register their names puts a multi-second floor under
+every dmx call. The manifest records, for every plugin:-
+    - the module and class that implement it
+    - its short help (get_help()) and whether it is HIDDEN
+so that dmx can list the commands and dispatch to the selected plugin after importing
+only that one plugin module. The argparse definition of a plugin is still built by
+its add_args(), right after the plugin is imported, as add_args() uses callables
+(types, actions, add_common_args) that can not be stored in the manifest.
+
+The commands (CMDWrapper subclasses) have their own manifest, so that bin/dmx.py only
+imports the wrapper of the command that is run. The help of a command lists its plugins,
+so the command manifest is also rebuilt when the plugins change.
+
+The manifests are stored in dmx/plugins/manifest.json and dmx/wrappers/manifest.json,
+together with a signature of the sources. If a file is added, removed or changed, the
+signature no longer matches, and the manifest is rebuilt (by importing all the modules,
+like before), and rewritten if the directory is writable. The manifests are generated
+files (not under revision control), created for deploys by:-
+    python lib/python/dmx/abnrlib/pluginmanifest.py
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+from __future__ import print_function
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import tempfile
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+LIB = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, LIB)
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+PLUGINS_DIR = os.path.join(LIB, 'dmx', 'plugins')
+PLUGINS_PACKAGE = 'dmx.plugins'
+PLUGINS_BASE = 'dmx.abnrlib.command.Command'
+WRAPPERS_DIR = os.path.join(LIB, 'dmx', 'wrappers')
+WRAPPERS_PACKAGE = 'dmx.wrappers'
+WRAPPERS_BASE = 'dmx.abnrlib.cmdwrapper.CMDWrapper'
+MANIFEST_FILE = 'manifest.json'
+
+class PluginManifestError(Exception): pass
+
+class PluginManifest(object):
+    '''
+    Name, module, class and short help of every plugin, without importing them.
+    '''
+
+    def __init__(self, plugins_dir=PLUGINS_DIR, package=PLUGINS_PACKAGE, base=PLUGINS_BASE, depends_on=None):
+        '''
+        :param plugins_dir: The directory of the plugin modules.
+        :type plugins_dir: str
+        :param package: The python package of plugins_dir.
+        :type package: str
+        :param base: The dotted name of the base class of the plugins.
+        :type base: str
+        :param depends_on: The manifest whose changes also invalidate this one.
+        :type depends_on: PluginManifest
+        '''
+        self.plugins_dir = plugins_dir
+        self.package = package
+        self.base = base
+        self.depends_on = depends_on
+        self.manifest_file = os.path.join(plugins_dir, MANIFEST_FILE)
+        self._plugins = None
+
+    @property
+    def plugins(self):
+        '''
+        {name: {'module': ..., 'class': ..., 'help': ..., 'hidden': ...}} of all the plugins.
+        '''
+        if self._plugins is None:
+            signature = self.get_signature()
+            self._plugins = self.load(signature)
+            if self._plugins is None:
+                LOGGER.debug("Plugin manifest {} is missing or out of date, rebuilding it.".format(self.manifest_file))
+                self._plugins = self.build()
+                self.write(self._plugins, signature)
+        return self._plugins
+
+    def get_plugin_files(self):
+        return sorted(x for x in os.listdir(self.plugins_dir) if x.endswith('.py') and x[0] != '_')
+
+    def get_signature(self):
+        '''
+        Returns the md5 of the names and contents of all the plugin files
+        (and of the signature of depends_on).
+        '''
+        md5 = hashlib.md5()
+        md5.update('{}\n'.format(MANIFEST_VERSION).encode('utf-8'))
+        if self.depends_on is not None:
+            md5.update('{}\n'.format(self.depends_on.get_signature()).encode('utf-8'))
+        for filename in self.get_plugin_files():
+            with open(os.path.join(self.plugins_dir, filename), 'rb') as f:
+                data = f.read()
+            md5.update('{}\n{}\n'.format(filename, len(data)).encode('utf-8'))
+            md5.update(data)
+        return md5.hexdigest()
+
+    def load(self, signature):
+        '''
+        Returns the plugins in the manifest file, or None if it is missing or
+        was not built from the current plugin files.
+        '''
+        try:
+            with open(self.manifest_file) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('signature') != signature:
+            return None
+        return data['plugins']
+
+    def build(self):
+        '''
+        Imports all the plugins, and returns their manifest.
+        '''
+        plugins = {}
+        for filename in self.get_plugin_files():
+            modulename = '{}.{}'.format(self.package, filename[:-3])
+            __import__(modulename)
+            base = self.get_base()
+            for obj in list(vars(sys.modules[modulename]).values()):
+                if isinstance(obj, type) and base in obj.__bases__ and obj.__module__ == modulename:
+                    plugins[obj.__name__.lower()] = {
+                        'module': modulename,
+                        'class': obj.__name__,
+                        'help': obj.get_help(),
+                        'hidden': bool(getattr(obj, 'HIDDEN', False)),
+                    }
+        return plugins
+
+    def get_base(self):
+        '''
+        Imports and returns the base class of the plugins.
+        '''
+        modulename, classname = self.base.rsplit('.', 1)
+        __import__(modulename)
+        return getattr(sys.modules[modulename], classname)
+
+    def write(self, plugins, signature=None):
+        '''
+        Writes the manifest file.
+        Failures to write are logged and ignored (eg: in a read-only installation), as
+        the manifest is only an optimization.
+        '''
+        if signature is None:
+            signature = self.get_signature()
+        tmpname = None
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=self.plugins_dir, prefix='.tmp.')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'signature': signature, 'plugins': plugins}, f, indent=4, sort_keys=True)
+            os.chmod(tmpname, 0o644)
+            os.rename(tmpname, self.manifest_file)
+        except (IOError, OSError) as e:
+            LOGGER.debug("Failed writing plugin manifest {}: {}".format(self.manifest_file, e))
+            if tmpname and os.path.exists(tmpname):
+                os.remove(tmpname)
+            return False
+        return True
+
+    def get_plugin_names(self, prefix=''):
+        '''
+        Returns the sorted names of the plugins that start with prefix.
+        '''
+        return sorted(x for x in self.plugins if x.startswith(prefix))
+
+    def import_plugin(self, name):
+        '''
+        Imports the plugin module, and returns the plugin class.
+        '''
+        if name not in self.plugins:
+            raise PluginManifestError("{} is not a dmx plugin.".format(name))
+        modulename = self.plugins[name]['module']
+        __import__(modulename)
+        return getattr(sys.modules[modulename], self.plugins[name]['class'])
+
+    def get_plugin_table(self):
+        '''
+        Returns a read-only {name: plugin class} mapping of all the plugins, that
+        only imports a plugin when it is looked up.
+        '''
+        return PluginTable(self)
+
+
+class PluginTable(Mapping):
+    '''
+    {name: plugin class} of the plugins of a PluginManifest, imported on lookup.
+    '''
+    def __init__(self, manifest):
+        self.manifest = manifest
+
+    def __getitem__(self, name):
+        if name not in self.manifest.plugins:
+            raise KeyError(name)
+        return self.manifest.import_plugin(name)
+
+    def __contains__(self, name):
+        return name in self.manifest.plugins
+
+    def __iter__(self):
+        return iter(self.manifest.get_plugin_names())
+
+    def __len__(self):
+        return len(self.manifest.plugins)
+
+
+_PLUGIN_MANIFEST = None
+def get_plugin_manifest():
+    '''
+    Returns the (per process) PluginManifest of dmx/plugins.
+    '''
+    global _PLUGIN_MANIFEST
+    if _PLUGIN_MANIFEST is None:
+        _PLUGIN_MANIFEST = PluginManifest()
+    return _PLUGIN_MANIFEST
+
+_WRAPPER_MANIFEST = None
+def get_wrapper_manifest():
+    '''
+    Returns the (per process) PluginManifest of the dmx commands, dmx/wrappers.
+    '''
+    global _WRAPPER_MANIFEST
+    if _WRAPPER_MANIFEST is None:
+        _WRAPPER_MANIFEST = PluginManifest(WRAPPERS_DIR, WRAPPERS_PACKAGE, WRAPPERS_BASE, depends_on=get_plugin_manifest())
+    return _WRAPPER_MANIFEST
+
+
+if __name__ == '__main__':
+    for manifest in (get_plugin_manifest(), get_wrapper_manifest()):
+        if not manifest.write(manifest.build()):
+            print("Failed writing {}".format(manifest.manifest_file))
+            sys.exit(1)
+        print("Wrote {}".format(manifest.manifest_file))
@@ -40,6 +40,7 @@ from dmx.utillib.decorators import memoized
 import dmx.abnrlib.icm
 import dmx.ecolib.ecosphere
 import dmx.utillib.arcutils
+from dmx.utillib.arcjobwatcher import get_watcher, share_watcher, ArcJobWatcherError, FINISHED_STATUSES
 LOGGER = logging.getLogger(__name__)
 
 # These values should be part of dmxdata family.json
@@ -47,6 +48,10 @@ LOGGER = logging.getLogger(__name__)
 WHR_TNR_DISK = '/nfs/site/disks/whr_tnr_1/release/'
 
 class ReleaseQueueError(Exception): pass
+TNR_SSH = '/p/psg/da/infra/admin/setuid/tnr_ssh'
+# How long to wait for a release job before reporting its status as unknown
+RELEASE_JOB_TIMEOUT = 24 * 3600
+
 class ReleaseJobError(Exception): pass
 
 def submit_release(immutable_config, input_config, milestone, thread, label,                
@@ -245,11 +250,12 @@ def get_tnr_dashboard_url_for_id(abnr_id, project='*', requestor='*', variant='*
         return '{0}release_by_id?abnr_release_id={1}'.format(TNR_DASHBOARD, abnr_id)
 
 class ReleaseJobHandler(object):
-    def __init__(self, arc_job_id):
+    def __init__(self, arc_job_id, watcher=None):
         self.arc_job_id = arc_job_id
         self.logger = logging.getLogger(__name__)
         self.rel_config = None
-        self.ssh = '/p/psg/da/infra/admin/setuid/tnr_ssh'
+        self.watcher = watcher
+        self.ssh = TNR_SSH
         self.site = os.getenv("ARC_SITE")
         self.motd = """
         +===========================================================+
@@ -291,27 +297,54 @@ class ReleaseJobHandler(object):
             raise ReleaseJobError('Failed getting {} job stdout'.format(self.arc_job_id))
         return stdout.splitlines()
 
-    def wait_for_job_completion(self):      
-        status = ''
-        done = True        
-        while done:
-            try:
-                time.sleep(60)
-                status = self.get_job_status()
-                self.logger.debug('job status: {}'.format(status))
-                if status == 'done' or status == 'failed' or status == 'error':
-                    done = False
-            except Exception as e:
-                self.logger.warning(str(e))
+    def get_watcher(self):
+        '''
+        Returns the ArcJobWatcher that tracks the job, shared by all the jobs of this process
+        '''
+        if self.watcher is None:
+            self.watcher = get_watcher(ssh=get_release_job_ssh())
+        return self.watcher
+
+    def wait_for_job_completion(self):
+        self.logger.info(self.motd)
+        watcher = self.get_watcher()
+        try:
+            status = watcher.wait(self.arc_job_id, timeout=RELEASE_JOB_TIMEOUT)
+        except ArcJobWatcherError as e:
+            LOGGER.error(str(e))
+            status = None
+        self.logger.debug('job status: {}'.format(status))
+        if status not in FINISHED_STATUSES:
+            # The job might still be running: leave rel_config unset, for the caller to report
+            # the release as not successful
+            LOGGER.error('The status of release job {} is unknown (last known: {}). Check the dashboard for more details'.format(self.arc_job_id, status))
+            return 0
 
         if status == 'done':
-            stdout = self.get_job_stdout()
+            try:
+                stdout = watcher.get_stdout(self.arc_job_id)
+            except ArcJobWatcherError as e:
+                LOGGER.error(str(e))
+                raise ReleaseJobError('Failed getting {} job stdout'.format(self.arc_job_id))
             for line in stdout:
                 m = re.match('.*Rel Config: (.*)', line)
                 if m:
                     rel_config = m.group(1).strip()
                     self.rel_config = None if rel_config == 'None' else rel_config
-        return 0                    
+        return 0
+
+def get_release_job_ssh():
+    '''
+    Returns the ssh to run arc with for the release jobs, or None if arc is run locally
+    '''
+    return None if os.getenv("ARC_SITE") == 'sc' else TNR_SSH
+
+def share_release_job_watcher():
+    '''
+    Shares the watcher of the release jobs with the releases run in parallel by child processes,
+    to use around run_mp/TaskPool. See dmx.utillib.arcjobwatcher.share_watcher
+    '''
+    return share_watcher(ssh=get_release_job_ssh())
 
 def convert_waiver_files(waiver_files):
     '''                                
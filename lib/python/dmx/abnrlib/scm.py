@@ -30,6 +30,7 @@ import glob
 import argparse
 import datetime
 import json
+import tempfile
 
 LIB = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
 sys.path.insert(0, LIB)
@@ -47,6 +48,13 @@ ICMADMIN = 'icmAdmin'
 LOGGER = logging.getLogger(__name__)
 EXCLUDED_FILES = ['.icminfo']
 EXCLUDED_DIRS = ['.naa_tmp']
+# Files given to a single 'icmp4 -x <argfile>' command
+BATCH_SIZE = 1000
+# Paths given to a single 'find' command
+FIND_BATCH_SIZE = 200
+NOT_ON_CLIENT = 'file(s) not on client'
+NOT_OPENED_ON_THIS_CLIENT = 'file(s) not opened on this client'
+NOT_OPENED = ' not opened '
 
 class SCMError(Exception): pass
 
@@ -266,6 +274,153 @@ class SCM(object):
                 self.logger.error(stdout + stderr)
                 raise SCMError('Failed to run {}'.format(command))            
 
+    def _run_icmp4_on_files(self, args, files):
+        '''
+        Runs '<icmp4> -x <argfile> <args>' on files, BATCH_SIZE files per command, instead of
+        a command per file.
+        Yields (batch, exitcode, stdout, stderr) for every batch of files.
+        '''
+        for i in range(0, len(files), BATCH_SIZE):
+            batch = files[i:i+BATCH_SIZE]
+            fd, argfile = tempfile.mkstemp(prefix='dmx_scm_')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write('\n'.join(batch) + '\n')
+                command = '{} -x {} {}'.format(self.icmp4, argfile, args)
+                exitcode, stdout, stderr = run_command(command)
+            finally:
+                os.remove(argfile)
+            self.logger.debug("_run_icmp4_on_files({}, {} files) : \nexitcode:{}\nstdout:{}\nstderr:{}\n".format(args, len(batch), exitcode, stdout, stderr))
+            yield batch, exitcode, stdout, stderr
+
+    def _get_reported_files(self, files, stderr, msg):
+        '''
+        Returns the set of files that icmp4 reported with msg in stderr, eg:
+            /ws/ip/deliverable/file - file(s) not on client.
+        Returns None if a reported path does not match any of the files.
+        '''
+        def normalize(path):
+            # Only the directories are resolved, as the files can be symlinks to NAA
+            path = os.path.abspath(path)
+            return os.path.join(os.path.realpath(os.path.dirname(path)), os.path.basename(path))
+
+        paths = {}
+        for file in files:
+            paths[os.path.abspath(file)] = file
+            paths[normalize(file)] = file
+        reported = set()
+        for line in stderr.splitlines():
+            if msg not in line:
+                continue
+            path = line.rsplit(' - ', 1)[0].strip()
+            file = paths.get(os.path.abspath(path), paths.get(normalize(path)))
+            if file is None:
+                return None
+            reported.add(file)
+        return reported
+
+    def _filter_files_in_icm(self, files, args, msg, is_file_in_state):
+        '''
+        Returns the files for which is_file_in_state(file) is True, in the order of files.
+        is_file_in_state is one of the per file checks (eg: _is_file_managed), that runs
+        '<icmp4> <args> <file>' and returns False if msg is in stderr.
+
+        The files are checked in batches (see _run_icmp4_on_files). A batch that fails, or whose
+        output can not be matched to its files, is checked again one file at a time with
+        is_file_in_state, so that the same SCMError is raised as before.
+        '''
+        ret = []
+        for batch, exitcode, stdout, stderr in self._run_icmp4_on_files(args, files):
+            reported = None if exitcode else self._get_reported_files(batch, stderr, msg)
+            if reported is None:
+                ret += [x for x in batch if is_file_in_state(x)]
+            else:
+                ret += [x for x in batch if x not in reported]
+        return ret
+
+    def _get_managed_files(self, files):
+        '''
+        Returns the files that are managed, like [x for x in files if self._is_file_managed(x)]
+        '''
+        return self._filter_files_in_icm(files, 'have', NOT_ON_CLIENT, self._is_file_managed)
+
+    def _get_naa_managed_files(self, files):
+        '''
+        Returns the files that are NAA managed (see _is_file_naa_managed)
+        '''
+        return [x for x in self._get_managed_files(files) if self.naa.is_path_naa_path(x)]
+
+    def _get_files_checked_out_globally(self, files):
+        '''
+        Returns the files that are checked out globally (see _is_file_checked_out_globally)
+        '''
+        files = self._filter_files_in_icm(files, 'opened -a', NOT_OPENED, self._is_file_checked_out_globally)
+        return self._filter_files_in_icm(files, 'opened', NOT_OPENED, self._is_file_checked_out_globally)
+
+    def _get_files_checked_out_in_this_workspace(self, files):
+        '''
+        Returns the files that are checked out in the current workspace
+        '''
+        return self._filter_files_in_icm(files, 'opened', NOT_OPENED_ON_THIS_CLIENT, self._is_file_checked_out_in_this_workspace)
+
+    def _run_on_files_in_icm(self, files, args, run_on_file):
+        '''
+        Runs '<icmp4> <args>' on files in batches (see _run_icmp4_on_files).
+        run_on_file is the per file method (eg: _add_file_to_icm). A batch that fails is run again
+        one file at a time with it, to find the files that fail.
+        Returns {file: SCMError} of the files that failed.
+        '''
+        failed = {}
+        if self.preview or not files:
+            return failed
+        for batch, exitcode, stdout, stderr in self._run_icmp4_on_files(args, files):
+            if not exitcode:
+                continue
+            self.logger.debug('Failed to run {} on {} files, running it on each file'.format(args, len(batch)))
+            for file in batch:
+                try:
+                    run_on_file(file)
+                except SCMError as e:
+                    failed[file] = e
+        return failed
+
+    def _raise_first_failure(self, files, failed):
+        for file in files:
+            if file in failed:
+                raise failed[file]
+
+    def _add_files_to_icm(self, files):
+        '''
+        Marks files as add in ICM. Raises the SCMError of the first file that fails.
+        '''
+        self._raise_first_failure(files, self._run_on_files_in_icm(files, 'add', self._add_file_to_icm))
+
+    def _add_symlinks_to_icm(self, symlinks):
+        '''
+        Marks symlinks as add in ICM. Raises the SCMError of the first symlink that fails.
+        '''
+        self._raise_first_failure(symlinks, self._run_on_files_in_icm(symlinks, 'add -t symlink+l', self._add_symlink_to_icm))
+
+    def _edit_files_in_icm(self, files):
+        '''
+        Marks files as edit in ICM. Returns {file: SCMError} of the files that failed.
+        '''
+        return self._run_on_files_in_icm(files, 'edit', self._edit_file_in_icm)
+
+    def _edit_symlinks_in_icm(self, symlinks):
+        '''
+        Marks symlinks as edit in ICM. Returns {file: SCMError} of the symlinks that failed.
+        '''
+        return self._run_on_files_in_icm(symlinks, 'edit -t symlink+l', self._edit_symlink_in_icm)
+
+    def _refresh_naa_paths(self, naapaths):
+        '''
+        Symlinks don't resolve immediately in the workspace, so we need to run a find command to refresh the paths
+        '''
+        for i in range(0, len(naapaths), FIND_BATCH_SIZE):
+            command = 'find {}'.format(' '.join(naapaths[i:i+FIND_BATCH_SIZE]))
+            run_command(command)
+
     def _submit_to_icm(self, changelist=None, description='', filespec='...'):
         '''
         Submit changelist to ICM
@@ -422,17 +577,7 @@ class SCM(object):
         NAA filename: <filename>.<numeric>
                       abc.txt.2
         '''
-        not_found = True
-        latest = '{}.1'.format(file)
-        count = 1
-        while not_found:
-            filename = '{}.{}'.format(file, count)
-            if not self.naa.file_exists(family, project, ip, deliverable, bom, filename):
-                not_found = False
-                latest = filename                
-            count = count + 1
-
-        return latest                     
+        return self.naa.get_version_index(family, project, ip, deliverable, bom).get_next_version(file)
 
     def _get_opened_files(self, workspaceroot, project, ip, deliverable):
         '''
@@ -544,10 +689,8 @@ class SCM(object):
         family = self.eco.get_family(os.getenv("DB_FAMILY")) if not family else family
 
         # Now we check-in files to ICManage
+        self._add_files_to_icm(files)
         for file in files:
-            # Add file to ICmanage
-            self._add_file_to_icm(file)
-
             self.logger.info('Marked {} as a new file'.format(file))
 
     def add_large_data(self, files, project, ip, deliverable, library, workspaceroot, family=None):
@@ -603,6 +746,8 @@ class SCM(object):
             os.mkdir(naa_tmp_dir)   
 
         new_filenames_dict = {}
+        # Pick the next version of every file in NAA
+        versions = self.naa.get_version_index(family, project, ip, deliverable, library)
         for subdir in dict:
             # First copy the files to be checked-in to naa_tmp_dir while preserving the nested dir
             if subdir == None:
@@ -617,7 +762,7 @@ class SCM(object):
                             os.mkdir(subdir_tmp)               
 
             for file, filepath in dict[subdir]:
-                new_filename = self._get_latest_naa_file(family, project, ip, deliverable, library, file)
+                new_filename = versions.reserve(file)
                 new_filenames_dict[new_filename] = (file, filepath)
                 new_filepath = '{}/{}/{}/{}'.format(workspaceroot, ip, deliverable, new_filename)
                 
@@ -628,8 +773,14 @@ class SCM(object):
                     # Move new_filepath to subdir
                     shutil.move(new_filepath, subdir_tmp)
 
-        # Push file to NAA
-        if self.naa.push_to_naa(family, project, ip, deliverable, library, naa_tmp_dir):
+        # Push file to NAA, unless a concurrent check-in has pushed some of the same versions
+        conflicts = versions.get_conflicts()
+        if conflicts:
+            self.logger.error('{} were pushed to NAA by another check-in, please try again.'.format(', '.join(conflicts)))
+            failed = 1
+        else:
+            failed = self.naa.push_to_naa(family, project, ip, deliverable, library, naa_tmp_dir)
+        if failed:
             # Restore files in .naa_tmp back to original location
             if not self.preview:
                 original_dir = naa_tmp_dir.split('.naa_tmp')[0]
@@ -649,6 +800,9 @@ class SCM(object):
         self.logger.debug('{} successfully pushed to NAA'.format(naa_tmp_dir))
                                      
         # Now we check-in symlink to ICManage
+        symlinks = []
+        naapaths = []
+        listed_dirs = set()
         for new_filename in new_filenames_dict:
             file, filepath = new_filenames_dict[new_filename]
             file_naapath = self.naa.get_naa_path(family, project, ip, deliverable, library, new_filename)
@@ -656,7 +810,9 @@ class SCM(object):
             if not self.preview:
                 # http://pg-rdjira:8080/browse/DI-1312
                 # List the directory to refresh the directory, otherwise python might not be able to find the file...                
-                os.listdir(os.path.dirname(file_naapath))            
+                if os.path.dirname(file_naapath) not in listed_dirs:
+                    os.listdir(os.path.dirname(file_naapath))
+                    listed_dirs.add(os.path.dirname(file_naapath))
 
                 # Ensure file is present in NAA 
                 if not os.path.exists(file_naapath):
@@ -664,15 +820,16 @@ class SCM(object):
 
                 # Create a symlink from workspace to NAA path
                 os.symlink(file_naapath, filepath)
+            symlinks.append(filepath)
+            naapaths.append(file_naapath)
 
-            # Add symlink to ICmanage
-            self._add_symlink_to_icm(filepath)
-
+        # Add symlinks to ICmanage
+        self._add_symlinks_to_icm(symlinks)
+        for filepath in symlinks:
             self.logger.info('Marked {} as a new file'.format(filepath))
 
-            # Symlink doesn't resolve immediately in the workspace, so we need to run a find command to refresh the path
-            command = 'find {}'.format(file_naapath)
-            run_command(command)
+        # Symlink doesn't resolve immediately in the workspace, so we need to run a find command to refresh the path
+        self._refresh_naa_paths(naapaths)
 
         # http://pg-rdjira:8080/browse/DI-1312
         # temp directory removal should be last
@@ -697,22 +854,22 @@ class SCM(object):
                 file = m.group(1)
             else:
                 raise SCMError('Failed to retrieve filepath from {}'.format(filepath))
-
-            # Ensure file is managed in ICM            
-            if not self._is_file_managed(filepath):
-                raise SCMError('{} is not managed in ICM'.format())                   
             files_to_edit.append((file, filepath))
+
+        # Ensure files are managed in ICM            
+        managed_files = set(self._get_managed_files([filepath for file, filepath in files_to_edit]))
+        for file, filepath in files_to_edit:
+            if filepath not in managed_files:
+                raise SCMError('{} is not managed in ICM'.format(filepath))                   
             
         # All checks end here. From here onwards, API will check-out files from ICM
+        failed = self._edit_files_in_icm([filepath for file, filepath in files_to_edit])
         for file, filepath in files_to_edit:
-            try:
-                # Mark symlink as edit 
-                self._edit_file_in_icm(filepath)
-
-                self.logger.info('{} checked-out in the current workspace'.format(file)) 
-            except Exception as e:
+            if filepath in failed:
                 self.logger.error('Failed to check-out {}'.format(file))
-                self.logger.debug(e)
+                self.logger.debug(failed[filepath])
+            else:
+                self.logger.info('{} checked-out in the current workspace'.format(file)) 
 
     def edit_large_data(self, files, project, ip, deliverable, workspaceroot, copy_file=True):
         '''
@@ -741,16 +898,21 @@ class SCM(object):
             # Ensure file is a symlink
             if not os.path.islink(filepath):
                 raise SCMError('{} is not a symlink'.format(filepath))
-            # Ensure symlink is managed in ICM            
-            if not self._is_file_managed(filepath):
-                raise SCMError('{} is not managed in ICM'.format())                   
             files_to_edit.append((file, filepath))
+
+        # Ensure symlinks are managed in ICM            
+        managed_files = set(self._get_managed_files([filepath for file, filepath in files_to_edit]))
+        for file, filepath in files_to_edit:
+            if filepath not in managed_files:
+                raise SCMError('{} is not managed in ICM'.format(filepath))                   
             
         # All checks end here. From here onwards, API will check-out files from NAA storage
+        # Mark symlinks as edit 
+        failed = self._edit_symlinks_in_icm([filepath for file, filepath in files_to_edit])
         for file, filepath in files_to_edit:
             try:
-                # Mark symlink as edit 
-                self._edit_symlink_in_icm(filepath)
+                if filepath in failed:
+                    raise failed[filepath]
 
                 file_naapath = os.path.realpath(filepath)
                 # Remove the symlink 
@@ -908,6 +1070,8 @@ class SCM(object):
                 os.mkdir(naa_tmp_dir)   
 
             new_filenames_dict = {}
+            # Pick the next version of every file in NAA
+            versions = self.naa.get_version_index(family, project, ip, deliverable, library)
             for subdir in dict:
                 # First copy the files to be checked-in to naa_tmp_dir while preserving the nested dir
                 if subdir == None:
@@ -922,7 +1086,7 @@ class SCM(object):
                                 os.mkdir(subdir_tmp)               
 
                 for file, filepath in dict[subdir]:
-                    new_filename = self._get_latest_naa_file(family, project, ip, deliverable, library, file)
+                    new_filename = versions.reserve(file)
                     new_filenames_dict[new_filename] = (file, filepath)
                     new_filepath = '{}/{}/{}/{}'.format(workspaceroot, ip, deliverable, new_filename)
                     
@@ -933,8 +1097,14 @@ class SCM(object):
                         # Move new_filepath to subdir
                         shutil.move(new_filepath, subdir_tmp)
 
-            # Push file to NAA
-            if self.naa.push_to_naa(family, project, ip, deliverable, library, naa_tmp_dir):
+            # Push file to NAA, unless a concurrent check-in has pushed some of the same versions
+            conflicts = versions.get_conflicts()
+            if conflicts:
+                self.logger.error('{} were pushed to NAA by another check-in, please try again.'.format(', '.join(conflicts)))
+                failed = 1
+            else:
+                failed = self.naa.push_to_naa(family, project, ip, deliverable, library, naa_tmp_dir)
+            if failed:
                 # Restore files in .naa_tmp back to original location
                 if not self.preview:
                     original_dir = naa_tmp_dir.split('.naa_tmp')[0]
@@ -954,6 +1124,7 @@ class SCM(object):
             self.logger.debug('{} successfully pushed to NAA'.format(naa_tmp_dir))
                                          
             # Now we create the symlink to newpath in NAA
+            naapaths = []
             for new_filename in new_filenames_dict:
                 file, filepath = new_filenames_dict[new_filename]
                 file_naapath = self.naa.get_naa_path(family, project, ip, deliverable, library, new_filename)
@@ -969,10 +1140,10 @@ class SCM(object):
                         raise SCMError('{} does not exist'.format(file_naapath))
 
                     os.symlink(file_naapath, filepath)
+                naapaths.append(file_naapath)
                     
-                # Symlink doesn't resolve immediately in the workspace, so we need to run a find command to refresh the path
-                command = 'find {}'.format(file_naapath)
-                run_command(command)                                    
+            # Symlink doesn't resolve immediately in the workspace, so we need to run a find command to refresh the path
+            self._refresh_naa_paths(naapaths)
 
             # http://pg-rdjira:8080/browse/DI-1312
             # temp directory removal should be last
@@ -1236,8 +1407,10 @@ class SCM(object):
                 # Create a symlink from workspace to NAA path
                 os.symlink(dest_naapath, symlink)
 
-            # Add symlink to ICManage
-            self._add_symlink_to_icm(symlink)
+        # Add symlinks to ICManage
+        symlinks = [symlink for filename_to_derive, symlink in filenames_to_derive]
+        self._add_symlinks_to_icm(symlinks)
+        for symlink in symlinks:
             self.logger.info('Marked {} as a new file'.format(symlink))
 
         # Only submit if there are files to derive
@@ -1478,11 +1651,12 @@ class SCM(object):
         if is_large:
             # Find if files are NAA managed
             # http://pg-rdjira:8080/browse/DI-1086
-            managed_files = [x for x in files if self._is_file_naa_managed(x)]
+            managed_files = self._get_naa_managed_files(files)
             self.logger.debug("Ignoring non-naa files: {}".format(set(files) - set(managed_files)))
 
             # Find files that are not checked out
-            unchecked_out_files = [x for x in managed_files if not self._is_file_checked_out_globally(x)]
+            checked_out_files = set(self._get_files_checked_out_globally(managed_files))
+            unchecked_out_files = [x for x in managed_files if x not in checked_out_files]
 
             # Filter only symlinks
             # Theoretically, at this stage, all files in the list should be symlinks
@@ -1490,10 +1664,11 @@ class SCM(object):
             self.logger.debug("Ignoring non-symlink files: {}".format(set(unchecked_out_files) - set(files_to_checkout)))
         else:
             # Find if files are managed in ICM
-            managed_files = [x for x in files if self._is_file_managed(x)]
+            managed_files = self._get_managed_files(files)
 
             # Find files that are not checked out
-            files_to_checkout = [x for x in managed_files if not self._is_file_checked_out_globally(x)]
+            checked_out_files = set(self._get_files_checked_out_globally(managed_files))
+            files_to_checkout = [x for x in managed_files if x not in checked_out_files]
 
         if files_to_checkout:
             # Sync each unchecked_out_file to workspace
@@ -1646,11 +1821,13 @@ class SCM(object):
             files = sorted(list(set(files))) 
 
         # Find if files are unmanaged in ICM
-        unmanaged_files = [x for x in files if not self._is_file_managed(x)]
+        managed_files = set(self._get_managed_files(files))
+        unmanaged_files = [x for x in files if x not in managed_files]
 
         # http://pg-rdjira:8080/browse/DI-1019
         # Look for files that are not opened but already managed
-        managed_not_opened_files = [x for x in files if not self._is_file_checked_out_in_this_workspace(x) and self._is_file_managed(x)]
+        opened_files = set(self._get_files_checked_out_in_this_workspace(files))
+        managed_not_opened_files = [x for x in files if x not in opened_files and x in managed_files]
         if managed_not_opened_files:
             self.logger.warning('The following file(s) already checked-in to repository:')
             for file in managed_not_opened_files:
@@ -281,6 +281,8 @@ class Workspace(object):
         contain_other_dm_deliverable = False
 
         sion_disk = dmx.sionlib.sion_utils.SionDisk()
+        cached = sion_disk.get_pvcds_in_sion_disk([(x['project:parent:name'], x['variant:parent:name'], x['libtype:parent:name'], x['name'])
+            for x in flatten_config if x['libtype:parent:name'] and x['libtype:parent:name'] not in other_dm_deliverable and self.cli.is_name_immutable(x['name'])])
 
         for config in flatten_config:
             config_name = config['name']
@@ -292,7 +294,7 @@ class Workspace(object):
 
             if self.cli.is_name_immutable(config_name):
                 contain_immutable = True
-                if deliverable and not sion_disk.is_pvcd_in_sion_disk(project, ip, deliverable, config_name) and not deliverable in other_dm_deliverable :
+                if deliverable and not deliverable in other_dm_deliverable and not cached[(project, ip, deliverable, config_name)]:
                     self.logger.info('{} {} {} {} not yet cached'.format(project, ip, deliverable, config_name))
                     all_immutable_cached = False
                     break
@@ -27,6 +27,9 @@ from builtins import str
 from past.builtins import basestring
 from builtins import object
 import collections
+import copy
+import re
+import sys
 from xml.etree.ElementTree import ElementTree, XMLParser, tostring
 from xml.dom import minidom
 import os
@@ -44,6 +47,94 @@ from dmx.dmlib.templateset.totem import Totem
 import dmx.dmlib.deliverables.utils.General as General # 
 
 
+class _CompiledTemplateset(object):
+    '''A templateset parsed with placeholders in place of the entity values.
+
+    Parsing the templateset is by far the most expensive part of creating a
+    :py:class:`Manifest`, and a Manifest is created for every IP, cell and
+    deliverable that is checked.  The parsed templateset only depends on the
+    templateset itself and on the names of the entities, so it is cached per
+    process.  The entity values of each Manifest are substituted for the
+    placeholders in a copy of the elements it looks up.
+
+    >>> compiled = _CompiledTemplateset.get('<templateset><template id="T">&ip_name;.v</template></templateset>',
+    ...                                     {'ip_name': 'ip1'})
+    >>> compiled is _CompiledTemplateset.get('<templateset><template id="T">&ip_name;.v</template></templateset>',
+    ...                                      {'ip_name': 'ip2'})
+    True
+    >>> compiled.bind(compiled.templates['T'], {'ip_name': 'ip1'}).text
+    'ip1.v'
+    '''
+    _cache = {}
+    _cacheSize = 32
+    _placeholderStart = u'\ue000'
+    _placeholderEnd = u'\ue001'
+    _placeholderRegex = re.compile(u'\ue000([^\ue001]*)\ue001')
+
+    def __init__(self, templatesetFile, entityNames):
+        parser = XMLParser()
+        parser.parser.UseForeignDTD(True)
+        parser.entity = dict((name, self._placeholderStart + name + self._placeholderEnd)
+                             for name in entityNames)
+        etree = ElementTree()
+        self.rootElement = etree.parse(templatesetFile, parser=parser)
+        self.templates = {}
+        for template in self.rootElement.iterfind('template'):
+            # Like a linear search, the first of duplicate ids wins
+            self.templates.setdefault(template.get('id'), template)
+
+    @classmethod
+    def get(cls, templatesetString, entityValues):
+        '''Return the compiled templateset for the specified templateset string
+        (or the default templateset file if it is `None`) and entity names.
+        '''
+        entityNames = frozenset(entityValues)
+        if templatesetString is None:
+            templatesetFileName = Manifest.templatesetFileName()
+            key = (templatesetFileName, os.path.getmtime(templatesetFileName), entityNames)
+        else:
+            key = (None, templatesetString, entityNames)
+        if key not in cls._cache:
+            if templatesetString is None:
+                templatesetFile = open(templatesetFileName)
+            else:
+                templatesetFile = StringIO(templatesetString)
+            try:
+                compiled = cls(templatesetFile, entityNames)
+            finally:
+                templatesetFile.close()
+            if len(cls._cache) >= cls._cacheSize:
+                cls._cache.clear()
+            cls._cache[key] = compiled
+        return cls._cache[key]
+
+    @classmethod
+    def bind(cls, element, entityValues):
+        '''Return a copy of the element with the entity values substituted
+        for the placeholders.
+        '''
+        element = copy.deepcopy(element)
+        for elem in element.iter():
+            elem.text = cls._bindText(elem.text, entityValues)
+            elem.tail = cls._bindText(elem.tail, entityValues)
+            for name, value in list(elem.attrib.items()):
+                elem.attrib[name] = cls._bindText(value, entityValues)
+        return element
+
+    @classmethod
+    def _bindText(cls, text, entityValues):
+        if not text or cls._placeholderStart not in text:
+            return text
+        text = cls._placeholderRegex.sub(lambda m: entityValues[m.group(1)], text)
+        if sys.version_info[0] < 3:
+            # Like ElementTree, return plain ASCII text as a byte string
+            try:
+                return text.encode('ascii')
+            except UnicodeError:
+                pass
+        return text
+
+
 class Manifest(object):
     '''Parse the deliverable templateset XML into
     an :py:class:`xml.etree.ElementTree.Element`.
@@ -111,20 +202,17 @@ class Manifest(object):
                            else ip_name)    #pylint: disable=C0103
         self._deliverableName = (deliverable_name if deliverable_name is not None
                                  else Manifest.deliverableNameDefault)
-        parser = XMLParser()
-        parser.parser.UseForeignDTD(True)
-        parser.entity = entityValues
-        parser.entity['ip_name'] = self._ipName
-        parser.entity['cell_name'] = self.cell_name
-        parser.entity['deliverable_name'] = self._deliverableName
-
-        etree = ElementTree()
-        if templatesetString is None:
-            templatesetFile = open(self.templatesetFileName())
-        else:
-            templatesetFile = StringIO(templatesetString)
-        self._rootElement = etree.parse(templatesetFile, parser=parser)
-        templatesetFile.close()
+        self._entityValues = dict(entityValues)
+        self._entityValues['ip_name'] = self._ipName
+        self._entityValues['cell_name'] = self.cell_name
+        self._entityValues['deliverable_name'] = self._deliverableName
+
+        # The templateset is parsed only once per process.  The entities are
+        # bound to this instance's values when an element is first looked up.
+        self._templateset = _CompiledTemplateset.get(templatesetString,
+                                                     self._entityValues)
+        self._boundRootElement = None
+        self._boundTemplates = {}
         self._successors = None
         self._predecessors = None
         self._allAliases = None
@@ -201,6 +289,18 @@ class Manifest(object):
         'templateset'
         '''
         return self._rootElement
+
+    @property
+    def _rootElement(self):
+        '''The whole templateset, with the entity values of this instance.
+        Binding the whole tree is slower than looking up a single deliverable,
+        so it is only done the first time it is needed.
+        '''
+        if self._boundRootElement is None:
+            self._boundRootElement = self._templateset.bind(
+                                        self._templateset.rootElement,
+                                        self._entityValues)
+        return self._boundRootElement
    
     @property    
     def allAliases(self):
@@ -3259,9 +3359,18 @@ class Manifest(object):
         'TEST'
         """
         assert isinstance(deliverableName, basestring), 'deliverableName valid'
-        for template in self._rootElement.iterfind('template'):
-            if template.get('id') == deliverableName:
-                return template
+        if self._boundRootElement is not None:
+            for template in self._boundRootElement.iterfind('template'):
+                if template.get('id') == deliverableName:
+                    return template
+        elif deliverableName in self._boundTemplates:
+            return self._boundTemplates[deliverableName]
+        elif deliverableName in self._templateset.templates:
+            template = self._templateset.bind(
+                            self._templateset.templates[deliverableName],
+                            self._entityValues)
+            self._boundTemplates[deliverableName] = template
+            return template
 
         if isAlias:
             msg = "Could not find any alias nor deliverable named '{}'.". \
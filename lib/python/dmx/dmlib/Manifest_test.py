@@ -220,5 +220,47 @@ class TestManifest(unittest.TestCase): # pylint: disable=R0904
                                                          indicateFilelists=True)
         self.assertEqual (expected, actual)
         
+
+class TestManifestCache(unittest.TestCase): # pylint: disable=R0904
+    """Test the per process cache of the parsed templateset."""
+
+    templatesetXml = '''<?xml version="1.0" encoding="utf-8"?>
+        <templateset>
+            <template id="TEST">
+                <pattern id="pattern1">
+                    &ip_name;/&layoutDirName;/&cell_name;.a.txt
+                </pattern>
+                <filelist id="filelist1">
+                    &ip_name;/&deliverable_name;.c.filelist
+                </filelist>
+            </template>
+        </templateset>'''
+
+    def test_0_lazyBinding(self):
+        '''Check that every Manifest gets its own entity values.'''
+        for ip in ('ip1', 'ip2'):
+            manifest = Manifest.Manifest(ip, 'cell_' + ip, 'DEL',
+                                         templatesetString=self.templatesetXml,
+                                         entityValues={'layoutDirName' : 'icc'})
+            self.assertEqual(manifest.getPattern('TEST', 'pattern1'),
+                             '{0}/icc/cell_{0}.a.txt'.format(ip))
+            self.assertEqual(manifest.getFilelist('TEST', 'filelist1'),
+                             '{}/DEL.c.filelist'.format(ip))
+            self.assertEqual(manifest.rootElement.find('template/pattern').text.strip(),
+                             '{0}/icc/cell_{0}.a.txt'.format(ip))
+
+    def test_1_sameAsFullTree(self):
+        '''Check that the deliverables bound one at a time are the same as
+        the deliverables of the whole templateset.
+        '''
+        lazy = Manifest.Manifest('<ip>', '<cell>')
+        full = Manifest.Manifest('<ip>', '<cell>')
+        full.rootElement # pylint: disable=W0104
+        for deliverableName in full.allDeliverables:
+            self.assertEqual(lazy.getPatterns(deliverableName),
+                             full.getPatterns(deliverableName))
+            self.assertEqual(lazy.getFilelists(deliverableName),
+                             full.getFilelists(deliverableName))
+
 if __name__ == "__main__":
     unittest.main (verbosity=2, failfast=True)
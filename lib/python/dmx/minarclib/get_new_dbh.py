@@ -1,3 +1,5 @@
+import os
+
 import MySQLdb
 
 def get_new_dbh():
@@ -6,3 +8,22 @@ def get_new_dbh():
         user='admin', passwd='mY5Q1@dm', 
         db='Min_ARC_Resource'
     )
+
+# one connection per process, a forked child must not share its parent's socket
+_dbh = {}
+
+def get_dbh():
+    '''
+    Returns the connection of this process, connecting (or reconnecting, if the
+    server dropped it) only when needed.
+    '''
+    pid = os.getpid()
+    dbh = _dbh.get(pid)
+    if dbh is not None:
+        try:
+            dbh.ping()
+        except MySQLdb.Error:
+            dbh = None
+    if dbh is None:
+        dbh = _dbh[pid] = get_new_dbh()
+    return dbh
@@ -52,25 +52,31 @@ def atomic_parse(
 
     printer.lock()
 
-    # get ecosystem info for extracting cells & deliverables 
-    os.chdir(workspace_location)
-
-    workspace = Workspace()
-    ip = EcoSphere().get_family().get_ip(ip_name)
-
-    # IPQC class is needed to get the correct status for POR, hierachy, etc
-    ipqc = IPQC(milestone, ip_name)
-    ipqc.init_ip()
-
-    parse(ip_name, ipqc, ip, milestone, rel_id, workspace_location, single_deliverable, printer) 
-
-    if include_hierarchy: 
-        for sub_ipqc in ipqc.hierarchy:
-            printer.store_ip(sub_ipqc.ip.name)
-            ip = EcoSphere().get_family().get_ip(sub_ipqc.ip.name)
-            parse(sub_ipqc.ip.name, sub_ipqc, ip, sub_ipqc.ip.milestone, rel_id, workspace_location, single_deliverable, printer) 
-
-    printer.unlock()
+    # nothing of the release is stored unless all of it is, as the printer
+    # stores the whole release in one transaction
+    try:
+        # get ecosystem info for extracting cells & deliverables 
+        os.chdir(workspace_location)
+
+        workspace = Workspace()
+        ip = EcoSphere().get_family().get_ip(ip_name)
+
+        # IPQC class is needed to get the correct status for POR, hierachy, etc
+        ipqc = IPQC(milestone, ip_name)
+        ipqc.init_ip()
+
+        parse(ip_name, ipqc, ip, milestone, rel_id, workspace_location, single_deliverable, printer) 
+
+        if include_hierarchy: 
+            for sub_ipqc in ipqc.hierarchy:
+                printer.store_ip(sub_ipqc.ip.name)
+                ip = EcoSphere().get_family().get_ip(sub_ipqc.ip.name)
+                parse(sub_ipqc.ip.name, sub_ipqc, ip, sub_ipqc.ip.milestone, rel_id, workspace_location, single_deliverable, printer) 
+
+        printer.unlock()
+    except:
+        printer.rollback()
+        raise
 
     if preserve_workspace == False:
         workspace.delete()
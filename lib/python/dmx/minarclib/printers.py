@@ -8,7 +8,7 @@ import shutil
 
 from prettytable import PrettyTable
 
-from .get_new_dbh import get_new_dbh
+from .get_new_dbh import get_dbh
 from .logger import Logger
 
 logger = Logger()
@@ -19,6 +19,69 @@ logger = Logger()
 __AUDIT_STORE__ = '/nfs/sc/disks/swuser_work_mconkin/audits';
 
 class DBPrinter(object):
+    '''
+    Stores the parsed audit results of a release in the Min ARC database.
+
+    All the store_*() calls of a release share the connection of the process, and
+    are stored in one transaction, that unlock() commits. The rows nothing refers
+    to (hierarchy, audit, resource_used) are buffered, and inserted with one
+    executemany() per flush_size rows.
+    '''
+
+    # rows that are buffered, and the INSERT that stores them
+    BULK_INSERTS = {
+        'hierarchy': """
+            INSERT INTO hierarchy (rel_id, child_rel_id)
+            VALUES (%s, %s)
+        """,
+        'audit': """
+            INSERT INTO audit (audit_name, checker_id, audit_list_id)
+            VALUES (%s, %s, %s)
+        """,
+        'resource_used': """
+            INSERT INTO resource_used
+            (resource_name, used_ver, checker_id, status, min_version, critical_version)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+    }
+
+    def __init__(self, flush_size=1000, dbh=None):
+        self.flush_size = flush_size
+        self._dbh = dbh
+        self._rows = dict((table, []) for table in self.BULK_INSERTS)
+        self._owners = set()
+
+    @property
+    def dbh(self):
+        if self._dbh is None:
+            self._dbh = get_dbh()
+        return self._dbh
+
+    def _insert(self, table, row):
+        self._rows[table].append(row)
+        if len(self._rows[table]) >= self.flush_size:
+            self._flush(table)
+
+    def _flush(self, table):
+        if self._rows[table]:
+            self.dbh.cursor().executemany(self.BULK_INSERTS[table], self._rows[table])
+            self._rows[table] = []
+
+    def flush(self):
+        '''
+        Inserts all the buffered rows (without committing them).
+        '''
+        for table in self.BULK_INSERTS:
+            self._flush(table)
+
+    def rollback(self):
+        '''
+        Drops everything stored since lock().
+        '''
+        for table in self.BULK_INSERTS:
+            self._rows[table] = []
+        self._owners = set()
+        self.dbh.rollback()
 
     def store_ip(self, ip):
         pass
@@ -26,8 +89,7 @@ class DBPrinter(object):
     def store_rel(self, rel):
         self.rel_id = rel
         
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
+        cursor = self.dbh.cursor()
         cursor.execute("""
             SELECT 
                 Rel.workspace_location, ms.ms_name, 
@@ -46,17 +108,17 @@ class DBPrinter(object):
         return row[0]
 
     def lock(self):
-        dbh = get_new_dbh()
-        dbh.cursor().execute("""
+        # committed right away, so that others see the release is being parsed
+        self.dbh.cursor().execute("""
             UPDATE Rel
             SET is_parsed = 0
             WHERE rel_id = %s
         """, (self.rel_id,))
-        dbh.commit()
+        self.dbh.commit()
 
-    def store_owner(self, owner):
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
+    def _store_user(self, cursor, owner, email):
+        if owner in self._owners:
+            return
         cursor.execute("""
             SELECT owner_id
             FROM user
@@ -69,20 +131,23 @@ class DBPrinter(object):
         if not user_row:
             cursor.execute("""
                 INSERT INTO user
-                SET owner_id = %s,
-                email = %s
-            """, (owner, 'unregistered@intel.com'))
-            dbh.commit()
+                (owner_id, email)
+                VALUES (%s, %s)
+            """, (owner, email))
+        self._owners.add(owner)
+
+    def store_owner(self, owner):
+        cursor = self.dbh.cursor()
+        self._store_user(cursor, owner, 'unregistered@intel.com')
         
         cursor.execute("""
             UPDATE Rel
             SET owner_id = %s
             WHERE rel_id = %s
         """, (owner, self.rel_id))
-        dbh.commit()
 
     def store_hierarchy(self, sub_ip, bom):
-        cursor = get_new_dbh().cursor()
+        cursor = self.dbh.cursor()
         cursor.execute("""
             SELECT rel_id
             FROM Rel
@@ -91,6 +156,7 @@ class DBPrinter(object):
             AND IP.ip_name = %s
             AND project_id = %s
         """, (bom, sub_ip, self.project_id))
+        rows = cursor.fetchall()
 
         # TODO: is there a case where there are duplicate rels? If that is the
         #       case, then it needs to be recorded. This suggests the need for
@@ -100,85 +166,46 @@ class DBPrinter(object):
         #       Something else is wrong if nothing gets returned, as it's
         #       assumed that the child rel must already exist in the database.
         #       For now just return if there is unexpected behavior
-        if cursor.rowcount != 1:
+        if len(rows) != 1:
             logger.error('there are duplicates of a release in the database')
             logger.error('or the child rel does not exist in the database')
             return
 
-        child_rel_id = cursor.fetchone()[0]
+        child_rel_id = rows[0][0]
 
         # add the child rel into the hierarchy table
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
-        cursor.execute("""
-            INSERT INTO hierarchy
-            SET rel_id = %s,
-            child_rel_id = %s
-        """, (self.rel_id, child_rel_id))
-        dbh.commit()
+        self._insert('hierarchy', (self.rel_id, child_rel_id))
 
     def store_deliverable(self, deliverable, not_por, bom, owner, email, waived):
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
-        cursor.execute("""
-            SELECT owner_id
-            FROM user
-            WHERE owner_id = %s
-        """, (owner,))
-
-        user_row = cursor.fetchone()
-        
-        # an owner may not exist, so create on if none
-        if not user_row:
-            cursor.execute("""
-                INSERT INTO user
-                SET owner_id = %s,
-                email = %s
-            """, (owner, email + '@intel.com'))
-            dbh.commit()
-
-        # otherwise just set the user guid to the existing one
-        else:
-            user_guid = user_row[0]
+        cursor = self.dbh.cursor()
+        self._store_user(cursor, owner, email + '@intel.com')
 
         cursor.execute("""
             INSERT INTO deliverable 
-            SET del_name = %s,
-            rel_id = %s,
-            not_por = %s,
-            bom = %s,
-            owner_id = %s,
-            is_waived = %s
+            (del_name, rel_id, not_por, bom, owner_id, is_waived)
+            VALUES (%s, %s, %s, %s, %s, %s)
         """, (deliverable, self.rel_id, not_por, bom, owner, waived))
-        dbh.commit()
 
         return cursor.lastrowid
 
     def store_cell(self, cell):
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
+        cursor = self.dbh.cursor()
         cursor.execute("""
             INSERT INTO cell
-            SET cell_name = %s,
-            rel_id = %s
+            (cell_name, rel_id)
+            VALUES (%s, %s)
         """, (cell, self.rel_id))
-        dbh.commit()
 
         return cursor.lastrowid
 
     def store_checker(self, checker):
 
         # store checkers into database 
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
+        cursor = self.dbh.cursor()
         cursor.execute("""
             INSERT INTO checker
-            SET cell_id = %s,
-            del_id = %s,
-            checker_name = %s,
-            flow = %s,
-            subflow = %s,
-            not_por = %s
+            (cell_id, del_id, checker_name, flow, subflow, not_por)
+            VALUES (%s, %s, %s, %s, %s, %s)
         """, (
                 checker['cell_id'], 
                 checker['del_id'],
@@ -188,7 +215,6 @@ class DBPrinter(object):
                 checker['not_por']
             )
         )
-        dbh.commit()
 
         checker['checker_id'] = cursor.lastrowid
 
@@ -202,10 +228,9 @@ class DBPrinter(object):
             al = checker['audit_list'].split('/')[-1]
             cursor.execute("""
                 INSERT INTO audit_list
-                SET audit_list_name = %s,
-                checker_id = %s
+                (audit_list_name, checker_id)
+                VALUES (%s, %s)
             """, (al, checker['checker_id']))
-            dbh.commit()
 
             if not os.path.isfile(audit_dir+'/'+al):
                 shutil.copy(checker['audit_list'], audit_dir)
@@ -214,13 +239,7 @@ class DBPrinter(object):
             
         for audit in checker['audits']:
             a = audit.split('/')[-1]
-            cursor.execute("""
-                INSERT INTO audit
-                SET audit_name = %s,
-                checker_id = %s,
-                audit_list_id = %s
-            """, (a, checker['checker_id'], audit_list_id))
-            dbh.commit()
+            self._insert('audit', (a, checker['checker_id'], audit_list_id))
 
             if not os.path.isfile(audit_dir+'/'+a):
                 try:
@@ -229,17 +248,7 @@ class DBPrinter(object):
                     logger.error(str(err))
 
     def store_resource(self, c, resource, used_ver, status, min_ver, crit_ver):
-        dbh = get_new_dbh()
-        cursor = dbh.cursor()
-        cursor.execute("""
-            INSERT INTO resource_used
-            SET resource_name = %s,
-            used_ver = %s,
-            checker_id = %s,
-            status = %s,
-            min_version = %s,
-            critical_version = %s
-        """, (
+        self._insert('resource_used', (
                 resource,
                 used_ver.lstrip('/'), 
                 c['checker_id'],
@@ -248,19 +257,18 @@ class DBPrinter(object):
                 crit_ver
             )    
         )
-        dbh.commit()
 
     def unlock(self):
-        # finally update Rel for successful parsing
+        # finally update Rel for successful parsing, and commit the whole release
+        self.flush()
         now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        dbh = get_new_dbh()
-        dbh.cursor().execute("""
+        self.dbh.cursor().execute("""
             UPDATE Rel
             SET is_parsed = 1,
             date_parsed = %s
             WHERE rel_id = %s
         """, (now, self.rel_id,))
-        dbh.commit()
+        self.dbh.commit()
 
 class StdoutPrinter(object):
     def __init__(self, override_file=None, output_file=None):
@@ -301,6 +309,9 @@ class StdoutPrinter(object):
     def store_owner(self, owner):
         pass   
 
+    def rollback(self):
+        pass
+
     def store_hierarchy(self, sub_ip, bom):
         pass
 
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import collections
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import dmx.minarclib.printers
+from dmx.minarclib.printers import DBPrinter
+
+SCHEMA = """
+    CREATE TABLE ms (ms_id INTEGER PRIMARY KEY, ms_name TEXT);
+    CREATE TABLE IP (ip_id INTEGER PRIMARY KEY, ip_name TEXT, project_id INTEGER);
+    CREATE TABLE Rel (rel_id INTEGER PRIMARY KEY, rel_name TEXT, ip_id INTEGER, ms_id INTEGER,
+        workspace_location TEXT, owner_id TEXT, is_parsed INTEGER, date_parsed TEXT);
+    CREATE TABLE user (owner_id TEXT PRIMARY KEY, email TEXT);
+    CREATE TABLE hierarchy (rel_id INTEGER, child_rel_id INTEGER);
+    CREATE TABLE deliverable (del_id INTEGER PRIMARY KEY, del_name TEXT, rel_id INTEGER,
+        not_por INTEGER, bom TEXT, owner_id TEXT, is_waived INTEGER);
+    CREATE TABLE cell (cell_id INTEGER PRIMARY KEY, cell_name TEXT, rel_id INTEGER);
+    CREATE TABLE checker (checker_id INTEGER PRIMARY KEY, cell_id INTEGER, del_id INTEGER,
+        checker_name TEXT, flow TEXT, subflow TEXT, not_por INTEGER);
+    CREATE TABLE audit_list (audit_list_id INTEGER PRIMARY KEY, audit_list_name TEXT, checker_id INTEGER);
+    CREATE TABLE audit (audit_id INTEGER PRIMARY KEY, audit_name TEXT, checker_id INTEGER, audit_list_id INTEGER);
+    CREATE TABLE resource_used (resource_name TEXT, used_ver TEXT, checker_id INTEGER, status TEXT,
+        min_version TEXT, critical_version TEXT);
+    INSERT INTO ms VALUES (1, '1.0');
+    INSERT INTO IP VALUES (1, 'ip1', 1);
+    INSERT INTO IP VALUES (2, 'ip2', 1);
+    INSERT INTO Rel (rel_id, rel_name, ip_id, ms_id, workspace_location) VALUES (1, 'REL1.0', 1, 1, '/ws');
+    INSERT INTO Rel (rel_id, rel_name, ip_id, ms_id, workspace_location) VALUES (2, 'REL2.0', 2, 1, '/ws2');
+"""
+
+Checkname = collections.namedtuple('Checkname', ['checkname', 'flow', 'subflow'])
+
+class SqliteCursor(object):
+    '''sqlite3 stand-in for a MySQLdb cursor, that uses %s placeholders.'''
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, args=()):
+        return self._cursor.execute(sql.replace('%s', '?'), args)
+
+    def executemany(self, sql, rows):
+        return self._cursor.executemany(sql.replace('%s', '?'), rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class SqliteDBH(object):
+    '''sqlite3 stand-in for a MySQLdb connection.'''
+    def __init__(self, path=':memory:'):
+        self.conn = sqlite3.connect(path)
+        self.commits = 0
+
+    def cursor(self):
+        return SqliteCursor(self.conn.cursor())
+
+    def commit(self):
+        self.commits += 1
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+class TestDBPrinter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.dbfile = os.path.join(self.tmpdir, 'minarc.db')
+        conn = sqlite3.connect(self.dbfile)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self.dbh = SqliteDBH(self.dbfile)
+        self.audit_store = dmx.minarclib.printers.__AUDIT_STORE__
+        dmx.minarclib.printers.__AUDIT_STORE__ = os.path.join(self.tmpdir, 'audits')
+        self.audits = []
+        for name in ('audit.a.xml', 'audit.b.xml', 'audit.f'):
+            self.audits.append(os.path.join(self.tmpdir, name))
+            open(self.audits[-1], 'w').close()
+
+    def tearDown(self):
+        dmx.minarclib.printers.__AUDIT_STORE__ = self.audit_store
+        shutil.rmtree(self.tmpdir)
+
+    def count(self, table):
+        # a separate connection only sees what has been committed
+        conn = sqlite3.connect(self.dbfile)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM {}'.format(table)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def store_release(self, printer, nresources):
+        self.assertEqual(printer.store_rel(1), '/ws')
+        printer.lock()
+        printer.store_owner('jdoe')
+        printer.store_hierarchy('ip2', 'REL2.0')
+        del_id = printer.store_deliverable('rtl', 0, 'REL1.0', 'jdoe', 'jdoe', 0)
+        cell_id = printer.store_cell('cell1')
+        checker = {'cell_id': cell_id, 'del_id': del_id, 'del_name': 'rtl', 'not_por': 0,
+            'ref': Checkname('lint', 'rtl', 'lint'), 'audit_list': self.audits[2], 'audits': self.audits[:2]}
+        printer.store_checker(checker)
+        for i in range(nresources):
+            printer.store_resource(checker, 'tool{}'.format(i), '/1.{}'.format(i), 'Met', '1.0', '1.0')
+
+    def test_001___one_transaction_per_release(self):
+        printer = DBPrinter(flush_size=10, dbh=self.dbh)
+        self.store_release(printer, 25)
+        self.assertEqual(self.dbh.commits, 1)
+        self.assertEqual(self.count('resource_used'), 0)
+        printer.unlock()
+        self.assertEqual(self.dbh.commits, 2)
+        self.assertEqual(dict((table, self.count(table)) for table in ('user', 'hierarchy', 'deliverable', 'cell', 'checker', 'audit_list', 'audit', 'resource_used')),
+            {'user': 1, 'hierarchy': 1, 'deliverable': 1, 'cell': 1, 'checker': 1, 'audit_list': 1, 'audit': 2, 'resource_used': 25})
+        row = self.dbh.conn.execute('SELECT used_ver, checker_id FROM resource_used WHERE resource_name = ?', ('tool3',)).fetchone()
+        self.assertEqual(row, ('1.3', 1))
+        row = self.dbh.conn.execute('SELECT owner_id, is_parsed FROM Rel WHERE rel_id = 1').fetchone()
+        self.assertEqual(row, ('jdoe', 1))
+
+    def test_002___flush_size(self):
+        printer = DBPrinter(flush_size=10, dbh=self.dbh)
+        self.store_release(printer, 25)
+        self.assertEqual(self.dbh.conn.execute('SELECT COUNT(*) FROM resource_used').fetchone()[0], 20)
+        printer.flush()
+        self.assertEqual(self.dbh.conn.execute('SELECT COUNT(*) FROM resource_used').fetchone()[0], 25)
+
+    def test_003___rollback(self):
+        printer = DBPrinter(dbh=self.dbh)
+        self.store_release(printer, 5)
+        printer.rollback()
+        printer.unlock()
+        self.assertEqual(self.count('deliverable'), 0)
+        self.assertEqual(self.count('resource_used'), 0)
+        self.assertEqual(self.count('user'), 0)
+
+if __name__ == '__main__':
+    unittest.main()
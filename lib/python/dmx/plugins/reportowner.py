@@ -61,19 +61,15 @@ class ReportOwner(Command):
             Designer: snerlika (shilpa.nerlikar)
             Time: 2016/04/22 10:38:21
 
-            $ dmx report owner -p i10socfm -i cw_lib -b dev --all
+            $ dmx report owner -p i10socfm -i cw_lib -b REL2.0FM8revA0__17ww032a --all
+            [i10socfm/cw_lib@REL2.0FM8revA0__17ww032a]
+            Owner: chialinh (chialin.hsing)
+            Creator: icetnr ()
+            Time: 2017/01/18 11:26:47
+            [i10socfm/cw_lib:rtl@REL2.0FM8revA0__17ww032a]
             .
             .
             .
-            [12]
-            Creator: snerlika (shilpa.nerlikar)
-            Designer: ajangity ()
-            Time: 2016/09/29 11:54:00
-            [13]
-            Owner: snerlika (shilpa.nerlikar)
-            Creator: snerlika (shilpa.nerlikar)
-            Designer: snerlika (shilpa.nerlikar)
-            Time: 2016/10/06 11:16:21
             
             $ dmx report owner -p i10socfm -i cw_lib -b dev --set-owner abc
             Set the ownership of i10socfm/cw_lib@dev to abc
@@ -92,7 +88,7 @@ class ReportOwner(Command):
         parser.add_argument('-d', '--deliverable', metavar='deliverable', required=False)
         parser.add_argument('-b', '--bom',  metavar='bom', required=False)
         parser.add_argument('--all', required=False, action='store_true',
-                            help='Show all records for bom including updaters.')
+                            help='Show the owner of every bom in the tree of --bom/-b.')
         parser.add_argument('--format', required=False, choices=['csv'], 
                             help='Format the output into the desired format.')
         parser.add_argument('--owner', required=False, action='store_true', 
@@ -126,6 +126,8 @@ class WorkspaceCheck(Command):
             help='Force GoldenArc Check to user proddb/devdb. Default: proddb')
         parser.add_argument('--disable_goldenarc_check', required=False, action='store_true', default=False,
             help='Any GoldenArc Check error will not be reported.')
+        parser.add_argument('--jobs', required=False, type=int, default=None,
+            help='Number of processes used to validate the audit files and their checksums. Default: $TNR_NPROCESS, or the number of cpus.')
         
 
     @classmethod
@@ -178,6 +180,6 @@ class WorkspaceCheck(Command):
         ret = Workspace.check_action(project, ip, bom, milestone, thread, libtype, logfile, dashboard, celllist_file, nowarnings, waiver_file, views=views,
             validate_deliverable_existence_check=not args.disable_deliverable_check, validate_type_check=not args.disable_type_check, 
             validate_checksum_check=not args.disable_checksum_check, validate_result_check=not args.disable_result_check, validate_goldenarc_check=not args.disable_goldenarc_check,
-            source=args.source)
+            source=args.source, jobs=args.jobs)
         
         return ret
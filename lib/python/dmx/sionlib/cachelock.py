@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+'''
+Description: lock files that guard the population of a deliverable@bom in the SION cache
+
+A lock file <cache_dir>/.locks/<project>.<ip>.<deliverable>.<bom> is owned by the
+process that populates the deliverable@bom:-
+    - It is created with O_CREAT|O_EXCL, so only one process can own it.
+    - Its owner also holds an fcntl lock on it for as long as it is populating. The lock
+      is released by the kernel (or the NFS lock manager) if the owner dies, so a lock file
+      nobody holds an fcntl lock on is stale, and can be broken.
+    - Other processes wait for the population by blocking on the fcntl lock, instead of
+      polling the lock file.
+
+The first line of the lock file is the ARC job id of its owner, which
+scripts/remove_lock_file.py looks for. Lock files written by older versions only contain
+that line; they are not held with an fcntl lock, so they are only considered stale after
+LEGACY_STALE_AFTER seconds, and are waited for by polling.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+import os
+import time
+import errno
+import fcntl
+import socket
+import logging
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+LEGACY_STALE_AFTER = 24 * 60 * 60
+LEGACY_POLL_INTERVAL = 30
+BREAK_TIMEOUT = 60
+
+class CacheLockError(Exception): pass
+
+# fcntl locks are owned by processes, not threads: a thread of the owner would not block
+# on them, and closing any descriptor of the lock file would release them. So the threads
+# of a process also take a (per lock file) mutex before they touch the lock file.
+_LOCAL_LOCKS = {}
+_LOCAL_LOCKS_LOCK = threading.Lock()
+
+def _get_local_lock(lockfile):
+    with _LOCAL_LOCKS_LOCK:
+        if lockfile not in _LOCAL_LOCKS:
+            _LOCAL_LOCKS[lockfile] = threading.Lock()
+        return _LOCAL_LOCKS[lockfile]
+
+class CacheLock(object):
+    '''
+    An exclusive, crash-safe lock file.
+    '''
+
+    def __init__(self, lockfile, owner=None):
+        '''
+        :param lockfile: The lock file.
+        :type lockfile: str
+        :param owner: The id written on the first line of the lock file. Defaults to $ARC_JOB_ID.
+        :type owner: str
+        '''
+        self.lockfile = lockfile
+        self.owner = owner if owner is not None else os.environ.get('ARC_JOB_ID', '')
+        self._local_lock = _get_local_lock(lockfile)
+        self._fd = None
+        self._inode = None
+
+    @property
+    def locked(self):
+        return self._fd is not None
+
+    def acquire(self):
+        '''
+        Returns True if this process now owns the lock, False if another process (or another
+        thread of this process) owns it. A stale lock file is broken, and then acquired.
+        '''
+        if self.locked:
+            raise CacheLockError('{} is already locked by this object.'.format(self.lockfile))
+        if not self._local_lock.acquire(False):
+            return False
+        try:
+            acquired = self._acquire()
+        except Exception:
+            self._local_lock.release()
+            raise
+        if not acquired:
+            self._local_lock.release()
+        return acquired
+
+    def _acquire(self):
+        for attempt in range(3):
+            try:
+                fd = os.open(self.lockfile, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                if self._break_if_stale():
+                    continue
+                return False
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.write(fd, '{}\nhost={} pid={}\n'.format(self.owner, socket.gethostname(), os.getpid()).encode('utf-8'))
+                os.fchmod(fd, 0o666)
+            except (IOError, OSError):
+                os.close(fd)
+                os.unlink(self.lockfile)
+                raise
+            self._fd = fd
+            self._inode = os.fstat(fd).st_ino
+            return True
+        return False
+
+    def release(self):
+        '''
+        Removes the lock file (unless it has been broken in the meantime), and releases the fcntl lock.
+        The lock file is removed first, so that processes that wake up on the released fcntl
+        lock see that the population is over.
+        '''
+        if not self.locked:
+            return
+        try:
+            if self._get_inode() == self._inode:
+                os.unlink(self.lockfile)
+        except OSError as e:
+            LOGGER.error("Could not remove lockfile {}: {}".format(self.lockfile, e))
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._inode = None
+            self._local_lock.release()
+
+    def wait(self):
+        '''
+        Blocks until the current owner of the lock releases it (or dies).
+        Returns immediately if the lock file does not exist.
+        '''
+        with self._local_lock:
+            while True:
+                try:
+                    fd = os.open(self.lockfile, os.O_RDONLY)
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        return
+                    raise
+                try:
+                    data = os.read(fd, 4096)
+                    if not data:
+                        # The owner has not written its lock file yet
+                        time.sleep(1)
+                        continue
+                    if self._is_legacy(data):
+                        if not self._is_stale(fd):
+                            time.sleep(LEGACY_POLL_INTERVAL)
+                            continue
+                    else:
+                        # Blocks until the owner closes the lock file (or dies)
+                        fcntl.lockf(fd, fcntl.LOCK_SH)
+                        fcntl.lockf(fd, fcntl.LOCK_UN)
+                finally:
+                    os.close(fd)
+                # The owner is gone. Its lock file is only left if it died.
+                self.break_stale()
+                return
+
+    def break_stale(self):
+        '''
+        Removes the lock file if it is stale.
+        A second O_EXCL lock file guards the check and the removal, so that a lock file that
+        has just been created by another process is never removed by mistake.
+        Returns False if another process is breaking the lock at the moment.
+        '''
+        breaker = self.lockfile + '.break'
+        try:
+            fd = os.open(breaker, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            # Clean up after a process that died while breaking the lock
+            try:
+                if time.time() - os.stat(breaker).st_mtime > BREAK_TIMEOUT:
+                    os.unlink(breaker)
+            except OSError:
+                pass
+            return False
+        os.close(fd)
+        try:
+            try:
+                fd = os.open(self.lockfile, os.O_RDONLY)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    return True
+                raise
+            try:
+                stale = self._is_stale(fd)
+            finally:
+                os.close(fd)
+            if stale:
+                LOGGER.warning("Removing stale lockfile {}".format(self.lockfile))
+                os.unlink(self.lockfile)
+        finally:
+            os.unlink(breaker)
+        return True
+
+    def _get_inode(self):
+        try:
+            return os.stat(self.lockfile).st_ino
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+
+    def _break_if_stale(self):
+        '''
+        Returns True if the lock file is gone, or was stale and has been broken.
+        '''
+        try:
+            fd = os.open(self.lockfile, os.O_RDONLY)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return True
+            raise
+        try:
+            stale = self._is_stale(fd)
+        finally:
+            os.close(fd)
+        if stale and self.break_stale():
+            return self._get_inode() is None
+        return False
+
+    def _is_stale(self, fd):
+        '''
+        Returns True if nobody holds the lock file any more.
+        '''
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = os.read(fd, 4096)
+        if self._is_legacy(data):
+            return time.time() - os.fstat(fd).st_mtime > LEGACY_STALE_AFTER
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            if e.errno not in (errno.EACCES, errno.EAGAIN):
+                raise
+            return False
+        fcntl.lockf(fd, fcntl.LOCK_UN)
+        return True
+
+    def _is_legacy(self, data):
+        '''
+        Lock files without the 'host=... pid=...' line were not created by CacheLock,
+        and are not held with an fcntl lock.
+        (A CacheLock lock file is only empty for the moment between its creation and
+        the write of its content, so an empty file is treated like a legacy one too.)
+        '''
+        return b'\nhost=' not in data
+
+
+def get_bom_lock(cache_dir, project, ip, deliverable, bom):
+    '''
+    Returns the CacheLock of the deliverable@bom in cache_dir.
+    '''
+    lockdir = os.path.join(cache_dir, '.locks')
+    if not os.path.isdir(lockdir):
+        try:
+            os.mkdir(lockdir)
+        except OSError:
+            if not os.path.isdir(lockdir):
+                raise
+    return CacheLock(os.path.join(lockdir, '{}.{}.{}.{}'.format(project, ip, deliverable, bom)))
@@ -46,6 +46,8 @@ from socket import gethostname
 import dmx.utillib.washgroup
 import dmx.utillib.utils
 from dmx.utillib.diskutils import DiskUtils
+from dmx.sionlib.cachelock import get_bom_lock
+import dmx.sionlib.symlinkfarm
 
 LOGGER = logging.getLogger(__name__)
 #class PopulateError(Exception): pass
@@ -64,14 +66,22 @@ golden_ws_path = "/nfs/site/disks/fm8_fctiming_2/users/bblanc/workspace/z1557a.s
 class SionDisk(object):
     def __init__(self):
         self.du = DiskUtils()
-        self.largest_disk, self.all_proj_disk = self._get_largest_disk_and_proj_disk_sion2()
-        pass
+        self.all_proj_disk = self._get_proj_disk_sion2()
+        self._largest_disk = None
 
-    def _get_largest_disk_and_proj_disk_sion2(self):
+    @property
+    def largest_disk(self):
+        '''
+        {project: the sion2 disk of the project with the most free space}
+        Looked up on first use, as it needs the disk usage of every disk.
+        '''
+        if self._largest_disk is None:
+            self._largest_disk = self._get_largest_disk_sion2(self.all_proj_disk)
+        return self._largest_disk
+
+    def _get_proj_disk_sion2(self):
         sion2disks = glob.glob('/p/psg/sion2/*/*')
         all_proj_disk = {}
-        largest_disk = {}
-        free_space = {}
 
         for ea_d in sion2disks:
             match = re.search("(\S+)_sion2_(\d+)", ea_d)
@@ -87,25 +97,33 @@ class SionDisk(object):
                     all_proj_disk[proj] = [ea_d]
                 else:
                     all_proj_disk[proj].append(ea_d)
-            try:
-                if sys.version_info[0] < 3:
-                    sys.path.insert(0, "/p/psg/ctools/python/2.7.13/linux64/suse/lib/python2.7/site-packages/")
-                import psutil
-                hdd = psutil.disk_usage(ea_d)
-                if sys.version_info[0] < 3:
-                    sys.path.pop(0)
 
-                if not largest_disk.get(proj):
-                    largest_disk[proj] = ea_d
-                    free_space[proj] = hdd.free
-                elif int(hdd.free) > int(free_space.get(proj)):
-                    largest_disk[proj] = ea_d
-                    free_space[proj] = hdd.free
-            except OSError:
-                LOGGER.warning('No permission to view {}'.format(ea_d))
+        return all_proj_disk
 
+    def _get_largest_disk_sion2(self, all_proj_disk):
+        largest_disk = {}
+        free_space = {}
+
+        if sys.version_info[0] < 3:
+            sys.path.insert(0, "/p/psg/ctools/python/2.7.13/linux64/suse/lib/python2.7/site-packages/")
+        import psutil
+        if sys.version_info[0] < 3:
+            sys.path.pop(0)
 
-        return largest_disk, all_proj_disk
+        for proj, proj_disks in list(all_proj_disk.items()):
+            for ea_d in proj_disks:
+                try:
+                    hdd = psutil.disk_usage(ea_d)
+                    if not largest_disk.get(proj):
+                        largest_disk[proj] = ea_d
+                        free_space[proj] = hdd.free
+                    elif int(hdd.free) > int(free_space.get(proj)):
+                        largest_disk[proj] = ea_d
+                        free_space[proj] = hdd.free
+                except OSError:
+                    LOGGER.warning('No permission to view {}'.format(ea_d))
+
+        return largest_disk
 
 
     def _get_largest_disk_and_proj_disk(self):
@@ -142,6 +160,46 @@ class SionDisk(object):
         LOGGER.debug("Can't find cache for {}, or path might be inaccessible.\nAvailable caches: {}".format([proj, ip, deliverable, bom], self.all_proj_disk.values()))
         return False
 
+    def get_pvcds_in_sion_disk(self, pvcds):
+        '''
+        Bulk is_pvcd_in_sion_disk() for a whole (flattened) bom.
+
+        :param pvcds: (project, ip, deliverable, bom) tuples.
+        :type pvcds: iterable
+        :return: {(project, ip, deliverable, bom): cache path, or False if it is not cached}
+
+        Every sion disk, <disk>/<ip> and <disk>/<ip>/<deliverable> directory is listed at
+        most once per call, instead of stat'ing <disk>/<ip>/<deliverable>/<bom> on every
+        disk for every deliverable. The listings are not kept after the call, as the cache
+        keeps getting populated.
+        '''
+        listings = {}
+        def listdir(path):
+            if path not in listings:
+                try:
+                    listings[path] = frozenset(os.listdir(path))
+                except OSError:
+                    listings[path] = frozenset()
+            return listings[path]
+
+        all_disks = [proj_disk for proj_disks in list(self.all_proj_disk.values()) for proj_disk in proj_disks]
+        result = {}
+        for pvcd in pvcds:
+            if pvcd in result:
+                continue
+            proj, ip, deliverable, bom = pvcd
+            result[pvcd] = False
+            for proj_disk in all_disks:
+                ipdir = '{}/{}'.format(proj_disk, ip)
+                deliverabledir = '{}/{}'.format(ipdir, deliverable)
+                if ip in listdir(proj_disk) and deliverable in listdir(ipdir) and bom in listdir(deliverabledir):
+                    fmt = '{}/{}'.format(deliverabledir, bom)
+                    if os.access(fmt, os.R_OK):
+                        result[pvcd] = fmt
+                        break
+        LOGGER.debug('Found {} of {} deliverables in cache, with {} directory listings'.format(len([x for x in result.values() if x]), len(result), len(listings)))
+        return result
+
 
 class CacheResults(object):
     def __init__(self, deferred_boms = None, mutable_boms = None, immutable_boms = None, synced_boms = None, failed_boms = None, boms_for_print = '', synced_boms_for_print = ''):
@@ -487,13 +545,16 @@ def get_simple_boms(project, ip, bom, deliverable=None):
 
 
 def link_files(src_path, sl_path, broken_link):
-    # after link we need to find .icmconfig file and remove them, else there will be conflict
-    # need to optimize this part, not sure if it is a FC hier, this find command might take time.
-    cmd = 'cp -sfLr {0}/* {1};  find {1} -name .icmconfig -exec rm -rf {{}} \;'.format(src_path, sl_path)
-    #LOGGER.info(cmd)
-    exitcode, stdout, stderr = run_command(cmd)
-    #if exitcode:
-    #    print_errors(cmd, exitcode, stdout, stderr)
+    # .icmconfig files are not linked, else there will be conflict
+    if dmx.sionlib.symlinkfarm.scandir is None:
+        cmd = 'cp -sfLr {0}/* {1};  find {1} -name .icmconfig -exec rm -rf {{}} \\;'.format(src_path, sl_path)
+        exitcode, stdout, stderr = run_command(cmd)
+        return broken_link
+    stats = dmx.sionlib.symlinkfarm.link_tree(src_path, sl_path)
+    LOGGER.debug('Linked {} files ({} already linked) from {} in {}'.format(stats.linked, stats.unchanged, src_path, sl_path))
+    if stats.errors:
+        LOGGER.debug('{} errors while linking {}: {}'.format(len(stats.errors), sl_path, stats.errors[:10]))
+    broken_link.extend(stats.broken)
     return broken_link
 
 def link_files2(src_path, sl_path, broken_link):
@@ -844,6 +905,9 @@ def process_boms(deliverable_boms, cache_dir, user, n_jobs = None):
         n_jobs = auto_get_n_jobs_for_parallelism()
         #n_jobs = 1
     results = CacheResults()
+    if cache_dir is not None:
+        # process_bom() does not chdir (so that boms can be populated in parallel threads)
+        cache_dir = os.path.abspath(cache_dir)
     try:
         # Failsafe to make sure EcoSphere does not error out
         os.chdir("/nfs/site/disks/fln_sion_1/cache")
@@ -851,11 +915,47 @@ def process_boms(deliverable_boms, cache_dir, user, n_jobs = None):
         LOGGER.info("Could not chdir to base cache")
     #reference_dict = generate_project_family_reference()
 
+    # The same deliverable@bom must not be populated twice
+    unique_boms = []
+    seen = set()
+    for bom in deliverable_boms:
+        key = (bom['project'], bom['variant'], bom['libtype'], bom['config'])
+        if key not in seen:
+            seen.add(key)
+            unique_boms.append(bom)
+
     sd = SionDisk()
-    Parallel(n_jobs=n_jobs, backend="threading")(delayed(process_bom)(bom, results, user, cache_dir, sd=sd) for bom in deliverable_boms)
+    Parallel(n_jobs=n_jobs, backend="threading")(delayed(process_bom)(bom, results, user, cache_dir, sd=sd) for bom in unique_boms)
+
+    # Wait for the boms that are being populated by other processes
+    deferred_boms = results.deferred_boms
+    results.deferred_boms = []
+    Parallel(n_jobs=n_jobs, backend="threading")(delayed(wait_for_bom)(bom, results, user, cache_dir, sd=sd) for bom in deferred_boms)
     return results
 
 
+def wait_for_bom(deliverable_bom, results, user, cache_dir=None, sd=None):
+    '''
+    Waits until the other process that populates deliverable_bom is done (by blocking on its
+    lock, not by polling), and only populates it if that process failed to.
+    '''
+    project = deliverable_bom['project']
+    ip = deliverable_bom['variant']
+    deliverable = deliverable_bom['libtype']
+    bom = deliverable_bom['config']
+    bom_cache_dir = cache_dir if cache_dir is not None else sd.largest_disk.get(project)
+    lock = get_bom_lock(bom_cache_dir, project, ip, deliverable, bom)
+
+    while True:
+        LOGGER.info("Waiting for %s/%s:%s@%s to be populated by another process (%s) ..." % (project, ip, deliverable, bom, lock.lockfile))
+        lock.wait()
+        bom_results = CacheResults()
+        process_bom(deliverable_bom, bom_results, user, cache_dir, sd=sd)
+        if not bom_results.deferred_boms:
+            results.append(bom_results)
+            return
+
+
 def pre_process_boms(deliverable_boms, cache_dir, user, variants_libtypes_specs = None, n_jobs = None):
     if n_jobs is None:
         n_jobs = auto_get_n_jobs_for_parallelism()
@@ -940,10 +1040,6 @@ def process_bom(deliverable_bom, results, user, cache_dir=None, full_check=True,
     if cache_dir is None:
         cache_dir = sd.largest_disk.get(project)
         LOGGER.info("Checking %s ..." % cache_dir)
-    try:
-        os.chdir(cache_dir)
-    except:
-        LOGGER.error("Could not chdir to cache_dir %s" % cache_dir)
 
     if is_mutable(bom):
         # Log and skip mutable deliverable boms
@@ -970,26 +1066,19 @@ def process_bom(deliverable_bom, results, user, cache_dir=None, full_check=True,
         populate_to_cache = True
         if populate_to_cache:
             # This deliverable@bom is not yet populated to cache; Populate ...
-            arc_id = os.environ.get('ARC_JOB_ID')
-            lockdir = "%s/.locks" % cache_dir
-            try:
-                if not os.path.exists(lockdir):
-                    os.mkdir(lockdir)
-            except:
-                LOGGER.error("{} already exists.".format(lockdir))
-
-            lockfile = "%s/%s.%s.%s.%s" % (lockdir, project, ip, deliverable, bom)
+            lock = get_bom_lock(cache_dir, project, ip, deliverable, bom)
             # Check is this deliverable@bom is locked by another populate process
-            if os.path.exists(lockfile):
-                LOGGER.info("%s/%s:%s@%s is being populated at the moment (%s). Adding to deferred queue ..." % (project, ip, deliverable, bom, lockfile))
+            if not lock.acquire():
+                LOGGER.info("%s/%s:%s@%s is being populated at the moment (%s). Adding to deferred queue ..." % (project, ip, deliverable, bom, lock.lockfile))
                 # Append deliverable@bom to deferred queue
                 results.deferred_boms.append(deliverable_bom)
+            elif os.path.isdir(target_dir):
+                # The cached directory is only renamed into place once it is completely populated,
+                # so it has been populated by another process since this bom was pre-processed.
+                lock.release()
+                LOGGER.info("%s/%s:%s@%s has been populated in SION cache by another process." % (project, ip, deliverable, bom))
+                results.boms_for_print+="%s/%s:%s@%s\n"  % (project, ip, deliverable, bom)
             else:
-                # Review ordering below
-                with open(lockfile, 'a') as f:
-                    f.write(arc_id)
-
-                #open(lockfile, 'a').close()
                 LOGGER.info("Locking %s/%s:%s@%s ..." % (project,ip,deliverable,bom))
                 # Clean up the deliverable@bom ws directory
                 if os.path.exists(target_dir):
@@ -1019,11 +1108,7 @@ def process_bom(deliverable_bom, results, user, cache_dir=None, full_check=True,
                         print_errors(cmd, exitcode, stdout, stderr)
     
                     # Remove the lock file for successfully populated deliverable@bom
-                    if os.path.exists(lockfile):
-                        try:
-                            os.remove(lockfile)
-                        except:
-                            LOGGER.error("Could not remove lockfile %s for successful population to cache" % lockfile)
+                    lock.release()
     
                     # Record deliverable@bom dir size in cache
                     storage_path = "%s/.storage" % cache_dir
@@ -1062,11 +1147,7 @@ def process_bom(deliverable_bom, results, user, cache_dir=None, full_check=True,
                     LOGGER.error(e)
                     LOGGER.error("%s/%s:%s@%s population FAILED. Adding to failed boms list ..." % (project, ip, deliverable, bom))
                     # Remove the lock file if deliverable@bom population fails
-                    if os.path.exists(lockfile):
-                        try:
-                            os.remove(lockfile)
-                        except:
-                            LOGGER.error("Could not remove lockfile %s for failed population to cache" % lockfile)
+                    lock.release()
                     # Clean up the temp deliverable@bom ws directory
                     if os.path.exists(temp_directory):
                         try:
@@ -1095,6 +1176,9 @@ def process_bom(deliverable_bom, results, user, cache_dir=None, full_check=True,
                             LOGGER.error("Could not clean up %s for failed population to cache" % temp_directory)
                             pass
                     '''
+                finally:
+                    # Never leave the lock behind, whatever went wrong
+                    lock.release()
                #try: 
                 new_ws.delete()
                 cli = ICManageCLI()
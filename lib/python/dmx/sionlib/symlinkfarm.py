@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+'''
+Description: builds the symlink farm of a cached deliverable@bom in a workspace
+
+Does what `cp -sfLr <src>/* <dst>; find <dst> -name .icmconfig -exec rm -rf {} \\;` did:-
+    - Every directory of src (including the ones src symlinks to) is created as a real
+      directory in dst.
+    - Every file of src gets a symlink in dst that points to its path in src.
+    - The hidden entries of the top level of src (.sion, .icminfo, ...) are skipped, like the src/* glob did.
+    - .icmconfig is left out everywhere.
+but in a single os.scandir() pass over src, without spawning a process:-
+    - .icmconfig is filtered while walking, instead of with a second walk of dst.
+    - Links that already point to the right file, and directories that already are a
+      symlink to the right directory, are left alone, so relinking a workspace only
+      touches what is missing or wrong.
+    - The top level directories of src are linked in parallel, by a bounded thread pool.
+
+Links to files that do not exist (broken symlinks in src) are not created, and are
+returned to the caller, as cp could not create them either.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+import os
+import errno
+import logging
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+LOGGER = logging.getLogger(__name__)
+
+EXCLUDE = frozenset(['.icmconfig'])
+DEFAULT_JOBS = 4
+
+class SymlinkFarmError(Exception): pass
+
+class LinkStats(object):
+    '''
+    What a SymlinkFarm did.
+    '''
+    def __init__(self):
+        self.linked = 0
+        self.unchanged = 0
+        self.dirs = 0
+        self.broken = []
+        self.errors = []
+
+    @property
+    def files(self):
+        return self.linked + self.unchanged
+
+    def merge(self, other):
+        self.linked += other.linked
+        self.unchanged += other.unchanged
+        self.dirs += other.dirs
+        self.broken.extend(other.broken)
+        self.errors.extend(other.errors)
+
+
+class SymlinkFarm(object):
+    '''
+    Links every file of src_path into sl_path.
+    '''
+
+    def __init__(self, src_path, sl_path, exclude=EXCLUDE, n_jobs=DEFAULT_JOBS):
+        '''
+        :param src_path: The directory to link to, eg: the deliverable@bom in the cache.
+        :type src_path: str
+        :param sl_path: The directory to create the links in, eg: the deliverable in the workspace.
+        :type sl_path: str
+        :param exclude: Names of the files and directories that are not linked.
+        :type exclude: frozenset
+        :param n_jobs: The maximum number of top level directories that are linked at the same time.
+        :type n_jobs: int
+        '''
+        if scandir is None:
+            raise SymlinkFarmError('os.scandir (or the scandir module) is required.')
+        self.src_path = src_path
+        self.sl_path = sl_path
+        self.exclude = exclude
+        self.n_jobs = n_jobs
+
+    def build(self):
+        '''
+        Creates the links, and returns a LinkStats.
+        '''
+        stats = LinkStats()
+        if not os.path.isdir(self.sl_path):
+            os.makedirs(self.sl_path)
+        subdirs = self._link_dir(self.src_path, self.sl_path, self._get_existing(self.sl_path), stats, toplevel=True)
+        if len(subdirs) > 1 and self.n_jobs > 1:
+            pool = ThreadPool(min(self.n_jobs, len(subdirs)))
+            try:
+                for substats in pool.map(self._link_tree, subdirs):
+                    stats.merge(substats)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for subdir in subdirs:
+                stats.merge(self._link_tree(subdir))
+        return stats
+
+    def _link_tree(self, subdir):
+        '''
+        Links the directory tree of subdir = (src, dst, existing), depth first.
+        '''
+        stats = LinkStats()
+        stack = [subdir]
+        while stack:
+            stack.extend(self._link_dir(*stack.pop(), stats=stats))
+        return stats
+
+    def _link_dir(self, src, dst, existing, stats, toplevel=False):
+        '''
+        Links the files of src into dst, and creates its subdirectories.
+        existing is {name: DirEntry} of what is in dst already.
+        Returns the (src, dst, existing) of the subdirectories, to be linked by the caller.
+        '''
+        subdirs = []
+        try:
+            entries = list(scandir(src))
+        except OSError as e:
+            self._error(stats, 'Cannot list {}: {}'.format(src, e))
+            return subdirs
+        for name in self.exclude:
+            if name in existing:
+                self._remove(os.path.join(dst, name), existing[name], stats)
+        for entry in entries:
+            name = entry.name
+            if name in self.exclude or (toplevel and name.startswith('.')):
+                continue
+            srcname = os.path.join(src, name)
+            dstname = os.path.join(dst, name)
+            old = existing.get(name)
+            try:
+                if entry.is_dir():
+                    if entry.is_symlink() and self._is_loop(src, srcname):
+                        LOGGER.warning('Not following {}, it links to a directory above it.'.format(srcname))
+                        continue
+                    subdir = self._make_dir(srcname, dstname, old, stats)
+                    if subdir is not None:
+                        subdirs.append(subdir)
+                elif entry.is_file():
+                    self._make_link(srcname, dstname, old, stats)
+                elif entry.is_symlink():
+                    stats.broken.append(dstname)
+            except OSError as e:
+                self._error(stats, 'Could not link {} to {}: {}'.format(dstname, srcname, e))
+        return subdirs
+
+    def _make_dir(self, srcname, dstname, old, stats):
+        if old is not None:
+            if old.is_dir(follow_symlinks=False):
+                return (srcname, dstname, self._get_existing(dstname))
+            if old.is_symlink() and os.readlink(dstname) == srcname:
+                return None
+            self._remove(dstname, old, stats)
+        os.mkdir(dstname)
+        stats.dirs += 1
+        return (srcname, dstname, {})
+
+    def _make_link(self, srcname, dstname, old, stats):
+        if old is not None:
+            if old.is_symlink() and os.readlink(dstname) == srcname:
+                stats.unchanged += 1
+                return
+            if old.is_dir(follow_symlinks=False):
+                raise OSError(errno.EISDIR, 'A directory is in the way')
+            os.unlink(dstname)
+        os.symlink(srcname, dstname)
+        stats.linked += 1
+
+    def _remove(self, path, entry, stats):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                for sub in list(scandir(path)):
+                    self._remove(os.path.join(path, sub.name), sub, stats)
+                os.rmdir(path)
+            else:
+                os.unlink(path)
+        except OSError as e:
+            self._error(stats, 'Could not remove {}: {}'.format(path, e))
+
+    def _get_existing(self, path):
+        try:
+            return dict((entry.name, entry) for entry in scandir(path))
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return {}
+            raise
+
+    def _is_loop(self, src, srcname):
+        '''
+        Returns True if the directory symlink srcname points to src, or to a directory above it.
+        '''
+        target = os.path.realpath(srcname)
+        realsrc = os.path.realpath(src)
+        return realsrc == target or realsrc.startswith(target.rstrip(os.sep) + os.sep)
+
+    def _error(self, stats, msg):
+        LOGGER.debug(msg)
+        stats.errors.append(msg)
+
+
+def link_tree(src_path, sl_path, n_jobs=DEFAULT_JOBS):
+    '''
+    Links every file of src_path into sl_path, and returns a LinkStats.
+    '''
+    return SymlinkFarm(src_path, sl_path, n_jobs=n_jobs).build()
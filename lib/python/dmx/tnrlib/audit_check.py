@@ -80,6 +80,9 @@ import dmx.utillib.cache
 #import dmx.utillib.arcutils
 import dmx.abnrlib.goldenarc_db
 import dmx.utillib.utils
+import dmx.utillib.multiproc
+import dmx.tnrlib.checksum_cache
+import dmx.tnrlib.md5filter
 
 af_logger = getLogger(__name__)
 
@@ -1519,15 +1522,26 @@ class AuditFile(object):
                         self.logger.debug(message)
 
 
-        pool_results = {}
-        pool = multiprocessing.Pool(processes=10, maxtasksperchild=1)
-        for (checkfile, filter, rcs_disable, required_sum, audit_revision) in files_to_get_checksum:
-            pool_results[checkfile] = pool.apply_async(get_checksum, args=(checkfile, filter, rcs_disable,))
-        pool.close()
-        pool.join()
+        checksums = {}
+        taskpool = dmx.utillib.multiproc.get_current_taskpool()
+        if taskpool is not None:
+            ### We are run by TestRunner's TaskPool: hand the checksums to that same pool,
+            ### instead of creating yet another pool per audit file.
+            args = [(checkfile, filter, rcs_disable, self.ws_root) for (checkfile, filter, rcs_disable, required_sum, audit_revision) in files_to_get_checksum]
+            for arg, sum in zip(args, taskpool.map(get_checksum, args, chunksize=8)):
+                checksums[arg[0]] = sum
+        else:
+            pool_results = {}
+            pool = multiprocessing.Pool(processes=10, maxtasksperchild=1)
+            for (checkfile, filter, rcs_disable, required_sum, audit_revision) in files_to_get_checksum:
+                pool_results[checkfile] = pool.apply_async(get_checksum, args=(checkfile, filter, rcs_disable, self.ws_root))
+            pool.close()
+            pool.join()
+            for checkfile in pool_results:
+                checksums[checkfile] = pool_results[checkfile].get()
 
         for (checkfile, filter, rcs_disable, required_sum, audit_revision) in files_to_get_checksum:
-            sum = pool_results[checkfile].get()
+            sum = checksums[checkfile]
             if sum == -1:
                 message = "FAILED validation of %s: checksum for %s failed: can not access file" % (self.audit_file, checkfile)
                 results.append(self.make_test_failure(message))
@@ -1697,35 +1711,46 @@ def md5sum(filename, blocksize=65536):
 
 
 def md5sum_with_filtering(filename, remove_regexp, blocksize=65536):
-    regexp = compile(remove_regexp)
-    hash = md5()
-
-    ### https://stackoverflow.com/a/36490019/335181
-    ### https://jira.devtools.intel.com/browse/PSGDMX-3582
-    with open(filename, 'r', newline='') as f:
-        for line in f: 
-            if not regexp.search(line):
-                if sys.version_info[0] > 2:
-                    hash.update(line.encode())
-                else:
-                    hash.update(line)
-    return hash.hexdigest()
+    ### The RCS_FILTER only matches lines with a '$', so those files are hashed
+    ### straight from an mmap, and the regex is only run on the lines that contain a '$'.
+    return dmx.tnrlib.md5filter.md5sum_with_filtering(filename, remove_regexp)
    
 
-def get_checksum(accessible_filepath, filter, rcs_disable):
+def get_checksum(accessible_filepath, filter, rcs_disable, ws_root=None):
+    '''
+    If ws_root is given, the checksum is looked up in, and stored into, the
+    ChecksumCache of that workspace (see dmx.tnrlib.checksum_cache).
+    The cache never makes the checksum fail: it is skipped if it can not be used.
+    '''
+    cache = None
+    if ws_root:
+        cache = dmx.tnrlib.checksum_cache.get_checksum_cache(ws_root)
     try:
         if rcs_disable and not filter:
-            the_checksum = md5sum(accessible_filepath)
-        else:
-            if filter:
-                if rcs_disable:
-                    md5_filter = filter
-                else:
-                    md5_filter = '(?:%s)|(?:%s)' % (filter, RCS_FILTER)
+            md5_filter = None
+        elif filter:
+            if rcs_disable:
+                md5_filter = filter
             else:
-                md5_filter = RCS_FILTER
+                md5_filter = '(?:%s)|(?:%s)' % (filter, RCS_FILTER)
+        else:
+            md5_filter = RCS_FILTER
+
+        key = None
+        if cache:
+            # Stat'ed before hashing, so that a file changed meanwhile is not cached with the new stat
+            key = cache.stat(accessible_filepath, md5_filter)
+            the_checksum = cache.get(accessible_filepath, md5_filter, key)
+            if the_checksum:
+                return the_checksum
 
+        if md5_filter is None:
+            the_checksum = md5sum(accessible_filepath)
+        else:
             the_checksum = md5sum_with_filtering(accessible_filepath, md5_filter)
+
+        if key:
+            cache.set(accessible_filepath, md5_filter, the_checksum, key)
         return the_checksum
     except Exception as e:
         #return e   # for debugging
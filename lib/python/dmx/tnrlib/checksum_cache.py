@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: Persistent cache of the checksums calculated by audit validation.
+
+The same file is usually required by many audit logs, and by every
+'dmx workspace check' and 'dmx release' that is run on the workspace.
+The checksums are stored in an sqlite database, keyed on the realpath of the file and
+the filter regex that was applied, and they are only reused if the inode, size and
+mtime of the file are still the same. The file is stat'ed before it is hashed, and the
+checksum is only stored if the file has not changed while it was hashed.
+
+    - Workspace files are cached in <wsroot>/.dmx/checksum_cache.db
+    - Files that resolve into the (immutable) SION cache or NAA areas are cached in
+      $DMX_SHARED_CHECKSUM_CACHE/<user>.db, so all the workspaces of a user share them.
+      If it is not set, they go to the workspace database too.
+
+Set $DMX_DISABLE_CHECKSUM_CACHE to turn the cache off.
+
+The cache never decides a checksum: if it can not be set up or used (eg: the NAA tools
+are not usable on this host), the checksums are just calculated.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+
+import os
+import logging
+import sqlite3
+from getpass import getuser
+
+import dmx.utillib.naa
+import dmx.utillib.cache
+
+LOGGER = logging.getLogger(__name__)
+
+WORKSPACE_CACHE_FILE = os.path.join('.dmx', 'checksum_cache.db')
+
+class ChecksumCache(object):
+    '''
+    Checksums of files, keyed on (realpath, inode, size, mtime_ns, filter).
+    All the errors are logged and ignored, as the cache is only an optimization.
+    '''
+
+    def __init__(self, dbfile, shared_dbfile=None):
+        '''
+        :param dbfile: The sqlite file of the cache.
+        :type dbfile: str
+        :param shared_dbfile: The sqlite file used for files in the SION cache/NAA areas. Defaults to dbfile.
+        :type shared_dbfile: str
+        '''
+        self.dbfile = dbfile
+        self.shared_dbfile = shared_dbfile or dbfile
+        self._connections = {}
+        self._pid = None
+        # The Cache and NAA, created on first use by _is_shared_path(), as they need the NAA/cache tools
+        self._areas = None
+
+    @classmethod
+    def for_workspace(cls, wsroot):
+        '''
+        Returns the ChecksumCache of the workspace, or None if the cache is disabled.
+        '''
+        if os.getenv('DMX_DISABLE_CHECKSUM_CACHE'):
+            return None
+        shared_dbfile = None
+        if os.getenv('DMX_SHARED_CHECKSUM_CACHE'):
+            shared_dbfile = os.path.join(os.getenv('DMX_SHARED_CHECKSUM_CACHE'), '{}.db'.format(getuser()))
+        return cls(os.path.join(wsroot, WORKSPACE_CACHE_FILE), shared_dbfile)
+
+    def _get_connection(self, dbfile):
+        # sqlite connections must not be shared with forked processes
+        if self._pid != os.getpid():
+            self._connections = {}
+            self._pid = os.getpid()
+        if dbfile not in self._connections:
+            dirname = os.path.dirname(dbfile)
+            if dirname and not os.path.isdir(dirname):
+                try:
+                    os.makedirs(dirname)
+                except OSError:
+                    if not os.path.isdir(dirname):
+                        raise
+            conn = sqlite3.connect(dbfile, timeout=60)
+            conn.execute('CREATE TABLE IF NOT EXISTS checksums (path TEXT, filter TEXT, inode INTEGER, size INTEGER, mtime_ns INTEGER, checksum TEXT, PRIMARY KEY (path, filter))')
+            conn.commit()
+            self._connections[dbfile] = conn
+        return self._connections[dbfile]
+
+    def _is_shared_path(self, realpath):
+        '''
+        Returns True if realpath is in the (immutable) SION cache or NAA areas.
+        If the NAA/cache tools are not usable here, nothing is a shared path.
+        '''
+        if self._areas is None:
+            try:
+                self._areas = (dmx.utillib.cache.Cache(), dmx.utillib.naa.NAA())
+            except Exception as e:
+                LOGGER.debug("Not using the shared checksum cache: {}".format(e))
+                self._areas = ()
+        if not self._areas:
+            return False
+        cache, naa = self._areas
+        return cache.is_path_cache_path(realpath) or naa.is_path_naa_path(realpath)
+
+    def _get_key(self, filepath, md5_filter):
+        '''
+        Returns (dbfile, realpath, filter, inode, size, mtime_ns) of filepath.
+        '''
+        realpath = os.path.realpath(filepath)
+        st = os.stat(realpath)
+        mtime_ns = getattr(st, 'st_mtime_ns', None)
+        if mtime_ns is None:
+            mtime_ns = int(st.st_mtime * 1000000000)
+        if self.shared_dbfile != self.dbfile and self._is_shared_path(realpath):
+            dbfile = self.shared_dbfile
+        else:
+            dbfile = self.dbfile
+        return (dbfile, realpath, md5_filter or '', st.st_ino, st.st_size, mtime_ns)
+
+    def stat(self, filepath, md5_filter):
+        '''
+        Returns the key of filepath as it is now (see _get_key), or None if it can not be stat'ed.
+        Pass it to get() and set(), to make sure the checksum stored is the one of this version of the file.
+        '''
+        try:
+            return self._get_key(filepath, md5_filter)
+        except Exception as e:
+            LOGGER.debug("Failed stat'ing {} for the checksum cache: {}".format(filepath, e))
+            return None
+
+    def get(self, filepath, md5_filter, key=None):
+        '''
+        Returns the cached checksum of filepath (filtered with the md5_filter regex), or None.
+        key is the one returned by stat(). If not given, filepath is stat'ed.
+        '''
+        try:
+            dbfile, realpath, md5_filter, inode, size, mtime_ns = key or self._get_key(filepath, md5_filter)
+            row = self._get_connection(dbfile).execute(
+                'SELECT inode, size, mtime_ns, checksum FROM checksums WHERE path=? AND filter=?', (realpath, md5_filter)).fetchone()
+        except Exception as e:
+            LOGGER.debug("Failed reading checksum cache for {}: {}".format(filepath, e))
+            return None
+        if row and tuple(row[:3]) == (inode, size, mtime_ns):
+            return row[3]
+        return None
+
+    def set(self, filepath, md5_filter, checksum, key=None):
+        '''
+        Stores the checksum of filepath (filtered with the md5_filter regex).
+        key is the one returned by stat() before the checksum was calculated: the checksum is
+        not stored if the file has changed since then.
+        '''
+        try:
+            current = self._get_key(filepath, md5_filter)
+            if key is not None and tuple(key) != current:
+                LOGGER.debug("Not caching the checksum of {}, which changed while it was hashed".format(filepath))
+                return False
+            dbfile, realpath, md5_filter, inode, size, mtime_ns = current
+            conn = self._get_connection(dbfile)
+            conn.execute('INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?)', (realpath, md5_filter, inode, size, mtime_ns, checksum))
+            conn.commit()
+        except Exception as e:
+            LOGGER.debug("Failed writing checksum cache for {}: {}".format(filepath, e))
+            return False
+        return True
+
+
+_CHECKSUM_CACHES = {}
+def get_checksum_cache(wsroot):
+    '''
+    Returns the (per process) ChecksumCache of the workspace, or None if the cache is disabled,
+    or can not be created.
+    '''
+    if wsroot not in _CHECKSUM_CACHES:
+        try:
+            _CHECKSUM_CACHES[wsroot] = ChecksumCache.for_workspace(wsroot)
+        except Exception as e:
+            LOGGER.debug("Not using a checksum cache for {}: {}".format(wsroot, e))
+            _CHECKSUM_CACHES[wsroot] = None
+    return _CHECKSUM_CACHES[wsroot]
@@ -5,6 +5,7 @@
 A simple wrapper around Popen to run commands and get their output.
 """
 from subprocess import Popen, PIPE
+from dmx.utillib.tracer import command_span
 
 def execute(cmd, shell=False):
     """
@@ -12,7 +13,9 @@ def execute(cmd, shell=False):
     """
     if shell:
         cmd = ' '.join(cmd)
-    p = Popen(cmd, stdout=PIPE, stderr=PIPE, shell=shell)
-    (o,e) = p.communicate()
+    with command_span(cmd) as span:
+        p = Popen(cmd, stdout=PIPE, stderr=PIPE, shell=shell)
+        (o,e) = p.communicate()
+        span.args['exitcode'] = p.returncode
     return (o.splitlines(), e.splitlines())
 
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: md5 checksums of text files with the lines matching a regex left out.
+
+md5sum_by_line() is the reference implementation: it reads the file in text mode,
+runs the regex on every line, and hashes the lines that do not match.
+
+For regexes that can only match lines containing a '$' (eg: the RCS keyword filter
+$Id$, $Header$, ...), md5sum_by_dollar_lines() gives the same digest much faster:
+it mmaps the file, hashes the spans between the '$' lines straight from the mapped
+bytes, and only decodes and runs the regex on the lines that contain a '$'.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+
+import os
+import re
+import sys
+import mmap
+import codecs
+import locale
+from hashlib import md5
+
+DECODE_BLOCKSIZE = 16 * 1024 * 1024
+
+def md5sum_with_filtering(filename, remove_regexp):
+    '''
+    Returns the md5 hexdigest of filename, leaving out the lines that match remove_regexp.
+    Picks the fastest implementation that gives the same digest as md5sum_by_line().
+    '''
+    if sys.version_info[0] > 2 and is_dollar_anchored(remove_regexp) and is_utf8_locale():
+        return md5sum_by_dollar_lines(filename, remove_regexp)
+    return md5sum_by_line(filename, remove_regexp)
+
+def is_dollar_anchored(regexp):
+    '''
+    Returns True if every alternative of the regex starts with a literal '$' that is not
+    optional (eg: '\\$?Id'), so it can only match lines that contain a '$'.
+
+    >>> is_dollar_anchored(r'\\$Id.*\\$|\\$Header.*\\$')
+    True
+    >>> is_dollar_anchored(r'(?:.*bbb.*)|(?:\\$Id.*\\$)')
+    False
+    >>> [is_dollar_anchored(x) for x in (r'\\$?Revision.*', r'\\$*Id.*', r'\\${0,1}Id.*')]
+    [False, False, False]
+    '''
+    if '(' in regexp or '[' in regexp:
+        return False
+    return all(part.startswith('\\$') and part[2:3] not in ('?', '*', '{') for part in regexp.split('|'))
+
+def is_utf8_locale():
+    '''
+    md5sum_by_line() decodes with the locale encoding and re-encodes the lines with utf-8,
+    so the bytes of the file are only hashed unchanged if the locale encoding is utf-8.
+    '''
+    return codecs.lookup(locale.getpreferredencoding(False)).name == 'utf-8'
+
+def md5sum_by_line(filename, remove_regexp):
+    regexp = re.compile(remove_regexp)
+    hash = md5()
+
+    ### https://stackoverflow.com/a/36490019/335181
+    ### https://jira.devtools.intel.com/browse/PSGDMX-3582
+    with open(filename, 'r', newline='') as f:
+        for line in f:
+            if not regexp.search(line):
+                if sys.version_info[0] > 2:
+                    hash.update(line.encode())
+                else:
+                    hash.update(line)
+    return hash.hexdigest()
+
+def md5sum_by_dollar_lines(filename, remove_regexp):
+    '''
+    Same digest as md5sum_by_line(), for a remove_regexp that can only match lines containing a '$'.
+
+    Lines are split the same way as the universal newline mode does ('\\n', '\\r' or '\\r\\n').
+    Like md5sum_by_line(), raises UnicodeDecodeError if the file is not valid utf-8.
+    '''
+    regexp = re.compile(remove_regexp)
+    hash = md5()
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return hash.hexdigest()
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(mm)
+            try:
+                _check_utf8(mm, size)
+                start = 0   ### the first byte that has not been hashed yet
+                pos = mm.find(b'$')
+                while pos != -1:
+                    linestart = mm.rfind(b'\n', 0, pos) + 1
+                    linestart = mm.rfind(b'\r', linestart, pos) + 1 or linestart
+                    lineend = _find_line_end(mm, pos, size)
+                    line = view[linestart:lineend].tobytes().decode('utf-8')
+                    if regexp.search(line):
+                        hash.update(view[start:linestart])
+                        start = lineend
+                    pos = mm.find(b'$', lineend)
+                hash.update(view[start:size])
+            finally:
+                view.release()
+        finally:
+            mm.close()
+    return hash.hexdigest()
+
+def _find_line_end(mm, pos, size):
+    '''
+    Returns the offset right after the line terminator of the line that contains pos.
+    '''
+    nl = mm.find(b'\n', pos)
+    cr = mm.find(b'\r', pos, size if nl == -1 else nl)
+    if cr != -1 and (nl == -1 or cr < nl):
+        if cr + 1 < size and mm[cr + 1:cr + 2] == b'\n':
+            return cr + 2
+        return cr + 1
+    if nl != -1:
+        return nl + 1
+    return size
+
+def _check_utf8(mm, size):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for offset in range(0, size, DECODE_BLOCKSIZE):
+        decoder.decode(mm[offset:offset + DECODE_BLOCKSIZE])
+    decoder.decode(b'', final=True)
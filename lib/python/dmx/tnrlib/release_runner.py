@@ -60,6 +60,7 @@ from dmx.dmlib.ICManageConfiguration import ICManageConfiguration
 import dmx.utillib.intel_dates as intel_dates
 
 from dmx.utillib.utils import run_command, get_class_filepath
+from dmx.utillib.tracer import span, traced, start_tracing, finish_tracing
 from dmx.utillib.version import Version
 from dmx.abnrlib.config_naming_scheme import ConfigNamingScheme
 
@@ -138,6 +139,7 @@ class ReleaseRunner(object):
         self.logger.info("Initialized ReleaseRunner")
 
 
+    @traced()
     def handle_request(self):
         """
         Given a ReleaseRequest instance, run the tests,
@@ -228,7 +230,8 @@ class ReleaseRunner(object):
                     import dmx.utillib.gkutils
                     gk = dmx.utillib.gkutils.GkUtils()
                     rel_config_name = self.get_rel_config_name(request.project, request.variant, request.libtype, request.milestone, request.thread, self.request.label, self.request.views, self.request.skipmscheck, prel=self.request.prel)
-                    retcode, retmsg = gk.run_turnin_from_icm_workspace(self.workspace_path, request.project, request.variant, request.libtype, request.thread, request.milestone, mock=False, tag=rel_config_name)
+                    with span('run_turnin_from_icm_workspace', 'gatekeeper'):
+                        retcode, retmsg = gk.run_turnin_from_icm_workspace(self.workspace_path, request.project, request.variant, request.libtype, request.thread, request.milestone, mock=False, tag=rel_config_name)
                     if retcode:
                         # turnin failed.
                         retmsg += ' (UNWAIVABLE)'
@@ -299,6 +302,7 @@ class ReleaseRunner(object):
         return failures
 
 
+    @traced()
     def create_new_release_log(self):
         release_id = self.request.release_id
         filename = '{}.json'.format(release_id)
@@ -348,6 +352,7 @@ class ReleaseRunner(object):
         return files
 
 
+    @traced()
     def prepare_to_handle_request(self, request):
         self.rerun_config = self.get_snapshot_config_for_abnr_rerun(request.project, request.variant, request.libtype, request.snapshot_config)
         self.ipspec_config = self.get_ipspec_config(request.project, request.variant, request.snapshot_config)
@@ -371,6 +376,7 @@ class ReleaseRunner(object):
             self.logger_file_handler.setFormatter(Formatter('%(asctime)s %(name)-12s %(levelname)-8s %(message)s', '%m-%d %H:%M:%S'))
             self.logger.addHandler(self.logger_file_handler)
 
+    @traced()
     def create_workspace(self):
         """
         Create a brand new IC Manage workspace for the variant (if any)
@@ -402,6 +408,7 @@ class ReleaseRunner(object):
         (stdout, stderr) = execute(['du', '-sk', workspace_path], shell=True)
         return int(stdout[0].split()[0])
 
+    @traced()
     def populate_workspace(self):
         """
         Determines what needs syncing based on the tests to be run. 
@@ -522,6 +529,7 @@ class ReleaseRunner(object):
             self.logger.error(str(e))
 
 
+    @traced()
     def sync_symlink(self, filepath):
         '''
         Assuming:-
@@ -578,6 +586,7 @@ class ReleaseRunner(object):
 
         return types
 
+    @traced()
     def sync(self, path):
         # Added @@ suffix to fix filenames with '@' or '#'. Fogbugz 336479
         cmd = ['xlp4', 'sync', '%s/%s@@' % (self.workspace_path, path)]
@@ -601,6 +610,7 @@ class ReleaseRunner(object):
             info = self.tnr_dashboard.required_fields()
         return dmx.tnrlib.test_runner.TestRunner(project, variant, libtype, configuration, workspace, milestone, thread, self.web_api, info, development_mode=self.request.devmode, views=self.request.views, prel=self.request.prel)
 
+    @traced()
     def run_tests(self):
         """
         Runs the tests, logs results to the dashboard,
@@ -698,6 +708,7 @@ class ReleaseRunner(object):
         """
         return ConfigFactory.create_from_icm(project, variant, config)
 
+    @traced()
     def apply_waivers(self, failures, waivers):
         """
         Looks at the errors and sees if there are any waivers that match.
@@ -749,6 +760,7 @@ class ReleaseRunner(object):
     def all_pass_or_waived(self):
         return self.all_tests_passed_or_waived
 
+    @traced()
     def make_rel_config(self):
         """
         Call this to create a REL configuration from the request snapshot
@@ -1032,6 +1044,8 @@ def parse_cmdline():
     ### http://pg-rdjira:8080/browse/DI-1176
     parser.add_argument('--skipmscheck', required=False, default=None, help='Reason for skipping milestone check. (label SKIPMSCHECK will be attached to the REL config.')
 
+    parser.add_argument('--trace', required=False, default=None, help='Write a Chrome trace (json) timeline of the release phases to this file. Defaults to release_trace.json in $ARC_JOB_STORAGE. Set to \'\' to turn it off.')
+
     args = parser.parse_args()
 
     return args
@@ -1049,8 +1063,19 @@ def main():
 
     (logger, logger_file_handler) = setup_logging()
 
-    rr = ReleaseRunner(args, logger, logfile=None, logger_file_handler=None, arc_job_id=arc_job_id)
-    rr.handle_request()
+    ### Timeline of the phases of the release, see dmx.utillib.tracer
+    trace = args.trace
+    if trace is None and environ.get('ARC_JOB_STORAGE'):
+        trace = os.path.join(environ['ARC_JOB_STORAGE'], 'release_trace.json')
+    if trace:
+        start_tracing(trace)
+
+    try:
+        rr = ReleaseRunner(args, logger, logfile=None, logger_file_handler=None, arc_job_id=arc_job_id)
+        rr.handle_request()
+    finally:
+        if trace:
+            finish_tracing()
 
 
 if __name__ == "__main__":
@@ -308,6 +308,8 @@ class SplunkLog(object):
             js_fields.append('"%s": "%s"' % (k, splunk_data[k]))
         js_obj = ','.join(js_fields)
 
+        # Appended synchronously: SplunkLog is used from multiprocessing children, that
+        # exit without running atexit, so the line must be on disk when we return
         with open(self.datafile, 'a') as splunk_file:
             splunk_file.write('{%s}\n' % js_obj)
 
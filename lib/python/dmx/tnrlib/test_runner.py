@@ -31,6 +31,7 @@ rootdir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file
 sys.path.insert(0, rootdir)
 from dmx.tnrlib.execute import execute
 import dmx.tnrlib.audit_check
+from dmx.utillib.multiproc import TaskPool
 from dmx.tnrlib.test_result import TestFailure, TestResult
 
 from dmx.abnrlib.icm import ICManageCLI
@@ -59,6 +60,13 @@ def get_topcells(workspace_root, variant):
     topcells = icm_ws.getCellNamesForIPName(variant)
     return topcells
 
+### The TestRunner whose audit validation is being run by the TaskPool workers.
+### The workers are forked, so they inherit it without having to pickle it.
+_AUDIT_TESTRUNNER = None
+def _run_audit_task(audit_file, flow, subflow, libtype, topcell, kwargs):
+    _AUDIT_TESTRUNNER.run_audit(audit_file, flow, subflow, libtype, topcell, **kwargs)
+    return audit_file
+
 class TestRunner(object):
     """
     Provides the common elements required by "quick test" 
@@ -72,7 +80,7 @@ class TestRunner(object):
     ReleaseRunner needs to log audit arc resource details
     to support ARC Resource reports on the release dashboard.
     """
-    def __init__(self, project, variant, libtype, configuration, workspace_root, milestone, thread, web_api=None, dashboard_context={}, development_mode=False, splunk_app_name='qa', log_audit_validation_to_splunk=True, views=None, validate_deliverable_existence_check=True, validate_type_check=True, validate_checksum_check=True, validate_result_check=True, validate_goldenarc_check=False, familyobj=None, only_run_flow_subflow_list=None, prel=None):
+    def __init__(self, project, variant, libtype, configuration, workspace_root, milestone, thread, web_api=None, dashboard_context={}, development_mode=False, splunk_app_name='qa', log_audit_validation_to_splunk=True, views=None, validate_deliverable_existence_check=True, validate_type_check=True, validate_checksum_check=True, validate_result_check=True, validate_goldenarc_check=False, familyobj=None, only_run_flow_subflow_list=None, prel=None, jobs=None):
         """
         workspace_root - the absolute path to the root of the IC Manage workspace 
 
@@ -81,6 +89,9 @@ class TestRunner(object):
         dashboard_context - a dict of key/values pairs for Splunk.
             only provded by the gated release runner and ensures the data logged
             by the audit API is tied to the rest of the release data.
+
+        jobs - the number of processes that run the audit validation (audit files
+            and their checksums). Defaults to $TNR_NPROCESS, or the number of cpus.
         """
         self.project = project
         self.variant = variant
@@ -111,6 +122,10 @@ class TestRunner(object):
 
         self.development_mode = development_mode
 
+        if not jobs:
+            jobs = int(os.getenv("TNR_NPROCESS", multiprocessing.cpu_count()))
+        self.jobs = jobs
+
         # List of files referenced by tests; populated before invoking any tests
         self.files_to_sync = []
 
@@ -646,7 +661,7 @@ class TestRunner(object):
         # Run the required audit validation
         all_f_files = []    ### all the audit.*.f files
         all_xml_files = []  ### This includes all the audit.*.xml files within all the audit.*.f files
-        thread_list = []
+        tasks = []
         for (audit_files, flow, subflow, libtype, topcell, is_variant_rel) in all_audit_logs:
 
             if self.only_run_flow_subflow_list and (flow, subflow) not in self.only_run_flow_subflow_list:
@@ -662,56 +677,56 @@ class TestRunner(object):
                         development_mode=self.development_mode, splunk_app_name=self.splunk_app_name, exempted_varlibs=self.exempted_varlibs, thread=self.thread, milestone=self.milestone)
                     audit_api.load(audit_file)
 
-                    #thread_list.append(threading.Thread(target=self.run_audit, args=(audit_file, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':True}))
-                    thread_list.append(multiprocessing.Process(target=self.run_audit, args=(audit_file, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':True}))
-                    thread_list[-1].name = "{}:{}".format(thread_list[-1].name, audit_file)
+                    tasks.append((audit_file, flow, subflow, libtype, topcell, {'results_only':False, 'dont_validate_xml':True}))
                     all_f_files.append(audit_file)
                     for xmlfile in audit_api.audit_filelist:
                         if xmlfile not in all_xml_files:
-                            #thread_list.append(threading.Thread(target=self.run_audit, args=(xmlfile, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
-                            thread_list.append(multiprocessing.Process(target=self.run_audit, args=(xmlfile, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
-                            thread_list[-1].name = "{}:{}".format(thread_list[-1].name, xmlfile)
+                            tasks.append((xmlfile, flow, subflow, libtype, topcell, {'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
                             all_xml_files.append(xmlfile)
                 else:
                     if audit_file not in all_xml_files:
-                        #thread_list.append(threading.Thread(target=self.run_audit, args=(audit_file, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
-                        thread_list.append(multiprocessing.Process(target=self.run_audit, args=(audit_file, flow, subflow, libtype, topcell), kwargs={'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
-                        thread_list[-1].name = "{}:{}".format(thread_list[-1].name, audit_file)
+                        tasks.append((audit_file, flow, subflow, libtype, topcell, {'results_only':False, 'dont_validate_xml':False, 'foreign_checksum_only':is_variant_rel}))
                         all_xml_files.append(audit_file)
 
-        process_limit = int(os.getenv("TNR_NPROCESS", 500))
-        done_list = []
-        running_list = []
-        index = 0
-        while len(done_list) < len(thread_list):
-
-            ### Remove completed process from `running_list
-            ### Add completed process to `done_list
-            for p in running_list:
-                if not p.is_alive():
-                    done_list.append(p)
-                    running_list.remove(p)
-
-            ### submit process to run on the available slots
-            available_slots = process_limit - len(running_list)
-            while index < len(thread_list) and available_slots > 0:
-                t = thread_list[index]
-                logger.debug("process_limit:{}, available_slots:{}".format(process_limit, available_slots))
-                logger.debug("starting process: {}".format(t.name))
-                t.start()
-                running_list.append(t)
-                index += 1
-                available_slots -= 1
-
-            time.sleep(5)
-
-
-        for t in thread_list:
-            logger.debug("joining process: {}".format(t.name))
-            t.join()
-
+        self.run_audit_tasks(tasks)
 
+    def run_audit_tasks(self, tasks):
+        """
+        Runs run_audit() for every (audit_file, flow, subflow, libtype, topcell, kwargs) in tasks.
 
+        All the audit files, and the checksums of the files they reference
+        (see AuditFile.validate_checksum_requirements), are validated by one
+        shared TaskPool of self.jobs processes. Progress is reported as the tasks complete.
+        """
+        if not tasks:
+            return
+        global _AUDIT_TESTRUNNER
+        _AUDIT_TESTRUNNER = self
+        jobs = min(self.jobs, len(tasks))
+        logger.debug("Validating {} audit files with {} processes.".format(len(tasks), jobs))
+
+        start = time.time()
+        done = 0
+        reported = 0
+        pool = TaskPool(jobs).start()
+        try:
+            for task in tasks:
+                pool.submit(_run_audit_task, *task)
+            for taskid, ok, ret in pool.as_completed():
+                done += 1
+                if ok:
+                    logger.debug("Done validating audit file: {}".format(ret))
+                else:
+                    logger.error("Audit validation process failed: {}".format(ret))
+                percent = done * 100 // len(tasks)
+                if percent >= reported + 10 or done == len(tasks):
+                    reported = percent - percent % 10
+                    elapsed = time.time() - start
+                    logger.info("Audit validation: {}/{} files ({}%) in {:.1f}s, {:.1f} files/s".format(
+                        done, len(tasks), percent, elapsed, done / elapsed if elapsed else 0.0))
+        finally:
+            pool.close()
+            _AUDIT_TESTRUNNER = None
 
 
     def run_audit(self, audit_file, flow, subflow, libtype, topcell, results_only, skip_links=False, dont_validate_xml=False, foreign_checksum_only=False):
@@ -35,6 +35,7 @@ rootdir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file
 sys.path.insert(0, rootdir)
 from dmx.tnrlib.execute import execute
 from dmx.tnrlib.splunk_log import SplunkLog
+from dmx.utillib.tracer import traced
 
 
 logger = getLogger(__name__)
@@ -103,6 +104,7 @@ class TNRDashboard(object):
         """
         return {}
 
+    @traced(cat='splunk')
     def write_logfile(self, logfile_fullpath):
         """
         Writes the given logfile using SplunkLog (which makes a copy
@@ -193,6 +195,7 @@ class TNRDashboard(object):
                }
         self.log_new_status(info, result.result_type)
 
+    @traced(cat='splunk')
     def write_passed_and_skipped_tests(self, results):
         """
         Writes given test results (as returned by TestRunner.get_test_results).
@@ -201,6 +204,7 @@ class TNRDashboard(object):
             if result.result_type == 'pass' or result.result_type == 'skip':
                 self.write_a_pass_or_skipped_test(result)
 
+    @traced(cat='splunk')
     def log_new_status(self, given_info, status):
         """
         Writes a new record to Splunk with the given "status" field value.
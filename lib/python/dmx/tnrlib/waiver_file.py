@@ -85,6 +85,139 @@ def reconstruct_line(parts):
     return ','.join(result)
 
 
+class WaiverMatcher(object):
+    """
+    Finds the first waiver (in list order) that matches a variant/flow/subflow/error,
+    without running the regexes of every waiver.
+
+    - Waivers are bucketed by their literal (wildcard-free) variant, flow and subflow.
+      A field with a wildcard goes to the None bucket of that field.
+    - The error regexes of a bucket are combined into one alternation, which tells
+      the first waiver of the bucket whose error matches.
+    - Results are memoized, as the same error is often reported many times.
+
+    The candidates are always checked again with the regexes of the waiver itself,
+    so this gives exactly the same result as looping over all the waivers.
+    """
+    # Python 2 does not allow more than 100 groups in a regex
+    GROUPS_PER_REGEX = 90
+
+    def __init__(self, waivers, accept=None):
+        """
+        waivers is a list of AWaiver (with compiled regexps).
+        accept(waiver, variant, flow, subflow) can veto a matching waiver,
+        in which case the next matching one is looked for.
+        """
+        self.waivers = waivers
+        self.size = len(waivers)
+        self.accept = accept
+        self.buckets = {}
+        self.memo = {}
+        for index, waiver in enumerate(waivers):
+            key = (self._literal(waiver.variant), self._literal(waiver.flow), self._literal(waiver.subflow))
+            self.buckets.setdefault(key, []).append(index)
+        self.combined = {}
+
+    def is_current(self, waivers):
+        """ True if waivers is still the list this matcher was built from """
+        return waivers is self.waivers and len(waivers) == self.size
+
+    @staticmethod
+    def _literal(regex):
+        """
+        Returns the lowercased string matched by a wildcard-free regex from to_regex(), else None.
+        """
+        pattern = regex.pattern
+        if '.*' in pattern:
+            return None
+        literal = re.sub(r'\\(.)', r'\1', pattern[:-1])
+        try:
+            literal.encode('ascii')
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            return None
+        return literal.lower()
+
+    @staticmethod
+    def _key(value):
+        # '$' also matches right before a trailing newline
+        if value.endswith('\n'):
+            value = value[:-1]
+        return value.lower()
+
+    def _get_combined(self, key):
+        """
+        Returns a list of (compiled alternation, [waiver indices]) for the bucket.
+        """
+        if key not in self.combined:
+            indices = self.buckets[key]
+            combined = []
+            for i in range(0, len(indices), self.GROUPS_PER_REGEX):
+                chunk = indices[i:i + self.GROUPS_PER_REGEX]
+                pattern = '|'.join('({})'.format(self.waivers[x].error.pattern) for x in chunk)
+                try:
+                    combined.append((re.compile(pattern, re.IGNORECASE), chunk))
+                except (re.error, AssertionError, OverflowError):
+                    combined.append((None, chunk))
+            self.combined[key] = combined
+        return self.combined[key]
+
+    def _first_error_match(self, key, error, start):
+        """
+        Returns the index of the first waiver of the bucket, from position start in the
+        bucket, whose error regex matches error. Returns None if there is none.
+        """
+        for regex, chunk in self._get_combined(key):
+            if chunk[-1] < start:
+                continue
+            if regex is not None and start <= chunk[0]:
+                match = regex.match(error)
+                if match is None:
+                    continue
+                return chunk[match.lastindex - 1]
+            for index in chunk:
+                if index >= start and self.waivers[index].error.match(error):
+                    return index
+        return None
+
+    def find(self, variant, flow, subflow, error):
+        """
+        Returns the first waiver matching the given parameters (and accepted), or None.
+        """
+        memokey = (variant, flow, subflow, error)
+        if memokey in self.memo:
+            return self.memo[memokey]
+
+        keys = [(v, f, s)
+            for v in (self._key(variant), None)
+            for f in (self._key(flow), None)
+            for s in (self._key(subflow), None)]
+        # Next candidate (by waiver index) in every bucket that exists
+        candidates = {}
+        for key in keys:
+            if key in self.buckets:
+                index = self._first_error_match(key, error, 0)
+                if index is not None:
+                    candidates[key] = index
+
+        found = None
+        while candidates:
+            key = min(candidates, key=candidates.get)
+            index = candidates[key]
+            waiver = self.waivers[index]
+            if waiver.variant.match(variant) and waiver.flow.match(flow) and waiver.subflow.match(subflow) and \
+                (self.accept is None or self.accept(waiver, variant, flow, subflow)):
+                found = waiver
+                break
+            index = self._first_error_match(key, error, index + 1)
+            if index is None:
+                del candidates[key]
+            else:
+                candidates[key] = index
+
+        self.memo[memokey] = found
+        return found
+
+
 class WaiverFile(object):
     """
     This class is used to represent a set of waivers which may include wildcards and
@@ -94,6 +227,7 @@ class WaiverFile(object):
         self.waivers = []
         self.hsdes_waivers = []
         self.rawdata = []
+        self._matchers = {}
 
     def add(self, waiver):
         """
@@ -405,34 +539,48 @@ class WaiverFile(object):
         Returns a tuple (creator, reason, waiverfile) if a waiver exists which matches
         the given parameters.  Otherwise, returns None.
         """
-        found = False
-
-        for waiver in self.waivers:
-            if waiver.variant.match(variant) and waiver.flow.match(flow) and waiver.subflow.match(subflow) and waiver.error.match(error) and not 'UNWAIVABLE' in error:
-                if flow == 'deliverable' and subflow == 'existence' and not waiver.filepath.endswith('{}/reldoc/tnrwaivers.csv'.format(variant)):
-                    logger.debug("deliverable:existance waivers are only allowed from reldoc/tnrwaivers.csv. ({})".format(waiver.filepath))
-                else:
-                    return ('CommandLine', waiver.reason, waiver.filepath)
-
-        return None
+        if 'UNWAIVABLE' in error:
+            return None
+        waiver = self._get_matcher('waivers', self._accept_waiver).find(variant, flow, subflow, error)
+        if waiver is None:
+            return None
+        return ('CommandLine', waiver.reason, waiver.filepath)
 
     def find_matching_hsdes_waiver(self, variant, flow, subflow, error):
         """
         Returns a tuple (creator, reason, waiverfile) if a waiver exists which matches
         the given parameters.  Otherwise, returns None.
         """
-        found = False
-
-        for waiver in self.hsdes_waivers:
-            if waiver.variant.match(variant) and waiver.flow.match(flow) and waiver.subflow.match(subflow) and waiver.error.match(error) and not 'UNWAIVABLE' in error:
-                if flow == 'deliverable' and subflow == 'existence' and not waiver.filepath.endswith('mongodb'.format(variant)):
-                    logger.debug("deliverable:existance waivers are only allowed from reldoc/tnrwaivers.csv. ({})".format(waiver.filepath))
-                else:
-                    return ('HsdesWaiver', waiver.reason, waiver.filepath)
-
-        return None
+        if 'UNWAIVABLE' in error:
+            return None
+        waiver = self._get_matcher('hsdes_waivers', self._accept_hsdes_waiver).find(variant, flow, subflow, error)
+        if waiver is None:
+            return None
+        return ('HsdesWaiver', waiver.reason, waiver.filepath)
+
+    def _get_matcher(self, attr, accept):
+        """
+        Returns the WaiverMatcher of self.<attr>, rebuilding it if waivers were added since.
+        """
+        waivers = getattr(self, attr)
+        matcher = self._matchers.get(attr)
+        if matcher is None or not matcher.is_current(waivers):
+            matcher = self._matchers[attr] = WaiverMatcher(waivers, accept)
+        return matcher
 
+    @staticmethod
+    def _accept_waiver(waiver, variant, flow, subflow):
+        if flow == 'deliverable' and subflow == 'existence' and not waiver.filepath.endswith('{}/reldoc/tnrwaivers.csv'.format(variant)):
+            logger.debug("deliverable:existance waivers are only allowed from reldoc/tnrwaivers.csv. ({})".format(waiver.filepath))
+            return False
+        return True
 
+    @staticmethod
+    def _accept_hsdes_waiver(waiver, variant, flow, subflow):
+        if flow == 'deliverable' and subflow == 'existence' and not waiver.filepath.endswith('mongodb'):
+            logger.debug("deliverable:existance waivers are only allowed from reldoc/tnrwaivers.csv. ({})".format(waiver.filepath))
+            return False
+        return True
 
 
     def get_tnrwaivers_files(self, wsroot, variant, libtype=None, filename='tnrwaivers.csv'):
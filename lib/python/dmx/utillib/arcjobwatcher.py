@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: watches many ARC jobs at once, until they finish
+
+An ArcJobWatcher tracks ARC job ids for any number of threads waiting on them (eg: the
+releases submitted in parallel), with a single poller thread:-
+    - The status of all the jobs that are due (or soon due) is queried with one command (one ssh, running
+      'arc job-info' for every job), instead of one ssh and arc per job.
+    - Every job is queried quickly at first (after POLL_INTERVAL seconds), and less and less
+      often the longer it runs (the interval doubles up to MAX_POLL_INTERVAL).
+    - Remote commands reuse a persistent ssh control connection (ControlMaster), so that
+      only the first one pays for the ssh handshake (when the ssh supports it, plain ssh otherwise).
+    - When the storage directory of a job is visible from this host, it is watched: a
+      write to it (eg: the last output of the job) makes the job due right away, and
+      the stdout of the job is read directly instead of over ssh.
+    - A failed query is retried (with the same backoff) until the job finishes, or until the
+      waiter's timeout.
+
+    watcher = get_watcher(ssh=TNR_SSH)
+    status = watcher.wait(arc_job_id)
+    lines = watcher.get_stdout(arc_job_id)
+
+The releases run in parallel by child processes (eg: of run_mp or a TaskPool) share the watcher of
+the parent, so that all their jobs are still polled by a single poller:-
+
+    with share_watcher(ssh=TNR_SSH):
+        results = run_mp(release_deliverable, mp_args)
+
+The arc commands are run by an ArcCli, which can be given any arc executable (eg: a stub in tests).
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+from builtins import object
+import os
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import current_process
+from multiprocessing.connection import Listener, Client
+
+from dmx.utillib.utils import run_command, get_tools_path, quotify
+
+LOGGER = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('done', 'failed', 'error')
+POLL_INTERVAL = 5
+MAX_POLL_INTERVAL = 120
+BACKOFF = 2
+# How often the visible storage directories are checked for writes
+STORAGE_INTERVAL = 2
+CONTROL_PATH = '/tmp/dmx_arc_ssh_%r@%h:%p'
+CONTROL_PERSIST = 600
+# The address of the watcher shared by a parent process (see share_watcher)
+WATCHER_ENV = 'DMX_ARC_JOB_WATCHER'
+
+class ArcJobWatcherError(Exception): pass
+
+class ArcCli(object):
+    '''
+    Runs arc commands, locally, or on a server through ssh (with a persistent control connection,
+    if the ssh supports it)
+    '''
+    def __init__(self, arc=None, ssh=None, server=None, control_path=CONTROL_PATH, control_persist=CONTROL_PERSIST):
+        '''
+        :param arc: The arc executable. Defaults to the one in ctools.
+        :param ssh: The ssh executable (eg: tnr_ssh). If not given, the commands are run locally.
+        :param server: The server to ssh to. Defaults to a working server (see Server.get_working_server)
+        '''
+        self.arc = arc or '{}/arc/bin/arc'.format(get_tools_path('ctools'))
+        self.ssh = ssh
+        self.server = server
+        self.control_path = control_path
+        self.control_persist = control_persist
+        self._control_master = None
+        self._lock = threading.Lock()
+
+    def get_control_options(self):
+        return '-o ControlMaster=auto -o ControlPath={} -o ControlPersist={} '.format(self.control_path, self.control_persist)
+
+    def supports_control_master(self):
+        '''
+        Returns True if the ssh accepts the control connection options.
+        A setuid wrapper (eg: tnr_ssh) might not, so it is checked once, with a command that does nothing.
+        '''
+        with self._lock:
+            if self._control_master is None:
+                command = '{} -q {}{} true'.format(self.ssh, self.get_control_options(), self.server)
+                LOGGER.debug(command)
+                exitcode, stdout, stderr = run_command(command)
+                self._control_master = not exitcode
+                if exitcode:
+                    LOGGER.debug('{} does not support a control connection, using plain ssh: {}'.format(self.ssh, stderr))
+            return self._control_master
+
+    def get_command(self, script):
+        '''
+        Returns the command that runs the shell script, over ssh if needed
+        '''
+        if not self.ssh:
+            return script
+        if not self.server:
+            from dmx.utillib.server import Server
+            self.server = Server().get_working_server()
+        options = ''
+        if self.control_path and self.supports_control_master():
+            options = self.get_control_options()
+        return '{} -q {}{} {}'.format(self.ssh, options, self.server, quotify(script))
+
+    def run(self, script):
+        command = self.get_command(script)
+        LOGGER.debug(command)
+        exitcode, stdout, stderr = run_command(command)
+        if exitcode:
+            LOGGER.debug('stdout: {}'.format(stdout))
+            LOGGER.debug('stderr: {}'.format(stderr))
+            raise ArcJobWatcherError('Failed running {}: {}'.format(command, stderr))
+        return stdout
+
+    def get_jobs_info(self, job_ids, keys=('status',)):
+        '''
+        Runs 'arc job-info <id> <key>' for all the job_ids and keys, in a single command.
+        Returns {job_id: {key: value}}
+        '''
+        script = '; '.join(['echo "{0} {1} $({2} job-info {0} {1})"'.format(job_id, key, self.arc) for job_id in job_ids for key in keys])
+        ret = {}
+        for line in self.run(script).splitlines():
+            words = line.split(None, 2)
+            if len(words) >= 2:
+                ret.setdefault(words[0], {})[words[1]] = words[2].strip() if len(words) > 2 else ''
+        return ret
+
+    def get_job_output(self, job_id, storage=None, filesys='stdout'):
+        '''
+        Returns the stdout/stderr of a job
+        '''
+        if not storage:
+            storage = '`{} job-info {} storage`'.format(self.arc, job_id)
+        return self.run('cat {}/{}.txt'.format(storage, filesys))
+
+
+class ArcJob(object):
+    '''
+    A job tracked by an ArcJobWatcher
+    '''
+    def __init__(self, job_id):
+        self.id = str(job_id)
+        self.status = None
+        self.storage = None
+        self.storage_visible = False
+        self.storage_mtime = None
+        self.queries = 0
+        self.interval = POLL_INTERVAL
+        self.next_query = time.time() + POLL_INTERVAL
+        self.finished = threading.Event()
+
+    def backoff(self, now):
+        self.next_query = now + self.interval
+        self.interval = min(self.interval * BACKOFF, MAX_POLL_INTERVAL)
+
+    def get_storage_mtime(self):
+        '''
+        Returns the time of the last write to the storage directory (or to a file in it)
+        '''
+        try:
+            mtimes = [os.stat(self.storage).st_mtime]
+            for name in os.listdir(self.storage):
+                mtimes.append(os.stat(os.path.join(self.storage, name)).st_mtime)
+            return max(mtimes)
+        except OSError:
+            return None
+
+
+class ArcJobWatcher(object):
+    '''
+    Tracks ARC jobs with a single poller thread, that runs while there are jobs to wait for.
+    '''
+    def __init__(self, cli=None):
+        self.cli = cli or ArcCli()
+        self.logger = LOGGER
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self.commands = 0
+
+    def watch(self, job_id):
+        '''
+        Starts tracking job_id (if it is not already), and returns its ArcJob
+        '''
+        job_id = str(job_id)
+        with self._cond:
+            if job_id not in self._jobs:
+                self._jobs[job_id] = ArcJob(job_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='arc job watcher')
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+            return self._jobs[job_id]
+
+    def wait(self, job_id, timeout=None):
+        '''
+        Waits until job_id finishes (or timeout seconds have passed), and returns its status
+        '''
+        job = self.watch(job_id)
+        deadline = None if timeout is None else time.time() + timeout
+        while not job.finished.is_set():
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            # A bounded wait, so that the waiting thread can still be interrupted
+            job.finished.wait(60 if remaining is None else min(60, remaining))
+        return job.status
+
+    def get_stdout(self, job_id, filesys='stdout'):
+        '''
+        Returns the lines of the stdout/stderr of job_id, read directly when its storage is visible
+        '''
+        job = self.watch(job_id)
+        if job.storage_visible:
+            try:
+                with open(os.path.join(job.storage, '{}.txt'.format(filesys))) as f:
+                    return f.read().splitlines()
+            except (IOError, OSError) as e:
+                self.logger.debug('Failed reading {} of {} locally: {}'.format(filesys, job_id, e))
+        self.commands += 1
+        return self.cli.get_job_output(job_id, storage=job.storage, filesys=filesys).splitlines()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                jobs = [x for x in list(self._jobs.values()) if not x.finished.is_set()]
+                if not jobs:
+                    self._thread = None
+                    return
+            now = time.time()
+            for job in jobs:
+                if job.storage_visible:
+                    mtime = job.get_storage_mtime()
+                    if mtime != job.storage_mtime:
+                        job.storage_mtime = mtime
+                        job.next_query = now
+            if [x for x in jobs if x.next_query <= now]:
+                # The jobs that would be due soon are queried along
+                self._query([x for x in jobs if x.next_query <= now + POLL_INTERVAL])
+            with self._cond:
+                jobs = [x for x in list(self._jobs.values()) if not x.finished.is_set()]
+                if jobs:
+                    wakeup = min([x.next_query for x in jobs])
+                    if [x for x in jobs if x.storage_visible]:
+                        wakeup = min(wakeup, time.time() + STORAGE_INTERVAL)
+                    self._cond.wait(max(0, wakeup - time.time()))
+
+    def _query(self, jobs):
+        '''
+        Queries the status of the jobs (and the storage of the jobs that do not have it yet)
+        with a single command
+        '''
+        keys = ('status', 'storage') if [x for x in jobs if x.storage is None] else ('status',)
+        now = time.time()
+        try:
+            self.commands += 1
+            info = self.cli.get_jobs_info([x.id for x in jobs], keys)
+        except Exception as e:
+            self.logger.warning(str(e))
+            for job in jobs:
+                job.backoff(now)
+            return
+        for job in jobs:
+            data = info.get(job.id, {})
+            if job.storage is None and 'storage' in data:
+                job.storage = data['storage']
+                job.storage_visible = bool(job.storage) and os.path.isdir(job.storage)
+                if job.storage_visible:
+                    job.storage_mtime = job.get_storage_mtime()
+                self.logger.debug('job {} storage: {} ({})'.format(job.id, job.storage, 'visible' if job.storage_visible else 'remote'))
+            job.status = data.get('status') or job.status
+            job.queries += 1
+            self.logger.debug('job {} status: {}'.format(job.id, job.status))
+            if job.status in FINISHED_STATUSES:
+                job.finished.set()
+            else:
+                job.backoff(now)
+
+
+class ArcJobWatcherServer(object):
+    '''
+    Serves an ArcJobWatcher to the child processes of this process, over a unix socket.
+    Every request (wait, get_stdout) gets its own connection and thread.
+    '''
+    def __init__(self, watcher, address=None, authkey=None):
+        self.watcher = watcher
+        self._tmpdir = None
+        if address is None:
+            self._tmpdir = tempfile.mkdtemp(prefix='dmx_arc_')
+            address = os.path.join(self._tmpdir, 'watcher.sock')
+        self.address = address
+        # The children (forked, or started by multiprocessing) inherit the key of their parent
+        self.authkey = authkey or bytes(current_process().authkey)
+        self.pid = os.getpid()
+        self._listener = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def _handle_connection(self, conn):
+        try:
+            request = conn.recv()
+            try:
+                if request[0] == 'wait':
+                    conn.send(('ok', self.watcher.wait(request[1], timeout=request[2])))
+                elif request[0] == 'get_stdout':
+                    conn.send(('ok', self.watcher.get_stdout(request[1], filesys=request[2])))
+                else:
+                    conn.send(('error', 'Unknown request: {}'.format(request[0])))
+            except Exception as e:
+                conn.send(('error', str(e)))
+        except (EOFError, IOError, OSError) as e:
+            LOGGER.debug('ArcJobWatcherServer lost a connection: {}'.format(e))
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        while not self._stopped.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                LOGGER.debug('ArcJobWatcherServer failed to accept a connection: {}'.format(e))
+                continue
+            t = threading.Thread(target=self._handle_connection, args=(conn,))
+            t.daemon = True
+            t.start()
+
+    def start(self):
+        '''
+        Runs serve_forever() in a background thread, and returns once the server is listening.
+        '''
+        self._listener = Listener(self.address, 'AF_UNIX', authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+        self._thread = threading.Thread(target=self.serve_forever, name='arc job watcher server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._listener is not None:
+            # Wake up the blocking accept() with a bare connection
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.address)
+                sock.close()
+            except Exception:
+                pass
+            self._listener.close()
+        if self._thread is not None:
+            self._thread.join()
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class ArcJobWatcherClient(object):
+    '''
+    Waits for the jobs through the ArcJobWatcher served by a parent process (see share_watcher).
+    If the parent can not be reached, the fallback watcher (of this process) is used instead.
+    '''
+    def __init__(self, address, authkey=None, fallback=None):
+        self.address = address
+        self.authkey = authkey or bytes(current_process().authkey)
+        self.fallback = fallback
+
+    def _request(self, request):
+        try:
+            conn = Client(self.address, 'AF_UNIX', authkey=self.authkey)
+            try:
+                conn.send(request)
+                status, data = conn.recv()
+            finally:
+                conn.close()
+        except (EOFError, IOError, OSError, socket.error) as e:
+            if self.fallback is None:
+                raise ArcJobWatcherError('Unable to talk to the arc job watcher at {}: {}'.format(self.address, e))
+            LOGGER.debug('Unable to talk to the arc job watcher at {}: {}. Watching the job from this process.'.format(self.address, e))
+            return getattr(self.fallback, request[0])(*request[1:])
+        if status != 'ok':
+            raise ArcJobWatcherError(data)
+        return data
+
+    def wait(self, job_id, timeout=None):
+        return self._request(('wait', str(job_id), timeout))
+
+    def get_stdout(self, job_id, filesys='stdout'):
+        return self._request(('get_stdout', str(job_id), filesys))
+
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+# {address: pid} of the servers started by share_watcher
+_servers = {}
+
+def get_watcher(ssh=None):
+    '''
+    Returns the ArcJobWatcher of this process, that runs arc locally, or over ssh.
+    In a child of a process that shares its watcher (see share_watcher), returns a client of that
+    watcher instead, so that the child does not poll the jobs on its own.
+    '''
+    with _watchers_lock:
+        if ssh not in _watchers:
+            _watchers[ssh] = ArcJobWatcher(ArcCli(ssh=ssh))
+        watcher = _watchers[ssh]
+    address = os.getenv(WATCHER_ENV)
+    if address and _servers.get(address) != os.getpid():
+        return ArcJobWatcherClient(address, fallback=watcher)
+    return watcher
+
+@contextmanager
+def share_watcher(ssh=None):
+    '''
+    Shares the ArcJobWatcher of this process with the child processes started in the with block
+    (eg: by run_mp or a TaskPool), that inherit its address through WATCHER_ENV.
+    Does nothing if the watcher of a parent is already shared.
+    '''
+    if os.getenv(WATCHER_ENV):
+        yield
+        return
+    server = ArcJobWatcherServer(get_watcher(ssh)).start()
+    _servers[server.address] = server.pid
+    os.environ[WATCHER_ENV] = server.address
+    try:
+        yield
+    finally:
+        del os.environ[WATCHER_ENV]
+        del _servers[server.address]
+        server.shutdown()
@@ -28,6 +28,7 @@ from socket import error as socket_error
 
 from dmx.utillib.utils import *
 from dmx.utillib.version import Version
+from dmx.utillib.telemetry import get_tcp_sink
 import json
 from socket import create_connection
 DEV_SERVER = 'sjdacron01.sc.intel.com'
@@ -105,23 +106,20 @@ class LogStash(object):
     
     def logstash_log(self, data):
         '''
-        Sends data to logstash in our standard format
+        Queues data to be sent to logstash in our standard format
         data is a dict
+        Returns False if the data had to be dropped
         '''
         ret = True
         # Combine the standard attributes with data
         # We do it like this to ensure that the standard attributes win
         # if there's a key clash
         combined = dict(list(data.items()) + list(self.attributes.items()))
-        try:
-            with LogStashTCP(self.server, self.port) as stcp:
-                stcp.send_line(combined)
-        except socket_error as serr:
-            # Only warn if we are on production server
-            if not self.testserver:
-                self.logger.warn('Unable to connect to LogStash server at {0}:{1}'.format(self.server, self.port))
-                self.logger.warn(str(serr))
-                ret = False
+        # Sent from a background thread, over a connection shared by all the logs of
+        # the process, so that dmx never waits for the LogStash server
+        if not get_tcp_sink(self.server, self.port).send_line(json.dumps(combined)):
+            self.logger.debug('LogStash queue for {0}:{1} is full, log dropped'.format(self.server, self.port))
+            ret = False
 
         return ret
 
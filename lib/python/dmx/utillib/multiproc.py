@@ -14,9 +14,22 @@ All rights reserved.
 #from multiprocessing import Pool
 import multiprocessing
 import multiprocessing.pool
+import logging
+import traceback
+import itertools
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from time import sleep
 
+LOGGER = logging.getLogger(__name__)
+
+# How often the parent of a TaskPool checks that its workers are alive, while it waits for results
+WORKER_CHECK_INTERVAL = 0.5
+
 def run_mp(func, args, num_processes=2):
     '''
     Runs func across multiple processes using the list of argument tuples
@@ -85,3 +98,353 @@ class NoDaemonProcess(multiprocessing.Process):
 class MyPool(multiprocessing.pool.Pool):
     Process = NoDaemonProcess
 
+
+
+class TaskPoolError(Exception): pass
+
+def _run_chunk(func, chunk):
+    return [func(*args) for args in chunk]
+
+_CURRENT_TASKPOOL = None
+def get_current_taskpool():
+    '''
+    Returns the TaskPool that runs the current process, or None if this is not a TaskPool worker.
+    Lets a task hand its own sub-tasks to the pool it is running in, instead of creating a new pool.
+    '''
+    return _CURRENT_TASKPOOL
+
+
+class TaskPool(object):
+    '''
+    A bounded pool of (non-daemonic) worker processes that share one task queue.
+
+    Unlike multiprocessing.Pool, tasks that run in a worker can submit sub-tasks to the
+    same pool with map(). While a worker waits for its sub-tasks, it keeps taking tasks
+    from the shared queue (its own sub-tasks, or anybody else's), so the number of
+    busy processes never goes above the number of workers, and no worker sits idle.
+
+    The functions (and their arguments) must be picklable, ie: module level functions.
+    Workers are forked, so they see the state the parent had when start() was called.
+
+    If a worker dies (eg: killed, out of memory, os._exit), the tasks it was running can
+    never complete: the parent then stops the other workers, and every task that has not
+    completed yet fails with a TaskPoolError message as its result.
+
+    Usage:
+        pool = TaskPool(8).start()
+        for i in range(10):
+            pool.submit(func, i)
+        for taskid, ok, result in pool.as_completed():
+            ...
+        pool.close()
+    '''
+
+    def __init__(self, processes=None):
+        self.processes = max(1, processes or multiprocessing.cpu_count())
+        self._tasks = multiprocessing.Queue()
+        # results of the tasks submitted by the parent go to _results[0], by worker N to _results[N]
+        self._results = [multiprocessing.Queue() for _ in range(self.processes + 1)]
+        self._workers = []
+        self._wid = 0
+        self._counter = itertools.count()
+        self._pending = 0
+        self._stash = {}
+        # ids of the tasks submitted by this process that have not been returned yet
+        self._outstanding = set()
+        self._broken = None
+
+    def start(self):
+        for wid in range(1, self.processes + 1):
+            p = NoDaemonProcess(target=self._worker_main, args=(wid,))
+            p.name = 'TaskPool-{}'.format(wid)
+            p.start()
+            self._workers.append(p)
+        return self
+
+    def _worker_main(self, wid):
+        global _CURRENT_TASKPOOL
+        _CURRENT_TASKPOOL = self
+        self._wid = wid
+        self._pending = 0
+        self._stash = {}
+        self._outstanding = set()
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            self._execute(task)
+
+    def _execute(self, task):
+        origin, taskid, func, args, kwargs = task
+        try:
+            ret = (taskid, True, func(*args, **kwargs))
+        except Exception:
+            ret = (taskid, False, traceback.format_exc())
+        self._results[origin].put(ret)
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        Queues func(*args, **kwargs) and returns the id of the task.
+        The result is returned by as_completed().
+
+        :raises TaskPoolError: if a worker of the pool has died.
+        '''
+        if self._broken:
+            raise TaskPoolError(self._broken)
+        taskid = (self._wid, next(self._counter))
+        self._tasks.put((self._wid, taskid, func, args, kwargs))
+        self._pending += 1
+        self._outstanding.add(taskid)
+        return taskid
+
+    def as_completed(self):
+        '''
+        Yields (taskid, ok, result) for every submitted task, as soon as it completes.
+        If the task raised an exception, ok is False and result is the formatted traceback.
+        '''
+        while self._pending:
+            yield self._get_result()
+
+    def _get_result(self, wanted=None):
+        '''
+        Returns the next (taskid, ok, result) whose taskid is in wanted (any taskid if wanted is None).
+        Results of other tasks (eg: of an outer map() while a nested one is waiting) are stashed.
+        '''
+        while True:
+            for taskid in list(self._stash):
+                if wanted is None or taskid in wanted:
+                    self._pending -= 1
+                    self._outstanding.discard(taskid)
+                    return self._stash.pop(taskid)
+            ret = self._next_result()
+            if ret is None:
+                continue
+            if wanted is None or ret[0] in wanted:
+                self._pending -= 1
+                self._outstanding.discard(ret[0])
+                return ret
+            self._stash[ret[0]] = ret
+
+    def _next_result(self):
+        '''
+        Returns the next result sent to this process.
+        A worker helps with one queued task instead, if no result is there yet, and returns None.
+        '''
+        if not self._wid:
+            return self._get_parent_result()
+        try:
+            return self._results[self._wid].get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            task = self._tasks.get(timeout=0.05)
+        except queue.Empty:
+            return None
+        if task is None:
+            self._tasks.put(None)
+            return self._results[self._wid].get()
+        # The task may be a nested map() that stashes results of ours
+        self._execute(task)
+        return None
+
+    def _get_parent_result(self):
+        '''
+        Returns the next result sent to the parent, or None if a worker died meanwhile
+        (in which case the tasks that have not completed are failed, see _fail_outstanding()).
+
+        :raises TaskPoolError: if a worker has died, and the tasks being waited for are not known to the pool.
+        '''
+        if self._broken:
+            raise TaskPoolError(self._broken)
+        while True:
+            try:
+                return self._results[0].get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                pass
+            dead = [p for p in self._workers if not p.is_alive()]
+            if dead:
+                self._fail_outstanding(dead)
+                return None
+
+    def _fail_outstanding(self, dead):
+        '''
+        Stops the workers, and fails every task of the parent that has not completed.
+        '''
+        self._broken = 'TaskPoolError: {} died (exitcode {}), the task did not complete'.format(
+            ', '.join([p.name for p in dead]), ', '.join([str(p.exitcode) for p in dead]))
+        LOGGER.error(self._broken)
+        for p in self._workers:
+            if p.is_alive():
+                p.terminate()
+        for p in self._workers:
+            p.join()
+        self._workers = []
+        # Keep the results that were sent before the workers stopped
+        while True:
+            try:
+                ret = self._results[0].get_nowait()
+            except queue.Empty:
+                break
+            self._stash[ret[0]] = ret
+        for taskid in self._outstanding:
+            if taskid not in self._stash:
+                self._stash[taskid] = (taskid, False, self._broken)
+
+    def map(self, func, args, chunksize=1):
+        '''
+        Runs func(*arg) for every arg (a list/tuple) in args across the pool, and returns the results in order.
+        Can be called from the parent, or from within a task.
+
+        :raises TaskPoolError: if any of the calls raised an exception.
+        '''
+        args = list(args)
+        chunksize = max(1, chunksize)
+        chunks = [args[i:i + chunksize] for i in range(0, len(args), chunksize)]
+        order = {}
+        for i, chunk in enumerate(chunks):
+            order[self.submit(_run_chunk, func, chunk)] = i
+        results = [None] * len(chunks)
+        errors = []
+        while order:
+            taskid, ok, ret = self._get_result(order)
+            i = order.pop(taskid)
+            if ok:
+                results[i] = ret
+            else:
+                errors.append(ret)
+        if errors:
+            raise TaskPoolError(errors[0])
+        return [x for chunk in results for x in chunk]
+
+    def close(self):
+        '''
+        Stops the workers once the queued tasks are done.
+        '''
+        for _ in self._workers:
+            self._tasks.put(None)
+        for p in self._workers:
+            p.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DependencyScheduler(object):
+    '''
+    Runs a graph of tasks that depend on each other on a TaskPool.
+
+    A task is submitted as soon as all the tasks it depends on have completed, instead of
+    running the graph level by level, so a slow task only holds up the tasks that depend on it.
+    At most max_running tasks are in flight (by default, the number of processes of the pool).
+    The ready tasks with the longest chain of dependents go first.
+
+    Usage:
+        scheduler = DependencyScheduler(pool)
+        scheduler.add('a', get_task_a)
+        scheduler.add('b', get_task_b, depends_on=['a'])
+        for key, ok, result in scheduler.run():
+            ...
+        path = scheduler.get_critical_path()
+
+    get_task_<x>() returns the (func, args) to submit to the pool. It is only called when the
+    task is submitted, ie: after the caller has been given the results of its dependencies.
+    The dependents of a task that failed are never run.
+    '''
+
+    def __init__(self, pool, max_running=None):
+        self.pool = pool
+        self.max_running = max(1, max_running or pool.processes)
+        self._tasks = {}
+        self._started = None
+        # key: [time submitted, time completed]
+        self._times = {}
+
+    def add(self, key, get_task, depends_on=()):
+        if key in self._tasks:
+            raise TaskPoolError('Task {!r} is added twice'.format(key))
+        self._tasks[key] = (get_task, set(depends_on))
+
+    def _get_heights(self, dependents):
+        '''
+        Returns {key: the length of the longest chain of tasks that depend on key}.
+
+        :raises TaskPoolError: if the tasks depend on each other in a cycle.
+        '''
+        waiting = dict((key, len(depends_on)) for key, (get_task, depends_on) in list(self._tasks.items()))
+        order = [key for key in waiting if not waiting[key]]
+        for key in order:
+            for dependent in dependents[key]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    order.append(dependent)
+        if len(order) != len(self._tasks):
+            raise TaskPoolError('Tasks depend on each other in a cycle: {}'.format(sorted([repr(x) for x in waiting if waiting[x]])))
+        heights = {}
+        for key in reversed(order):
+            heights[key] = max([heights[x] + 1 for x in dependents[key]] or [0])
+        return heights
+
+    def run(self):
+        '''
+        Runs the tasks, and yields (key, ok, result) for every task as soon as it completes.
+        If the task raised an exception, ok is False and result is the formatted traceback.
+
+        :raises TaskPoolError: if a task depends on a task that was not added, or on itself.
+        '''
+        dependents = dict((key, []) for key in self._tasks)
+        for key, (get_task, depends_on) in list(self._tasks.items()):
+            for dep in depends_on:
+                if dep not in self._tasks:
+                    raise TaskPoolError('Task {!r} depends on unknown task {!r}'.format(key, dep))
+                dependents[dep].append(key)
+        heights = self._get_heights(dependents)
+
+        waiting = dict((key, len(depends_on)) for key, (get_task, depends_on) in list(self._tasks.items()))
+        ready = [key for key in waiting if not waiting[key]]
+        running = {}
+        self._started = time.time()
+        while ready or running:
+            ready.sort(key=lambda x: heights[x])
+            while ready and len(running) < self.max_running:
+                key = ready.pop()
+                func, args = self._tasks[key][0]()
+                self._times[key] = [time.time(), None]
+                running[self.pool.submit(func, *args)] = key
+
+            taskid, ok, result = next(self.pool.as_completed())
+            key = running.pop(taskid)
+            self._times[key][1] = time.time()
+            yield key, ok, result
+            if not ok:
+                continue
+            for dependent in dependents[key]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+
+    def get_critical_path(self):
+        '''
+        Returns the chain of tasks that determined when the last task completed, from the
+        first task to the last, as a list of (key, waited, ran):-
+            waited  seconds between the completion of the previous task of the chain (or the
+                    start of run()) and the submission of this one
+            ran     seconds the task took
+        The sum of waited and ran over the chain is the elapsed time of run().
+        '''
+        done = [key for key in self._times if self._times[key][1] is not None]
+        if not done:
+            return []
+        path = []
+        key = max(done, key=lambda x: self._times[x][1])
+        while key is not None:
+            submitted, completed = self._times[key]
+            depends_on = self._tasks[key][1]
+            previous = max(depends_on, key=lambda x: self._times[x][1]) if depends_on else None
+            previous_completed = self._times[previous][1] if previous is not None else self._started
+            path.append((key, submitted - previous_completed, completed - submitted))
+            key = previous
+        return path[::-1]
@@ -18,15 +18,147 @@ import logging
 import sys
 import datetime
 import time
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
 from dmx.utillib.utils import is_pice_env, run_command
 #NAAPATH = '/nfs/site/disks/psg_flowscommon_1/naa/wplim_dev/naa.py'
 NAAPATH = '/nfs/site/disks/psg_flowscommon_1/naa/current/naa.py' if not  os.environ.get('NAAPATH') else os.environ.get('NAAPATH')
 NAAROOT = '/p/psg/naa'
 # The user account used by NAA. Only this account may run 'naa put' for dmx related project/intent
 NAAUSER = 'dmx'
+# http://pg-rdjira:8080/browse/DI-1385
+# Pushed files take a while to be visible over NFS. Instead of waiting for a fixed minute,
+# the pushed files are polled, every POLL_INTERVAL seconds at first, doubling up to
+# MAX_POLL_INTERVAL, for at most VISIBLE_TIMEOUT seconds.
+VISIBLE_TIMEOUT = 120
+POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 10
 
 class NAAError(Exception): pass
 
+def get_invisible_paths(paths):
+    '''
+    Returns the paths that can not be seen yet.
+    The directories are listed first, to refresh their NFS attributes, otherwise python
+    might not be able to find the files (http://pg-rdjira:8080/browse/DI-1312)
+    '''
+    for dirname in sorted(set([os.path.dirname(x) for x in paths])):
+        try:
+            os.listdir(dirname)
+        except OSError:
+            pass
+    ret = []
+    for path in paths:
+        try:
+            os.stat(path)
+        except OSError:
+            ret.append(path)
+    return ret
+
+def wait_until_visible(paths, timeout=VISIBLE_TIMEOUT, interval=POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+    '''
+    Polls paths, with exponential backoff, until they can all be seen or timeout seconds have passed.
+    Returns the paths that can still not be seen.
+    '''
+    deadline = time.time() + timeout
+    paths = get_invisible_paths(paths)
+    while paths:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
+        paths = get_invisible_paths(paths)
+    return paths
+
+class VersionIndex(object):
+    '''
+    The versions of the files in a NAA tag directory. NAA files are named <filename>.<N>.
+
+    Every directory of the tag is read once (with scandir), the first time a file of
+    that directory is asked for, instead of checking <filename>.1, <filename>.2, ...
+    one by one until one does not exist.
+
+    Nothing is written into NAA: reserve() only makes sure that a batch never hands
+    out the same version twice. A concurrent check-in of the same file can still pick
+    the same version, so get_conflicts() must be called just before the push, to stat
+    the reserved versions again.
+    '''
+    def __init__(self, tagdir, preview=False):
+        self.tagdir = tagdir
+        self.preview = preview
+        self.logger = logging.getLogger(__name__)
+        # {dirpath: {filename: set of versions}}
+        self._versions = {}
+        self._reserved = []
+
+    def _get_versions(self, file):
+        dirpath = os.path.dirname(os.path.join(self.tagdir, file))
+        if dirpath not in self._versions:
+            self._versions[dirpath] = self._scan(dirpath)
+        return self._versions[dirpath].setdefault(os.path.basename(file), set())
+
+    def _scan(self, dirpath):
+        '''
+        Returns {filename: set of versions} of dirpath
+        '''
+        versions = {}
+        try:
+            if scandir is None:
+                names = os.listdir(dirpath)
+            else:
+                names = [x.name for x in scandir(dirpath)]
+        except OSError:
+            # The directory is not in NAA yet
+            return versions
+        for name in names:
+            filename, _, version = name.rpartition('.')
+            if filename and version.isdigit():
+                versions.setdefault(filename, set()).add(int(version))
+        return versions
+
+    def get_next_version(self, file):
+        '''
+        Returns the first <file>.<N> that does not exist, N starting from 1
+        '''
+        versions = self._get_versions(file)
+        version = 1
+        while version in versions:
+            version += 1
+        return '{}.{}'.format(file, version)
+
+    def reserve(self, file):
+        '''
+        Returns the first <file>.<N> that does not exist and was not reserved by this
+        index yet, and reserves it.
+        '''
+        versions = self._get_versions(file)
+        while True:
+            name = self.get_next_version(file)
+            versions.add(int(name.rpartition('.')[2]))
+            if not self.preview and os.path.lexists(os.path.join(self.tagdir, name)):
+                # Pushed by another check-in after the directory was read
+                continue
+            self._reserved.append(name)
+            return name
+
+    def get_conflicts(self):
+        '''
+        Returns the reserved versions that exist in NAA by now, ie: that were pushed by
+        a concurrent check-in since they were reserved.
+        '''
+        if self.preview:
+            return []
+        return [x for x in self._reserved if os.path.lexists(os.path.join(self.tagdir, x))]
+
+
 class NAA(object):
     def __init__(self, preview=False):
         self.naa = NAAPATH
@@ -101,6 +233,12 @@ class NAA(object):
         '''
         return '{}/{}/{}/{}/{}/{}/{}'.format(NAAROOT, project, intent, variant, libtype, tag, naa_file)
 
+    def get_version_index(self, project, intent, variant, libtype, tag):
+        '''
+        Returns the VersionIndex of a tag
+        '''
+        return VersionIndex(self.get_naa_path(project, intent, variant, libtype, tag, '').rstrip('/'), preview=self.preview)
+
     def file_exists(self, project, intent, variant, libtype, tag, naa_file):
         '''
         Returns True if file exists in NAA
@@ -125,9 +263,36 @@ class NAA(object):
         '''
         return not self.is_tag_immutable(tag)              
 
+    def wait_until_visible(self, paths):
+        '''
+        Waits until the paths in NAA can be seen (see wait_until_visible)
+        Returns 1 if some of them can still not be seen.
+        '''
+        start = time.time()
+        invisible = wait_until_visible(paths)
+        if invisible:
+            self.logger.warning('{} of {} file(s) are still not visible in NAA after {}s: {}'.format(len(invisible), len(paths), VISIBLE_TIMEOUT, invisible[:10]))
+            return 1
+        self.logger.debug('{} file(s) visible in NAA after {:.1f}s'.format(len(paths), time.time() - start))
+        return 0
+
+    def get_files_to_push(self, project, intent, variant, libtype, tag, source_realpath, subdir=None):
+        '''
+        Returns the paths in NAA of the files that pushing source_realpath creates
+        '''
+        ret = []
+        for root, dirs, files in os.walk(source_realpath):
+            for file in files:
+                naa_file = os.path.relpath(os.path.join(root, file), source_realpath)
+                if subdir:
+                    naa_file = os.path.join(subdir, naa_file)
+                ret.append(self.get_naa_path(project, intent, variant, libtype, tag, naa_file))
+        return ret
+
     def push_to_naa(self, project, intent, variant, libtype, tag, source_realpath, subdir=None, incremental=True):
         '''
-        Push a directory's content to NAA path
+        Push a directory's content to NAA path.
+        Returns once the pushed files can be seen.
         '''
         ret = 0
         command = 'python {} put -u {} -p {} -i {} -v {} -lib {} -t {} --source {}'.format( 
@@ -139,6 +304,7 @@ class NAA(object):
 
         self.logger.debug(command)
         if not self.preview:
+            paths = self.get_files_to_push(project, intent, variant, libtype, tag, source_realpath, subdir=subdir)
             exitcode, stdout, stderr = run_command(command, retry=True)
             self.logger.debug(stdout)
             self.logger.debug(stderr)
@@ -146,16 +312,15 @@ class NAA(object):
                 err = 'stdout:{}\nstderr:{}'.format(stdout, stderr)
                 self.logger.error(err)
                 ret = 1
-
-            # http://pg-rdjira:8080/browse/DI-1385
-            # Add a delay of 1min to accommodate for NFS delay
-            time.sleep(60)
+            else:
+                self.wait_until_visible(paths)
                         
         return ret   
 
     def clone_tag(self, project, intent, variant, libtype, tag, file, target):
         '''
-        Clone a NAA tag
+        Clone a NAA tag.
+        file lists the files to clone. Returns once they can be seen in target.
         '''
         ret = 0
         command = 'python {} clone -u {} -p {} -i {} -v {} -lib {} -t {} -f {} -tar {}'.format( 
@@ -168,10 +333,10 @@ class NAA(object):
                 err = 'stdout:{}\nstderr:{}'.format(stdout, stderr)
                 self.logger.error(err)
                 ret = 1
-
-        # http://pg-rdjira:8080/browse/DI-1385
-        # Add a delay of 1min to accommodate for NFS delay
-        time.sleep(60)
+            else:
+                with open(file) as f:
+                    naa_files = [x.strip() for x in f if x.strip()]
+                self.wait_until_visible([self.get_naa_path(project, intent, variant, libtype, target, x) for x in naa_files])
 
         return ret          
 
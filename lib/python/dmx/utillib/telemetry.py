@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: asynchronous sink for the telemetry dmx sends to LogStash and Splunk
+
+A TelemetrySink takes lines (eg: a json event) from the command, and writes them from a
+background thread:-
+    - send_line() never blocks: the lines go into a bounded queue, and when the queue is
+      full (eg: the server is down, or slow) the line is dropped and counted.
+    - The thread writes all the lines that are queued at once, as one newline-delimited batch.
+    - The connection is kept for the next batch, and reopened when it fails.
+    - The sinks are flushed when the process exits, for at most FLUSH_TIMEOUT seconds. That
+      is done by atexit, and by a multiprocessing finalizer for the multiprocessing children
+      (eg: TaskPool and run_mp workers), which leave with os._exit() and skip atexit.
+
+The sinks are shared by the whole process, one per destination:-
+    get_tcp_sink(host, port)  -  eg: LogStash
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+from builtins import object
+import os
+import time
+import atexit
+import socket
+import logging
+import threading
+import multiprocessing.util
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_QUEUED = 10000
+MAX_BATCH = 500
+CONNECT_TIMEOUT = 5
+RETRY_INTERVAL = 30
+FLUSH_TIMEOUT = 10
+
+class TCPTransport(object):
+    '''
+    A persistent TCP connection.
+    '''
+    def __init__(self, host, port, timeout=CONNECT_TIMEOUT):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.sock = None
+
+    def __repr__(self):
+        return 'TCPTransport({!r}, {})'.format(self.host, self.port)
+
+    @property
+    def is_open(self):
+        return self.sock is not None
+
+    def write(self, data):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock.sendall(data.encode('utf-8', 'ignore'))
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+
+class TelemetrySink(object):
+    '''
+    Writes lines to a transport from a background thread.
+    '''
+
+    def __init__(self, transport, max_queued=MAX_QUEUED, max_batch=MAX_BATCH, retry_interval=RETRY_INTERVAL):
+        '''
+        :param transport: Where the lines are written to, eg: a TCPTransport.
+        :param max_queued: The maximum number of lines waiting to be written. More lines are dropped.
+        :type max_queued: int
+        :param max_batch: The maximum number of lines written at once.
+        :type max_batch: int
+        :param retry_interval: The seconds lines are dropped for, after a batch could not be written.
+        :type retry_interval: int
+        '''
+        self.transport = transport
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self._queue = queue.Queue(max_queued)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._retry_after = 0
+        self._closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_pending = 0
+        self._thread = threading.Thread(target=self._run, name='telemetry {!r}'.format(transport))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send_line(self, line):
+        '''
+        Queues a line (without its newline) to be written.
+        Returns False if the line was dropped because the queue is full.
+        '''
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            try:
+                self._queue.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.max_pending = max(self.max_pending, self._pending)
+        return True
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        '''
+        Waits (for at most timeout seconds) until all the queued lines have been written
+        (or dropped). Returns True if nothing is left in the queue.
+        '''
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=FLUSH_TIMEOUT):
+        '''
+        Flushes the queue, and stops the thread. Lines sent after close() are dropped.
+        '''
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+        if flushed:
+            self._queue.put(None)
+            self._thread.join(timeout)
+        return flushed
+
+    def get_stats(self):
+        '''
+        Returns the counters of the sink:-
+            sent        lines written
+            dropped     lines dropped because the queue was full (or the sink closed)
+            failed      lines that could not be written
+            pending     lines in the queue
+            max_pending the most lines that have been in the queue at once
+        '''
+        with self._cond:
+            return {'sent': self.sent, 'dropped': self.dropped, 'failed': self.failed,
+                'pending': self._pending, 'max_pending': self.max_pending}
+
+    def _run(self):
+        while True:
+            lines = [self._queue.get()]
+            while len(lines) < self.max_batch:
+                try:
+                    lines.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = lines[-1] is None
+            if stop:
+                lines.pop()
+            if lines:
+                ok = self._write(lines)
+                with self._cond:
+                    if ok:
+                        self.sent += len(lines)
+                    else:
+                        self.failed += len(lines)
+                    self._pending -= len(lines)
+                    self._cond.notify_all()
+            if stop:
+                self.transport.close()
+                return
+
+    def _write(self, lines):
+        '''
+        Writes the batch. If the transport was open, and fails (eg: the server closed an
+        idle connection), it is reopened once. If the batch still can not be written, the
+        batches are dropped for retry_interval seconds, so that a dead server does not hold
+        up the queue with connect timeouts.
+        '''
+        if time.time() < self._retry_after:
+            return False
+        data = '\n'.join(lines) + '\n'
+        retry = self.transport.is_open
+        while True:
+            try:
+                self.transport.write(data)
+                return True
+            except (IOError, OSError) as e:
+                # Only logged at debug level: the users must not see telemetry problems
+                LOGGER.debug('Failed writing to {!r}: {}'.format(self.transport, e))
+                try:
+                    self.transport.close()
+                except (IOError, OSError):
+                    pass
+            if not retry:
+                break
+            retry = False
+        self._retry_after = time.time() + self.retry_interval
+        return False
+
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+def get_sink(key, transport_factory):
+    '''
+    Returns the sink of this process for key, creating it with transport_factory() if needed.
+    '''
+    pid = os.getpid()
+    key = (pid, key)
+    with _sinks_lock:
+        if key not in _sinks:
+            if not any(x[0] == pid for x in _sinks):
+                # Runs in multiprocessing children too, unlike atexit
+                multiprocessing.util.Finalize(None, close_sinks, exitpriority=10)
+            _sinks[key] = TelemetrySink(transport_factory())
+        return _sinks[key]
+
+def get_tcp_sink(host, port):
+    return get_sink(('tcp', host, str(port)), lambda: TCPTransport(host, port))
+
+def close_sinks(timeout=FLUSH_TIMEOUT):
+    '''
+    Flushes and closes all the sinks of this process, in at most timeout seconds in total.
+    '''
+    deadline = time.time() + timeout
+    pid = os.getpid()
+    with _sinks_lock:
+        sinks = [(key, sink) for key, sink in list(_sinks.items()) if key[0] == pid]
+    for key, sink in sinks:
+        sink.close(max(0, deadline - time.time()))
+        stats = sink.get_stats()
+        if stats['dropped'] or stats['failed']:
+            LOGGER.debug('Telemetry {!r}: {}'.format(sink.transport, stats))
+        with _sinks_lock:
+            _sinks.pop(key, None)
+
+atexit.register(close_sinks)
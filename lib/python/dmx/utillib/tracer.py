@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+'''
+$Header$
+$Change$
+$DateTime$
+$Author$
+
+Description: span based tracer, that writes a Chrome trace (chrome://tracing, Perfetto) timeline
+
+A span is a named phase of work, timed with its start and duration:-
+    with span('populate_workspace'):
+        ...
+    @traced()
+    def make_rel_config(self):
+        ...
+Spans nest (a span opened within another one is drawn under it), and can be opened
+from any thread. run_command() and run_subcommand() open a span for every command
+they run.
+
+Tracing is off unless start_tracing(path) has been called, in which case span()
+costs nothing. start_tracing() exports the path in $DMX_TRACE, so that the child
+processes (forked, eg: by a TaskPool, or run as commands, eg: a nested dmx) trace
+too. Every process appends its spans to its own <path>.parts/<pid>.jsonl file as
+they end, and finish_tracing() (in the process that called start_tracing) merges
+them into the Chrome trace json at <path>, with a summary of the phases that took
+the most wall-clock time.
+
+Copyright (c) Altera Corporation 2015
+All rights reserved.
+'''
+from builtins import object
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import logging
+import functools
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+TRACE_ENV = 'DMX_TRACE'
+TRACE_OWNER_ENV = 'DMX_TRACE_OWNER'
+SUMMARY_TOP = 15
+MAX_ARG_LENGTH = 1000
+
+_lock = threading.Lock()
+# pids whose process_name has been written
+_named = set()
+
+def get_trace_path():
+    '''
+    Returns the path of the trace being written, or None if tracing is off
+    '''
+    return os.environ.get(TRACE_ENV) or None
+
+def is_tracing():
+    return get_trace_path() is not None
+
+def get_parts_dir(path):
+    return '{}.parts'.format(path)
+
+def start_tracing(path):
+    '''
+    Starts tracing this process (and its children) into the Chrome trace json at path
+    '''
+    path = os.path.abspath(path)
+    parts_dir = get_parts_dir(path)
+    if os.path.isdir(parts_dir):
+        shutil.rmtree(parts_dir)
+    os.makedirs(parts_dir)
+    os.environ[TRACE_ENV] = path
+    os.environ[TRACE_OWNER_ENV] = str(os.getpid())
+    LOGGER.debug('Tracing into {}'.format(path))
+    return path
+
+
+class Span(object):
+    '''
+    A span being timed. Arguments that are only known at the end (eg: the exitcode of
+    a command) can be added to args before it ends.
+    '''
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        end = time.time()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        _write_event({
+            'name': self.name,
+            'cat': self.cat,
+            'ph': 'X',
+            'ts': int(self.start * 1000000),
+            'dur': int((end - self.start) * 1000000),
+            'pid': os.getpid(),
+            'tid': threading.current_thread().ident,
+            'args': self.args,
+        })
+        return False
+
+
+class NullSpan(object):
+    '''
+    The span of span() when tracing is off
+    '''
+    def __init__(self):
+        self.args = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+def span(name, cat='phase', **args):
+    '''
+    Returns a context manager that times the work done within it, as a span called name.
+    cat is the category of the span (eg: phase, subprocess), and args are shown with it.
+    '''
+    if not is_tracing():
+        return NullSpan()
+    for key, value in list(args.items()):
+        if isinstance(value, str) and len(value) > MAX_ARG_LENGTH:
+            args[key] = value[:MAX_ARG_LENGTH] + '...'
+    return Span(name, cat, args)
+
+def traced(name=None, cat='phase'):
+    '''
+    Decorator that times every call of the function as a span (called after the function,
+    unless name is given)
+    '''
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_tracing():
+                return func(*args, **kwargs)
+            with span(name or func.__name__, cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_command_span_name(command):
+    '''
+    Returns the name of the span of a command: its executable and sub-command (eg: 'xlp4 sync')
+    '''
+    if isinstance(command, (list, tuple)):
+        command = ' '.join(command)
+    words = [x for x in command.split() if not x.startswith('-')]
+    return ' '.join([os.path.basename(x) for x in words[:2]]) or command
+
+def command_span(command):
+    '''
+    Returns the span of running command (a string or a list)
+    '''
+    if not is_tracing():
+        return NullSpan()
+    if isinstance(command, (list, tuple)):
+        command = ' '.join(command)
+    return span(get_command_span_name(command), 'subprocess', command=command)
+
+def _write_event(event):
+    '''
+    Appends the event to the trace part file of this process
+    '''
+    path = get_trace_path()
+    if path is None:
+        return
+    pid = os.getpid()
+    lines = []
+    with _lock:
+        if pid not in _named:
+            _named.add(pid)
+            name = ' '.join([os.path.basename(sys.argv[0] if sys.argv and sys.argv[0] else 'python')] + sys.argv[1:3])
+            lines.append(json.dumps({'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0, 'args': {'name': '{} ({})'.format(name, pid)}}))
+        lines.append(json.dumps(event, default=str))
+        try:
+            with open(os.path.join(get_parts_dir(path), '{}.jsonl'.format(pid)), 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+        except (IOError, OSError) as e:
+            LOGGER.debug('Failed writing trace event: {}'.format(e))
+
+def read_events(path):
+    '''
+    Returns the events written by all the processes into the trace parts of path
+    '''
+    events = []
+    for part in sorted(glob.glob(os.path.join(get_parts_dir(path), '*.jsonl'))):
+        with open(part) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # A process killed while writing
+                    continue
+    return events
+
+def summarize(events, top=SUMMARY_TOP):
+    '''
+    Returns the phases that took the most wall-clock time, as a list of
+    (cat, name, count, total, self, max) sorted by total, in seconds.
+    self is the time not spent in nested spans of the same thread.
+    '''
+    durations = {}
+    threads = {}
+    for event in events:
+        if event.get('ph') == 'X':
+            threads.setdefault((event['pid'], event['tid']), []).append(dict(event, children=0))
+    for spans in list(threads.values()):
+        spans.sort(key=lambda x: (x['ts'], -x['dur']))
+        stack = []
+        for event in spans:
+            while stack and stack[-1]['ts'] + stack[-1]['dur'] <= event['ts']:
+                stack.pop()
+            if stack:
+                stack[-1]['children'] += event['dur']
+            stack.append(event)
+        for event in spans:
+            data = durations.setdefault((event['cat'], event['name']), [0, 0, 0, 0])
+            data[0] += 1
+            data[1] += event['dur']
+            data[2] += max(0, event['dur'] - event['children'])
+            data[3] = max(data[3], event['dur'])
+    summary = [(cat, name, count, total / 1e6, self / 1e6, longest / 1e6) for (cat, name), (count, total, self, longest) in list(durations.items())]
+    summary.sort(key=lambda x: -x[3])
+    return summary[:top]
+
+def format_summary(summary):
+    lines = ['{:<12} {:<40} {:>7} {:>10} {:>10} {:>10}'.format('category', 'phase', 'count', 'total(s)', 'self(s)', 'max(s)')]
+    for cat, name, count, total, self, longest in summary:
+        lines.append('{:<12} {:<40} {:>7} {:>10.2f} {:>10.2f} {:>10.2f}'.format(cat, name[:40], count, total, self, longest))
+    return '\n'.join(lines)
+
+def finish_tracing(top=SUMMARY_TOP):
+    '''
+    Merges the spans of all the processes into the Chrome trace json, logs the summary
+    of the top phases, and stops tracing. Only does it in the process that started tracing.
+    Returns the summary (see summarize()).
+    '''
+    path = get_trace_path()
+    if path is None or os.environ.get(TRACE_OWNER_ENV) != str(os.getpid()):
+        return []
+    events = read_events(path)
+    summary = summarize(events, top)
+    trace = {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'otherData': {'summary': [dict(zip(('cat', 'name', 'count', 'total', 'self', 'max'), x)) for x in summary]},
+    }
+    with open(path, 'w') as f:
+        json.dump(trace, f)
+    shutil.rmtree(get_parts_dir(path), ignore_errors=True)
+    del os.environ[TRACE_ENV]
+    del os.environ[TRACE_OWNER_ENV]
+    LOGGER.info('Trace written to {} (open it in chrome://tracing or https://ui.perfetto.dev)'.format(path))
+    LOGGER.info('Top phases by wall-clock time:\n{}'.format(format_summary(summary)))
+    return summary
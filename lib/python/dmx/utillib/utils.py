@@ -56,6 +56,7 @@ LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
 sys.path.insert(0, LIB)
 from dmx.errorlib.exceptions import *
 from dmx.utillib.decorators import memoized
+from dmx.utillib.tracer import command_span
 
 ICMADMIN = 'icmanage'
 
@@ -433,27 +434,29 @@ def run_command(command, stdin=None, timeout=None, retried=0, maxtry=5, delay_in
         os.kill(pid, signal.SIGTERM)
         kill_flag.set() # tell the main routine that we had to kill
         return
-    proc = subprocess.Popen(command, bufsize=1, shell=True,
-              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     if regex_list is None:
         regex_list = get_icm_error_list()
     if regex_list2 is None:
         regex_list2 = ['.*']
 
-    if timeout is not None:
-        pid = proc.pid
-        watchdog = threading.Timer(timeout, _kill_process_after_a_timeout, args=(pid, ))
-        watchdog.start()
-        (stdout, stderr) = proc.communicate(stdin)
-        watchdog.cancel() # if it's still waiting to run
-        success = not kill_flag.isSet()
-        kill_flag.clear()
-        exitcode = None
-        if success:
+    with command_span(command) as span:
+        proc = subprocess.Popen(command, bufsize=1, shell=True,
+                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if timeout is not None:
+            pid = proc.pid
+            watchdog = threading.Timer(timeout, _kill_process_after_a_timeout, args=(pid, ))
+            watchdog.start()
+            (stdout, stderr) = proc.communicate(stdin)
+            watchdog.cancel() # if it's still waiting to run
+            success = not kill_flag.isSet()
+            kill_flag.clear()
+            exitcode = None
+            if success:
+                exitcode = proc.returncode
+        else:
+            (stdout, stderr) = proc.communicate(stdin)
             exitcode = proc.returncode
-    else:
-        (stdout, stderr) = proc.communicate(stdin)
-        exitcode = proc.returncode
+        span.args['exitcode'] = exitcode
 
     ### This is needed for python 3
     if sys.version_info[0] > 2: